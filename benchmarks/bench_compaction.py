@@ -0,0 +1,73 @@
+"""历史摘要基准
+
+模拟一个不断增长的 chat，每隔若干条消息组装一次上下文，对比三种方式每轮提示词的 token 数：
+全部历史、按预算截取最近消息、历史摘要（摘要条目 + 最近的原始消息）。摘要使用不调用模型的
+extractive_summary，并统计摘要函数的调用次数（多个成员共享摘要缓存时只调用一次）。
+
+用法:
+    python -m benchmarks.bench_compaction --count 5000 --members 8
+    python benchmarks/bench_compaction.py --count 5000 --members 8
+"""
+import argparse
+import os
+import sys
+import time
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import make_messages
+from client.compaction import HistoryCompactor, SummaryCache, extractive_summary, is_summary
+from client.memory import AgentChats
+from client.retention import build_context_window, message_tokens
+
+
+def tokens(messages) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=5000, help='消息条数')
+    parser.add_argument('--members', type=int, default=4, help='看到同一 chat 的成员数')
+    parser.add_argument('--every', type=int, default=500, help='每隔多少条消息统计一次')
+    parser.add_argument('--budget', type=int, default=8000, help='截取最近消息时的 token 预算')
+    parser.add_argument('--span-size', type=int, default=40, help='每段的消息数')
+    parser.add_argument('--keep-recent', type=int, default=40, help='不参与摘要的最近消息数')
+    args = parser.parse_args()
+
+    messages, _ = make_messages(args.count)
+    calls = []
+
+    def summarizer(span):
+        calls.append(len(span))
+        return extractive_summary(span)
+
+    cache = SummaryCache()
+    members = []
+    for i in range(args.members):
+        memory = AgentChats(member_id=f'member-{i}')
+        compactor = HistoryCompactor(memory, summarizer, span_size=args.span_size,
+                                     keep_recent=args.keep_recent, cache=cache, namespace='bench')
+        members.append((memory, compactor))
+
+    print(f'{"消息数":>8} {"全部历史":>10} {"最近消息":>10} {"历史摘要":>10} {"摘要条目":>8}')
+    started = time.perf_counter()
+    for index, message in enumerate(messages, 1):
+        for memory, _ in members:
+            memory.add_message(message)
+        if index % args.every and index != len(messages):
+            continue
+        for _, compactor in members:
+            # 后台摘要可能还没跟上，这里同步补齐，统计的是稳定后的结果
+            compactor.compact_chat('game')
+        history = members[0][0].copy_messages('game')
+        compacted = members[0][1].compact(history)
+        print(f'{index:>8} {tokens(history):>10} {tokens(build_context_window(history, args.budget)):>10} '
+              f'{tokens(compacted):>10} {sum(map(is_summary, compacted)):>8}')
+    elapsed = time.perf_counter() - started
+    print(f'摘要函数调用 {len(calls)} 次（{args.members} 个成员共享缓存），缓存命中 {cache.hits} 次；用时 {elapsed:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
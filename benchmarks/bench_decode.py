@@ -0,0 +1,105 @@
+"""DTO 解码 / 编码开销基准
+
+对比 Message(**data) 与 from_wire、model_construct 免校验构造，model_dump 与 to_wire，
+以及标准库 json 与 FastJSON 在加载大量聊天记录时的单条消息耗时。
+from_wire 与 Message(**data) 做相同的校验，解码本身没有加速；加载聊天记录的差别来自 JSON 解析。
+
+用法:
+    python -m benchmarks.bench_decode --count 50000
+    python benchmarks/bench_decode.py --count 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.codec import FastJSON, orjson
+from client.dto import Message
+
+
+def make_payloads(count: int) -> list:
+    """构造与服务器 LOAD_CHAT_MESSAGES_FROM_SERVER 返回格式相同的消息列表"""
+    return [
+        {
+            '_id': uuid.uuid4().hex[:24],
+            'message': f'第 {i} 条消息，内容用于测试解码速度',
+            'message_type': 'text',
+            'chat_id': 'bench-chat',
+            'from_member_id': f'member-{i % 12}',
+            'from_member_name': f'玩家{i % 12}',
+            'timestamp': str(datetime.now()),
+            'message_id': str(uuid.uuid4()),
+            '__v': 0,
+        }
+        for i in range(count)
+    ]
+
+
+def timeit(fn, repeat: int) -> float:
+    """返回多次运行中最快一次的耗时，单位为秒"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(name: str, seconds: float, count: int, baseline: float = None):
+    per_message = seconds / count * 1e6
+    line = f'{name:<28} {seconds * 1000:10.1f} ms  {per_message:8.2f} us/msg'
+    if baseline:
+        line += f'  x{baseline / seconds:.1f}'
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=50000, help='消息条数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.count)
+    messages = [Message(**p) for p in payloads]
+    raw = json.dumps(payloads)
+    print(f'{args.count} messages, {len(raw) / 1024:.0f} KiB, orjson: {"yes" if orjson else "no"}')
+
+    print('\n-- decode dict -> Message (same validation, no speedup expected) --')
+    validated = timeit(lambda: [Message(**p) for p in payloads], args.repeat)
+    report('Message(**data)', validated, args.count)
+    fast = timeit(lambda: [Message.from_wire(p) for p in payloads], args.repeat)
+    report('Message.from_wire', fast, args.count)
+    constructed = timeit(lambda: [Message.model_construct(**p) for p in payloads], args.repeat)
+    report('Message.model_construct', constructed, args.count)
+
+    print('\n-- encode Message -> dict --')
+    dumped = timeit(lambda: [m.model_dump() for m in messages], args.repeat)
+    report('model_dump', dumped, args.count)
+    wired = timeit(lambda: [m.to_wire() for m in messages], args.repeat)
+    report('to_wire', wired, args.count, dumped)
+
+    print('\n-- wire JSON --')
+    std_loads = timeit(lambda: json.loads(raw), args.repeat)
+    report('json.loads', std_loads, args.count)
+    fast_loads = timeit(lambda: FastJSON.loads(raw), args.repeat)
+    report('FastJSON.loads', fast_loads, args.count, std_loads)
+    std_dumps = timeit(lambda: json.dumps(payloads, separators=(',', ':')), args.repeat)
+    report('json.dumps', std_dumps, args.count)
+    fast_dumps = timeit(lambda: FastJSON.dumps(payloads), args.repeat)
+    report('FastJSON.dumps', fast_dumps, args.count, std_dumps)
+
+    print('\n-- load history end to end (JSON text -> List[Message]), difference is JSON parsing --')
+    before = timeit(lambda: [Message(**p) for p in json.loads(raw)], args.repeat)
+    report('json + validate', before, args.count)
+    after = timeit(lambda: [Message.from_wire(p) for p in FastJSON.loads(raw)], args.repeat)
+    report('FastJSON + from_wire', after, args.count, before)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""消息链路负载基准
+
+启动 N 个模拟 MemberClient，分布在 M 个 chat 中，每个 chat 另有若干监听者，按指定速率和大小发送消息，测量：
+    - 端到端延迟：produce_message 到接收方 on_receive_message 被调用
+    - 确认延迟：消息发出到收到服务器确认
+    - 吞吐：发送和投递的消息数/秒，--rate 0 时不限速，即饱和吞吐
+    - 内存：登录前后进程 RSS 的增量，以及每个客户端的平均占用
+
+可以连接真实服务器（--url），也可以使用进程内回环服务器（--transport memory 或 socketio）。
+结果以 JSON 输出；指定 --baseline 时与之前的结果比较，吞吐下降或延迟上升超过 --tolerance 时以退出码 1 结束。
+
+用法:
+    python -m benchmarks.bench_messaging --members 50 --chats 5 --listeners 2 --rate 0 --duration 10
+    python benchmarks/bench_messaging.py --members 50 --chats 5 --listeners 2 --rate 0 --duration 10
+    python -m benchmarks.bench_messaging --url http://localhost:3000 --rate 5 --output run.json
+    python -m benchmarks.bench_messaging --baseline run.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.loopbackServer import LoopbackServer
+from client.memberClient import MemberClient, login_many
+from client.metrics import Histogram, get_default_metrics
+
+
+class LoadStats:
+    """所有模拟客户端共用的计数和延迟直方图"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # message_id -> 生成消息时的 perf_counter
+        self.produced_at: Dict[str, float] = {}
+        self.e2e = Histogram()
+        self.ack = Histogram()
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.delivered = 0
+        self.expected = 0
+        self.sent_done = False
+        self.first_send = None
+        self.last_delivery = None
+        self.all_delivered = threading.Event()
+
+    def on_delivered(self, message_id: str):
+        now = time.perf_counter()
+        start = self.produced_at.get(message_id)
+        if start is not None:
+            self.e2e.observe(now - start)
+        with self.lock:
+            self.delivered += 1
+            self.last_delivery = now
+            if self.delivered >= self.expected and self.sent_done:
+                self.all_delivered.set()
+
+
+class LoadClient(MemberClient):
+    """记录收到的消息，不打印"""
+
+    def __init__(self, name, member_id, stats: LoadStats, **kwargs):
+        super().__init__(name, member_id, **kwargs)
+        self.stats = stats
+
+    def produce_message(self, message: str, chat_id: str, message_type: str = 'text'):
+        produced = super().produce_message(message, chat_id, message_type)
+        self.stats.produced_at[produced.message_id] = time.perf_counter()
+        return produced
+
+    def on_receive_message(self, message):
+        self.stats.on_delivered(message.message_id)
+
+
+def rss_kib() -> float:
+    """当前进程的常驻内存，单位为 KiB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def sender(client: LoadClient, chat_id: str, receivers: int, args, stats: LoadStats, deadline: float):
+    payload = 'x' * args.size
+    interval = 1 / args.rate if args.rate > 0 else 0
+    next_send = time.perf_counter()
+    while time.perf_counter() < deadline:
+        if interval:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += interval
+        start = time.perf_counter()
+        with stats.lock:
+            stats.sent += 1
+            stats.expected += receivers
+            if stats.first_send is None:
+                stats.first_send = start
+        if args.mode == 'blocking':
+            client.send_message(payload, chat_id)
+            stats.ack.observe(time.perf_counter() - start)
+            with stats.lock:
+                stats.acked += 1
+            continue
+
+        _, future = client.send_message_async(payload, chat_id)
+
+        def on_ack(f, start=start):
+            stats.ack.observe(time.perf_counter() - start)
+            with stats.lock:
+                if f.exception() is None and (f.result() or {}).get('status') != 'failed':
+                    stats.acked += 1
+                else:
+                    stats.failed += 1
+
+        future.add_done_callback(on_ack)
+
+
+def run(args) -> dict:
+    stats = LoadStats()
+    run_id = uuid.uuid4().hex[:8]
+    server = None
+    url = args.url
+    if url is None:
+        server = LoopbackServer()
+        if args.transport == 'socketio':
+            url = server.serve(args.port)
+
+    rss_before = rss_kib()
+    members = [LoadClient(f'bench{i}', f'bench-{run_id}-{i}', stats, url=url or 'loopback://',
+                          serializer=args.serializer) for i in range(args.members)]
+    listeners = [LoadClient(f'listener{i}', f'bench-{run_id}-l{i}', stats, url=url or 'loopback://',
+                            serializer=args.serializer) for i in range(args.listeners * args.chats)]
+    clients = members + listeners
+    for client in clients:
+        if server is not None and args.transport == 'memory':
+            server.bind(client)
+        else:
+            client.signup()
+        client.resume_on_reconnect = False
+
+    login_start = time.perf_counter()
+    logged_in = login_many(clients, max_workers=min(len(clients), 64))
+    login_seconds = time.perf_counter() - login_start
+    if not all(logged_in):
+        raise RuntimeError(f'{logged_in.count(False)} clients failed to log in')
+
+    # 成员按轮转分配到各 chat，每个 chat 的第一个成员创建 chat
+    assignments: List[List[LoadClient]] = [members[i::args.chats] for i in range(args.chats)]
+    chat_ids = []
+    for chat_index, chat_members in enumerate(assignments):
+        ok, chat = chat_members[0].create_chat(f'bench-{run_id}-{chat_index}')
+        if not ok:
+            raise RuntimeError(f'create chat failed: {chat}')
+        chat_ids.append(chat.chat_id)
+        chat_members[0].pull_members_into_chat(chat.chat_id, [m.member_id for m in chat_members[1:]])
+        for listener in listeners[chat_index * args.listeners:(chat_index + 1) * args.listeners]:
+            listener.listen_in_chat(chat.chat_id)
+    rss_after_login = rss_kib()
+
+    get_default_metrics().reset()
+    deadline = time.perf_counter() + args.duration
+    threads = []
+    for chat_id, chat_members in zip(chat_ids, assignments):
+        receivers = len(chat_members) - 1 + args.listeners
+        for client in chat_members:
+            thread = threading.Thread(target=sender, args=(client, chat_id, receivers, args, stats, deadline),
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join()
+    send_end = time.perf_counter()
+    for client in members:
+        client.send_queue.flush(timeout=args.drain)
+    with stats.lock:
+        stats.sent_done = True
+        if stats.delivered >= stats.expected:
+            stats.all_delivered.set()
+    stats.all_delivered.wait(args.drain)
+    rss_peak = rss_kib()
+
+    for client in clients:
+        client.socket.disconnect()
+    if server is not None:
+        server.stop()
+
+    elapsed = (stats.last_delivery or send_end) - (stats.first_send or send_end)
+    return {
+        'config': {
+            'members': args.members,
+            'chats': args.chats,
+            'listeners_per_chat': args.listeners,
+            'rate': args.rate,
+            'size': args.size,
+            'duration': args.duration,
+            'mode': args.mode,
+            'serializer': args.serializer,
+            'target': args.url or f'loopback-{args.transport}',
+        },
+        'results': {
+            'sent': stats.sent,
+            'acked': stats.acked,
+            'failed': stats.failed,
+            'delivered': stats.delivered,
+            'expected_deliveries': stats.expected,
+            'lost': max(stats.expected - stats.delivered, 0),
+            'login_seconds': login_seconds,
+            'send_rate': stats.sent / (send_end - stats.first_send) if stats.first_send else 0.0,
+            'delivery_rate': stats.delivered / elapsed if elapsed > 0 else 0.0,
+            'e2e_latency': stats.e2e.summary(),
+            'ack_latency': stats.ack.summary(),
+            'memory_kib': {
+                'before': rss_before,
+                'after_login': rss_after_login,
+                'peak': rss_peak,
+                'per_client': (rss_after_login - rss_before) / len(clients),
+                'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            },
+        },
+        'metrics': get_default_metrics().snapshot(),
+    }
+
+
+# 与基准比较的指标：(路径, 越大越好)
+REGRESSION_KEYS = (
+    (('delivery_rate',), True),
+    (('send_rate',), True),
+    (('e2e_latency', 'p50'), False),
+    (('e2e_latency', 'p99'), False),
+    (('ack_latency', 'p99'), False),
+)
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """返回超出容差的退化项"""
+    regressions = []
+    for path, higher_is_better in REGRESSION_KEYS:
+        current, previous = result['results'], baseline['results']
+        for key in path:
+            current, previous = current[key], previous[key]
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f'{".".join(path)}: {previous:.6g} -> {current:.6g} ({change:+.0%})')
+    return regressions
+
+
+def print_report(result: dict):
+    r = result['results']
+    e2e, ack = r['e2e_latency'], r['ack_latency']
+    print(f'target {result["config"]["target"]}, {result["config"]["members"]} members, '
+          f'{result["config"]["chats"]} chats, {result["config"]["listeners_per_chat"]} listeners/chat')
+    print(f'sent {r["sent"]} acked {r["acked"]} failed {r["failed"]} '
+          f'delivered {r["delivered"]}/{r["expected_deliveries"]} lost {r["lost"]}')
+    print(f'send {r["send_rate"]:.0f} msg/s, delivery {r["delivery_rate"]:.0f} msg/s')
+    print(f'e2e  p50 {e2e["p50"] * 1000:.2f}ms p95 {e2e["p95"] * 1000:.2f}ms p99 {e2e["p99"] * 1000:.2f}ms')
+    print(f'ack  p50 {ack["p50"] * 1000:.2f}ms p95 {ack["p95"] * 1000:.2f}ms p99 {ack["p99"] * 1000:.2f}ms')
+    print(f'memory {r["memory_kib"]["per_client"]:.0f} KiB/client, peak {r["memory_kib"]["peak"] / 1024:.0f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=20, help='发送消息的成员数')
+    parser.add_argument('--chats', type=int, default=4, help='chat 数')
+    parser.add_argument('--listeners', type=int, default=1, help='每个 chat 的监听者数')
+    parser.add_argument('--rate', type=float, default=0, help='每个成员每秒发送的消息数，0 表示不限速')
+    parser.add_argument('--size', type=int, default=200, help='消息内容的字符数')
+    parser.add_argument('--duration', type=float, default=5, help='发送持续时间，单位为秒')
+    parser.add_argument('--drain', type=float, default=30, help='发送结束后等待投递完成的最长时间')
+    parser.add_argument('--mode', choices=('pipelined', 'blocking'), default='pipelined',
+                        help='pipelined 使用 send_message_async，blocking 使用 send_message')
+    parser.add_argument('--serializer', default='json', help="'json'、'msgpack' 或 'msgpack-tagged'")
+    parser.add_argument('--url', help='真实服务器地址，不指定时使用进程内回环服务器')
+    parser.add_argument('--transport', choices=('memory', 'socketio'), default='memory',
+                        help='回环服务器的接入方式')
+    parser.add_argument('--port', type=int, default=3100, help='--transport socketio 时回环服务器的端口')
+    parser.add_argument('--output', help='结果 JSON 写入的文件，默认输出到标准输出')
+    parser.add_argument('--baseline', help='用于比较的历史结果 JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对退化幅度')
+    parser.add_argument('--verbose', action='store_true', help='保留客户端的日志输出')
+    args = parser.parse_args()
+    if args.chats < 1 or args.members < 2 * args.chats:
+        parser.error('each chat needs at least two members')
+
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        result = run(args)
+
+    print_report(result)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    elif not args.baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print('regressions:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
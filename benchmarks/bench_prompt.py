@@ -0,0 +1,65 @@
+"""提示消息组装基准
+
+模拟一个不断增长的 chat，每来一条消息组装一次传给模型的 langchain 消息，对比每轮的耗时：
+原来的方式（用消息列表构造临时 AgentChat 再 convert_to_langchain_messages 全部转换）与
+PromptCache（MessageStore.from_unique 构造临时 AgentChat，只转换新追加的消息）。
+
+用法:
+    python -m benchmarks.bench_prompt --count 3000
+    python benchmarks/bench_prompt.py --count 3000
+"""
+import argparse
+import os
+import sys
+import time
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import make_messages
+from client.langChainMA import convert_to_langchain_messages, to_langchain_message
+from client.memory import AgentChat, AgentChats, MessageStore
+from client.promptCache import PromptCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=3000, help='消息条数')
+    parser.add_argument('--every', type=int, default=500, help='每隔多少条消息统计一次')
+    args = parser.parse_args()
+
+    messages, _ = make_messages(args.count)
+    memory = AgentChats(member_id=messages[0].from_member_id)
+    cache = PromptCache(to_langchain_message, memory)
+
+    print(f'{"消息数":>8} {"全部转换 ms":>12} {"增量转换 ms":>12}')
+    full_total = cached_total = 0.0
+    full_window = cached_window = 0.0
+    for index, message in enumerate(messages, 1):
+        memory.add_message(message)
+        history = memory.copy_messages('game')
+
+        started = time.perf_counter()
+        full = convert_to_langchain_messages(AgentChat(chat_id='game', member_id=memory.member_id, messages=history))
+        elapsed = time.perf_counter() - started
+        full_total += elapsed
+        full_window += elapsed
+
+        started = time.perf_counter()
+        chat = AgentChat(chat_id='game', member_id=memory.member_id, messages=MessageStore.from_unique(history))
+        cached = cache.convert(chat.chat_id, chat.messages)
+        elapsed = time.perf_counter() - started
+        cached_total += elapsed
+        cached_window += elapsed
+
+        assert len(full) == len(cached)
+        if index % args.every and index != len(messages):
+            continue
+        turns = args.every if index % args.every == 0 else index % args.every
+        print(f'{index:>8} {full_window / turns * 1000:>12.3f} {cached_window / turns * 1000:>12.3f}')
+        full_window = cached_window = 0.0
+    print(f'合计: 全部转换 {full_total:.2f} s，增量转换 {cached_total:.2f} s；缓存 {cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""语义检索基准
+
+统计 SemanticMemory 建立索引和检索的耗时，并对比三种上下文的 token 数与组装耗时：
+全部历史、按预算截取最近消息（build_context_window）、最近消息加检索结果（build_retrieval_window）。
+另外检查埋在早期历史中的一条关键发言能否被检索进窗口。
+
+用法:
+    python -m benchmarks.bench_retrieval --count 50000 --budget 4000
+    python benchmarks/bench_retrieval.py --count 50000 --budget 4000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_decode import report, timeit
+from client.clock import HybridLogicalClock
+from client.dto import Message
+from client.retention import build_context_window, message_tokens
+from client.semanticMemory import HashingEmbedder, SemanticMemory, TfidfEmbedder, build_retrieval_window
+
+TEMPLATES = [
+    '我觉得 {a} 号玩家昨晚的发言有问题，建议大家关注一下',
+    '我是好人，{a} 号和 {b} 号的逻辑我不太认同',
+    '先听听大家的意见，我这一轮过',
+    '{a} 号一直在带节奏，像是狼人在保 {b} 号',
+    '我站 {a} 号这边，他的发言比较真诚',
+]
+KEY_MESSAGE = '我是预言家，第一晚查验了 7 号，他是狼人，女巫的药还在'
+QUESTION = '预言家第一晚查验的结果是什么？'
+
+
+def make_messages(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    clock = HybridLogicalClock()
+
+    def make(text: str) -> Message:
+        speaker = rng.randrange(12)
+        return Message.model_construct(
+            message=text, message_type='text', chat_id='game', from_member_id=f'member-{speaker}',
+            from_member_name=f'玩家{speaker}', timestamp='', message_id=str(uuid.uuid4()), hlc=clock.now())
+
+    messages = []
+    for i in range(count):
+        if i == count // 10:
+            key = make(KEY_MESSAGE)
+            messages.append(key)
+        messages.append(make(rng.choice(TEMPLATES).format(a=rng.randrange(12), b=rng.randrange(12))))
+    messages.append(make(QUESTION))
+    return messages, key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=50000, help='消息条数')
+    parser.add_argument('--budget', type=int, default=4000, help='上下文 token 预算')
+    parser.add_argument('--dim', type=int, default=512, help='向量维数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+
+    messages, key = make_messages(args.count)
+    count = len(messages)
+    for name, embedder_type in (('特征哈希', HashingEmbedder), ('TF-IDF', TfidfEmbedder)):
+        started = time.perf_counter()
+        semantic = SemanticMemory(embedder_type(args.dim), messages)
+        report(f'{name} 建立索引', time.perf_counter() - started, count)
+        seconds = timeit(lambda: semantic.search(QUESTION, k=8), args.repeat)
+        print(f'{name} 检索 top-8: {seconds * 1000:.2f} ms，矩阵 {semantic.stats()["bytes"] / 1e6:.1f} MB')
+
+    print(f'全部历史: {count} 条，{sum(message_tokens(m) for m in messages)} token')
+    for name, build in (
+            ('最近消息', lambda: build_context_window(messages, args.budget)),
+            ('最近消息 + 检索', lambda: build_retrieval_window(messages, args.budget, semantic))):
+        window = build()
+        seconds = timeit(build, args.repeat)
+        print(f'{name}: {len(window)} 条，{sum(message_tokens(m) for m in window)} token，'
+              f'组装 {seconds * 1000:.1f} ms，包含关键发言: {"是" if key in window else "否"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""聊天记录快照基准
+
+对比二进制快照（snapshot.py）与 pydantic JSON（model_dump_json / model_validate_json）保存和恢复
+一个成员的大量聊天记录的耗时与文件大小。快照恢复只读取元数据，另外单独统计解码全部消息的耗时。
+
+用法:
+    python -m benchmarks.bench_snapshot --count 1000000 --chats 4
+    python benchmarks/bench_snapshot.py --count 1000000 --chats 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_decode import report, timeit
+from client.clock import HybridLogicalClock
+from client.dto import Message
+from client.memory import AgentChats
+
+
+def make_memory(count: int, chats: int) -> AgentChats:
+    clock = HybridLogicalClock()
+    memory = AgentChats(member_id='bench-member')
+    for i in range(count):
+        memory.add_message(Message.model_construct(
+            message=f'第 {i} 条发言，我觉得 {i % 12} 号玩家昨晚的发言有问题',
+            message_type='text',
+            chat_id=f'chat-{i % chats}',
+            from_member_id=f'member-{i % 12}',
+            from_member_name=f'玩家{i % 12}',
+            timestamp='2026-01-01 20:00:00.000000',
+            message_id=str(uuid.uuid4()),
+            hlc=clock.now(),
+        ))
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200000, help='消息条数')
+    parser.add_argument('--chats', type=int, default=4, help='chat 数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+
+    memory = make_memory(args.count, args.chats)
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, 'memory.snap')
+        json_path = os.path.join(directory, 'memory.json')
+
+        def save_json():
+            with open(json_path, 'w', encoding='utf-8') as f:
+                f.write(memory.model_dump_json())
+
+        def load_json():
+            with open(json_path, encoding='utf-8') as f:
+                AgentChats.model_validate_json(f.read())
+
+        def restore_snapshot():
+            restored = AgentChats(member_id=memory.member_id)
+            restored.restore(snapshot_path)
+            return restored
+
+        def restore_and_decode():
+            restored = restore_snapshot()
+            for chat in restored.chats.values():
+                chat.messages.last()
+
+        save_seconds = timeit(save_json, args.repeat)
+        report('JSON 保存', save_seconds, args.count)
+        report('快照保存', timeit(lambda: memory.snapshot(snapshot_path), args.repeat), args.count, save_seconds)
+        load_seconds = timeit(load_json, args.repeat)
+        report('JSON 恢复（校验）', load_seconds, args.count)
+        report('快照恢复', timeit(restore_snapshot, args.repeat), args.count, load_seconds)
+        report('快照恢复并解码全部消息', timeit(restore_and_decode, args.repeat), args.count, load_seconds)
+        print(f'文件大小: JSON {os.path.getsize(json_path) / 1e6:.1f} MB，'
+              f'快照 {os.path.getsize(snapshot_path) / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
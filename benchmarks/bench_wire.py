@@ -0,0 +1,102 @@
+"""线路编码基准
+
+对比 JSON、MessagePack 和键名替换为短标签的 MessagePack 三种编码下，
+RECEIVE_MESSAGE / SEND_COMMAND 等事件包的字节数以及编码、解码耗时。
+
+用法:
+    python -m benchmarks.bench_wire --count 20000 --fanout 50
+    python benchmarks/bench_wire.py --count 20000 --fanout 50
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from socketio import packet
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.codec import JSON, MSGPACK, MSGPACK_TAGGED, create_socket
+from client.events import Events
+
+
+def make_events(count: int) -> list:
+    """构造与服务器推送格式相同的事件数据，消息和命令结果按 4:1 混合"""
+    events = []
+    for i in range(count):
+        if i % 5:
+            events.append([Events.RECEIVE_MESSAGE, {
+                'message': f'第 {i} 条消息：我觉得 {i % 12} 号玩家昨晚的发言有问题',
+                'message_type': 'text',
+                'chat_id': str(uuid.uuid4()),
+                'from_member_id': str(uuid.uuid4()),
+                'from_member_name': f'玩家{i % 12}',
+                'timestamp': str(datetime.now()),
+                'message_id': str(uuid.uuid4()),
+            }])
+        else:
+            events.append([Events.RECEIVE_COMMAND, {
+                'command': 'vote',
+                'by': str(uuid.uuid4()),
+                'to': [str(uuid.uuid4()) for _ in range(3)],
+                'data': {'day': i % 7, 'candidates': ['玩家1', '玩家2', '玩家3']},
+            }])
+    return events
+
+
+def packet_class(serializer: str):
+    return create_socket(serializer).packet_class
+
+
+def bench(serializer: str, events: list, repeat: int) -> dict:
+    cls = packet_class(serializer)
+    packets = [cls(packet.EVENT, data=data) for data in events]
+
+    best_encode = float('inf')
+    encoded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encoded = [p.encode() for p in packets]
+        best_encode = min(best_encode, time.perf_counter() - start)
+
+    best_decode = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for e in encoded:
+            cls(encoded_packet=e)
+        best_decode = min(best_decode, time.perf_counter() - start)
+
+    total_bytes = sum(len(e.encode('utf-8')) if isinstance(e, str) else len(e) for e in encoded)
+    return {
+        'bytes': total_bytes / len(events),
+        'encode_us': best_encode / len(events) * 1e6,
+        'decode_us': best_decode / len(events) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20000, help='事件数')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    parser.add_argument('--fanout', type=int, default=50, help='估算群聊广播流量时的接收者数量')
+    args = parser.parse_args()
+
+    events = make_events(args.count)
+    results = {serializer: bench(serializer, events, args.repeat)
+               for serializer in (JSON, MSGPACK, MSGPACK_TAGGED)}
+    baseline = results[JSON]
+
+    print(f'{args.count} events, fanout {args.fanout}')
+    print(f'{"serializer":<16} {"bytes/msg":>10} {"encode us":>10} {"decode us":>10} '
+          f'{"KiB/fanout":>11} {"size":>6}')
+    for serializer, r in results.items():
+        fanout_kib = r['bytes'] * args.fanout / 1024
+        print(f'{serializer:<16} {r["bytes"]:10.1f} {r["encode_us"]:10.2f} {r["decode_us"]:10.2f} '
+              f'{fanout_kib:11.1f} {r["bytes"] / baseline["bytes"]:6.0%}')
+
+
+if __name__ == '__main__':
+    main()
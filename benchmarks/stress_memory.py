@@ -0,0 +1,242 @@
+"""聊天记录并发压力测试
+
+多个线程同时对若干成员的 AgentChats 追加、删除、读取消息，检查：
+    - 不丢消息、不重复：结束时每个 chat 的消息恰好是写入的消息减去删除的消息
+    - 副本一致：copy_messages 中没有重复的 message_id，同一写入线程的消息保持写入顺序
+    - 合并时间线有序：MergedTimeline 的结果按 HLC 排列且没有重复
+    - 并发创建 chat：多个线程同时向同一个新 chat 写入时不会各自创建 AgentChat 而丢消息
+
+--shared 时各成员的 chat 引用同一份 SharedLog。发现违反时打印原因并以退出码 1 结束。
+
+用法:
+    python -m benchmarks.stress_memory --members 4 --chats 3 --writers 8 --messages 2000
+    python benchmarks/stress_memory.py --members 4 --chats 3 --writers 8 --messages 2000
+    python -m benchmarks.stress_memory --shared --retention 500
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Set
+
+if __package__ in (None, ''):  # 以脚本运行时把仓库根目录加入模块搜索路径
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.clock import HybridLogicalClock, order_key
+from client.dto import Message
+from client.memory import AgentChats
+from client.retention import MaxMessages
+from client.sharedLog import SharedLog
+from client.timeline import MergedTimeline
+
+
+class Violations:
+    """各线程发现的问题，只保留前若干条"""
+
+    def __init__(self, limit: int = 20):
+        self.lock = threading.Lock()
+        self.items: List[str] = []
+        self.count = 0
+        self.limit = limit
+
+    def add(self, text: str):
+        with self.lock:
+            self.count += 1
+            if len(self.items) < self.limit:
+                self.items.append(text)
+
+
+def make_message(chat_id: str, writer: int, seq: int, clock: HybridLogicalClock) -> Message:
+    return Message.model_construct(
+        message=f'写入线程 {writer} 的第 {seq} 条消息',
+        message_type='text',
+        chat_id=chat_id,
+        from_member_id=f'writer-{writer}',
+        from_member_name=f'写入线程{writer}',
+        timestamp='',
+        message_id=f'{chat_id}:{writer}:{seq}',
+        hlc=clock.now(),
+    )
+
+
+def check_order(messages: List[Message], where: str, violations: Violations):
+    """没有重复，同一写入线程的消息按序号递增"""
+    seen: Set[str] = set()
+    last_seq: Dict[str, int] = {}
+    for message in messages:
+        if message.message_id in seen:
+            violations.add(f'{where}: 重复的消息 {message.message_id}')
+        seen.add(message.message_id)
+        _, writer, seq = message.message_id.rsplit(':', 2)
+        seq = int(seq)
+        if seq <= last_seq.get(writer, -1):
+            violations.add(f'{where}: 写入线程 {writer} 的消息 {seq} 出现在 {last_seq[writer]} 之后')
+        last_seq[writer] = seq
+
+
+def run(args) -> int:
+    clock = HybridLogicalClock()
+    shared_log = SharedLog() if args.shared else None
+    members = []
+    for i in range(args.members):
+        memory = AgentChats(member_id=f'member-{i}')
+        if shared_log is not None:
+            memory.use_shared_log(shared_log)
+        if args.retention:
+            memory.set_retention([MaxMessages(args.retention)])
+        members.append(memory)
+    chat_ids = [f'chat-{i}' for i in range(args.chats)]
+    for memory in members:
+        for chat_id in chat_ids[1:]:
+            memory.add_reference_chat(chat_ids[0], chat_id)
+
+    violations = Violations()
+    # chat_id -> 写入/删除的 message_id，每个写入线程只写自己的列表，结束后汇总
+    written: List[Dict[str, List[str]]] = [{chat_id: [] for chat_id in chat_ids} for _ in range(args.writers)]
+    removed: List[Set[str]] = [set() for _ in range(args.removers)]
+    stop = threading.Event()
+    counters = {'reads': 0, 'timeline_reads': 0}
+    counters_lock = threading.Lock()
+
+    def writer(index: int):
+        for seq in range(args.messages):
+            chat_id = chat_ids[seq % len(chat_ids)]
+            message = make_message(chat_id, index, seq, clock)
+            # 与分发线程相同，同一条消息写入每个成员的聊天记录
+            for memory in members:
+                memory.add_message(message)
+            written[index][chat_id].append(message.message_id)
+
+    def remover(index: int):
+        rng = random.Random(index)
+        while not stop.is_set():
+            writer_index = rng.randrange(args.writers)
+            chat_id = rng.choice(chat_ids)
+            ids = written[writer_index][chat_id]
+            if not ids:
+                time.sleep(0.001)
+                continue
+            message_id = ids[rng.randrange(len(ids))]
+            for memory in members:
+                memory.remove_message(message_id, chat_id)
+            removed[index].add(message_id)
+            time.sleep(args.remove_interval)
+
+    def reader(index: int):
+        rng = random.Random(1000 + index)
+        timelines = [MergedTimeline(memory, chat_ids) for memory in members]
+        reads = timeline_reads = 0
+        while not stop.is_set():
+            member = rng.randrange(len(members))
+            memory = members[member]
+            chat_id = rng.choice(chat_ids)
+            messages = memory.copy_messages(chat_id)
+            check_order(messages, f'成员 {member} 的 {chat_id} 副本', violations)
+            with memory.chat_lock(chat_id):
+                store = memory.get_chat(chat_id).messages
+                if len(store) != len(list(store)):
+                    violations.add(f'成员 {member} 的 {chat_id}: len 与遍历结果不一致')
+            reads += 1
+
+            merged = timelines[member].messages()
+            keys = [order_key(message) for message in merged]
+            if keys != sorted(keys):
+                violations.add(f'成员 {member} 的合并时间线没有按 HLC 排列')
+            if len({message.message_id for message in merged}) != len(merged):
+                violations.add(f'成员 {member} 的合并时间线中有重复消息')
+            timeline_reads += 1
+        with counters_lock:
+            counters['reads'] += reads
+            counters['timeline_reads'] += timeline_reads
+
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    background = [threading.Thread(target=remover, args=(i,)) for i in range(args.removers)]
+    background += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    started = time.perf_counter()
+    for thread in background + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in background:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # 结束时的内容：写入的消息减去删除的消息，启用保留策略时只检查没有多出消息
+    all_removed = set().union(*removed)
+    for chat_id in chat_ids:
+        expected = {message_id for w in written for message_id in w[chat_id]} - all_removed
+        for i, memory in enumerate(members):
+            messages = memory.copy_messages(chat_id)
+            actual = {message.message_id for message in messages}
+            check_order(messages, f'成员 {i} 的 {chat_id} 最终结果', violations)
+            if args.retention:
+                if not actual <= expected:
+                    violations.add(f'成员 {i} 的 {chat_id}: 多出 {len(actual - expected)} 条已删除的消息')
+                if len(actual) > args.retention:
+                    violations.add(f'成员 {i} 的 {chat_id}: {len(actual)} 条消息超出保留上限 {args.retention}')
+            elif actual != expected:
+                violations.add(f'成员 {i} 的 {chat_id}: 缺少 {len(expected - actual)} 条，多出 {len(actual - expected)} 条')
+
+    race_lost = check_create_race(args, clock, shared_log)
+    if race_lost:
+        violations.add(f'并发创建 chat 时丢失 {race_lost} 条消息')
+
+    total = args.writers * args.messages * args.members
+    print(f'成员 {args.members}，chat {args.chats}，写入线程 {args.writers}，'
+          f'删除线程 {args.removers}，读取线程 {args.readers}，共享日志 {"是" if args.shared else "否"}')
+    print(f'写入 {total} 次，{total / elapsed:.0f} 次/秒；删除 {len(all_removed)} 条；'
+          f'副本读取 {counters["reads"]} 次，时间线读取 {counters["timeline_reads"]} 次；用时 {elapsed:.2f} s')
+    if violations.count:
+        print(f'发现 {violations.count} 处问题:')
+        for text in violations.items:
+            print(f'  {text}')
+        return 1
+    print('未发现问题')
+    return 0
+
+
+def check_create_race(args, clock: HybridLogicalClock, shared_log) -> int:
+    """多个线程同时向尚不存在的 chat 写入，返回丢失的消息数"""
+    lost = 0
+    for round_index in range(args.create_rounds):
+        memory = AgentChats(member_id='create-race')
+        if shared_log is not None:
+            memory.use_shared_log(shared_log)
+        chat_id = f'new-chat-{round_index}'
+        barrier = threading.Barrier(args.writers)
+
+        def add(index: int):
+            message = make_message(chat_id, index, 0, clock)
+            barrier.wait()
+            memory.add_message(message)
+
+        threads = [threading.Thread(target=add, args=(i,)) for i in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        lost += args.writers - len(memory.get_chat(chat_id).messages)
+    return lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=4, help='成员数，每条消息写入每个成员的聊天记录')
+    parser.add_argument('--chats', type=int, default=3, help='chat 数，第一个为主聊天，其余为参考聊天')
+    parser.add_argument('--writers', type=int, default=8, help='写入线程数')
+    parser.add_argument('--messages', type=int, default=2000, help='每个写入线程写入的消息数')
+    parser.add_argument('--removers', type=int, default=2, help='删除线程数')
+    parser.add_argument('--remove-interval', type=float, default=0.0005, help='删除线程每次删除后的间隔，秒')
+    parser.add_argument('--readers', type=int, default=4, help='读取线程数')
+    parser.add_argument('--retention', type=int, default=0, help='每个 chat 保留的最大消息数，0 为不限')
+    parser.add_argument('--create-rounds', type=int, default=200, help='并发创建 chat 的测试轮数')
+    parser.add_argument('--shared', action='store_true', help='各成员引用同一份 SharedLog')
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
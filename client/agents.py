@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from dto import Message
 from memberAgent import BaseMemberAgent
 from memory import AgentChat
+from promptCache import PromptCache
 
 
 # 定义角色枚举，确保角色只能取固定值
@@ -65,17 +66,14 @@ class OpenRouterLLM:
         return completion.choices[0].message.content
 
 
-def convert_to_openrouter_messages(agent_chat: AgentChat) -> List[OpenAIMessage]:
-    openrouter_messages = []
-    for message in agent_chat.messages:
-        if message.from_member_id == agent_chat.member_id:
-            openrouter_messages.append(OpenAIMessage(role=Role.ASSISTANT.value, content=message.message))
+def to_openrouter_message(message: Message, member_id: str) -> OpenAIMessage:
+    if message.from_member_id == member_id:
+        return OpenAIMessage(role=Role.ASSISTANT.value, content=message.message)
+    return OpenAIMessage(role=Role.USER.value, content=f'{message.from_member_name}: {message.message}')
 
-        else:
-            openrouter_messages.append(
-                OpenAIMessage(role=Role.USER.value, content=f'{message.from_member_name}: {message.message}'))
 
-    return openrouter_messages
+def convert_to_openrouter_messages(agent_chat: AgentChat) -> List[OpenAIMessage]:
+    return [to_openrouter_message(message, agent_chat.member_id) for message in agent_chat.messages]
 
 
 class OpenRouterAgent(BaseMemberAgent):
@@ -83,9 +81,11 @@ class OpenRouterAgent(BaseMemberAgent):
         super().__init__(name, member_id)
         self.llm = OpenRouterLLM(model)
         self.prompt = '你是一个AI助手，请回答用户的问题。'
+        # 上一轮转换过的消息直接复用，每轮只转换新消息
+        self.prompt_cache = PromptCache(to_openrouter_message, self.memory)
 
     def get_ai_response(self, prompt: str, chat: AgentChat) -> str:
-        messages = convert_to_openrouter_messages(chat)
+        messages = self.prompt_cache.convert(chat.chat_id, chat.messages)
         messages = [OpenAIMessage(role=Role.SYSTEM.value, content=prompt)] + messages
         return self.llm.invoke(messages)
 
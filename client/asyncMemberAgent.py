@@ -0,0 +1,66 @@
+from .chatMemory import ChatMemoryMixin
+from .dto import Message, ReplyData
+from .events import Events
+from .asyncMemberClient import AsyncMemberClient
+from .memory import AgentChat, MessageStore
+
+
+# 带有聊天记录的异步成员客户端，与传输无关的部分见 ChatMemoryMixin
+class AsyncMemberClientWithChats(ChatMemoryMixin, AsyncMemberClient):
+    def __init__(self, name, member_id, **kwargs):
+        super().__init__(name, member_id, **kwargs)
+        self._init_chat_memory()
+
+    async def on_receive_message(self, message: Message):
+        self.memory.add_message(message)
+
+    async def send_message(self, message: str, chat_id: str) -> Message:
+        message_obj: Message = await super().send_message(message, chat_id)
+        self.memory.add_message(message_obj)
+        return message_obj
+
+
+class AsyncBaseMemberAgent(AsyncMemberClientWithChats):
+    """异步智能体基类，reply 和 get_ai_response 都是协程"""
+
+    def __init__(self, name: str, member_id: str, **kwargs):
+        super().__init__(name, member_id, **kwargs)
+        self.prompt = None
+
+    def connect_events(self):
+        super().connect_events()
+        self.socket.on(Events.NEXT_SPEAKER, self._reply)
+
+    async def _reply(self, data: dict):
+        # 在后台任务中生成回复，不阻塞事件循环上的其他事件
+        self.spawn(self.reply(ReplyData.from_wire(data)))
+
+    async def reply(self, data: ReplyData):
+        """根据主聊天和参考聊天生成回复
+
+        Args:
+            data: 包含聊天ID的数据对象
+        """
+        chat_id = data.chat_id
+        if chat_id not in self.memory.chats:
+            print(f'{self.name}: chat not in chats')
+            return
+
+        # 以主聊天ID命名，提示消息的转换缓存（PromptCache）按它复用上一轮的结果
+        temp_chat = AgentChat(
+            chat_id=chat_id,
+            member_id=self.member_id,
+            messages=MessageStore.from_unique(self.get_context_window(chat_id, self.prompt))
+        )
+        rsp = await self.get_ai_response(self.prompt, temp_chat)
+        await self.send_message(rsp, chat_id)
+
+    async def get_ai_response(self, prompt: str, chat: AgentChat) -> str:
+        """调用模型生成回复
+
+        Args:
+            prompt: 系统提示词
+            chat: 已在 context_token_budget 以内的聊天记录，reply 中由 get_context_window 构建；
+                其他调用方需要先调用 fit_to_budget
+        """
+        pass
@@ -0,0 +1,524 @@
+import asyncio
+import inspect
+import time
+import uuid
+from datetime import datetime
+from typing import List, Union, Dict, Callable, Any, Tuple
+
+import aiohttp
+
+from .clientState import ClientStateMixin
+from .clock import HybridLogicalClock, get_default_clock
+from .codec import create_socket, socketio_path
+from .dto import Message, Command, CommandResult, Member, Chat
+from .events import Events
+from .memberClient import command
+from .metadataCache import MetadataCache
+from .metrics import Metrics, get_default_metrics
+
+
+class AsyncMemberClient(ClientStateMixin):
+    """基于 socketio.AsyncClient 的成员客户端
+
+    与 MemberClient 接口一致，但所有 RPC、事件处理和命令处理都是协程，
+    运行在同一个事件循环上，不再为每条消息创建线程。
+    命令仍使用 @command 装饰器注册，处理函数可以是普通函数或协程。
+    断线恢复、消息去重和元数据缓存与 MemberClient 相同，见 ClientStateMixin。
+    """
+
+    def __init__(self, name, member_id, description='', url='http://localhost:3000', serializer='json',
+                 socket=None):
+        self.name = name
+        self.member_id = member_id
+        self.description = description
+        # 线路编码：'json'、'msgpack' 或 'msgpack-tagged'，连接时通过 Socket.IO 路径与服务器协商
+        self.serializer = serializer
+        # 可以传入已有的传输，此时不再创建 socketio.AsyncClient
+        self.socket = socket if socket is not None else create_socket(serializer, asynchronous=True)
+        self.base_url = url
+
+        self.login_success = False  # login状态标识
+        self.events_bound = False  # 标识事件是否已经绑定
+
+        self.connect_timeout = 10  # 设置连接超时时间，单位为秒
+        self._login_event: asyncio.Event | None = None
+        # 命名空间连接建立时置位，断开时清除；补拉需要等连接可用后才能发出请求。与 _login_event 一样在 login 中创建
+        self._connected: asyncio.Event | None = None
+
+        self.command_handlers: Dict[str, Callable[[Any], Any]] = {}
+        self.register_commands()
+
+        # 保存正在运行的消息处理任务，避免被垃圾回收
+        self._tasks = set()
+        # RPC 延迟、处理时间等指标，进程内所有客户端共用
+        self.metrics: Metrics = get_default_metrics()
+        # 混合逻辑时钟，发送时打时间戳，收到消息时合并对方的时钟
+        self.clock: HybridLogicalClock = get_default_clock()
+        # chat 和成员信息缓存，由服务器推送的变更事件失效
+        self.metadata_cache = MetadataCache()
+        # 断线恢复的游标和消息去重，见 ClientStateMixin
+        self._init_client_state()
+
+    def set_serializer(self, serializer: str):
+        """切换线路编码，需要在 login 之前调用
+
+        Args:
+            serializer: 'json'（默认）、'msgpack' 或 'msgpack-tagged'（键名替换为短标签的 msgpack）
+        """
+        if self.socket.connected:
+            raise RuntimeError('set_serializer must be called before login')
+        self.serializer = serializer
+        self.socket = create_socket(serializer, asynchronous=True)
+        self.events_bound = False
+
+    def register_commands(self):
+        # 自动注册被 @command 装饰的实例方法
+        for attr_name in dir(self):
+            attr = getattr(self, attr_name)
+            if callable(attr) and hasattr(attr, '_command_name'):
+                command_name = attr._command_name
+                self.command_handlers[command_name] = attr
+
+    def spawn(self, coro) -> asyncio.Task:
+        """在当前事件循环中调度协程，并持有任务引用直到其结束"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def send_command(self, command: str, to: List[str], data: dict = None,
+                           timeout: float = 30) -> List[CommandResult]:
+        """发送命令并等待所有接收者的结果
+
+        Args:
+            command: 命令名称
+            to: 接收命令的成员列表
+            data: 命令数据
+            timeout: 超时时间，单位为秒
+
+        Returns:
+            List[CommandResult]: 命令执行结果列表
+        """
+        if command is None or command == '':
+            print(f'{self.name} 发送命令失败，命令为空')
+            return []
+        if to is None or len(to) == 0:
+            print(f'{self.name} 发送命令失败，to为空')
+            return []
+
+        if data is None:
+            data = {}
+        command_obj = Command(command=command, to=to, data=data, by=self.member_id)
+        try:
+            response = await self.socket.call(Events.SEND_COMMAND, command_obj.to_wire(), timeout=timeout)
+            return [CommandResult.from_wire(r) for r in response]
+        except Exception as e:
+            print(f"发送命令时发生错误: {str(e)}")
+            return []
+
+    async def on_receive_command(self, command: dict):
+        command = Command.from_wire(command)
+        handler = self.command_handlers.get(command.command)
+        if handler:
+            with self.metrics.timer('handler_seconds', f'command:{command.command}', 'handler_errors'):
+                ret = handler(command.data)
+                if inspect.isawaitable(ret):
+                    ret = await ret
+            if ret is None:
+                ret = ''
+            return ret
+        else:
+            print(f"{self.name} 收到未知命令：{command.command}")
+            return f'unknown command,{command.command}'
+
+    def connect_events(self):
+        self.events_bound = True  # 确保事件处理程序只绑定一次
+        self.socket.on(Events.CONNECT, self._on_connect)
+        self.socket.on(Events.RECEIVE_LOGIN_RESPONSE, self.on_receive_login_response)
+        self.socket.on(Events.DISCONNECT, self.logout)
+        self.socket.on(Events.RECEIVE_MESSAGE, self._on_receive_message)
+        self.socket.on(Events.RECEIVE_COMMAND, self.on_receive_command)
+        self.socket.on(Events.CHAT_CHANGED, self.on_chat_changed)
+        self.socket.on(Events.CHAT_MEMBERSHIP_CHANGED, self.on_chat_membership_changed)
+
+    def _on_connect(self):
+        if self._connected is not None:
+            self._connected.set()
+
+    async def login(self) -> bool:
+        """连接到 Socket.IO 服务器并等待登录响应"""
+        if self.login_success and self.socket.connected:
+            return True
+
+        self._login_event = asyncio.Event()
+        self._connected = asyncio.Event()
+        # 事件需要在连接前绑定，否则可能错过登录响应
+        if not self.events_bound:
+            self.connect_events()
+        if self.socket.connected:
+            self._connected.set()
+        else:
+            await self.socket.connect(self.base_url, transports=['websocket'],
+                                      socketio_path=socketio_path(self.serializer),
+                                      auth={'member_name': self.name, 'member_id': self.member_id})
+        try:
+            await asyncio.wait_for(self._login_event.wait(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            print("Connection timed out. Please try again.")
+            return False
+        return self.login_success
+
+    async def on_receive_login_response(self, data):
+        """处理登录响应"""
+        print('login response:', data)
+        if data['status'] == 200:
+            print(f"Login Success: {data['message']}")
+            self.login_success = True
+            resume = self._on_login_accepted()
+            ret = self.on_login_success()
+            if inspect.isawaitable(ret):
+                await ret
+            if resume:
+                self.spawn(self.resume_session())
+        else:
+            print(f"Login Failed: {data['message']}")
+            self.login_success = False
+        if self._login_event is not None:
+            self._login_event.set()
+
+    def on_login_success(self):
+        pass
+
+    async def logout(self):
+        """断开连接"""
+        self.login_success = False
+        if self._connected is not None:
+            self._connected.clear()
+        print(f"Socketio Disconnected, {self.name} {self.member_id}")
+
+    def produce_message(self, message: str, chat_id: str, message_type: str = 'text') -> Message:
+        return Message(message=message,
+                       message_type=message_type,
+                       chat_id=chat_id,
+                       from_member_id=self.member_id,
+                       from_member_name=self.name,
+                       timestamp=str(datetime.now()),
+                       message_id=str(uuid.uuid4()),
+                       hlc=self.clock.now(),
+                       )
+
+    async def send_message(self, message: str, chat_id: str) -> Message:
+        print(f'{datetime.now()} {self.name}:', message)
+
+        message: Message = self.produce_message(message, chat_id)
+        try:
+            ack = await self.socket.call(Events.SEND_MESSAGE, message.to_wire())
+            self.adopt_ack(message, ack)
+            self._remember_message(message)
+        except TimeoutError:
+            print("请求超时，服务器未在指定时间内响应")
+        except Exception as e:
+            print(f"发生未知错误: {e}")
+
+        return message
+
+    async def signup(self) -> dict:
+        data = {
+            "member_id": self.member_id,
+            "member_name": self.name,
+            "description": self.description
+        }
+
+        try:
+            print('signup:', self.base_url)
+            async with aiohttp.ClientSession() as session:
+                async with session.post(self.base_url + '/chat/signup', json=data) as response:
+                    rsp = await response.json()
+            if rsp.get('status') in [200, 201]:
+                print("Signup Success:", rsp)
+            else:
+                print(f"Signup Failed: {rsp.get('status')} - {rsp}")
+            return rsp
+        except aiohttp.ClientError as e:
+            print(f"Error occurred during signup: {e}")
+            return {}
+
+    def _parse_message(self, data: dict) -> Message:
+        return Message.from_wire(data)
+
+    async def _on_receive_message(self, message: Dict):
+        # 先确认收到，再在后台任务中处理，避免阻塞服务端的转发
+        message = self._parse_message(message)
+        self.clock.update(message.hlc)
+        if not self._buffer_if_resuming(message):
+            self._deliver_message(message)
+        return True
+
+    def _deliver_message(self, message: Message):
+        if self._remember_message(message):
+            self.spawn(self.on_receive_message(message))
+
+    async def resume_session(self) -> int:
+        """补拉断线期间错过的消息，与 MemberClient.resume_session 相同
+
+        Returns:
+            int: 补拉到的消息数
+        """
+        # 登录响应可能先于命名空间连接完成到达，等待连接可用后再请求
+        if self._connected is not None:
+            try:
+                await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        started = self._begin_resume()
+        if started is None:
+            return 0  # 已有补拉在进行
+        cursors, hlc_cursors = started
+
+        replayed = 0
+        try:
+            for chat_id, since in cursors.items():
+                try:
+                    missed = await self.load_chat_messages_from_server(chat_id, self.resume_max_messages, since=since,
+                                                                       since_hlc=hlc_cursors.get(chat_id))
+                except Exception as e:
+                    print(f"{self.name} 补拉聊天室 {chat_id} 的消息失败: {e}")
+                    continue
+                for message in missed:
+                    # 服务器不会把自己发出的消息推送给自己，补拉时同样跳过
+                    if message.from_member_id == self.member_id or not self._remember_message(message):
+                        continue
+                    self.spawn(self.on_receive_message(message))
+                    replayed += 1
+        finally:
+            while True:
+                buffered = self._take_resume_buffer()
+                if not buffered:
+                    break
+                for message in buffered:
+                    self._deliver_message(message)
+
+        if replayed:
+            print(f"{self.name} 重连后补拉了 {replayed} 条消息")
+        return replayed
+
+    async def on_receive_message(self, message: Message):
+        """处理接收到的消息"""
+        print(f'{self.name} receive_message:', message)
+
+    async def get_online_members(self):
+        return await self.socket.call(Events.GET_ONLINE_MEMBERS)
+
+    async def get_chat_online_members(self, chat_id: str):
+        return await self.socket.call(Events.GET_CHAT_ONLINE_MEMBERS, {'chat_id': chat_id})
+
+    async def create_chat(self, name: str, description: str = None, join: bool = True,
+                          is_group: bool = True) -> Tuple[bool, Union[Chat, str]]:
+        """
+        name: 聊天室名称
+        description: 聊天室描述
+        is_group: 是否为群聊
+        """
+        try:
+            data = {
+                'name': name,
+                'description': description,
+                'is_group': is_group
+            }
+
+            response = await self.socket.call(Events.CREATE_CHAT, data)
+            if response.get('status') == 'success':
+                chat_id = response['data']['chat_id']
+                print(f"聊天室 {chat_id} 创建成功")
+                if join:
+                    await self.join_chat(chat_id)
+                return True, Chat.from_wire(response.get('data'))
+            else:
+                print(f"创建聊天室失败: {response.get('message')}")
+                return False, response.get('message')
+        except Exception as e:
+            print(f"创建聊天室时发生错误: {str(e)}")
+            return False, f'发生异常: {str(e)}'
+
+    async def join_chat(self, chat_id: str) -> tuple[bool, Any]:
+        """
+        chat_id: 聊天室ID
+        """
+        try:
+            response = await self.socket.call(Events.JOIN_CHAT, {'chat_id': chat_id})
+            self.metadata_cache.invalidate_chat(chat_id)
+            if response.get('status') == 'success':
+                print(f"{self.name}成功加入聊天室 {chat_id}")
+                return True, response
+            else:
+                print(f"加入聊天室失败: {response.get('message')}")
+                return False, response
+        except Exception as e:
+            error_msg = f"加入聊天室时发生错误: {str(e)}"
+            print(error_msg)
+            return False, error_msg
+
+    async def get_joined_chats(self) -> List[str]:
+        return await self.socket.call(Events.GET_JOINED_CHATS)
+
+    async def get_chat(self, chat_id: str, try_get_from_local: bool = True) -> Chat | None:
+        if try_get_from_local:
+            chat = self.metadata_cache.get_chat(chat_id)
+            if chat is not None:
+                return chat
+        response = await self.socket.call(Events.GET_CHAT, {'chat_id': chat_id})
+        if response.get('status') == 'success':
+            chat = Chat.from_wire(response.get('data'))
+            self.metadata_cache.put_chat(chat)
+            return chat
+        else:
+            return None
+
+    async def delete_chat(self, chat_id: str) -> dict:
+        self.metadata_cache.invalidate_chat(chat_id)
+        return await self.socket.call(Events.DELETE_CHAT, {'chat_id': chat_id})
+
+    async def exit_chat(self, chat_id: str) -> dict:
+        self.metadata_cache.invalidate_chat(chat_id)
+        return await self.socket.call(Events.EXIT_CHAT, {'chat_id': chat_id})
+
+    async def pull_members_into_chat(self, chat_id: str, member_ids: List[str]) -> dict:
+        data = {
+            'chat_id': chat_id,
+            'members': member_ids
+        }
+        self.metadata_cache.invalidate_chat(chat_id)
+        return await self.socket.call(Events.PULL_MEMBERS_INTO_CHAT, data)
+
+    async def get_member(self, member_id: str, try_get_from_local: bool = True) -> Member:
+        if try_get_from_local:
+            member = self.metadata_cache.get_member(member_id)
+            if member is not None:
+                return member
+        member = Member.from_wire(await self.socket.call(Events.GET_MEMBER, {'member_id': member_id}))
+        self.metadata_cache.put_member(member)
+        return member
+
+    async def get_members(self, member_ids: List[str], try_get_from_local: bool = True) -> List[Member]:
+        cached = {}
+        if try_get_from_local:
+            for member_id in member_ids:
+                member = self.metadata_cache.get_member(member_id)
+                if member is not None:
+                    cached[member_id] = member
+        missing = [member_id for member_id in member_ids if member_id not in cached]
+        if missing:
+            for member in await self.socket.call(Events.GET_MEMBERS, {'members': missing}):
+                member = Member.from_wire(member)
+                self.metadata_cache.put_member(member)
+                cached[member.member_id] = member
+        return [cached[member_id] for member_id in member_ids if member_id in cached]
+
+    async def get_chat_members(self, chat_id: str, need_complete_info: bool = False,
+                               try_get_from_local: bool = True) -> List[Member | str]:
+        if try_get_from_local:
+            if need_complete_info:
+                members = self.metadata_cache.get_chat_members(chat_id)
+                if members is not None:
+                    return list(members)
+            else:
+                chat = self.metadata_cache.get_chat(chat_id)
+                if chat is not None:
+                    return list(chat.members)
+        data = {
+            'chat_id': chat_id,
+            'complete': need_complete_info
+        }
+        members = await self.socket.call(Events.GET_CHAT_MEMBERS, data)
+        if not need_complete_info:
+            return members
+        members = [Member.from_wire(member) for member in members]
+        self.metadata_cache.put_chat_members(chat_id, members)
+        return list(members)
+
+    async def get_created_chats(self) -> List[Chat]:
+        chats = await self.socket.call(Events.GET_CREATED_CHATS)
+        return [Chat.from_wire(chat) for chat in chats]
+
+    async def get_member_by_name(self, name: str, chat_id: str, try_get_from_local: bool = True) -> Member:
+        if try_get_from_local:
+            for member in await self.get_chat_members(chat_id, True):
+                if member.name == name:
+                    return member
+        data = {
+            'name': name,
+            'chat_id': chat_id
+        }
+        member = await self.socket.call(Events.GET_MEMBER_BY_NAME, data)
+        return Member.from_wire(member)
+
+    async def remove_member_from_chat(self, chat_id: str, member_id: str):
+        data = {
+            'chat_id': chat_id,
+            'member_id': member_id
+        }
+        self.metadata_cache.invalidate_chat(chat_id)
+        return await self.socket.call(Events.REMOVE_MEMBER_FROM_CHAT, data)
+
+    async def load_chat_messages_from_server(self, chat_id: str, count: int = -1, since: str = None,
+                                             since_hlc: int = None) -> List[Message]:
+        """
+        count: 加载的聊天记录数量，-1表示加载所有
+        since: 消息ID游标，只加载该消息之后的消息；游标不存在时按 count 加载最近的消息
+        since_hlc: HLC 游标，只加载 HLC 大于该值的消息，服务器支持时优先于 since
+        """
+        data = {
+            'chat_id': chat_id,
+            'count': count
+        }
+        if since is not None:
+            data['since'] = since
+        if since_hlc:
+            data['since_hlc'] = since_hlc
+        messages_data = await self.socket.call(Events.LOAD_CHAT_MESSAGES_FROM_SERVER, data)
+        messages = [Message.from_wire(message) for message in messages_data]
+        if messages:
+            self.clock.update(max(message.hlc for message in messages))
+        return messages
+
+    async def listen_in_chat(self, chat_id: str):
+        self.metadata_cache.invalidate_chat(chat_id)
+        return await self.socket.call(Events.LISTEN_IN_CHAT, {'chat_id': chat_id})
+
+    async def unlisten_in_chat(self, chat_id: str):
+        self.metadata_cache.invalidate_chat(chat_id)
+        return await self.socket.call(Events.UNLISTEN_IN_CHAT, {'chat_id': chat_id})
+
+    async def get_listen_in_chats(self):
+        return await self.socket.call(Events.GET_LISTEN_IN_CHATS)
+
+    async def wait(self):
+        """阻塞直到连接断开"""
+        await self.socket.wait()
+
+    @command()
+    async def test(self, data: dict):
+        print(f'{self.name} run test command:', data)
+        return f'{self.name} this is a test command result'
+
+
+async def login_many(clients: List[AsyncMemberClient]) -> List[bool]:
+    """在同一个事件循环中并发登录多个客户端
+
+    Returns:
+        List[bool]: 与 clients 顺序一致的登录结果
+    """
+    start = time.time()
+    results = await asyncio.gather(*(client.login() for client in clients))
+    print(f'{len(clients)} 个客户端登录完成，耗时 {time.time() - start:.3f}s')
+    return list(results)
+
+
+if __name__ == '__main__':
+    async def main():
+        ms = [AsyncMemberClient(f"member{i}", f"member_id{i}") for i in range(10)]
+        await login_many(ms)
+        await ms[0].wait()
+
+    asyncio.run(main())
@@ -1,5 +1,4 @@
 import random
-import threading
 from typing import Dict
 
 from .dto import Message, Notification
@@ -9,22 +8,25 @@ from langchain_core.messages import HumanMessage
 
 
 class BaseChatManager(LangchainMemberAgent):
-    def __init__(self, name, member_id):
-        super().__init__(name, member_id)
+    def __init__(self, name, member_id, **kwargs):
+        super().__init__(name, member_id, **kwargs)
 
     def choose_next_speaker(self, chat_id: str, member_id: str):
+        # 发言者需要先收到队列中尚未送达的消息
+        self.send_queue.flush(chat_id)
         self.socket.emit(Events.NEXT_SPEAKER,
                          {'chat_id': chat_id, 'member_id': member_id, 'manager_id': self.member_id})
         
     def produce_notification(self, chat_id: str, to_chat_id: str, notification: str):
         message = self.produce_message(notification, chat_id)
-        return Notification(**message.model_dump(), to_chat_id=to_chat_id)
+        return Notification.from_wire({**message.to_wire(), 'to_chat_id': to_chat_id})
         
     def send_notification_to_chat(self, chat_id: str, to_chat_id: str, notification: str):
         notification = self.produce_notification(chat_id, to_chat_id, notification)
-        return self.socket.call(Events.SEND_NOTIFICATION_TO_CHAT, notification.model_dump())
+        return self.socket.call(Events.SEND_NOTIFICATION_TO_CHAT, notification.to_wire())
         
     def register_chat_manager(self, chat_id: str):
+        self.metadata_cache.invalidate_chat(chat_id)
         ret = self.socket.call(Events.REGISTER_CHAT_MANAGER, {'chat_id': chat_id})
         if not ret['status'] == 'success':
             print('register chat manager failed:', ret)
@@ -32,8 +34,10 @@ class BaseChatManager(LangchainMemberAgent):
             print('register chat manager success:', ret['message'])
 
     def _on_receive_notification_from_chat(self, notification: Dict):
-        threading.Thread(target=self.on_receive_notification_from_chat, args=(Notification(**notification),)).start()
-        return True
+        notification = Notification.from_wire(notification)
+        # 在 socket 接收线程中调用，不能阻塞，见 Dispatcher
+        return self.dispatcher.submit((self.member_id, notification.chat_id),
+                                      self.on_receive_notification_from_chat, notification, block=False)
 
     def on_receive_notification_from_chat(self, notification: Notification):
         """处理接收到的通知"""
@@ -49,8 +53,8 @@ class BaseChatManager(LangchainMemberAgent):
 
 
 class ChatManager(BaseChatManager):
-    def __init__(self, name: str, member_id: str):
-        super().__init__(name, member_id)
+    def __init__(self, name: str, member_id: str, **kwargs):
+        super().__init__(name, member_id, **kwargs)
 
         self.choose_next_speaker_method = 'round_robin'
 
@@ -141,9 +145,6 @@ class ChatManager(BaseChatManager):
         else:
             next_index = index + 1
 
-        member_id = members[next_index]
-        member_name = self.get_member(member_id).name
-        # print('next speaker:', member_name)
         return members[next_index]
 
 
@@ -0,0 +1,220 @@
+from typing import List, Dict, Optional, Union
+
+from .compaction import HistoryCompactor, extractive_summary, is_summary
+from .dto import Message
+from .memory import AgentChat, AgentChats, MessageStore
+from .memoryBackend import MemoryBackend
+from .retention import build_context_window, estimate_tokens
+from .semanticMemory import SemanticMemory, build_retrieval_window
+from .snapshot import Snapshot, save_agents
+from .timeline import MergedTimeline
+
+
+class ChatMemoryMixin:
+    """带聊天记录的客户端中与传输无关的部分，MemberClientWithChats 和 AsyncMemberClientWithChats 共用
+
+    包括聊天记录和参考聊天、持久化与快照恢复、合并时间线、历史摘要、语义检索和上下文窗口。
+    收发消息的方法由两个客户端各自实现；使用者需要继承 ClientStateMixin，并在 __init__ 中调用 _init_chat_memory。
+    """
+
+    def _init_chat_memory(self):
+        self.memory = AgentChats(member_id=self.member_id)
+        # 每个聊天可以有多个参考聊天
+        self.reference_chats: Dict[str, List[str]] = {}
+        # 主聊天ID -> 主聊天与参考聊天的合并时间线
+        self._timelines: Dict[str, MergedTimeline] = {}
+        # 每次调用模型时上下文（含提示词）的 token 预算，为 None 时发送全部历史
+        self.context_token_budget: int | None = 8000
+        # 启用语义检索（enable_semantic_memory）后，上下文窗口中留给检索结果的预算比例和最多检索的条数
+        self.retrieval_share = 0.3
+        self.retrieval_k = 8
+        # 历史摘要，见 enable_compaction
+        self.compactor: Optional[HistoryCompactor] = None
+
+    def restore_memory(self, backend: MemoryBackend, resume: bool = True) -> int:
+        """从持久化后端恢复聊天记录，之后的消息都会写入该后端，需要在 login 之前调用
+
+        Args:
+            backend: 持久化后端，见 memoryBackend.py
+            resume: 登录后是否以每个 chat 最后一条消息为游标向服务器补拉离线期间的消息
+
+        Returns:
+            int: 恢复的消息数
+        """
+        restored = self.memory.attach_backend(backend)
+        cursors = {}
+        seen_ids = []
+        for chat_id, chat in list(self.memory.chats.items()):
+            # 内存中的消息可能已被保留策略淘汰，游标以后端记录为准
+            last = backend.get_messages(self.member_id, chat_id, limit=1)
+            peer_hlc = 0
+            for message in chat.messages:
+                seen_ids.append(message.message_id)
+                if message.from_member_id != self.member_id and message.hlc > peer_hlc:
+                    peer_hlc = message.hlc
+            cursors[chat_id] = (last[-1].message_id if last else None, peer_hlc)
+        self._restore_cursors(cursors, seen_ids, resume)
+        print(f"{self.name} 从本地恢复了 {restored} 条消息")
+        return restored
+
+    def get_state(self) -> dict:
+        """保存到快照中的智能体状态，子类在此基础上扩展，值需要能用 MessagePack 编码"""
+        return {'reference_chats': {k: list(v) for k, v in self.reference_chats.items()}}
+
+    def set_state(self, state: dict):
+        """从快照恢复 get_state 保存的状态"""
+        for main_chat_id, reference_chat_ids in state.get('reference_chats', {}).items():
+            for reference_chat_id in reference_chat_ids:
+                self.add_reference_chat(main_chat_id, reference_chat_id)
+
+    def save_snapshot(self, path: str) -> int:
+        """把聊天记录和状态写入快照，多个智能体写入同一个快照见 snapshot.save_agents
+
+        Returns:
+            int: 写入的消息数
+        """
+        return save_agents(path, [self])
+
+    def restore_snapshot(self, snapshot: Union[str, Snapshot], resume: bool = True) -> int:
+        """从快照恢复聊天记录和状态，需要在 login 之前调用
+
+        只读取元数据，各 chat 的消息在第一次访问时才解码。
+
+        Args:
+            snapshot: 快照文件路径或已打开的 Snapshot
+            resume: 登录后是否向服务器补拉快照之后的消息
+
+        Returns:
+            int: 恢复的消息数
+        """
+        if isinstance(snapshot, str):
+            snapshot = Snapshot(snapshot)
+        restored = self.memory.restore(snapshot)
+        self.set_state(snapshot.state(self.member_id))
+        self._restore_cursors(snapshot.cursors(self.member_id), resume=resume)
+        print(f"{self.name} 从快照恢复了 {restored} 条消息")
+        return restored
+
+    def _parse_message(self, data: dict) -> Message:
+        return self.memory.parse_message(data)
+
+    def clear_chat(self, chat_id: str):
+        self.memory.clear_chat(chat_id)
+
+    def remove_message(self, message_id: str, chat_id: str) -> bool:
+        return self.memory.remove_message(message_id, chat_id)
+
+    def add_reference_chat(self, main_chat_id: str, reference_chat_id: str):
+        """添加参考聊天
+
+        Args:
+            main_chat_id: 主聊天ID
+            reference_chat_id: 参考聊天ID
+        """
+        if main_chat_id not in self.reference_chats:
+            self.reference_chats[main_chat_id] = []
+        if reference_chat_id not in self.reference_chats[main_chat_id]:
+            self.reference_chats[main_chat_id].append(reference_chat_id)
+
+    def remove_reference_chat(self, main_chat_id: str, reference_chat_id: str):
+        """移除参考聊天
+
+        Args:
+            main_chat_id: 主聊天ID
+            reference_chat_id: 参考聊天ID
+        """
+        if main_chat_id in self.reference_chats:
+            if reference_chat_id in self.reference_chats[main_chat_id]:
+                self.reference_chats[main_chat_id].remove(reference_chat_id)
+
+    def get_timeline(self, main_chat_id: str) -> MergedTimeline:
+        """主聊天及其参考聊天的合并时间线，参考聊天变化时自动重建
+
+        Args:
+            main_chat_id: 主聊天ID
+        """
+        chat_ids = [main_chat_id, *self.reference_chats.get(main_chat_id, [])]
+        timeline = self._timelines.get(main_chat_id)
+        if timeline is None:
+            timeline = self._timelines[main_chat_id] = MergedTimeline(self.memory, chat_ids)
+        else:
+            timeline.set_chats(chat_ids)
+        return timeline
+
+    def get_all_messages(self, main_chat_id: str) -> List[Message]:
+        """获取主聊天及其所有参考聊天的消息
+
+        Args:
+            main_chat_id: 主聊天ID
+
+        Returns:
+            所有消息列表，按时间戳排序
+        """
+        return self.get_timeline(main_chat_id).messages()
+
+    def enable_semantic_memory(self, embedder=None) -> SemanticMemory:
+        """启用语义检索（需要 numpy），之后上下文窗口由最近消息和与之相关的更早消息组成，见 semanticMemory.py
+
+        Args:
+            embedder: 嵌入器，默认为 TfidfEmbedder
+        """
+        return self.memory.enable_semantic_memory(embedder)
+
+    def enable_compaction(self, summarizer=None, **options) -> HistoryCompactor:
+        """启用历史摘要，之后上下文窗口中较早的消息由后台生成的摘要代替，见 compaction.py
+
+        Args:
+            summarizer: 摘要函数，默认为 self.summarize
+            **options: HistoryCompactor 的其他参数，如 span_size、keep_recent、max_summaries
+        """
+        if self.compactor is None:
+            self.compactor = HistoryCompactor(self.memory, summarizer or self.summarize, **options)
+        return self.compactor
+
+    def summarize(self, messages: List[Message]) -> str:
+        """把一段聊天记录压缩为摘要，在摘要线程池中调用；默认不调用模型，子类可以改为调用模型"""
+        return extractive_summary(messages)
+
+    def get_pinned_messages(self, main_chat_id: str) -> List[Message]:
+        """主聊天及参考聊天中的置顶消息，按时间线的顺序排列"""
+        timeline = self.get_timeline(main_chat_id)
+        return timeline.ordered(message for chat_id in timeline.chat_ids
+                                for message in self.memory.pinned_messages(chat_id))
+
+    def _build_window(self, messages: List[Message], prompt: str = None,
+                      pinned: List[Message] = None) -> List[Message]:
+        """pinned 为 messages 中的置顶消息，为 None 时逐条判断"""
+        reserved = estimate_tokens(prompt or '')
+        memory_pinned = self.memory.pinned_predicate()
+
+        def is_pinned(message: Message) -> bool:
+            return is_summary(message) or memory_pinned(message)
+
+        if self.compactor is not None:
+            messages = self.compactor.compact(messages)
+            # 摘要条目也是置顶消息，压缩后逐条判断
+            pinned = None
+        if self.memory.semantic is None:
+            return build_context_window(messages, self.context_token_budget,
+                                        reserved=reserved, is_pinned=is_pinned, pinned=pinned)
+        return build_retrieval_window(messages, self.context_token_budget, self.memory.semantic,
+                                      reserved=reserved, is_pinned=is_pinned, pinned=pinned,
+                                      k=self.retrieval_k, share=self.retrieval_share)
+
+    def get_context_window(self, main_chat_id: str, prompt: str = None) -> List[Message]:
+        """主聊天及参考聊天中，在 context_token_budget 内的最近消息和置顶消息
+
+        启用历史摘要时较早的消息由摘要代替，启用语义检索时另加相关的更早消息。
+        """
+        # 先取置顶消息再取全部消息，期间新到的置顶消息只会被当作普通消息，不会出现在 messages 之外
+        pinned = self.get_pinned_messages(main_chat_id)
+        return self._build_window(self.get_all_messages(main_chat_id), prompt, pinned)
+
+    def fit_to_budget(self, prompt: str, chat: AgentChat) -> AgentChat:
+        """把传给模型的 chat 裁剪到 context_token_budget 以内，启用历史摘要时先压缩，没有变化时原样返回"""
+        if self.context_token_budget is None and self.compactor is None:
+            return chat
+        window = self._build_window(chat.messages, prompt)
+        if len(window) == len(chat.messages) and all(a is b for a, b in zip(window, chat.messages)):
+            return chat
+        return AgentChat(chat_id=chat.chat_id, member_id=chat.member_id, messages=MessageStore.from_unique(window))
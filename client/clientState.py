@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .dto import Message
+
+
+class ClientStateMixin:
+    """MemberClient 和 AsyncMemberClient 共用的、与传输无关的客户端状态
+
+    包括断线恢复用的消息游标、收到消息的去重、补拉期间实时消息的暂存，以及元数据缓存随服务器推送失效。
+    这里只维护状态，不做 I/O；补拉（resume_session）等需要收发的部分由两个客户端各自实现。
+    使用者需要在 __init__ 中调用 _init_client_state，并提供 member_id、clock 和 metadata_cache。
+    """
+
+    def _init_client_state(self):
+        # 断线恢复：记录每个 chat 最后见到的消息ID，重连后只向服务器补拉之后的消息
+        self.resume_on_reconnect = True
+        self.resume_max_messages = 1000  # 游标在服务器上失效时，最多补拉最近的消息数
+        self.max_seen_message_ids = 10000  # 用于去重的最近消息ID数量上限
+        self._has_logged_in = False
+        # 为 True 时首次登录也执行补拉，用于从本地持久化的聊天记录恢复后继续
+        self._resume_on_first_login = False
+        self._session_lock = threading.Lock()
+        self._last_seen: Dict[str, str] = {}
+        # 每个 chat 收到的最大 HLC，作为补拉游标；消息ID游标在服务器上失效时仍然可用
+        self._last_seen_hlc: Dict[str, int] = {}
+        self._seen_message_ids: OrderedDict = OrderedDict()
+        # 补拉期间收到的实时消息，补拉完成后按顺序处理；为 None 表示没有在补拉
+        self._resume_buffer: List[Message] | None = None
+
+    def _on_login_accepted(self) -> bool:
+        """登录成功时调用，返回是否需要补拉"""
+        reconnected = self._has_logged_in
+        self._has_logged_in = True
+        if reconnected:
+            # 断线期间的 chat 变更事件已丢失
+            self.metadata_cache.clear()
+        if (reconnected and self.resume_on_reconnect) or self._resume_on_first_login:
+            self._resume_on_first_login = False
+            return True
+        return False
+
+    def on_chat_changed(self, data: dict):
+        """chat 信息（管理员、监听者、删除等）发生变化，使缓存失效"""
+        self.metadata_cache.invalidate_chat(data['chat_id'])
+
+    def on_chat_membership_changed(self, data: dict):
+        """chat 成员发生变化，使缓存失效"""
+        self.metadata_cache.invalidate_chat(data['chat_id'])
+        for member_id in data.get('member_ids', []):
+            self.metadata_cache.invalidate_member(member_id)
+
+    def adopt_ack(self, message: Message, ack: Any):
+        """采用服务器在确认中分配的 HLC，使本地副本与其他成员收到的消息排序一致"""
+        if isinstance(ack, dict) and ack.get('hlc'):
+            message.hlc = ack['hlc']
+            self.clock.update(message.hlc)
+
+    def _remember_message(self, message: Message) -> bool:
+        """更新 chat 的消息游标，返回 False 表示该消息已经处理过"""
+        with self._session_lock:
+            if message.message_id in self._seen_message_ids:
+                return False
+            self._seen_message_ids[message.message_id] = None
+            if len(self._seen_message_ids) > self.max_seen_message_ids:
+                self._seen_message_ids.popitem(last=False)
+            self._last_seen[message.chat_id] = message.message_id
+            if message.from_member_id != self.member_id and message.hlc > self._last_seen_hlc.get(message.chat_id, 0):
+                self._last_seen_hlc[message.chat_id] = message.hlc
+            return True
+
+    def _buffer_if_resuming(self, message: Message) -> bool:
+        """正在补拉时暂存实时消息并返回 True"""
+        with self._session_lock:
+            if self._resume_buffer is None:
+                return False
+            self._resume_buffer.append(message)
+            return True
+
+    def _begin_resume(self) -> Optional[Tuple[Dict[str, str], Dict[str, int]]]:
+        """开始补拉，返回 (消息ID游标, HLC 游标)；已有补拉在进行时返回 None"""
+        with self._session_lock:
+            if self._resume_buffer is not None:
+                return None
+            self._resume_buffer = []
+            return dict(self._last_seen), dict(self._last_seen_hlc)
+
+    def _take_resume_buffer(self) -> List[Message]:
+        """取出补拉期间暂存的消息，没有时结束补拉并返回空列表；调用方处理完后继续调用直到返回空列表"""
+        with self._session_lock:
+            buffered = self._resume_buffer
+            if not buffered:
+                self._resume_buffer = None
+                return []
+            self._resume_buffer = []
+            return buffered
+
+    def _restore_cursors(self, cursors: Dict[str, Tuple[Optional[str], int]], seen_ids: Iterable[str] = (),
+                         resume: bool = True):
+        """用本地恢复的聊天记录设置补拉游标，需要在 login 之前调用
+
+        Args:
+            cursors: chat_id -> (最后一条消息ID, 其他成员消息的最大 HLC)
+            seen_ids: 已经处理过的消息ID，补拉时跳过
+            resume: 登录后是否向服务器补拉游标之后的消息
+        """
+        with self._session_lock:
+            for chat_id, (last_id, peer_hlc) in cursors.items():
+                if last_id is not None:
+                    self._last_seen[chat_id] = last_id
+                if peer_hlc > self._last_seen_hlc.get(chat_id, 0):
+                    self._last_seen_hlc[chat_id] = peer_hlc
+            for message_id in seen_ids:
+                self._seen_message_ids[message_id] = None
+            while len(self._seen_message_ids) > self.max_seen_message_ids:
+                self._seen_message_ids.popitem(last=False)
+        if self._last_seen_hlc:
+            self.clock.update(max(self._last_seen_hlc.values()))
+        self._resume_on_first_login = resume and bool(self._last_seen)
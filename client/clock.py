@@ -0,0 +1,114 @@
+"""混合逻辑时钟（Hybrid Logical Clock）
+
+消息的 timestamp 是发送方本地时间的字符串，不同机器之间存在时钟偏差，按字符串排序既慢又不能保证因果顺序。
+每条消息额外携带一个 HLC 整数：高位是毫秒级的物理时间，低 LOGICAL_BITS 位是逻辑计数。
+发送时取 now()，收到消息时用 update() 合并对方的时钟，保证因果上在后的消息 HLC 一定更大，
+并且同一 HLC 在所有节点上比较结果一致。
+
+编码后的整数不超过 2**53，JavaScript 的 number 可以精确表示，服务器端见 server/src/chat/hlc.ts。
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Union
+
+# 逻辑计数的位数，同一毫秒内最多 1024 个事件，超出时借用下一毫秒
+LOGICAL_BITS = 10
+_LOGICAL_MASK = (1 << LOGICAL_BITS) - 1
+
+
+def pack(physical_ms: int, logical: int = 0) -> int:
+    return (physical_ms << LOGICAL_BITS) | logical
+
+
+def physical_ms(hlc: int) -> int:
+    """HLC 中的物理时间，Unix 毫秒"""
+    return hlc >> LOGICAL_BITS
+
+
+def logical(hlc: int) -> int:
+    return hlc & _LOGICAL_MASK
+
+
+def to_datetime(hlc: int) -> datetime:
+    """HLC 对应的本地时间"""
+    return datetime.fromtimestamp(physical_ms(hlc) / 1000)
+
+
+def from_timestamp(timestamp: Union[str, datetime, int, float, None]) -> int:
+    """把时间戳转换为逻辑计数为 0 的 HLC，用于没有 HLC 的旧消息和按时间范围查询
+
+    接受 str(datetime.now()) 格式的本地时间、服务器返回的 ISO 8601 UTC 时间、datetime 对象，
+    以及已经是 HLC 的整数。无法解析时返回 0。
+    """
+    if timestamp is None:
+        return 0
+    if isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, float):
+        return pack(int(timestamp * 1000))
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            return 0
+    # 不带时区的时间按本地时间处理
+    return pack(int(timestamp.timestamp() * 1000))
+
+
+def order_key(message) -> int:
+    """消息的排序键：有 HLC 时用 HLC，否则由 timestamp 换算"""
+    return message.hlc or from_timestamp(message.timestamp)
+
+
+class HybridLogicalClock:
+    """线程安全的混合逻辑时钟
+
+    Args:
+        wall_clock: 返回 Unix 秒的函数，默认为 time.time
+        max_drift_ms: 对方时钟超前本地物理时间超过该毫秒数时不合并，避免一个时钟错误的节点把所有节点带偏
+    """
+
+    def __init__(self, wall_clock=time.time, max_drift_ms: int = 60_000):
+        self._wall_clock = wall_clock
+        self.max_drift_ms = max_drift_ms
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def _wall_ms(self) -> int:
+        return int(self._wall_clock() * 1000)
+
+    def now(self) -> int:
+        """为本地事件（如发送消息）生成 HLC"""
+        with self._lock:
+            candidate = pack(self._wall_ms())
+            self._last = candidate if candidate > self._last else self._last + 1
+            return self._last
+
+    def update(self, remote: Optional[int]) -> int:
+        """收到带 HLC 的消息时合并对方的时钟，返回本地新的 HLC"""
+        with self._lock:
+            wall_ms = self._wall_ms()
+            candidate = pack(wall_ms)
+            if remote and physical_ms(remote) - wall_ms > self.max_drift_ms:
+                print(f'HLC: 忽略超前 {physical_ms(remote) - wall_ms} ms 的远端时钟')
+                remote = 0
+            self._last = max(candidate, self._last + 1, (remote or 0) + 1)
+            return self._last
+
+    def peek(self) -> int:
+        return self._last
+
+
+_default_clock: Optional[HybridLogicalClock] = None
+_default_clock_lock = threading.Lock()
+
+
+def get_default_clock() -> HybridLogicalClock:
+    """进程内所有客户端共用的时钟"""
+    global _default_clock
+    if _default_clock is None:
+        with _default_clock_lock:
+            if _default_clock is None:
+                _default_clock = HybridLogicalClock()
+    return _default_clock
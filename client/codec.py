@@ -0,0 +1,224 @@
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Any
+
+import msgpack
+from socketio.msgpack_packet import MsgPackPacket
+from socketio.packet import Packet
+
+from .metrics import InstrumentedAsyncClient, InstrumentedClient, record_bytes
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，未安装时回退到标准库
+    orjson = None
+
+
+class FastJSON:
+    """Socket.IO 包中 JSON 数据的编解码器，接口与标准库 json 相同
+
+    安装了 orjson 时使用 orjson，否则使用标准库 json（紧凑分隔符，不转义非 ASCII 字符）。
+    socketio 会以关键字参数传入 separators 等选项，这里统一忽略。
+    orjson 不支持非字符串键（如 {1: ...}）和超出 64 位的整数，遇到时回退到标准库，
+    与标准库一样把 1、True、None 等键编码为 "1"、"true"、"null"。
+    """
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj).decode('utf-8')
+            except TypeError:  # orjson.JSONEncodeError 是 TypeError 的子类
+                pass
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s)
+
+
+def _encoded_size(encoded) -> int:
+    """包在线路上的字节数：文本按 UTF-8 编码计算，带二进制附件时为各部分之和"""
+    if isinstance(encoded, list):
+        return sum(_encoded_size(part) for part in encoded)
+    if isinstance(encoded, str) and not encoded.isascii():
+        return len(encoded.encode('utf-8'))
+    return len(encoded)
+
+
+class JSONPacket(Packet):
+    """使用 FastJSON 的 Socket.IO 包
+
+    作为 serializer 传给 socketio 客户端或服务器，只对该连接生效；
+    socketio 的 json= 参数会修改全局的 Packet.json，影响进程内所有 Socket.IO 连接，因此不使用。
+    """
+
+    json = FastJSON
+
+
+class CountingJSONPacket(JSONPacket):
+    """JSON 编码，并把收发字节数计入指标"""
+
+    def encode(self):
+        encoded = super().encode()
+        record_bytes('out', _encoded_size(encoded))
+        return encoded
+
+    def decode(self, encoded_packet):
+        record_bytes('in', _encoded_size(encoded_packet))
+        return super().decode(encoded_packet)
+
+    def add_attachment(self, attachment):
+        record_bytes('in', len(attachment))
+        return super().add_attachment(attachment)
+
+
+# 协议中常见的键名，编码时替换为其下标的十进制字符串（"0"、"1"...），解码时还原。
+# 必须与 server/src/chat/wire/field-tags.ts 保持一致，只能在末尾追加，不能调整顺序。
+FIELD_TAGS = (
+    'message', 'message_type', 'chat_id', 'from_member_id', 'from_member_name', 'timestamp', 'message_id',
+    'to_chat_id', 'member_id', 'name', 'description', 'listen_in_chats', 'is_group', 'members', 'messages',
+    'created_by', 'createdAt', 'manager', 'listeners', 'command', 'by', 'to', 'data', 'result', 'error',
+    'status', 'as_member_id', 'to_member_id', 'request_id', 'timeout_ms', 'count', 'complete', 'manager_id',
+    'member_name', 'hlc',
+)
+_TAG_BY_KEY = {key: str(index) for index, key in enumerate(FIELD_TAGS)}
+_KEY_BY_TAG = {tag: key for key, tag in _TAG_BY_KEY.items()}
+
+
+def _map_keys(value: Any, mapping: dict) -> Any:
+    if isinstance(value, dict):
+        return {mapping.get(k, k): _map_keys(v, mapping) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_map_keys(v, mapping) for v in value]
+    return value
+
+
+def tag_keys(value: Any) -> Any:
+    """递归地把 FIELD_TAGS 中的键名替换为短标签"""
+    return _map_keys(value, _TAG_BY_KEY)
+
+
+def untag_keys(value: Any) -> Any:
+    """tag_keys 的逆操作，命令数据中恰好为纯数字的键也会被还原，使用时需避免"""
+    return _map_keys(value, _KEY_BY_TAG)
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def date_to_iso(seconds: int, nanoseconds: int = 0) -> str:
+    """Unix 时间转换为与 JavaScript Date.prototype.toJSON 相同的字符串（UTC，毫秒精度）"""
+    moment = _EPOCH + timedelta(seconds=seconds, microseconds=nanoseconds // 1000)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f'{nanoseconds // 1000000:03d}Z'
+
+
+def _ext_hook(code: int, data: bytes):
+    # notepack.io 3.0 之前把 Date 编码为 fixext 8、类型 0 的 float64 毫秒数
+    if code == 0 and len(data) == 8:
+        milliseconds = struct.unpack('>d', data)[0]
+        seconds = int(milliseconds // 1000)
+        return date_to_iso(seconds, int(round((milliseconds - seconds * 1000) * 1e6)))
+    return msgpack.ExtType(code, data)
+
+
+def _dates_in_map(value: dict) -> dict:
+    for key, item in value.items():
+        if type(item) is msgpack.Timestamp:
+            value[key] = date_to_iso(item.seconds, item.nanoseconds)
+    return value
+
+
+def _dates_in_list(value: list) -> list:
+    for index, item in enumerate(value):
+        if type(item) is msgpack.Timestamp:
+            value[index] = date_to_iso(item.seconds, item.nanoseconds)
+    return value
+
+
+class CountingMsgPackPacket(MsgPackPacket):
+    """MessagePack 编码，并把收发字节数计入指标
+
+    服务器的 socket.io-msgpack-parser（notepack.io）把 JS 的 Date（如 MongoDB 文档的 timestamp、createdAt）
+    编码为 MessagePack 的时间戳扩展类型，解码时转换为与 JSON 编码相同的 ISO 字符串，使 DTO 的字符串字段照常校验。
+    """
+
+    def encode(self):
+        encoded = super().encode()
+        record_bytes('out', len(encoded))
+        return encoded
+
+    def decode(self, encoded_packet):
+        record_bytes('in', len(encoded_packet))
+        decoded = msgpack.loads(encoded_packet, ext_hook=_ext_hook, object_hook=_dates_in_map,
+                                list_hook=_dates_in_list)
+        self.packet_type = decoded['type']
+        self.data = decoded.get('data')
+        self.id = decoded.get('id')
+        self.namespace = decoded['nsp']
+
+
+class TaggedMsgPackPacket(CountingMsgPackPacket):
+    """MessagePack 编码，且事件数据中的键名替换为短标签"""
+
+    def encode(self):
+        packet = self._to_dict()
+        if 'data' in packet:
+            packet['data'] = tag_keys(packet['data'])
+        encoded = msgpack.dumps(packet, default=self.__class__.dumps_default)
+        record_bytes('out', len(encoded))
+        return encoded
+
+    def decode(self, encoded_packet):
+        super().decode(encoded_packet)
+        self.data = untag_keys(self.data)
+
+
+# 断线后自动重连，等待时间从 reconnection_delay 开始指数增长到 reconnection_delay_max，
+# 每次乘以 [1 - randomization_factor, 1 + randomization_factor] 间的随机抖动，避免大量客户端同时重连
+RECONNECT_OPTIONS = {
+    'reconnection': True,
+    'reconnection_attempts': 0,  # 0 表示不限次数
+    'reconnection_delay': 1,
+    'reconnection_delay_max': 10,
+    'randomization_factor': 0.5,
+}
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+MSGPACK_TAGGED = 'msgpack-tagged'
+
+# 序列化方式 -> (socketio serializer, 服务器路径)
+# socket.io 的 parser 按服务器配置，因此每种编码在服务器上对应一个独立路径，客户端通过连接路径协商编码
+SERIALIZERS = {
+    JSON: (CountingJSONPacket, 'socket.io'),
+    MSGPACK: (CountingMsgPackPacket, 'socket.io-msgpack'),
+    MSGPACK_TAGGED: (TaggedMsgPackPacket, 'socket.io-msgpack-tagged'),
+}
+
+
+def socketio_path(serializer: str) -> str:
+    return SERIALIZERS[serializer][1]
+
+
+def create_socket(serializer: str = JSON, asynchronous: bool = False, **kwargs):
+    """按序列化方式创建 socketio 客户端
+
+    Args:
+        serializer: 'json'、'msgpack' 或 'msgpack-tagged'
+        asynchronous: 为 True 时创建 socketio.AsyncClient
+        **kwargs: 透传给 socketio 客户端的其他参数，覆盖 RECONNECT_OPTIONS 中的同名项
+
+    Returns:
+        socketio.Client | socketio.AsyncClient
+    """
+    if serializer not in SERIALIZERS:
+        raise ValueError(f'unknown serializer: {serializer}')
+    # 带指标记录的客户端，见 metrics.py
+    client_class = InstrumentedAsyncClient if asynchronous else InstrumentedClient
+    packet_serializer = SERIALIZERS[serializer][0]
+    kwargs = {**RECONNECT_OPTIONS, **kwargs}
+    return client_class(serializer=packet_serializer, **kwargs)
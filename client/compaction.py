@@ -0,0 +1,403 @@
+"""聊天记录的滚动摘要
+
+上下文窗口只按预算截取最近的消息，更早的内容直接丢失；不截取时长对话的每轮提示词随历史线性增长。
+HistoryCompactor 在后台把较早的消息按段摘要，组装上下文时用摘要条目代替原消息，最近的消息保持原样：
+    - 每个 chat 的非置顶消息按时间从头切成 span_size 条一段，最近 keep_recent 条不参与摘要
+    - 增量进行：已摘要的段不再处理，新消息凑满一段后才摘要；段内消息被删除时从该段起重新摘要
+    - 摘要按段内容的哈希缓存，同一进程中看到相同消息的多个智能体只调用一次摘要函数
+    - 摘要条目超过 max_summaries 条时，最早的若干条再合并摘要为一条，摘要总长度保持有界
+    - 摘要在独立的 Dispatcher 中执行，不占用处理消息和生成回复的线程，同一 chat 的摘要串行执行
+    - 被保留策略淘汰的消息仍由摘要覆盖；keep_recent + span_size 应小于保留的消息数，否则消息在摘要前就被淘汰
+
+用法:
+    agent.enable_compaction(span_size=40, keep_recent=40)
+    agent.get_context_window(chat_id)  # 摘要条目 + 最近的原始消息
+"""
+import hashlib
+import heapq
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence
+
+from .clock import order_key
+from .dispatcher import Dispatcher
+from .dto import Message
+
+# 摘要条目的 message_type 和发言人名字
+SUMMARY_TYPE = 'summary'
+SUMMARY_SENDER = '历史摘要'
+
+_SENTENCE_END = re.compile(r'[。！？!?\n]|\.\s')
+
+
+def is_summary(message: Message) -> bool:
+    return message.message_type == SUMMARY_TYPE
+
+
+def span_key(messages: Sequence[Message], namespace: str = '') -> str:
+    """一段消息的内容哈希，消息的 ID 和文本都相同时相同"""
+    digest = hashlib.sha1(namespace.encode('utf-8'))
+    for message in messages:
+        digest.update(message.message_id.encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update((message.message or '').encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def format_transcript(messages: Sequence[Message]) -> str:
+    """把消息排成"发言人: 内容"的文本，供模型摘要"""
+    return '\n'.join(f'{message.from_member_name or message.from_member_id}: {message.message}'
+                     for message in messages)
+
+
+def extractive_summary(messages: Sequence[Message], max_chars: int = 600, sentence_chars: int = 60) -> str:
+    """不调用模型的摘要：每条消息只保留发言人和第一句话，总长度超过 max_chars 时截断
+
+    Args:
+        messages: 要摘要的消息
+        max_chars: 摘要的最大字符数
+        sentence_chars: 每条消息最多保留的字符数
+    """
+    lines = []
+    length = 0
+    for message in messages:
+        text = (message.message or '').strip()
+        match = _SENTENCE_END.search(text)
+        if match:
+            text = text[:match.end()].strip()
+        if len(text) > sentence_chars:
+            text = text[:sentence_chars] + '…'
+        line = f'{message.from_member_name or message.from_member_id}: {text}'
+        if length + len(line) > max_chars:
+            lines.append('…')
+            break
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)
+
+
+class SummaryCache:
+    """按段哈希缓存的摘要，线程安全，超过 max_entries 条时淘汰最久未使用的
+
+    多个智能体几乎同时收到同一批消息，会同时摘要同一段；get_or_create 保证同一个键只生成一次。
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        # 正在生成的键 -> 生成结果，其他线程等待它而不是重复生成
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def get_or_create(self, key: str, create: Callable[[], str]) -> str:
+        """取缓存的摘要，没有时调用 create 生成，其他线程同时请求同一个键时等待这次生成的结果"""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return pending.result()
+        try:
+            text = create()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+        self.put(key, text)
+        with self._lock:
+            del self._pending[key]
+        pending.set_result(text)
+        return text
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Summary:
+    """一段消息（或若干条摘要合并后）的摘要
+
+    Args:
+        key: 段哈希
+        text: 摘要文本
+        message_ids: 覆盖的原始消息
+        last: 段内最后一条消息，摘要条目使用它的时间排在原来的位置
+    """
+
+    def __init__(self, key: str, text: str, message_ids: FrozenSet[str], last: Message):
+        self.key = key
+        self.text = text
+        self.message_ids = message_ids
+        # 组装上下文时代替原消息的摘要条目
+        self.entry = Message.model_construct(
+            message=text,
+            message_type=SUMMARY_TYPE,
+            chat_id=last.chat_id,
+            from_member_id='',
+            from_member_name=SUMMARY_SENDER,
+            timestamp=last.timestamp,
+            message_id=f'summary:{key}',
+            hlc=last.hlc,
+        )
+
+    def __repr__(self) -> str:
+        return f'Summary({self.key[:8]}, {len(self.message_ids)} messages)'
+
+
+_default_cache: Optional[SummaryCache] = None
+_default_dispatcher: Optional[Dispatcher] = None
+_default_lock = threading.Lock()
+
+
+def get_default_summary_cache() -> SummaryCache:
+    """进程内共享的摘要缓存"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = SummaryCache()
+    return _default_cache
+
+
+def get_default_compaction_dispatcher() -> Dispatcher:
+    """进程内共享的摘要线程池，与处理消息的分发器分开，摘要调用模型较慢时不会阻塞消息处理"""
+    global _default_dispatcher
+    if _default_dispatcher is None:
+        with _default_lock:
+            if _default_dispatcher is None:
+                _default_dispatcher = Dispatcher(max_workers=4, max_queue=1000, name='compaction')
+    return _default_dispatcher
+
+
+class HistoryCompactor:
+    """把一个成员的较早聊天记录分段摘要，由 enable_compaction 创建并挂载到 AgentChats 上随增删调度
+
+    Args:
+        memory: 成员的聊天记录（AgentChats）
+        summarizer: 摘要函数，参数为按时间排列的消息，返回摘要文本；可能被多个线程同时调用
+        span_size: 每段的消息数
+        keep_recent: 每个 chat 最近的多少条消息不参与摘要
+        max_summaries: 每个 chat 最多保留的摘要条目数，超出时最早的合并为一条
+        cache: 摘要缓存，默认为进程内共享的缓存
+        dispatcher: 执行摘要的线程池，默认为进程内共享的摘要线程池
+        namespace: 缓存键的前缀，默认为摘要函数的限定名，同一摘要函数的结果可以共享
+    """
+
+    def __init__(self, memory, summarizer: Callable[[List[Message]], str] = extractive_summary,
+                 span_size: int = 40, keep_recent: int = 40, max_summaries: int = 8,
+                 cache: SummaryCache = None, dispatcher: Dispatcher = None, namespace: str = None):
+        if span_size <= 0 or max_summaries < 2:
+            raise ValueError('span_size must be positive and max_summaries at least 2')
+        self.memory = memory
+        self.summarizer = summarizer
+        self.span_size = span_size
+        self.keep_recent = keep_recent
+        self.max_summaries = max_summaries
+        self.cache = cache if cache is not None else get_default_summary_cache()
+        self.dispatcher = dispatcher if dispatcher is not None else get_default_compaction_dispatcher()
+        self.namespace = namespace if namespace is not None else getattr(summarizer, '__qualname__', '')
+
+        self._lock = threading.Lock()
+        # chat_id -> 按时间排列的摘要，第一条可能是合并后的摘要
+        self._summaries: Dict[str, List[Summary]] = {}
+        # chat_id -> 摘要覆盖的消息ID，只整体替换不原地修改，读取时不需要复制
+        self._covered: Dict[str, FrozenSet[str]] = {}
+        # chat_id -> 摘要每次变化时递增，正在进行的摘要据此判断结果是否仍然有效
+        self._generations: Dict[str, int] = {}
+        self._scheduled = set()
+        memory.attach_index(self)
+
+    # ---- AgentChats 的索引接口，只负责调度
+
+    def add(self, message: Message) -> bool:
+        self.schedule(message.chat_id)
+        return True
+
+    def add_many(self, messages: Sequence[Message]):
+        for chat_id in {message.chat_id for message in messages}:
+            self.schedule(chat_id)
+
+    def remove(self, chat_id: str, message_id: str) -> bool:
+        """删除的消息已被摘要时，丢弃包含它的摘要及之后的摘要，稍后重新摘要"""
+        with self._lock:
+            if message_id not in self._covered.get(chat_id, ()):
+                return False
+            summaries = self._summaries[chat_id]
+            index = next(i for i, summary in enumerate(summaries) if message_id in summary.message_ids)
+            self._set_summaries(chat_id, summaries[:index])
+        self.schedule(chat_id)
+        return True
+
+    def evict(self, chat_id: str, message_id: str):
+        """被保留策略淘汰的消息仍由摘要覆盖，摘要不变"""
+
+    def remove_chat(self, chat_id: str) -> int:
+        with self._lock:
+            removed = len(self._summaries.get(chat_id, ()))
+            self._set_summaries(chat_id, [])
+            return removed
+
+    def clear(self):
+        with self._lock:
+            for chat_id in list(self._summaries):
+                self._set_summaries(chat_id, [])
+
+    def _set_summaries(self, chat_id: str, summaries: List[Summary]):
+        self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+        if summaries:
+            self._summaries[chat_id] = summaries
+            self._covered[chat_id] = frozenset().union(*(summary.message_ids for summary in summaries))
+        else:
+            self._summaries.pop(chat_id, None)
+            self._covered.pop(chat_id, None)
+
+    # ---- 后台摘要
+
+    def schedule(self, chat_id: str):
+        """在摘要线程池中压缩该 chat，已在排队时不重复提交"""
+        with self._lock:
+            if chat_id in self._scheduled:
+                return
+            self._scheduled.add(chat_id)
+        if not self.dispatcher.submit((self.memory.member_id, chat_id), self._run, chat_id):
+            with self._lock:
+                self._scheduled.discard(chat_id)
+
+    def _run(self, chat_id: str):
+        # 先取消排队标记，执行期间到达的消息会再次调度
+        with self._lock:
+            self._scheduled.discard(chat_id)
+        self.compact_chat(chat_id)
+
+    def summarize(self, messages: List[Message]) -> Summary:
+        """摘要一段消息，命中缓存时不调用摘要函数"""
+        key = span_key(messages, self.namespace)
+        text = self.cache.get_or_create(key, lambda: self.summarizer(messages))
+        message_ids = frozenset(message.message_id for message in messages if not is_summary(message))
+        return Summary(key, text, message_ids, messages[-1])
+
+    def summarize_async(self, messages: List[Message], key: str = 'summarize') -> Future:
+        """在摘要线程池中摘要任意一段消息（如狼人杀一天的发言），返回结果为摘要文本的 Future"""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.summarize(messages).text if messages else '')
+            except Exception as e:
+                future.set_exception(e)
+
+        if not self.dispatcher.submit((self.memory.member_id, key), run):
+            future.set_exception(RuntimeError('compaction queue is full'))
+        return future
+
+    def compact_chat(self, chat_id: str) -> int:
+        """立即压缩一个 chat：摘要凑满的新段，并合并过多的摘要
+
+        Returns:
+            int: 新摘要的段数
+        """
+        messages = sorted(self.memory.copy_messages(chat_id), key=order_key)
+        with self._lock:
+            generation = self._generations.get(chat_id, 0)
+            covered = self._covered.get(chat_id, frozenset())
+        is_pinned = self.memory.pinned_predicate()
+        pending = [message for message in messages
+                   if message.message_id not in covered and not is_pinned(message)]
+
+        created = 0
+        while len(pending) - self.keep_recent >= self.span_size:
+            span, pending = pending[:self.span_size], pending[self.span_size:]
+            summary = self.summarize(span)
+            with self._lock:
+                if self._generations.get(chat_id, 0) != generation:
+                    return created
+                self._set_summaries(chat_id, self._summaries.get(chat_id, []) + [summary])
+                generation = self._generations[chat_id]
+            created += 1
+
+        with self._lock:
+            summaries = self._summaries.get(chat_id, [])
+        if len(summaries) > self.max_summaries:
+            # 最早的若干条合并为一条，合并后共 max_summaries // 2 条，下次合并前还能再加入一半
+            merged = summaries[:len(summaries) - self.max_summaries // 2 + 1]
+            rolled = self.summarize([summary.entry for summary in merged])
+            rolled = Summary(rolled.key, rolled.text,
+                             frozenset().union(*(summary.message_ids for summary in merged)), merged[-1].entry)
+            with self._lock:
+                if self._generations.get(chat_id, 0) == generation:
+                    self._set_summaries(chat_id, [rolled] + self._summaries[chat_id][len(merged):])
+        return created
+
+    # ---- 组装上下文
+
+    def summaries(self, chat_id: str) -> List[Summary]:
+        with self._lock:
+            return list(self._summaries.get(chat_id, ()))
+
+    def compact(self, messages: Sequence[Message]) -> List[Message]:
+        """把 messages 中已被摘要覆盖的消息替换为摘要条目，其余原样保留
+
+        Args:
+            messages: 按时间排列的消息，可以来自多个 chat（如主聊天和参考聊天的合并时间线）
+
+        Returns:
+            List[Message]: 摘要条目和未被覆盖的消息，按时间排列
+        """
+        with self._lock:
+            covered = dict(self._covered)
+            summaries = {chat_id: list(items) for chat_id, items in self._summaries.items()}
+        if not covered:
+            return list(messages)
+        chat_ids = set()
+        raw = []
+        for message in messages:
+            chat_ids.add(message.chat_id)
+            if message.message_id not in covered.get(message.chat_id, ()):
+                raw.append(message)
+        entries = sorted((summary.entry for chat_id in chat_ids for summary in summaries.get(chat_id, ())),
+                         key=order_key)
+        return list(heapq.merge(entries, raw, key=order_key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'chats': len(self._summaries),
+                'summaries': sum(len(items) for items in self._summaries.values()),
+                'covered_messages': sum(len(ids) for ids in self._covered.values()),
+                'cache_entries': len(self.cache),
+                'cache_hits': self.cache.hits,
+                'cache_misses': self.cache.misses,
+            }
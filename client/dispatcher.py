@@ -0,0 +1,195 @@
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .metrics import get_default_metrics
+
+
+class Dispatcher:
+    """有界工作线程池，用于处理收到的消息和通知
+
+    - 同一个 key（通常是 (member_id, chat_id)）的任务按提交顺序串行执行，不同 key 之间并行执行
+    - 工作线程按需创建，数量不超过 max_workers
+    - 排队任务数达到 max_queue 时，按 policy 处理：'block' 阻塞提交者直到有空位，'drop' 直接丢弃
+    - socket 接收线程不能阻塞：它阻塞时收不到确认，而工作线程可能正在等待这些确认，会互相等待。
+      接收线程中以 submit(..., block=False) 提交，'block' 策略下队列已满时超出上限继续排队（计入 spilled），
+      'drop' 策略下照常丢弃；工作线程内的提交同样按 block=False 处理
+    - 记录排队时间和处理时间等统计信息
+    """
+
+    BLOCK = 'block'
+    DROP = 'drop'
+
+    def __init__(self, max_workers: int = 16, max_queue: int = 1000, policy: str = BLOCK,
+                 name: str = 'dispatcher'):
+        if policy not in (self.BLOCK, self.DROP):
+            raise ValueError(f'unknown policy: {policy}')
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        # key -> 待执行任务队列
+        self._pending: Dict[Hashable, deque] = {}
+        # 有待执行任务且未被工作线程占用的 key
+        self._ready: deque = deque()
+        # 已在 _ready 中或正在执行的 key，保证同一 key 同时只有一个线程处理
+        self._scheduled = set()
+        self._queued = 0
+
+        self._workers = []
+        self._idle_workers = 0
+        self._local = threading.local()
+        self.metrics = get_default_metrics()
+
+        # 统计信息
+        self._submitted = 0
+        self._completed = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._errors = 0
+        self._max_depth = 0
+        self._queue_time_total = 0.0
+        self._queue_time_max = 0.0
+        self._handle_time_total = 0.0
+        self._handle_time_max = 0.0
+
+    def submit(self, key: Hashable, fn: Callable, *args: Any, block: bool = True) -> bool:
+        """提交任务
+
+        Args:
+            key: 顺序键，相同 key 的任务按提交顺序执行
+            fn: 任务函数
+            *args: 任务参数
+            block: 'block' 策略下队列已满时是否阻塞等待；为 False 时超出 max_queue 继续排队。
+                socket 接收线程中必须为 False，工作线程内的提交总是按 False 处理
+
+        Returns:
+            bool: 任务是否被接受，drop 策略下队列已满时返回 False
+        """
+        # 工作线程阻塞等待空位时，可能所有工作线程互相等待
+        block = block and not getattr(self._local, 'is_worker', False)
+        with self._lock:
+            if self._queued >= self.max_queue:
+                if self.policy == self.DROP:
+                    self._dropped += 1
+                    return False
+                if block:
+                    while self._queued >= self.max_queue:
+                        self._not_full.wait()
+                else:
+                    self._spilled += 1
+
+            self._pending.setdefault(key, deque()).append((fn, args, time.perf_counter()))
+            self._queued += 1
+            self._submitted += 1
+            self._max_depth = max(self._max_depth, self._queued)
+            if key not in self._scheduled:
+                self._scheduled.add(key)
+                self._ready.append(key)
+                if self._idle_workers > 0:
+                    self._work_available.notify()
+                elif len(self._workers) < self.max_workers:
+                    self._start_worker()
+        return True
+
+    def _start_worker(self):
+        worker = threading.Thread(target=self._run, name=f'{self.name}-{len(self._workers)}', daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _run(self):
+        self._local.is_worker = True
+        while True:
+            with self._lock:
+                while not self._ready:
+                    self._idle_workers += 1
+                    self._work_available.wait()
+                    self._idle_workers -= 1
+                key = self._ready.popleft()
+                fn, args, enqueued_at = self._pending[key].popleft()
+                self._queued -= 1
+                self._not_full.notify()
+
+            handler_name = getattr(fn, '__name__', self.name)
+            started_at = time.perf_counter()
+            try:
+                fn(*args)
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                self.metrics.inc('handler_errors', handler_name)
+                traceback.print_exc()
+            finished_at = time.perf_counter()
+            self.metrics.observe('queue_wait_seconds', handler_name, started_at - enqueued_at)
+            self.metrics.observe('handler_seconds', handler_name, finished_at - started_at)
+
+            with self._lock:
+                queue_time = started_at - enqueued_at
+                handle_time = finished_at - started_at
+                self._completed += 1
+                self._queue_time_total += queue_time
+                self._queue_time_max = max(self._queue_time_max, queue_time)
+                self._handle_time_total += handle_time
+                self._handle_time_max = max(self._handle_time_max, handle_time)
+
+                if self._pending[key]:
+                    # 排到队尾，避免一个繁忙的 chat 占用工作线程
+                    self._ready.append(key)
+                    if self._idle_workers > 0:
+                        self._work_available.notify()
+                else:
+                    del self._pending[key]
+                    self._scheduled.discard(key)
+
+    def queue_depth(self, key: Optional[Hashable] = None) -> int:
+        """排队中的任务数，指定 key 时只统计该 key"""
+        with self._lock:
+            if key is None:
+                return self._queued
+            return len(self._pending.get(key, ()))
+
+    def stats(self) -> dict:
+        """统计信息快照，时间单位为秒"""
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                'workers': len(self._workers),
+                'queued': self._queued,
+                'max_queue_depth': self._max_depth,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'dropped': self._dropped,
+                'spilled': self._spilled,
+                'errors': self._errors,
+                'queue_time_avg': self._queue_time_total / completed,
+                'queue_time_max': self._queue_time_max,
+                'handle_time_avg': self._handle_time_total / completed,
+                'handle_time_max': self._handle_time_max,
+            }
+
+
+_default_dispatcher: Optional[Dispatcher] = None
+_default_lock = threading.Lock()
+
+
+def get_default_dispatcher() -> Dispatcher:
+    """进程内共享的默认分发器，同一进程的所有客户端共用一个线程池"""
+    global _default_dispatcher
+    with _default_lock:
+        if _default_dispatcher is None:
+            _default_dispatcher = Dispatcher(max_workers=32, max_queue=10000)
+        return _default_dispatcher
+
+
+def set_default_dispatcher(dispatcher: Dispatcher):
+    """替换默认分发器，需要在创建客户端之前调用"""
+    global _default_dispatcher
+    with _default_lock:
+        _default_dispatcher = dispatcher
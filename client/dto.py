@@ -3,14 +3,31 @@ from typing import Optional, List, Any
 from pydantic import BaseModel
 
 
-class Member(BaseModel):
+class WireModel(BaseModel):
+    """在 socket 上传输的 DTO 基类
+
+    from_wire 直接调用 pydantic-core 编译好的校验器，与 Message(**data) 做相同的校验，耗时也基本相同。
+    没有免校验的可信路径：pydantic v2 中 model_construct 或手工填充 __dict__ 等纯 Python 构造
+    都比编译好的校验器慢（见 benchmarks/bench_decode.py）。
+    to_wire 直接复制字段字典，代替较慢的 model_dump。
+    """
+
+    @classmethod
+    def from_wire(cls, data: dict):
+        return cls.__pydantic_validator__.validate_python(data)
+
+    def to_wire(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Member(WireModel):
     member_id: str
     name: str
     description: Optional[str] = None
     listen_in_chats: List[str] = []
 
 
-class Message(BaseModel):
+class Message(WireModel):
     message: str
     message_type: str
     chat_id: str
@@ -18,13 +35,15 @@ class Message(BaseModel):
     from_member_name: str = ''
     timestamp: str = ''
     message_id: str
+    # 混合逻辑时钟，由服务器在收到消息时分配，排序和补拉游标以它为准；旧消息为 0，见 clock.py
+    hlc: int = 0
 
 
 class Notification(Message):
     to_chat_id: str
 
 
-class Chat(BaseModel):
+class Chat(WireModel):
     chat_id: str
     name: str
     description: Optional[str] = None
@@ -40,23 +59,30 @@ class Chat(BaseModel):
 
 
 
-class Command(BaseModel):
+class Command(WireModel):
     command: str
     by: str
     to: Optional[List[str]] = None  # 指定接收命令的成员列表，现在是可选的
     data: dict = None  # 命令携带的数据
 
 
-class CommandBasicInfo(BaseModel):
+class CommandBasicInfo(WireModel):
     command: str
     by: str
     to: str
 
 
-class CommandResult(BaseModel):
-    result: Any
+class CommandResult(WireModel):
+    result: Any = None
     command: CommandBasicInfo
+    # 接收者未连接、超时或执行出错时的错误信息
+    error: Optional[str] = None
+
+    def to_wire(self) -> dict:
+        data = dict(self.__dict__)
+        data['command'] = self.command.to_wire()
+        return data
 
 
-class ReplyData(BaseModel):
+class ReplyData(WireModel):
     chat_id: str
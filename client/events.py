@@ -3,6 +3,7 @@ class Events:
     CONNECT = 'connect'
     DISCONNECT = 'disconnect'
     SEND_MESSAGE = 'send_message'
+    SEND_MESSAGES = 'send_messages'  # 同一 chat 的一批消息
     RECEIVE_MESSAGE = 'receive_message' 
     SEND_COMMAND = 'send_command'
     RECEIVE_COMMAND = 'receive_command'
@@ -30,3 +31,9 @@ class Events:
     LISTEN_IN_CHAT = 'listen_in_chat'
     UNLISTEN_IN_CHAT = 'unlisten_in_chat'
     GET_LISTEN_IN_CHATS = 'get_listen_in_chats'
+    ATTACH_MEMBER = 'attach_member'
+    DETACH_MEMBER = 'detach_member'
+    CHAT_CHANGED = 'chat_changed'
+    CHAT_MEMBERSHIP_CHANGED = 'chat_membership_changed'
+    SEND_COMMAND_STREAM = 'send_command_stream'
+    RECEIVE_COMMAND_RESULT = 'receive_command_result'
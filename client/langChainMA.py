@@ -9,9 +9,12 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+from client.compaction import format_transcript
 from client.dto import Message
+from client.asyncMemberAgent import AsyncBaseMemberAgent
 from client.memberAgent import BaseMemberAgent
 from client.memory import AgentChat
+from client.promptCache import PromptCache
 
 
 @tool
@@ -38,23 +41,29 @@ def test_tool(a: str) -> str:
     return f'test ok, arg:{a}'
 
 
+# 历史摘要的提示词，不含角色设定，同一段聊天记录的摘要可以在多个智能体之间共享
+SUMMARY_PROMPT = '把下面的聊天记录压缩为简短的摘要，保留每个人的关键观点、表态和事实，不加评论，不超过200字。'
+
+
+def to_langchain_message(message: Message, member_id: str) -> Union[HumanMessage, AIMessage]:
+    """
+    将一条消息转换为 langchain 的 message 格式，member_id 自己的发言为 AIMessage。
+    """
+    if message.from_member_id == member_id:
+        return AIMessage(content=message.message)
+    return HumanMessage(content=f'{message.from_member_name}: {message.message}')
+
+
 def convert_to_langchain_messages(agent_chat: AgentChat) -> List[Union[HumanMessage, AIMessage]]:
     """
     将 AgentChat 中的消息转换为 langchain 的 message 格式。
     """
-    langchain_messages = []
-    for message in agent_chat.messages:
-        if message.from_member_id == agent_chat.member_id:
-            langchain_messages.append(AIMessage(content=message.message))
-        else:
-            langchain_messages.append(HumanMessage(content=f'{message.from_member_name}: {message.message}'))
-
-    return langchain_messages
+    return [to_langchain_message(message, agent_chat.member_id) for message in agent_chat.messages]
 
 
 class LangchainMemberAgent(BaseMemberAgent):
-    def __init__(self, name: str, member_id: str):
-        super().__init__(name, member_id)
+    def __init__(self, name: str, member_id: str, **kwargs):
+        super().__init__(name, member_id, **kwargs)
 
         self.model = ChatOpenAI(model='gpt-4o',
                                 api_key='')
@@ -68,6 +77,8 @@ class LangchainMemberAgent(BaseMemberAgent):
         # self.agent = create_react_agent(self.model, tools=[test_tool])
 
         self.prompt = f'你正在参加群聊，你叫{self.name},擅长聊天,扮演真人,直接回复消息，无需添加名字前缀.其他人消息格式:[Name:message]'
+        # 上一轮转换过的消息直接复用，每轮只转换新消息
+        self.prompt_cache = PromptCache(to_langchain_message, self.memory)
 
     @retry(
         stop=stop_after_attempt(10),  # 最多重试3次
@@ -75,15 +86,53 @@ class LangchainMemberAgent(BaseMemberAgent):
         retry=retry_if_exception_type((openai.APIError, openai.APIConnectionError, openai.RateLimitError))  # 指定需要重试的异常类型
     )
     def get_ai_response(self, prompt: str, chat: AgentChat) -> str:
-        mes = convert_to_langchain_messages(chat)
+        mes = self.prompt_cache.convert(chat.chat_id, chat.messages)
         messages = [SystemMessage(prompt)] + mes
         # ret = self.model.invoke({"messages": messages})
-        ret = self.model.invoke(messages)
+        with self.metrics.timer('llm_seconds', self.model.model_name, 'llm_errors'):
+            ret = self.model.invoke(messages)
         rsp = ret.content
         # print('ret:', ret, type(ret))
         # rsp = ret['messages'][-1].content
         return rsp
 
+    def summarize(self, messages: List[Message]) -> str:
+        """调用模型生成历史摘要，在摘要线程池中执行"""
+        with self.metrics.timer('llm_seconds', self.model.model_name, 'llm_errors'):
+            ret = self.model.invoke([SystemMessage(SUMMARY_PROMPT), HumanMessage(format_transcript(messages))])
+        return ret.content
+
+
+class AsyncLangchainMemberAgent(AsyncBaseMemberAgent):
+    """LangchainMemberAgent 的异步版本，通过 ainvoke 调用模型，不占用线程"""
+
+    def __init__(self, name: str, member_id: str, **kwargs):
+        super().__init__(name, member_id, **kwargs)
+
+        self.model = ChatOpenAI(model='gpt-4o',
+                                api_key='')
+
+        self.prompt = f'你正在参加群聊，你叫{self.name},擅长聊天,扮演真人,直接回复消息，无需添加名字前缀.其他人消息格式:[Name:message]'
+        # 上一轮转换过的消息直接复用，每轮只转换新消息
+        self.prompt_cache = PromptCache(to_langchain_message, self.memory)
+
+    @retry(
+        stop=stop_after_attempt(10),
+        wait=wait_exponential(multiplier=2, min=5, max=120),
+        retry=retry_if_exception_type((openai.APIError, openai.APIConnectionError, openai.RateLimitError))
+    )
+    async def get_ai_response(self, prompt: str, chat: AgentChat) -> str:
+        messages = [SystemMessage(prompt)] + self.prompt_cache.convert(chat.chat_id, chat.messages)
+        with self.metrics.timer('llm_seconds', self.model.model_name, 'llm_errors'):
+            ret = await self.model.ainvoke(messages)
+        return ret.content
+
+    def summarize(self, messages: List[Message]) -> str:
+        """调用模型生成历史摘要，在摘要线程池中执行，因此使用同步的 invoke"""
+        with self.metrics.timer('llm_seconds', self.model.model_name, 'llm_errors'):
+            ret = self.model.invoke([SystemMessage(SUMMARY_PROMPT), HumanMessage(format_transcript(messages))])
+        return ret.content
+
 
 if __name__ == '__main__':
     tom = LangchainMemberAgent('tom', 'admin001')
@@ -0,0 +1,1154 @@
+"""进程内的回环服务器
+
+用纯 Python 数据结构实现 server/ 中 ChatGateway 的全部事件语义（chat、成员、监听者、管理员、
+next_speaker、通知路由和命令分发），不依赖 NestJS、MongoDB 和 Redis，用于端到端测试、基准和大规模模拟。
+
+两种接入方式：
+    - 内存传输：LoopbackServer.bind(client) 把客户端的 socket 替换为 LoopbackSocket / AsyncLoopbackSocket，
+      事件数据以原对象传递，不经过编码和网络
+    - 真实 Socket.IO：LoopbackServer.serve(port) 在后台线程启动 aiohttp 服务，
+      提供 /chat/signup 以及 json、msgpack、msgpack-tagged 三个 Socket.IO 路径，客户端按原方式连接
+
+用法:
+    server = LoopbackServer()
+    for agent in agents:
+        server.bind(agent)  # 同时完成注册，无需 signup
+        agent.login()
+
+    # 或者
+    url = server.serve(3000)
+    client = MemberClient('alice', 'alice-id', url=url)
+
+    # 命令行
+    python -m client.loopbackServer --port 3000
+"""
+import argparse
+import asyncio
+import inspect
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import msgpack
+import socketio
+from socketio import exceptions
+from socketio.msgpack_packet import MsgPackPacket
+
+from .clock import HybridLogicalClock
+from .codec import JSON, JSONPacket, MSGPACK, MSGPACK_TAGGED, SERIALIZERS, tag_keys, untag_keys
+from .events import Events
+from .metrics import get_default_metrics
+
+# 处理函数不会阻塞的事件，在发出事件的线程中直接调用，同一接收者收到的顺序与发出顺序一致；
+# 其他事件（命令、next_speaker、通知）的处理函数可能运行很久，交给线程池执行
+INLINE_EVENTS = frozenset({
+    Events.RECEIVE_LOGIN_RESPONSE,
+    Events.RECEIVE_MESSAGE,
+    Events.RECEIVE_COMMAND_RESULT,
+    Events.CHAT_CHANGED,
+    Events.CHAT_MEMBERSHIP_CHANGED,
+})
+
+
+def _now() -> str:
+    """与 MongoDB 文档序列化后相同格式的时间字符串"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _completed(result: Any = None) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class Session(ABC):
+    """一条客户端连接在服务器一侧的状态
+
+    普通连接代表 member_id 一个成员；共享连接（auth={'shared': True}）上挂载的成员保存在 members 中。
+    """
+
+    def __init__(self):
+        self.member_id: Optional[str] = None
+        self.shared = False
+        self.members = set()
+
+    @property
+    @abstractmethod
+    def connected(self) -> bool:
+        """连接是否仍然可用"""
+
+    @abstractmethod
+    def deliver(self, event: str, payload: Any, ack: bool = False) -> Optional[Future]:
+        """向客户端发出事件
+
+        Returns:
+            Future | None: ack 为 True 时返回以客户端确认值完成的 Future
+        """
+
+    @abstractmethod
+    def close(self):
+        """由服务器断开连接"""
+
+
+class LoopbackServer:
+    """ChatGateway 的进程内实现
+
+    所有状态保存在内存中并由一把锁保护；事件处理函数是同步的，在调用方线程或内部线程池中执行，
+    等待接收者确认时不持有锁。
+
+    Args:
+        ack_timeout: 等待接收者确认的默认时间，单位为秒；命令可以用 timeout_ms 单独指定
+        max_workers: 执行可能阻塞的事件处理函数的线程数上限
+        verbose: 是否像 NestJS 服务器一样打印每个事件
+    """
+
+    def __init__(self, ack_timeout: float = 60, max_workers: int = 256, verbose: bool = False):
+        self.ack_timeout = ack_timeout
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='loopback')
+
+        self._lock = threading.RLock()
+        # member_id -> 成员文档
+        self.members: Dict[str, dict] = {}
+        # chat_id -> chat 文档
+        self.chats: Dict[str, dict] = {}
+        # message_id -> 消息
+        self.messages: Dict[str, dict] = {}
+        # chat_id -> {message_id: 在 chat['messages'] 中的位置}，用于 since 游标查找
+        self._message_positions: Dict[str, Dict[str, int]] = {}
+        # member_id -> 在线连接
+        self.online: Dict[str, Session] = {}
+        # 收到消息时分配 HLC，与服务器的 ChatGateway 一致
+        self.clock = HybridLogicalClock()
+
+        self._handlers: Dict[str, Callable[[Session, Any], Any]] = {
+            Events.SEND_MESSAGE: self.handle_send_message,
+            Events.SEND_MESSAGES: self.handle_send_messages,
+            Events.SEND_COMMAND: self.handle_send_command,
+            Events.SEND_COMMAND_STREAM: self.handle_send_command_stream,
+            Events.GET_ONLINE_MEMBERS: self.handle_get_online_members,
+            Events.GET_CHAT_ONLINE_MEMBERS: self.handle_get_chat_online_members,
+            Events.CREATE_CHAT: self.handle_create_chat,
+            Events.JOIN_CHAT: self.handle_join_chat,
+            Events.GET_JOINED_CHATS: self.handle_get_joined_chats,
+            Events.GET_CHAT: self.handle_get_chat,
+            Events.DELETE_CHAT: self.handle_delete_chat,
+            Events.EXIT_CHAT: self.handle_exit_chat,
+            Events.NEXT_SPEAKER: self.handle_next_speaker,
+            Events.PULL_MEMBERS_INTO_CHAT: self.handle_pull_members_into_chat,
+            Events.GET_MEMBER: self.handle_get_member,
+            Events.GET_MEMBERS: self.handle_get_members,
+            Events.GET_CREATED_CHATS: self.handle_get_created_chats,
+            Events.GET_CHAT_MEMBERS: self.handle_get_chat_members,
+            Events.GET_MEMBER_BY_NAME: self.handle_get_member_by_name,
+            Events.REMOVE_MEMBER_FROM_CHAT: self.handle_remove_member_from_chat,
+            Events.LOAD_CHAT_MESSAGES_FROM_SERVER: self.handle_load_chat_messages_from_server,
+            Events.SEND_NOTIFICATION_TO_CHAT: self.handle_send_notification_to_chat,
+            Events.REGISTER_CHAT_MANAGER: self.handle_register_chat_manager,
+            Events.LISTEN_IN_CHAT: self.handle_listen_in_chat,
+            Events.UNLISTEN_IN_CHAT: self.handle_unlisten_in_chat,
+            Events.GET_LISTEN_IN_CHATS: self.handle_get_listen_in_chats,
+            Events.ATTACH_MEMBER: self.handle_attach_member,
+            Events.DETACH_MEMBER: self.handle_detach_member,
+        }
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner = None
+        self._socketio_servers: List[socketio.AsyncServer] = []
+        self.url: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # 接入
+
+    def signup(self, member_id: str, member_name: str, description: str = '') -> dict:
+        """与 POST /chat/signup 相同"""
+        with self._lock:
+            if member_id in self.members:
+                return {'status': 400, 'message': 'Member creation failed, member already exists'}
+            now = _now()
+            self.members[member_id] = {
+                'member_id': member_id,
+                'name': member_name,
+                'description': description,
+                'chats': [],
+                'listen_in_chats': [],
+                'createdAt': now,
+                'updatedAt': now,
+            }
+        return {
+            'status': 201,
+            'message': 'Member created successfully',
+            'data': {'member_id': member_id, 'member_name': member_name},
+        }
+
+    def bind(self, target, signup: bool = True):
+        """让客户端使用内存传输，需要在 login 之前调用
+
+        Args:
+            target: MemberClient、AsyncMemberClient 及其子类，或 SharedConnection
+            signup: 是否同时注册成员；target 为 SharedConnection 时忽略
+
+        Returns:
+            LoopbackSocket | AsyncLoopbackSocket: 替换后的 socket
+        """
+        old = target.socket
+        if isinstance(old, (socketio.AsyncClient, AsyncLoopbackSocket)):
+            socket = AsyncLoopbackSocket(self)
+        else:
+            socket = LoopbackSocket(self)
+        # 保留已经注册的处理函数，例如 SharedConnection 在构造时注册的登录响应处理
+        if isinstance(old, (LoopbackSocket, AsyncLoopbackSocket)):
+            socket.handlers.update(old.handlers)
+        else:
+            socket.handlers.update(getattr(old, 'handlers', {}).get('/', {}))
+        target.socket = socket
+        target.base_url = 'loopback://'
+        if signup and hasattr(target, 'member_id'):
+            self.signup(target.member_id, target.name, getattr(target, 'description', '') or '')
+        return socket
+
+    def connect(self, session: Session, auth: dict):
+        """与 ChatGateway.handleConnection 相同"""
+        auth = auth or {}
+        member_id, member_name = auth.get('member_id'), auth.get('member_name')
+        if auth.get('shared'):
+            session.shared = True
+            session.members = set()
+            session.deliver(Events.RECEIVE_LOGIN_RESPONSE, {
+                'status': 200,
+                'message': 'shared connection established',
+                'data': {'shared': True},
+            })
+            return
+
+        if not member_id or not member_name:
+            session.deliver(Events.RECEIVE_LOGIN_RESPONSE, {
+                'status': 400,
+                'message': 'Missing member_id or member_name',
+            })
+            session.close()
+            return
+
+        with self._lock:
+            member = self.members.get(member_id)
+            if member is not None:
+                session.member_id = member_id
+                self.online[member_id] = session
+                member['name'] = member_name
+        if member is None:
+            session.deliver(Events.RECEIVE_LOGIN_RESPONSE, {
+                'status': 404,
+                'message': f'MemberId {member_id} does not exist',
+            })
+            session.close()
+            return
+
+        session.deliver(Events.RECEIVE_LOGIN_RESPONSE, {
+            'status': 200,
+            'message': f'{member_name} {member_id} login success',
+            'data': {'member_id': member_id, 'member_name': member_name},
+        })
+        if self.verbose:
+            print(f'{member_name} ({member_id}) connected successfully.')
+
+    def disconnect(self, session: Session):
+        """与 ChatGateway.handleDisconnect 相同，移除该连接上的所有在线成员"""
+        with self._lock:
+            for member_id in [m for m, s in self.online.items() if s is session]:
+                del self.online[member_id]
+
+    def handle(self, session: Session, event: str, data: Any = None) -> Any:
+        """处理客户端发来的事件，返回值作为确认"""
+        handler = self._handlers.get(event)
+        if handler is None:
+            if self.verbose:
+                print(f'loopback server: unknown event {event}')
+            return None
+        if self.verbose:
+            print(f'{event}:', data)
+        return handler(session, data if data is not None else {})
+
+    # ------------------------------------------------------------------
+    # 工具函数，对应 OnlineMembersService
+
+    @staticmethod
+    def resolve_member_id(session: Session, data: Any) -> Optional[str]:
+        if session.shared:
+            member_id = data.get('as_member_id') if isinstance(data, dict) else None
+            return member_id if member_id in session.members else None
+        return session.member_id
+
+    @staticmethod
+    def not_attached(data: Any) -> dict:
+        """共享连接上 as_member_id 未挂载（resolve_member_id 返回 None）时给调用方的失败确认"""
+        member_id = data.get('as_member_id') if isinstance(data, dict) else None
+        return {'status': 'failed', 'message': f'Member {member_id} is not attached to this shared connection'}
+
+    @staticmethod
+    def with_target(session: Session, member_id: str, payload: dict) -> dict:
+        if session.shared:
+            return {**payload, 'to_member_id': member_id}
+        return payload
+
+    def _session_of(self, member_id: str) -> Optional[Session]:
+        session = self.online.get(member_id)
+        return session if session is not None and session.connected else None
+
+    def _wait(self, future: Optional[Future], timeout: float = None) -> Any:
+        if future is None:
+            return None
+        try:
+            return future.result(self.ack_timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            raise TimeoutError('operation has timed out') from None
+
+    @staticmethod
+    def _chat_view(chat: dict) -> dict:
+        """返回给客户端的 chat 副本，避免客户端读到之后被修改的列表"""
+        view = dict(chat)
+        for key in ('members', 'messages', 'chat_listeners'):
+            view[key] = list(chat[key])
+        return view
+
+    @staticmethod
+    def _member_view(member: dict) -> dict:
+        view = dict(member)
+        view['chats'] = list(member['chats'])
+        view['listen_in_chats'] = list(member['listen_in_chats'])
+        return view
+
+    def _notify_chat_changed(self, chat_id: str, event: str, payload: dict, extra_members: List[str] = ()):
+        """通知 chat 的成员、监听者和管理员 chat 信息发生了变化，客户端据此使缓存失效"""
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            targets = dict.fromkeys([
+                *(chat['members'] if chat else []),
+                *(chat['chat_listeners'] if chat else []),
+                *([chat['manager']] if chat and chat['manager'] else []),
+                *extra_members,
+            ])
+            sessions = [(member_id, self._session_of(member_id)) for member_id in targets]
+        for member_id, session in sessions:
+            if session is not None:
+                session.deliver(event, self.with_target(session, member_id, payload))
+
+    # ------------------------------------------------------------------
+    # 消息
+
+    def handle_send_message(self, session: Session, data: dict) -> dict:
+        # 消息的发送者由 from_member_id 指定，共享连接的身份字段无需转发
+        data.pop('as_member_id', None)
+        failed, recipients = self._resolve_recipients(data)
+        if failed:
+            return failed
+        data['hlc'] = self.clock.update(data.get('hlc'))
+        return self._complete_message(data, self._collect_acks(self._deliver_message(data, recipients)))
+
+    def handle_send_messages(self, session: Session, data: dict) -> List[dict]:
+        """同一 chat 的一批消息：校验一次，依次发出所有消息后并行等待确认，最后按顺序持久化"""
+        messages = data.get('messages') or []
+        if not messages:
+            return []
+        first = messages[0]
+        if any(m['chat_id'] != first['chat_id'] or m['from_member_id'] != first['from_member_id']
+               for m in messages):
+            return [{
+                'message_id': m['message_id'],
+                'status': 'failed',
+                'message': 'Batch must contain messages of one sender in one chat',
+            } for m in messages]
+
+        failed, recipients = self._resolve_recipients(first)
+        if failed:
+            return [{**failed, 'message_id': m['message_id']} for m in messages]
+        for m in messages:
+            m['hlc'] = self.clock.update(m.get('hlc'))
+        deliveries = [self._deliver_message(m, recipients) for m in messages]
+        return [self._complete_message(m, self._collect_acks(d)) for m, d in zip(messages, deliveries)]
+
+    def _resolve_recipients(self, data: dict) -> Tuple[Optional[dict], List[Tuple[str, Session]]]:
+        """校验发送者和 chat，返回在线的接收者及其连接；校验失败时返回给发送方的结果"""
+        chat_id = data['chat_id']
+        with self._lock:
+            error = None
+            chat = self.chats.get(chat_id)
+            if data['from_member_id'] not in self.members:
+                error = 'Member not found'
+            elif chat is None:
+                error = 'Chat not found'
+            elif data['from_member_id'] not in chat['members']:
+                error = 'Sender not in chat'
+            if error:
+                return {'message_id': data['message_id'], 'status': 'failed', 'message': error}, []
+            # 排除发送者，合并监听者并去重，只发给在线成员
+            targets = dict.fromkeys(chat['members'] + chat['chat_listeners'])
+            targets.pop(data['from_member_id'], None)
+            recipients = [(member_id, self.online[member_id]) for member_id in targets
+                          if member_id in self.online]
+        return None, recipients
+
+    def _deliver_message(self, data: dict, recipients: List[Tuple[str, Session]]) -> List[Tuple[str, Future]]:
+        """向每个接收者发出消息，不等待确认"""
+        deliveries = []
+        for member_id, session in recipients:
+            if not session.connected:
+                deliveries.append((member_id, None))
+                continue
+            try:
+                deliveries.append((member_id, session.deliver(
+                    Events.RECEIVE_MESSAGE, self.with_target(session, member_id, data), ack=True)))
+            except Exception as e:
+                print(f'Failed to send message to member {member_id}: {e}')
+                deliveries.append((member_id, None))
+        return deliveries
+
+    def _collect_acks(self, deliveries: List[Tuple[str, Future]]) -> List[str]:
+        """等待所有接收者确认，返回未确认的成员"""
+        not_received = []
+        for member_id, future in deliveries:
+            if future is None:
+                not_received.append(member_id)
+                continue
+            try:
+                self._wait(future)
+            except Exception as e:
+                print(f'Failed to send message to member {member_id}: {e}')
+                not_received.append(member_id)
+        return not_received
+
+    def _complete_message(self, data: dict, not_received: List[str]) -> dict:
+        """持久化消息并生成返回给发送方的结果"""
+        chat_id, message_id = data['chat_id'], data['message_id']
+        with self._lock:
+            self.messages[message_id] = data
+            chat = self.chats.get(chat_id)
+            positions = self._message_positions.setdefault(chat_id, {})
+            if chat is not None and message_id not in positions:
+                positions[message_id] = len(chat['messages'])
+                chat['messages'].append(message_id)
+        return {
+            'message_id': message_id,
+            'status': 'success' if not not_received else 'pending',
+            'notReceivedMembers': not_received,
+            'hlc': data.get('hlc'),
+        }
+
+    def handle_load_chat_messages_from_server(self, session: Session, data: dict) -> List[dict]:
+        chat_id = data['chat_id']
+        count = data.get('count', -1)
+        since = data.get('since')
+        since_hlc = data.get('since_hlc')
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                return []
+            message_ids = chat['messages']
+            # HLC 游标优先：返回 HLC 大于游标的消息，按 HLC 排序
+            if since_hlc:
+                messages = sorted((self.messages[m] for m in message_ids
+                                   if m in self.messages and self.messages[m].get('hlc', 0) > since_hlc),
+                                  key=lambda m: m['hlc'])
+                if count != -1:
+                    messages = messages[-count:] if count else []
+                return messages
+            # 提供了消息ID游标时只返回游标之后的消息；游标不存在时按 count 返回
+            if since:
+                index = self._message_positions.get(chat_id, {}).get(since)
+                if index is not None:
+                    message_ids = message_ids[index + 1:]
+            if count != -1:
+                message_ids = message_ids[-count:] if count else []
+            return [self.messages[m] for m in message_ids if m in self.messages]
+
+    # ------------------------------------------------------------------
+    # 命令
+
+    def _dispatch_command(self, data: dict, member_id: str) -> dict:
+        """向单个成员发送命令并等待结果，失败或超时时返回 error"""
+        command = {k: v for k, v in data.items() if k not in ('to', 'as_member_id', 'timeout_ms', 'request_id')}
+        command_info = {'command': data.get('command'), 'by': data.get('by'), 'to': member_id}
+        session = self._session_of(member_id)
+        if session is None:
+            return {'result': None, 'command': command_info, 'error': 'Client not connected'}
+        timeout_ms = data.get('timeout_ms')
+        try:
+            future = session.deliver(Events.RECEIVE_COMMAND, self.with_target(session, member_id, command), ack=True)
+            result = self._wait(future, timeout_ms / 1000 if timeout_ms else None)
+            return {'result': result, 'command': command_info}
+        except Exception as e:
+            return {'result': None, 'command': command_info, 'error': str(e) or type(e).__name__}
+
+    def handle_send_command(self, session: Session, data: dict):
+        if not data.get('to'):
+            return {'status': 'failed', 'message': 'To is empty'}
+        # 并行执行所有的请求
+        futures = [self.executor.submit(self._dispatch_command, data, member_id) for member_id in data['to']]
+        return [future.result() for future in futures]
+
+    def handle_send_command_stream(self, session: Session, data: dict) -> dict:
+        """流式命令：立即确认，每个接收者返回结果后单独推送给发送方"""
+        if not data.get('to'):
+            return {'status': 'failed', 'message': 'To is empty'}
+        caller = self.resolve_member_id(session, data)
+        if caller is None:
+            return self.not_attached(data)
+
+        def push(future: Future):
+            if session.connected:
+                session.deliver(Events.RECEIVE_COMMAND_RESULT, self.with_target(
+                    session, caller, {**future.result(), 'request_id': data.get('request_id')}))
+
+        for member_id in data['to']:
+            self.executor.submit(self._dispatch_command, data, member_id).add_done_callback(push)
+        return {'status': 'success', 'request_id': data.get('request_id'), 'count': len(data['to'])}
+
+    # ------------------------------------------------------------------
+    # chat 和成员
+
+    def handle_create_chat(self, session: Session, data: dict) -> dict:
+        chat_id = str(uuid.uuid4())
+        created_by = self.resolve_member_id(session, data)
+        if created_by is None:
+            return self.not_attached(data)
+        if not created_by or not data.get('name'):
+            return {'status': 'failed', 'message': 'Failed to create chat. Error: name and created_by are required'}
+        now = _now()
+        chat = {
+            'chat_id': chat_id,
+            'name': data['name'],
+            'members': [],
+            'messages': [],
+            'is_group': data.get('is_group', True) is not False,
+            'created_by': created_by,
+            'description': data.get('description') or '',
+            'manager': '',
+            'chat_listeners': [],
+            'createdAt': now,
+            'updatedAt': now,
+        }
+        with self._lock:
+            self.chats[chat_id] = chat
+            view = self._chat_view(chat)
+        return {'status': 'success', 'message': f'Chat with id {chat_id} created successfully.', 'data': view}
+
+    def _join(self, chat: dict, member: dict):
+        """把成员加入 chat，成员原本是监听者时取消监听，调用方持有锁"""
+        chat_id, member_id = chat['chat_id'], member['member_id']
+        if member_id in chat['chat_listeners']:
+            chat['chat_listeners'].remove(member_id)
+        if member_id not in chat['members']:
+            chat['members'].append(member_id)
+        if chat_id in member['listen_in_chats']:
+            member['listen_in_chats'].remove(chat_id)
+        if chat_id not in member['chats']:
+            member['chats'].append(chat_id)
+
+    def _leave(self, chat_id: str, member_id: str):
+        """把成员移出 chat，调用方持有锁"""
+        chat = self.chats.get(chat_id)
+        member = self.members.get(member_id)
+        if chat is not None and member_id in chat['members']:
+            chat['members'].remove(member_id)
+        if member is not None and chat_id in member['chats']:
+            member['chats'].remove(chat_id)
+
+    def handle_join_chat(self, session: Session, data: dict) -> dict:
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            chat = self.chats.get(data.get('chat_id'))
+            if chat is None:
+                return {'status': 'failed', 'message': 'Chat not found'}
+            member = self.members.get(member_id)
+            if member is None:
+                return {'status': 'failed', 'message': 'Member not found'}
+            # 与服务器相同，返回加入前的成员列表
+            members = list(chat['members'])
+            self._join(chat, member)
+        self._notify_chat_changed(chat['chat_id'], Events.CHAT_MEMBERSHIP_CHANGED,
+                                  {'chat_id': chat['chat_id'], 'member_ids': [member_id], 'action': 'join'})
+        return {'chat': chat['chat_id'], 'members': members, 'status': 'success'}
+
+    def handle_get_online_members(self, session: Session, data: Any) -> List[str]:
+        with self._lock:
+            return list(self.online)
+
+    def handle_get_chat_online_members(self, session: Session, data: dict) -> List[str]:
+        with self._lock:
+            chat = self.chats.get(data.get('chat_id'))
+            if chat is None:
+                return []
+            members = set(chat['members'])
+            return [member_id for member_id in self.online if member_id in members]
+
+    def handle_get_joined_chats(self, session: Session, data: Any) -> List[str]:
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            return [chat_id for chat_id, chat in self.chats.items() if member_id in chat['members']]
+
+    def handle_get_chat(self, session: Session, data: dict) -> dict:
+        with self._lock:
+            chat = self.chats.get(data.get('chat_id'))
+            if chat is None:
+                return {'status': 'failed', 'message': 'Chat not found'}
+            return {'status': 'success', 'message': 'Chat fetched successfully', 'data': self._chat_view(chat)}
+
+    def handle_delete_chat(self, session: Session, data: dict) -> dict:
+        chat_id = data.get('chat_id')
+        with self._lock:
+            chat = self.chats.pop(chat_id, None)
+            if chat is None:
+                return {'status': 'failed', 'message': 'Chat not found'}
+            for member_id in chat['members']:
+                member = self.members.get(member_id)
+                if member is not None and chat_id in member['chats']:
+                    member['chats'].remove(chat_id)
+            self._message_positions.pop(chat_id, None)
+            extra = [*chat['members'], *chat['chat_listeners'], chat['manager']]
+        self._notify_chat_changed(chat_id, Events.CHAT_CHANGED, {'chat_id': chat_id, 'action': 'delete'},
+                                  [member_id for member_id in extra if member_id])
+        return {'status': 'success', 'message': 'Chat deleted successfully'}
+
+    def handle_exit_chat(self, session: Session, data: dict) -> dict:
+        chat_id = data.get('chat_id')
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                return {'status': 'failed', 'message': 'Chat not found'}
+            if member_id not in self.members:
+                return {'status': 'failed', 'message': 'Member not found'}
+            if member_id not in chat['members']:
+                return {'status': 'failed', 'message': 'Member not in chat'}
+            self._leave(chat_id, member_id)
+        self._notify_chat_changed(chat_id, Events.CHAT_MEMBERSHIP_CHANGED,
+                                  {'chat_id': chat_id, 'member_ids': [member_id], 'action': 'exit'}, [member_id])
+        return {'status': 'success', 'message': 'Member exited chat successfully'}
+
+    def handle_pull_members_into_chat(self, session: Session, data: dict) -> dict:
+        chat_id = data.get('chat_id')
+        new_members = data.get('members') or []
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                return {'status': 'failed', 'message': 'Chat not found'}
+            for member_id in new_members:
+                member = self.members.get(member_id)
+                if member is None:
+                    return {'status': 'failed', 'message': f'Member {member_id} not found'}
+                self._join(chat, member)
+        self._notify_chat_changed(chat_id, Events.CHAT_MEMBERSHIP_CHANGED,
+                                  {'chat_id': chat_id, 'member_ids': new_members, 'action': 'pull'})
+        return {'status': 'success', 'message': 'Members pulled into chat successfully'}
+
+    def handle_get_member(self, session: Session, data: dict) -> Optional[dict]:
+        with self._lock:
+            member = self.members.get(data.get('member_id'))
+            return self._member_view(member) if member is not None else None
+
+    def handle_get_members(self, session: Session, data: dict) -> List[dict]:
+        with self._lock:
+            return [self._member_view(self.members[member_id]) for member_id in dict.fromkeys(data.get('members') or [])
+                    if member_id in self.members]
+
+    def handle_get_created_chats(self, session: Session, data: Any) -> List[dict]:
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            return [self._chat_view(chat) for chat in self.chats.values() if chat['created_by'] == member_id]
+
+    def handle_get_chat_members(self, session: Session, data: dict) -> List[Any]:
+        with self._lock:
+            chat = self.chats.get(data.get('chat_id'))
+            member_ids = list(chat['members']) if chat is not None else []
+            if not data.get('complete'):
+                return member_ids
+            return [self._member_view(self.members[member_id]) for member_id in member_ids
+                    if member_id in self.members]
+
+    def handle_get_member_by_name(self, session: Session, data: dict) -> Optional[dict]:
+        name, chat_id = data.get('name'), data.get('chat_id')
+        with self._lock:
+            for member in self.members.values():
+                if member['name'] == name and chat_id in member['chats']:
+                    return self._member_view(member)
+        return None
+
+    def handle_remove_member_from_chat(self, session: Session, data: dict) -> dict:
+        chat_id, member_id = data.get('chat_id'), data.get('member_id')
+        with self._lock:
+            self._leave(chat_id, member_id)
+        self._notify_chat_changed(chat_id, Events.CHAT_MEMBERSHIP_CHANGED,
+                                  {'chat_id': chat_id, 'member_ids': [member_id], 'action': 'remove'}, [member_id])
+        return {'status': 'success', 'message': 'Member removed from chat successfully'}
+
+    def handle_next_speaker(self, session: Session, data: dict):
+        member_id = data.get('member_id')
+        target = self._session_of(member_id)
+        if target is None:
+            print('连接已断开，无法发送消息')
+            return None
+        target.deliver(Events.NEXT_SPEAKER, self.with_target(target, member_id, {'chat_id': data.get('chat_id')}))
+        return None
+
+    def handle_send_notification_to_chat(self, session: Session, data: dict):
+        data.pop('as_member_id', None)
+        to_chat_id = data.get('to_chat_id')
+        with self._lock:
+            chat = self.chats.get(to_chat_id)
+            manager_id = chat['manager'] if chat is not None else None
+        if not manager_id:
+            return {
+                'status': 'failed',
+                'message': f'Chat manager in chat id {to_chat_id} is not found, please register chat manager first',
+            }
+        manager = self._session_of(manager_id)
+        if manager is None:
+            return {'status': 'failed', 'message': 'Chat manager not connected'}
+        manager.deliver(Events.RECEIVE_NOTIFICATION_FROM_CHAT, self.with_target(manager, manager_id, data))
+        return True
+
+    def handle_register_chat_manager(self, session: Session, data: dict) -> dict:
+        chat_id = data.get('chat_id')
+        manager_id = self.resolve_member_id(session, data)
+        if manager_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is not None:
+                chat['manager'] = manager_id
+        self._notify_chat_changed(chat_id, Events.CHAT_CHANGED, {'chat_id': chat_id, 'action': 'register_manager'})
+        return {'status': 'success', 'message': f'Chat manager: {manager_id} registered successfully'}
+
+    def handle_listen_in_chat(self, session: Session, data: dict) -> dict:
+        chat_id = data.get('chat_id')
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            member = self.members.get(member_id)
+            if member is None:
+                return {'status': 'failed', 'message': f'Member {member_id} not found'}
+            chat = self.chats.get(chat_id)
+            # 已经是成员或监听者时不重复添加
+            if chat is not None and member_id not in chat['members'] and member_id not in chat['chat_listeners']:
+                chat['chat_listeners'].append(member_id)
+            if chat_id not in member['listen_in_chats']:
+                member['listen_in_chats'].append(chat_id)
+        self._notify_chat_changed(chat_id, Events.CHAT_MEMBERSHIP_CHANGED,
+                                  {'chat_id': chat_id, 'member_ids': [member_id], 'action': 'listen'})
+        return {'status': 'success', 'message': f'Listener: {member_id} listened in chat: {chat_id} successfully'}
+
+    def handle_unlisten_in_chat(self, session: Session, data: dict) -> dict:
+        chat_id = data.get('chat_id')
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is not None and member_id in chat['chat_listeners']:
+                chat['chat_listeners'].remove(member_id)
+            member = self.members.get(member_id)
+            if member is not None and chat_id in member['listen_in_chats']:
+                member['listen_in_chats'].remove(chat_id)
+        self._notify_chat_changed(chat_id, Events.CHAT_MEMBERSHIP_CHANGED,
+                                  {'chat_id': chat_id, 'member_ids': [member_id], 'action': 'unlisten'}, [member_id])
+        return {'status': 'success', 'message': f'Listener: {member_id} unlistened in chat: {chat_id} successfully'}
+
+    def handle_get_listen_in_chats(self, session: Session, data: Any) -> List[str]:
+        member_id = self.resolve_member_id(session, data)
+        if member_id is None:
+            return self.not_attached(data)
+        with self._lock:
+            member = self.members.get(member_id)
+            return list(member['listen_in_chats']) if member is not None else []
+
+    def handle_attach_member(self, session: Session, data: dict) -> dict:
+        if not session.shared:
+            return {'status': 400, 'message': 'attach_member is only allowed on shared connections'}
+        member_id, member_name = data.get('member_id'), data.get('member_name')
+        if not member_id or not member_name:
+            return {'status': 400, 'message': 'Missing member_id or member_name'}
+        with self._lock:
+            member = self.members.get(member_id)
+            if member is None:
+                return {'status': 404, 'message': f'MemberId {member_id} does not exist'}
+            session.members.add(member_id)
+            self.online[member_id] = session
+            member['name'] = member_name
+        return {
+            'status': 200,
+            'message': f'{member_name} {member_id} login success',
+            'data': {'member_id': member_id, 'member_name': member_name},
+        }
+
+    def handle_detach_member(self, session: Session, data: dict) -> dict:
+        member_id = data.get('member_id')
+        with self._lock:
+            session.members.discard(member_id)
+            if self.online.get(member_id) is session:
+                del self.online[member_id]
+        return {'status': 'success', 'message': f'{member_id} detached'}
+
+    # ------------------------------------------------------------------
+    # 真实 Socket.IO 服务
+
+    def serve(self, port: int = 3000, host: str = '127.0.0.1') -> str:
+        """在后台线程中启动 HTTP + Socket.IO 服务
+
+        Returns:
+            str: 客户端使用的 url，如 http://127.0.0.1:3000
+        """
+        started = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop = loop
+            try:
+                loop.run_until_complete(self._start_http(host, port))
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                return
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name='loopback-server', daemon=True).start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        self.url = f'http://{host}:{port}'
+        print(f'loopback server listening on {self.url}')
+        return self.url
+
+    async def _start_http(self, host: str, port: int):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post('/chat/signup', self._http_signup)
+        for serializer, (_, path) in SERIALIZERS.items():
+            sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*',
+                                       always_connect=True, **_server_serializer(serializer))
+            sio.attach(app, socketio_path=path)
+            self._register_socketio(sio)
+            self._socketio_servers.append(sio)
+        # 停止时最多等待 1 秒让处理中的请求完成（默认 60 秒）
+        self._runner = web.AppRunner(app, shutdown_timeout=1)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def _http_signup(self, request):
+        from aiohttp import web
+
+        data = await request.json()
+        result = self.signup(data.get('member_id'), data.get('member_name'), data.get('description') or '')
+        return web.json_response(result, status=201)
+
+    def _register_socketio(self, sio: socketio.AsyncServer):
+        sessions: Dict[str, _SocketIOSession] = {}
+        loop = asyncio.get_running_loop()
+
+        @sio.on('connect')
+        async def on_connect(sid, environ, auth=None):
+            session = sessions[sid] = _SocketIOSession(sio, sid, loop)
+            # always_connect=True 时命名空间已经连接，登录响应可以直接发出
+            await loop.run_in_executor(self.executor, self.connect, session, auth)
+
+        @sio.on('disconnect')
+        async def on_disconnect(sid, *args):
+            session = sessions.pop(sid, None)
+            if session is not None:
+                session.closed = True
+                self.disconnect(session)
+
+        @sio.on('*')
+        async def on_event(event, sid, data=None):
+            session = sessions.get(sid)
+            if session is None:
+                return None
+            return await loop.run_in_executor(self.executor, self.handle, session, event, data)
+
+    async def _stop_http(self, timeout: float = 5):
+        for sio in self._socketio_servers:
+            # 先断开仍在线的客户端，否则 runner.cleanup 会一直等待这些 websocket 连接关闭
+            if sio.eio.sockets:
+                await asyncio.wait_for(sio.eio.disconnect(), timeout)
+            await asyncio.wait_for(sio.shutdown(), timeout)
+        self._socketio_servers.clear()
+        await asyncio.wait_for(self._runner.cleanup(), timeout)
+        # 取消连接残留的心跳等任务，避免事件循环停止时报告未完成的任务
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        """停止 Socket.IO 服务并关闭线程池"""
+        if self._loop is not None and self._runner is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._stop_http(), self._loop).result(20)
+            except Exception as e:
+                print(f'loopback server did not shut down cleanly: {e!r}')
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+                self._runner = None
+        self.executor.shutdown(wait=False)
+
+
+class _TaggedServerPacket(MsgPackPacket):
+    """服务器一侧的短标签 MessagePack 编码，不计入客户端的字节数指标"""
+
+    def encode(self):
+        packet = self._to_dict()
+        if 'data' in packet:
+            packet['data'] = tag_keys(packet['data'])
+        return msgpack.dumps(packet, default=self.__class__.dumps_default)
+
+    def decode(self, encoded_packet):
+        super().decode(encoded_packet)
+        self.data = untag_keys(self.data)
+
+
+def _server_serializer(serializer: str) -> dict:
+    if serializer == JSON:
+        return {'serializer': JSONPacket}
+    if serializer == MSGPACK:
+        return {'serializer': MsgPackPacket}
+    if serializer == MSGPACK_TAGGED:
+        return {'serializer': _TaggedServerPacket}
+    raise ValueError(f'unknown serializer: {serializer}')
+
+
+class _SocketIOSession(Session):
+    """通过真实 Socket.IO 连接的客户端"""
+
+    def __init__(self, sio: socketio.AsyncServer, sid: str, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self.sio = sio
+        self.sid = sid
+        self.loop = loop
+        self.closed = False
+
+    @property
+    def connected(self) -> bool:
+        return not self.closed
+
+    def deliver(self, event: str, payload: Any, ack: bool = False) -> Optional[Future]:
+        if ack:
+            # 等待时间由服务器一侧的 _wait 控制
+            return asyncio.run_coroutine_threadsafe(
+                self.sio.call(event, payload, to=self.sid, timeout=None), self.loop)
+        asyncio.run_coroutine_threadsafe(self.sio.emit(event, payload, to=self.sid), self.loop)
+        return None
+
+    def close(self):
+        self.closed = True
+        asyncio.run_coroutine_threadsafe(self.sio.disconnect(self.sid), self.loop)
+
+
+class LoopbackSocket(Session):
+    """同步客户端使用的内存传输
+
+    提供 MemberClient 用到的 socketio.Client 接口子集（on/call/emit/connect/wait/disconnect），
+    同时作为服务器一侧的 Session。call 在调用方线程中直接执行服务器的处理函数；
+    事件数据不做拷贝，收发双方都不应修改收到的 dict。
+    """
+
+    def __init__(self, server: LoopbackServer):
+        super().__init__()
+        self.server = server
+        self.handlers: Dict[str, Callable] = {}
+        self._connected = False
+        self._closed = threading.Event()
+        self.metrics = get_default_metrics()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def on(self, event: str, handler: Callable = None):
+        if handler is None:
+            def set_handler(h):
+                self.handlers[event] = h
+                return h
+
+            return set_handler
+        self.handlers[event] = handler
+
+    def connect(self, url: str = None, transports: List[str] = None, auth: dict = None, **kwargs):
+        self._connected = True
+        self._closed.clear()
+        self._trigger(Events.CONNECT)
+        self.server.connect(self, auth)
+
+    def call(self, event: str, data: Any = None, namespace: str = None, timeout: float = 60):
+        if not self._connected:
+            raise exceptions.BadNamespaceError('/ is not a connected namespace.')
+        start = time.perf_counter()
+        try:
+            return self.server.handle(self, event, data)
+        except Exception:
+            self.metrics.inc('rpc_errors', event)
+            raise
+        finally:
+            self.metrics.observe('rpc_seconds', event, time.perf_counter() - start)
+
+    def emit(self, event: str, data: Any = None, namespace: str = None, callback: Callable = None):
+        if not self._connected:
+            raise exceptions.BadNamespaceError('/ is not a connected namespace.')
+
+        def run():
+            result = self.server.handle(self, event, data)
+            if callback is not None:
+                callback(result)
+
+        self.server.executor.submit(run)
+
+    def deliver(self, event: str, payload: Any, ack: bool = False) -> Optional[Future]:
+        if event in INLINE_EVENTS:
+            try:
+                return _completed(self._trigger(event, payload))
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+                return future
+        return self.server.executor.submit(self._trigger, event, payload)
+
+    def _trigger(self, event: str, *args):
+        handler = self.handlers.get(event)
+        if handler is None:
+            return None
+        start = time.perf_counter()
+        try:
+            return handler(*args)
+        finally:
+            self.metrics.observe('event_handler_seconds', event, time.perf_counter() - start)
+
+    def close(self):
+        self.disconnect()
+
+    def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self.server.disconnect(self)
+        self._trigger(Events.DISCONNECT)
+        self._closed.set()
+
+    def wait(self):
+        self._closed.wait()
+
+
+class AsyncLoopbackSocket(Session):
+    """异步客户端使用的内存传输，提供 socketio.AsyncClient 接口子集
+
+    服务器的处理函数在线程池中执行，发往客户端的事件通过 run_coroutine_threadsafe 回到客户端的事件循环。
+    """
+
+    def __init__(self, server: LoopbackServer):
+        super().__init__()
+        self.server = server
+        self.handlers: Dict[str, Callable] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connected = False
+        self._closed: Optional[asyncio.Event] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def on(self, event: str, handler: Callable = None):
+        if handler is None:
+            def set_handler(h):
+                self.handlers[event] = h
+                return h
+
+            return set_handler
+        self.handlers[event] = handler
+
+    async def connect(self, url: str = None, transports: List[str] = None, auth: dict = None, **kwargs):
+        self.loop = asyncio.get_running_loop()
+        self._closed = asyncio.Event()
+        self._connected = True
+        await self._trigger(Events.CONNECT)
+        await self.loop.run_in_executor(self.server.executor, self.server.connect, self, auth)
+
+    async def call(self, event: str, data: Any = None, namespace: str = None, timeout: float = 60):
+        if not self._connected:
+            raise exceptions.BadNamespaceError('/ is not a connected namespace.')
+        try:
+            return await asyncio.wait_for(
+                self.loop.run_in_executor(self.server.executor, self.server.handle, self, event, data), timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.TimeoutError() from None
+
+    async def emit(self, event: str, data: Any = None, namespace: str = None, callback: Callable = None):
+        if not self._connected:
+            raise exceptions.BadNamespaceError('/ is not a connected namespace.')
+        future = self.loop.run_in_executor(self.server.executor, self.server.handle, self, event, data)
+        if callback is not None:
+            def done(f: asyncio.Future):
+                if f.exception() is None:
+                    ret = callback(f.result())
+                    if inspect.isawaitable(ret):
+                        self.loop.create_task(ret)
+
+            future.add_done_callback(done)
+
+    def deliver(self, event: str, payload: Any, ack: bool = False) -> Optional[Future]:
+        if self.loop is None or self.loop.is_closed():
+            return None
+        return asyncio.run_coroutine_threadsafe(self._trigger(event, payload), self.loop)
+
+    async def _trigger(self, event: str, *args):
+        handler = self.handlers.get(event)
+        if handler is None:
+            return None
+        ret = handler(*args)
+        if inspect.isawaitable(ret):
+            ret = await ret
+        return ret
+
+    def close(self):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.disconnect(), self.loop)
+
+    async def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        await self.loop.run_in_executor(self.server.executor, self.server.disconnect, self)
+        await self._trigger(Events.DISCONNECT)
+        self._closed.set()
+
+    async def wait(self):
+        if self._closed is not None:
+            await self._closed.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='进程内回环服务器，代替 NestJS + MongoDB + Redis')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--verbose', action='store_true', help='打印每个事件')
+    args = parser.parse_args()
+
+    server = LoopbackServer(verbose=args.verbose)
+    server.serve(args.port, args.host)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,17 +1,15 @@
-from typing import List, Dict
+from .chatMemory import ChatMemoryMixin
 from .dto import Message, ReplyData
 from .events import Events
 from .memberClient import MemberClient
-from .memory import AgentChat, AgentChats
+from .memory import AgentChat, MessageStore
 
 
-# 带有聊天记录的成员客户端
-class MemberClientWithChats(MemberClient):
-    def __init__(self, name, member_id):
-        super().__init__(name, member_id)
-        self.memory = AgentChats(member_id=self.member_id)
-        # 每个聊天可以有多个参考聊天
-        self.reference_chats: Dict[str, List[str]] = {}
+# 带有聊天记录的成员客户端，聊天记录相关的逻辑见 ChatMemoryMixin
+class MemberClientWithChats(ChatMemoryMixin, MemberClient):
+    def __init__(self, name, member_id, **kwargs):
+        super().__init__(name, member_id, **kwargs)
+        self._init_chat_memory()
 
     def on_receive_message(self, message: Message):
         # print(f'{self.name}: receive message:{message}')
@@ -24,65 +22,17 @@ class MemberClientWithChats(MemberClient):
         self.memory.add_message(message_obj)
         return message_obj
 
-    def clear_chat(self, chat_id: str):
-        self.memory.clear_chat(chat_id)
-
-    def remove_message(self, message_id: str, chat_id: str) -> bool:
-        return self.memory.remove_message(message_id, chat_id)
-
-    def add_reference_chat(self, main_chat_id: str, reference_chat_id: str):
-        """添加参考聊天
-        
-        Args:
-            main_chat_id: 主聊天ID
-            reference_chat_id: 参考聊天ID
-        """
-        if main_chat_id not in self.reference_chats:
-            self.reference_chats[main_chat_id] = []
-        if reference_chat_id not in self.reference_chats[main_chat_id]:
-            self.reference_chats[main_chat_id].append(reference_chat_id)
-
-    def remove_reference_chat(self, main_chat_id: str, reference_chat_id: str):
-        """移除参考聊天
-        
-        Args:
-            main_chat_id: 主聊天ID
-            reference_chat_id: 参考聊天ID
-        """
-        if main_chat_id in self.reference_chats:
-            if reference_chat_id in self.reference_chats[main_chat_id]:
-                self.reference_chats[main_chat_id].remove(reference_chat_id)
-
-    def get_all_messages(self, main_chat_id: str) -> List[Message]:
-        """获取主聊天及其所有参考聊天的消息
-        
-        Args:
-            main_chat_id: 主聊天ID
-            
-        Returns:
-            所有消息列表，按时间戳排序
-        """
-        all_messages = []
-
-        # 获取主聊天消息
-        main_chat = self.memory.get_chat(main_chat_id)
-        if main_chat:
-            all_messages.extend(main_chat.messages)
-
-        # 获取参考聊天消息
-        if main_chat_id in self.reference_chats:
-            for ref_chat_id in self.reference_chats[main_chat_id]:
-                ref_chat = self.memory.get_chat(ref_chat_id)
-                if ref_chat:
-                    all_messages.extend(ref_chat.messages)
-
-        # 按时间戳排序
-        return sorted(all_messages, key=lambda x: x.timestamp)
+    def send_message_async(self, message: str, chat_id: str):
+        message_obj, future = super().send_message_async(message, chat_id)
+        # 确认后（adopt_ack 已换成服务器分配的 HLC）再加入内存，时间线、索引和存储后端都按服务器的 HLC 排序；
+        # 确认失败时按本地 HLC 加入，与 send_message 一致
+        future.add_done_callback(lambda _: self.memory.add_message(message_obj))
+        return message_obj, future
 
 
 class BaseMemberAgent(MemberClientWithChats):
-    def __init__(self, name: str, member_id: str):
-        super().__init__(name, member_id)
+    def __init__(self, name: str, member_id: str, **kwargs):
+        super().__init__(name, member_id, **kwargs)
         self.prompt = None
 
     def connect_events(self):
@@ -91,7 +41,7 @@ class BaseMemberAgent(MemberClientWithChats):
 
     def _reply(self, data: dict):
         # print('reply:', data)
-        self.reply(ReplyData(**data))
+        self.reply(ReplyData.from_wire(data))
 
     def reply(self, data: ReplyData):
         """根据主聊天和参考聊天生成回复
@@ -104,14 +54,14 @@ class BaseMemberAgent(MemberClientWithChats):
             print(f'{self.name}: chat not in chats')
             return
 
-        # 获取所有相关消息
-        messages = self.get_all_messages(chat_id)
+        # 获取预算内的相关消息
+        messages = self.get_context_window(chat_id, self.prompt)
 
-        # 创建临时聊天对象用于生成回复
+        # 创建临时聊天对象用于生成回复，以主聊天ID命名，提示消息的转换缓存（PromptCache）按它复用上一轮的结果
         temp_chat = AgentChat(
-            chat_id='temp',
+            chat_id=chat_id,
             member_id=self.member_id,
-            messages=messages
+            messages=MessageStore.from_unique(messages)
         )
         # chat_info = self.get_chat(chat_id)
         # 打印messages
@@ -123,4 +73,11 @@ class BaseMemberAgent(MemberClientWithChats):
         self.send_message(rsp, chat_id)
 
     def get_ai_response(self, prompt: str, chat: AgentChat) -> str:
+        """调用模型生成回复
+
+        Args:
+            prompt: 系统提示词
+            chat: 已在 context_token_budget 以内的聊天记录，reply 中由 get_context_window 构建；
+                其他调用方需要先调用 fit_to_budget
+        """
         pass
@@ -1,14 +1,22 @@
+import queue
 import threading
 import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Union, Dict, Callable, Any, Tuple
+from typing import List, Union, Dict, Callable, Any, Tuple, Iterator
 
 import requests
-import socketio
 
+from .clientState import ClientStateMixin
+from .clock import HybridLogicalClock, get_default_clock
+from .codec import create_socket, socketio_path
+from .dispatcher import Dispatcher, get_default_dispatcher
 from .dto import Message, Command, CommandResult, Member, Chat
 from .events import Events
+from .metadataCache import MetadataCache
+from .metrics import Metrics, get_default_metrics
+from .sendQueue import SendQueue
 
 
 def command(name: str = None):
@@ -20,12 +28,16 @@ def command(name: str = None):
     return decorator
 
 
-class MemberClient:
-    def __init__(self, name, member_id, description='', url='http://localhost:3000'):
+class MemberClient(ClientStateMixin):
+    def __init__(self, name, member_id, description='', url='http://localhost:3000', serializer='json',
+                 socket=None):
         self.name = name
         self.member_id = member_id
         self.description = description
-        self.socket = socketio.Client()
+        # 线路编码：'json'、'msgpack' 或 'msgpack-tagged'，连接时通过 Socket.IO 路径与服务器协商
+        self.serializer = serializer
+        # 可以传入已有的传输，如 SharedConnection.member_socket，此时不再创建 socketio.Client
+        self.socket = socket if socket is not None else create_socket(serializer)
         self.base_url = url
 
         self.login_success = False  # login状态标识
@@ -33,11 +45,40 @@ class MemberClient:
 
         self.connect_timeout = 10  # 设置连接超时时间，单位为秒
         self.connection_start_time = None  # 记录连接开始时间
+        self.login_latency: float | None = None  # 最近一次登录耗时，单位为秒
+        self._login_event = threading.Event()  # 收到登录响应时置位
+        self._connected_event = threading.Event()  # 命名空间连接建立时置位，断开时清除
 
         self.command_handlers: Dict[str, Callable[[Any], str]] = {}
         self.register_commands()
+        # request_id -> 流式命令结果队列
+        self._command_streams: Dict[str, queue.Queue] = {}
+
+        # chat 和成员信息缓存，由服务器推送的变更事件失效
+        self.metadata_cache = MetadataCache()
+
+        # 收到的消息交给有界线程池处理，同一个chat内按顺序执行
+        self.dispatcher: Dispatcher = get_default_dispatcher()
+        # send_message_async 使用的出站队列
+        self.send_queue = SendQueue(self)
+        # RPC 延迟、处理时间等指标，进程内所有客户端共用
+        self.metrics: Metrics = get_default_metrics()
+        # 混合逻辑时钟，发送时打时间戳，收到消息时合并对方的时钟
+        self.clock: HybridLogicalClock = get_default_clock()
+        # 断线恢复的游标和消息去重，见 ClientStateMixin
+        self._init_client_state()
+
+    def set_serializer(self, serializer: str):
+        """切换线路编码，需要在 login 之前调用
 
-        self.local_chat_members: Dict[str, List[Member]] = {}
+        Args:
+            serializer: 'json'（默认）、'msgpack' 或 'msgpack-tagged'（键名替换为短标签的 msgpack）
+        """
+        if self.socket.connected:
+            raise RuntimeError('set_serializer must be called before login')
+        self.serializer = serializer
+        self.socket = create_socket(serializer)
+        self.events_bound = False
 
     def register_commands(self):
         # 自动注册被 @command 装饰的实例方法
@@ -47,52 +88,130 @@ class MemberClient:
                 command_name = attr._command_name
                 self.command_handlers[command_name] = attr
 
-    def send_command(self, command: str, to: List[str], data: dict = None) -> List[CommandResult]:
+    def _check_command(self, command: str, to: List[str]) -> bool:
+        # 禁止发送空命令
+        if command is None or command == '':
+            print(f'{self.name} 发送命令失败，命令为空')
+            return False
+        # 禁止发送空to
+        if to is None or len(to) == 0:
+            print(f'{self.name} 发送命令失败，to为空')
+            return False
+        return True
+
+    def send_command(self, command: str, to: List[str], data: dict = None,
+                     per_recipient_timeout: float = None) -> List[CommandResult]:
         """发送命令并处理可能的超时和错误
-        
+
         Args:
             command: 命令名称
             to: 接收命令的成员列表
             data: 命令数据
-            
+            per_recipient_timeout: 单个接收者的超时时间，单位为秒。
+                超时的接收者以带 error 的 CommandResult 返回，其余结果照常返回
+
         Returns:
             List[CommandResult]: 命令执行结果列表
         """
-        # 禁止发送空命令
-        if command is None or command == '':
-            print(f'{self.name} 发送命令失败，命令为空')
-            return []
-        # 禁止发送空to
-        if to is None or len(to) == 0:
-            print(f'{self.name} 发送命令失败，to为空')
+        if not self._check_command(command, to):
             return []
 
         if data is None:
             data = {}
         command_obj = Command(command=command, to=to, data=data, by=self.member_id)
-        max_retries = 2
-        current_retry = 0
+        payload = command_obj.to_wire()
+        timeout = 30  # 设置合理的超时时间
+        if per_recipient_timeout is not None:
+            payload['timeout_ms'] = int(per_recipient_timeout * 1000)
+            timeout = per_recipient_timeout + 5
+
+        try:
+            response = self.socket.call(Events.SEND_COMMAND, payload, timeout=timeout)
+            # print('response:', response)
+            return [CommandResult.from_wire(r) for r in response]
+        except Exception as e:
+            print(f"发送命令时发生错误: {str(e)}")
+            return []
+
+    def iter_command_results(self, command: str, to: List[str], data: dict = None, timeout: float = 30,
+                             per_recipient_timeout: float = None) -> Iterator[CommandResult]:
+        """发送命令，每个接收者返回结果后立即产出，不等待其他接收者
+
+        Args:
+            command: 命令名称
+            to: 接收命令的成员列表
+            data: 命令数据
+            timeout: 整体截止时间，单位为秒，到期后停止产出，未返回的接收者被忽略
+            per_recipient_timeout: 单个接收者的超时时间，单位为秒，超时的接收者以带 error 的结果产出
+
+        Yields:
+            CommandResult: 按返回顺序产出的命令结果
+        """
+        if not self._check_command(command, to):
+            return
 
-        while current_retry < max_retries:
+        if data is None:
+            data = {}
+        request_id = str(uuid.uuid4())
+        payload = Command(command=command, to=to, data=data, by=self.member_id).to_wire()
+        payload['request_id'] = request_id
+        if per_recipient_timeout is not None:
+            payload['timeout_ms'] = int(per_recipient_timeout * 1000)
+
+        results: queue.Queue = queue.Queue()
+        self._command_streams[request_id] = results
+        deadline = time.monotonic() + timeout
+        try:
             try:
-                response = self.socket.call(
-                    Events.SEND_COMMAND,
-                    command_obj.model_dump(),
-                    timeout=30  # 设置合理的超时时间
-                )
-                # print('response:', response)
-                return [CommandResult(**r) for r in response]
+                response = self.socket.call(Events.SEND_COMMAND_STREAM, payload, timeout=timeout)
             except Exception as e:
                 print(f"发送命令时发生错误: {str(e)}")
-                return []
+                return
+            if response.get('status') != 'success':
+                print(f"发送命令失败: {response.get('message')}")
+                return
+
+            for _ in range(len(to)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    yield results.get(timeout=remaining)
+                except queue.Empty:
+                    break
+        finally:
+            self._command_streams.pop(request_id, None)
+
+    def send_command_quorum(self, command: str, to: List[str], quorum: int, data: dict = None,
+                            timeout: float = 30, per_recipient_timeout: float = None) -> List[CommandResult]:
+        """发送命令，收到 quorum 个成功结果或到达截止时间后立即返回
+
+        Returns:
+            List[CommandResult]: 已收到的结果，包括失败的结果；成功结果不足 quorum 个说明已超时
+        """
+        collected = []
+        succeeded = 0
+        for result in self.iter_command_results(command, to, data, timeout, per_recipient_timeout):
+            collected.append(result)
+            if result.error is None:
+                succeeded += 1
+                if succeeded >= quorum:
+                    break
+        return collected
+
+    def _on_receive_command_result(self, data: dict):
+        results = self._command_streams.get(data.get('request_id'))
+        if results is not None:
+            results.put(CommandResult.from_wire(data))
 
     def on_receive_command(self, command: dict):
         # 将传入的 dict 数据转为 Command 对象
-        command = Command(**command)
+        command = Command.from_wire(command)
         # print(f'{self.name} receive f{_command}')
         handler = self.command_handlers.get(command.command)
         if handler:
-            ret = handler(command.data)
+            with self.metrics.timer('handler_seconds', f'command:{command.command}', 'handler_errors'):
+                ret = handler(command.data)
             if ret is None:
                 ret = ''
             return ret
@@ -100,33 +219,48 @@ class MemberClient:
             print(f"{self.name} 收到未知命令：{command.command}")
             return f'unknown command,{command.command}'
 
+    def metrics_snapshot(self) -> dict:
+        """指标快照，附带分发器、出站队列和元数据缓存的统计信息"""
+        snapshot = self.metrics.snapshot()
+        snapshot['dispatcher'] = self.dispatcher.stats()
+        snapshot['send_queue'] = self.send_queue.stats()
+        snapshot['metadata_cache'] = self.metadata_cache.stats()
+        return snapshot
+
     def connect_events(self):
         self.events_bound = True  # 确保事件处理程序只绑定一次  
+        self.socket.on(Events.CONNECT, self._connected_event.set)
         self.socket.on(Events.RECEIVE_LOGIN_RESPONSE, self.on_receive_login_response)
         self.socket.on(Events.DISCONNECT, self.logout)
         self.socket.on(Events.RECEIVE_MESSAGE, self._on_receive_message)
         self.socket.on(Events.RECEIVE_COMMAND, self.on_receive_command)
+        self.socket.on(Events.RECEIVE_COMMAND_RESULT, self._on_receive_command_result)
+        self.socket.on(Events.CHAT_CHANGED, self.on_chat_changed)
+        self.socket.on(Events.CHAT_MEMBERSHIP_CHANGED, self.on_chat_membership_changed)
 
     def login(self):
         """连接到 Socket.IO 服务器并传递认证信息"""
         if not self.login_success or not self.socket.connected:
-            self.connection_start_time = time.time()
-            self.socket.connect(self.base_url, transports=['websocket'],
-                                auth={'member_name': self.name, 'member_id': self.member_id})
-
-            # 绑定事件
+            # 先绑定事件，避免在连接建立后、绑定前错过登录响应
             if not self.events_bound:
                 self.connect_events()
 
+            self._login_event.clear()
+            self.connection_start_time = time.time()
+            start = time.perf_counter()
+            if not self.socket.connected:
+                self.socket.connect(self.base_url, transports=['websocket'],
+                                    socketio_path=socketio_path(self.serializer),
+                                    auth={'member_name': self.name, 'member_id': self.member_id})
+
             # 等待登录响应
-            while True:
-                time.sleep(0.1)  # 等待一段时间，避免占用过多 CPU
-                if time.time() - self.connection_start_time > self.connect_timeout:
-                    print("Connection timed out. Please try again.")
-                    return False
-                # print('正在等待login response...')
-                if self.login_success:
-                    break
+            remaining = self.connect_timeout - (time.time() - self.connection_start_time)
+            if not self._login_event.wait(max(remaining, 0)):
+                print("Connection timed out. Please try again.")
+                return False
+            if not self.login_success:
+                return False
+            self.login_latency = time.perf_counter() - start
         return True
 
     def on_receive_login_response(self, data):
@@ -135,10 +269,14 @@ class MemberClient:
         if data['status'] == 200:
             print(f"Login Success: {data['message']}")
             self.login_success = True
+            resume = self._on_login_accepted()
             self.on_login_success()
+            if resume:
+                threading.Thread(target=self.resume_session, daemon=True).start()
         else:
             print(f"Login Failed: {data['message']}")
             self.login_success = False
+        self._login_event.set()
 
     def on_login_success(self):
         pass
@@ -147,6 +285,9 @@ class MemberClient:
         """断开连接"""
         # self.socket.disconnect()
         self.login_success = False
+        self._connected_event.clear()
+        # 断开后在途请求的确认不会再到达
+        self.send_queue.abort_in_flight()
         print(f"Socketio Disconnected, {self.name} {self.member_id}")
 
     def produce_message(self, message: str, chat_id: str, message_type: str = 'text') -> Message:
@@ -158,6 +299,7 @@ class MemberClient:
                        from_member_name=self.name,
                        timestamp=str(datetime.now()),
                        message_id=str(uuid.uuid4()),
+                       hlc=self.clock.now(),
                        )
 
     def send_message(self, message: str, chat_id: str) -> Message:
@@ -168,8 +310,12 @@ class MemberClient:
         message: Message = self.produce_message(message, chat_id)
         # print('message 对象:', message, type(message))
         try:
+            # 先等待该 chat 中 send_message_async 排队的消息得到确认，保证同一 chat 内按调用顺序送达
+            self.send_queue.flush(chat_id)
             # 使用 sio.call 发送消息并等待服务器响应
-            self.socket.call(Events.SEND_MESSAGE, message.model_dump())
+            ack = self.socket.call(Events.SEND_MESSAGE, message.to_wire())
+            self.adopt_ack(message, ack)
+            self._remember_message(message)
             # print('response:', response)
             # 根据服务器返回的响应进行处理
             # if response.get('status') == 'success':
@@ -185,6 +331,20 @@ class MemberClient:
 
         return message
 
+    def send_message_async(self, message: str, chat_id: str) -> Tuple[Message, Future]:
+        """不等待服务器确认，将消息放入出站队列后立即返回
+
+        同一 chat 的消息按调用顺序送达（与 send_message 混用时也是）；需要在其他事件（如 NEXT_SPEAKER）之前送达时，
+        调用 self.send_queue.flush(chat_id) 等待确认。
+
+        Returns:
+            Tuple[Message, Future]: 消息对象，以及结果为服务器确认的 Future
+        """
+        print(f'{datetime.now()} {self.name}:', message)
+        message: Message = self.produce_message(message, chat_id)
+        self._remember_message(message)
+        return message, self.send_queue.submit(message)
+
     def signup(self) -> dict:
         # 构建请求数据
         data = {
@@ -209,9 +369,67 @@ class MemberClient:
             print(f"Error occurred during signup: {e}")
             return {}
 
+    def _parse_message(self, data: dict) -> Message:
+        return Message.from_wire(data)
+
     def _on_receive_message(self, message: Dict):
-        threading.Thread(target=self.on_receive_message, args=(Message(**message),)).start()
-        return True
+        message = self._parse_message(message)
+        self.clock.update(message.hlc)
+        if self._buffer_if_resuming(message):
+            return True
+        # 返回值作为给服务器的确认，消息被丢弃时不确认
+        return self._deliver_message(message)
+
+    def _deliver_message(self, message: Message) -> bool:
+        if not self._remember_message(message):
+            return True
+        # 通常在 socket 接收线程中调用，不能阻塞，见 Dispatcher
+        return self.dispatcher.submit((self.member_id, message.chat_id), self.on_receive_message, message,
+                                      block=False)
+
+    def resume_session(self) -> int:
+        """补拉断线期间错过的消息
+
+        对每个收发过消息的 chat，以最后见到的消息ID为游标，只向服务器请求之后的消息，
+        去重后按服务器顺序交给 on_receive_message。补拉期间收到的实时消息先暂存，补拉完成后再处理。
+
+        Returns:
+            int: 补拉到的消息数
+        """
+        # 登录响应可能先于命名空间连接完成到达，等待连接可用后再请求
+        self._connected_event.wait(self.connect_timeout)
+
+        started = self._begin_resume()
+        if started is None:
+            return 0  # 已有补拉在进行
+        cursors, hlc_cursors = started
+
+        replayed = 0
+        try:
+            for chat_id, since in cursors.items():
+                try:
+                    missed = self.load_chat_messages_from_server(chat_id, self.resume_max_messages, since=since,
+                                                                 since_hlc=hlc_cursors.get(chat_id))
+                except Exception as e:
+                    print(f"{self.name} 补拉聊天室 {chat_id} 的消息失败: {e}")
+                    continue
+                for message in missed:
+                    # 服务器不会把自己发出的消息推送给自己，补拉时同样跳过
+                    if message.from_member_id == self.member_id or not self._remember_message(message):
+                        continue
+                    self.dispatcher.submit((self.member_id, chat_id), self.on_receive_message, message)
+                    replayed += 1
+        finally:
+            while True:
+                buffered = self._take_resume_buffer()
+                if not buffered:
+                    break
+                for message in buffered:
+                    self._deliver_message(message)
+
+        if replayed:
+            print(f"{self.name} 重连后补拉了 {replayed} 条消息")
+        return replayed
 
     def on_receive_message(self, message: Message):
         """处理接收到的消息"""
@@ -243,7 +461,7 @@ class MemberClient:
                 print(f"聊天室 {chat_id} 创建成功")
                 if join:
                     self.join_chat(chat_id)
-                return True, Chat(**response.get('data'))
+                return True, Chat.from_wire(response.get('data'))
             else:
                 print(f"创建聊天室失败: {response.get('message')}")
                 return False, response.get('message')
@@ -260,6 +478,7 @@ class MemberClient:
                 'chat_id': chat_id,
             }
             response = self.socket.call(Events.JOIN_CHAT, data)
+            self.metadata_cache.invalidate_chat(chat_id)
             if response.get('status') == 'success':
                 print(f"{self.name}成功加入聊天室 {chat_id}")
                 return True, response
@@ -274,13 +493,19 @@ class MemberClient:
     def get_joined_chats(self) -> List[str]:
         return self.socket.call(Events.GET_JOINED_CHATS)
 
-    def get_chat(self, chat_id: str) -> Chat | None:
+    def get_chat(self, chat_id: str, try_get_from_local: bool = True) -> Chat | None:
+        if try_get_from_local:
+            chat = self.metadata_cache.get_chat(chat_id)
+            if chat is not None:
+                return chat
         data = {
             'chat_id': chat_id
         }
         response = self.socket.call(Events.GET_CHAT, data)
         if response.get('status') == 'success':
-            return Chat(**response.get('data'))
+            chat = Chat.from_wire(response.get('data'))
+            self.metadata_cache.put_chat(chat)
+            return chat
         else:
             return None
 
@@ -288,12 +513,14 @@ class MemberClient:
         data = {
             'chat_id': chat_id
         }
+        self.metadata_cache.invalidate_chat(chat_id)
         return self.socket.call(Events.DELETE_CHAT, data)
 
     def exit_chat(self, chat_id: str) -> dict:
         data = {
             'chat_id': chat_id
         }
+        self.metadata_cache.invalidate_chat(chat_id)
         return self.socket.call(Events.EXIT_CHAT, data)
 
     def pull_members_into_chat(self, chat_id: str, member_ids: List[str]) -> dict:
@@ -301,44 +528,69 @@ class MemberClient:
             'chat_id': chat_id,
             'members': member_ids
         }
+        self.metadata_cache.invalidate_chat(chat_id)
         return self.socket.call(Events.PULL_MEMBERS_INTO_CHAT, data)
 
-    def get_member(self, member_id: str) -> Member:
+    def get_member(self, member_id: str, try_get_from_local: bool = True) -> Member:
+        if try_get_from_local:
+            member = self.metadata_cache.get_member(member_id)
+            if member is not None:
+                return member
         data = {
             'member_id': member_id
         }
-        member = self.socket.call(Events.GET_MEMBER, data)
-        return Member(**member)
+        member = Member.from_wire(self.socket.call(Events.GET_MEMBER, data))
+        self.metadata_cache.put_member(member)
+        return member
 
-    def get_members(self, member_ids: List[str]) -> List[Member]:
-        data = {
-            'members': member_ids
-        }
-        return [Member(**member) for member in self.socket.call(Events.GET_MEMBERS, data)]
+    def get_members(self, member_ids: List[str], try_get_from_local: bool = True) -> List[Member]:
+        cached = {}
+        if try_get_from_local:
+            for member_id in member_ids:
+                member = self.metadata_cache.get_member(member_id)
+                if member is not None:
+                    cached[member_id] = member
+        missing = [member_id for member_id in member_ids if member_id not in cached]
+        if missing:
+            data = {
+                'members': missing
+            }
+            for member in self.socket.call(Events.GET_MEMBERS, data):
+                member = Member.from_wire(member)
+                self.metadata_cache.put_member(member)
+                cached[member.member_id] = member
+        return [cached[member_id] for member_id in member_ids if member_id in cached]
 
-    def get_chat_members(self, chat_id: str, need_complete_info: bool = False, try_get_from_local: bool = False) -> \
+    def get_chat_members(self, chat_id: str, need_complete_info: bool = False, try_get_from_local: bool = True) -> \
             List[
                 Member | str]:
         if try_get_from_local:
-            if chat_id not in self.local_chat_members:
-                self.local_chat_members[chat_id] = self.get_chat_members(chat_id, True, False)
-            return self.local_chat_members[chat_id]
+            if need_complete_info:
+                members = self.metadata_cache.get_chat_members(chat_id)
+                if members is not None:
+                    return list(members)
+            else:
+                chat = self.metadata_cache.get_chat(chat_id)
+                if chat is not None:
+                    return list(chat.members)
         data = {
             'chat_id': chat_id,
             'complete': need_complete_info
         }
         members = self.socket.call(Events.GET_CHAT_MEMBERS, data)
-        return [Member(**member) if need_complete_info else member for member in members]
+        if not need_complete_info:
+            return members
+        members = [Member.from_wire(member) for member in members]
+        self.metadata_cache.put_chat_members(chat_id, members)
+        return list(members)
 
     def get_created_chats(self) -> List[Chat]:
         chats = self.socket.call(Events.GET_CREATED_CHATS)
-        return [Chat(**chat) for chat in chats]
+        return [Chat.from_wire(chat) for chat in chats]
 
     def get_member_by_name(self, name: str, chat_id: str, try_get_from_local: bool = True) -> Member:
         if try_get_from_local:
-            if chat_id not in self.local_chat_members:
-                self.local_chat_members[chat_id] = self.get_chat_members(chat_id, True)
-            for member in self.local_chat_members[chat_id]:
+            for member in self.get_chat_members(chat_id, True):
                 if member.name == name:
                     return member
         data = {
@@ -346,31 +598,42 @@ class MemberClient:
             'chat_id': chat_id
         }
         member = self.socket.call(Events.GET_MEMBER_BY_NAME, data)
-        return Member(**member)
+        return Member.from_wire(member)
 
     def remove_member_from_chat(self, chat_id: str, member_id: str):
         data = {
             'chat_id': chat_id,
             'member_id': member_id
         }
+        self.metadata_cache.invalidate_chat(chat_id)
         return self.socket.call(Events.REMOVE_MEMBER_FROM_CHAT, data)
 
-    def load_chat_messages_from_server(self, chat_id: str, count: int = -1):
+    def load_chat_messages_from_server(self, chat_id: str, count: int = -1, since: str = None,
+                                       since_hlc: int = None):
         """
         count: 加载的聊天记录数量，-1表示加载所有
+        since: 消息ID游标，只加载该消息之后的消息；游标不存在时按 count 加载最近的消息
+        since_hlc: HLC 游标，只加载 HLC 大于该值的消息，服务器支持时优先于 since
         """
         data = {
             'chat_id': chat_id,
             'count': count
         }
+        if since is not None:
+            data['since'] = since
+        if since_hlc:
+            data['since_hlc'] = since_hlc
         messages_data = self.socket.call(Events.LOAD_CHAT_MESSAGES_FROM_SERVER, data)
-        messages = [Message(**message) for message in messages_data]
+        messages = [Message.from_wire(message) for message in messages_data]
+        if messages:
+            self.clock.update(max(message.hlc for message in messages))
         return messages
     
     def listen_in_chat(self, chat_id: str):
         data = {
             'chat_id': chat_id
         }
+        self.metadata_cache.invalidate_chat(chat_id)
         return self.socket.call(Events.LISTEN_IN_CHAT, data)
     
     def unlisten_in_chat(self, chat_id: str):
@@ -378,6 +641,7 @@ class MemberClient:
             'chat_id': chat_id
         }
         # print('socket connect:', self.socket.connected)
+        self.metadata_cache.invalidate_chat(chat_id)
         return self.socket.call(Events.UNLISTEN_IN_CHAT, data)
     
     def get_listen_in_chats(self):
@@ -389,15 +653,37 @@ class MemberClient:
         return f'{self.name} this is a test command result'
 
 
+def login_many(clients: List[MemberClient], max_workers: int = None) -> List[bool]:
+    """并发登录多个客户端
+
+    Args:
+        clients: 要登录的客户端列表
+        max_workers: 同时登录的最大数量，默认全部同时登录
+
+    Returns:
+        List[bool]: 与 clients 顺序一致的登录结果
+    """
+    if not clients:
+        return []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or len(clients)) as executor:
+        results = list(executor.map(lambda client: client.login(), clients))
+    latencies = [client.login_latency for client in clients if client.login_latency is not None]
+    slowest = max(latencies) if latencies else 0
+    print(f'{sum(results)}/{len(clients)} 个客户端登录成功，'
+          f'总耗时 {time.perf_counter() - start:.3f}s，最慢 {slowest:.3f}s')
+    return results
+
+
 if __name__ == '__main__':
     ms = []
     for i in range(10):
         member = MemberClient(f"member{i}", f"member_id{i}")
         member.signup()
-        success = member.login()
+        ms.append(member)
+    for member, success in zip(ms, login_many(ms)):
         if success:
             print(f"{member.name} 已连接")
-        ms.append(member)
     # ms[0].join_chat('0017f743-a2d2-44d4-9717-1e8b3ba8f9ab')
     # ms[1].join_chat('97e948da-7771-4e3d-9544-c7af23fa1a75')
     # ms[0].send_message("hello from client", "chat_id")
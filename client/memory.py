@@ -1,27 +1,293 @@
-from typing import Dict, List
-from pydantic import BaseModel
+import bisect
+import threading
+from collections.abc import MutableSequence
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Iterable, Iterator, Optional, Tuple, Union
+from pydantic import BaseModel, Field, PrivateAttr
+from pydantic_core import core_schema
 import os
 
+from .clock import from_timestamp, order_key
 from .dto import Message
+from .memoryIndex import MemoryIndex, Query
+from .retention import PinnedLedger, RetentionPolicy, SpillStore, is_system_message
+
+if TYPE_CHECKING:
+    from .memoryBackend import MemoryBackend
+    from .sharedLog import SharedLog
+    from .snapshot import Snapshot
+    from .semanticMemory import SemanticMemory
+
+
+def _select_between(items: List[Message], since_key: Optional[int], until_key: Optional[int],
+                    time_sorted: bool) -> List[Message]:
+    """从消息列表中选出 HLC 在 [since_key, until_key) 内的消息，列表有序时二分查找"""
+    if not time_sorted:
+        return [m for m in items
+                if (since_key is None or order_key(m) >= since_key)
+                and (until_key is None or order_key(m) < until_key)]
+    lo = bisect.bisect_left(items, since_key, key=order_key) if since_key is not None else 0
+    hi = bisect.bisect_left(items, until_key, key=order_key) if until_key is not None else len(items)
+    return items[lo:hi]
+
+
+class MessageStore(MutableSequence):
+    """按到达顺序保存消息，并维护 message_id 索引
+
+    - 按 message_id 查找、删除和插入去重都是 O(1)
+    - 删除只留下墓碑，墓碑过多时或按位置访问时才压缩
+    - 支持按位置（range）和按时间（between）的范围查询
+    - 其余行为与 List[Message] 相同，可以直接替换 AgentChat.messages
+    """
+
+    # 墓碑数超过该值且超过存活消息数时压缩
+    COMPACT_THRESHOLD = 64
+
+    def __init__(self, messages: Iterable[Message] = ()):
+        self._items: List[Optional[Message]] = []
+        # message_id -> 在 _items 中的下标
+        self._positions: Dict[str, int] = {}
+        self._removed = 0
+        # 消息是否按 HLC（见 clock.order_key）非递减顺序到达，是则按时间查询时可以二分
+        self._time_sorted = True
+        self._last_key = 0
+        # 除追加以外的修改（删除、替换、插入、清空）都会递增，用于判断增量写入是否仍然有效
+        self.version = 0
+        # 置顶消息统计，由 AgentChats 创建并维护，见 retention.PinnedLedger
+        self.pinned_ledger: Optional[PinnedLedger] = None
+        self._lock = threading.RLock()
+        self.extend(messages)
+
+    @classmethod
+    def from_unique(cls, messages: List[Message]) -> 'MessageStore':
+        """用已经去重的消息批量构造，不逐条追加；每轮为模型组装上下文时使用
+
+        消息有重复的 message_id 时退回逐条追加。构造的 store 不做按时间的二分。
+        """
+        store = cls()
+        positions = {message.message_id: i for i, message in enumerate(messages)}
+        if len(positions) != len(messages):
+            return cls(messages)
+        store._items = list(messages)
+        store._positions = positions
+        store._time_sorted = False
+        return store
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        def validate(value, validate_list):
+            if isinstance(value, MessageStore):
+                return value
+            return cls(validate_list(value))
+
+        return core_schema.no_info_wrap_validator_function(
+            validate, handler(List[Message]),
+            serialization=core_schema.plain_serializer_function_ser_schema(list))
+
+    @property
+    def lock(self) -> threading.RLock:
+        """单个操作已经是线程安全的；需要多次读取之间保持一致（如先比较 version 再读取）时持有该锁"""
+        return self._lock
+
+    # ---- 按 message_id 的操作
+
+    def append(self, message: Message) -> bool:
+        """追加消息，message_id 已存在时忽略并返回 False"""
+        with self._lock:
+            if message.message_id in self._positions:
+                return False
+            if self._time_sorted:
+                key = order_key(message)
+                if key < self._last_key:
+                    self._time_sorted = False
+                self._last_key = key
+            self._positions[message.message_id] = len(self._items)
+            self._items.append(message)
+            return True
+
+    def extend(self, messages: Iterable[Message]):
+        for message in messages:
+            self.append(message)
+
+    def get(self, message_id: str) -> Optional[Message]:
+        # _compact 先后替换 _items 和 _positions，不持锁可能用新的下标读到旧的列表
+        with self._lock:
+            index = self._positions.get(message_id)
+            return self._items[index] if index is not None else None
+
+    def remove_by_id(self, message_id: str) -> Optional[Message]:
+        """删除并返回消息，不存在时返回 None"""
+        with self._lock:
+            index = self._positions.pop(message_id, None)
+            if index is None:
+                return None
+            message = self._items[index]
+            self._items[index] = None
+            self._removed += 1
+            self.version += 1
+            # 末尾的墓碑直接丢弃
+            while self._items and self._items[-1] is None:
+                self._items.pop()
+                self._removed -= 1
+            if self._removed > self.COMPACT_THRESHOLD and self._removed > len(self._positions):
+                self._compact()
+            return message
+
+    def remove(self, message: Message):
+        if self.remove_by_id(message.message_id) is None:
+            raise ValueError(f'message {message.message_id} not in store')
+
+    def index_of(self, message_id: str) -> int:
+        """消息在存活消息中的位置，不存在时返回 -1"""
+        with self._lock:
+            self._compact()
+            return self._positions.get(message_id, -1)
+
+    def last(self) -> Optional[Message]:
+        for message in reversed(self._items):
+            if message is not None:
+                return message
+        return None
+
+    # ---- 范围查询
+
+    def range(self, start: int = 0, stop: int = None) -> List[Message]:
+        """按位置返回 [start, stop) 的消息，支持负数下标"""
+        return self[start:stop]
+
+    def between(self, since: Union[str, datetime, int] = None,
+                until: Union[str, datetime, int] = None) -> List[Message]:
+        """返回时间在 [since, until) 内的消息，按存储顺序排列
+
+        Args:
+            since: 时间戳字符串、datetime 或 HLC 整数
+            until: 同 since
+        """
+        since_key = from_timestamp(since) if since is not None else None
+        until_key = from_timestamp(until) if until is not None else None
+        with self._lock:
+            self._compact()
+            return _select_between(self._items, since_key, until_key, self._time_sorted)
+
+    # ---- 序列接口
+
+    def _compact(self):
+        """去掉墓碑并重建索引，调用方持有锁"""
+        if not self._removed:
+            return
+        self._items = [m for m in self._items if m is not None]
+        self._positions = {m.message_id: i for i, m in enumerate(self._items)}
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __iter__(self) -> Iterator[Message]:
+        # 遍历快照，遍历期间可以安全地追加或删除
+        for message in list(self._items):
+            if message is not None:
+                yield message
+
+    def __reversed__(self) -> Iterator[Message]:
+        for message in reversed(list(self._items)):
+            if message is not None:
+                yield message
+
+    def __contains__(self, item) -> bool:
+        message_id = item if isinstance(item, str) else getattr(item, 'message_id', None)
+        return message_id in self._positions
+
+    def __getitem__(self, index):
+        with self._lock:
+            self._compact()
+            return self._items[index]
+
+    def __setitem__(self, index, message: Message):
+        if isinstance(index, slice):
+            raise TypeError('MessageStore does not support slice assignment')
+        with self._lock:
+            self._compact()
+            old = self._items[index]
+            if message.message_id != old.message_id and message.message_id in self._positions:
+                raise ValueError(f'message {message.message_id} already in store')
+            del self._positions[old.message_id]
+            self._items[index] = message
+            self._positions[message.message_id] = index % len(self._items)
+            self._time_sorted = False
+            self.version += 1
+
+    def __delitem__(self, index):
+        with self._lock:
+            self._compact()
+            targets = self._items[index] if isinstance(index, slice) else [self._items[index]]
+            for message in targets:
+                self.remove_by_id(message.message_id)
+
+    def insert(self, index: int, message: Message):
+        """在指定位置插入消息，message_id 已存在时忽略；需要重建索引，为 O(n)"""
+        with self._lock:
+            if message.message_id in self._positions:
+                return
+            self._compact()
+            self._items.insert(index, message)
+            self._positions = {m.message_id: i for i, m in enumerate(self._items)}
+            self._time_sorted = False
+            self.version += 1
+
+    def clear(self):
+        with self._lock:
+            self._items = []
+            self._positions = {}
+            self._removed = 0
+            self._time_sorted = True
+            self._last_key = 0
+            self.version += 1
+
+    def copy(self) -> List[Message]:
+        return list(self)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (MessageStore, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'MessageStore({list(self)!r})'
 
 
 class AgentChat(BaseModel):
     chat_id: str
-    messages: List[Message] = []
+    messages: MessageStore = Field(default_factory=MessageStore)
     member_id: str
 
-    def add_message(self, message: Message):
-        self.messages.append(message)
+    # 该 chat 的复合操作（添加后按保留策略淘汰、清空、替换 messages）持有的锁
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    def add_message(self, message: Message) -> bool:
+        """添加消息，重复的 message_id 会被忽略并返回 False"""
+        return self.messages.append(message)
+
+    def get_message(self, message_id: str) -> Optional[Message]:
+        return self.messages.get(message_id)
 
     def clear_messages(self):
         self.messages.clear()
 
-    def remove_message(self, message_id: str):
-        self.messages = [message for message in self.messages if message.message_id != message_id]
+    def remove_message(self, message_id: str) -> bool:
+        return self.messages.remove_by_id(message_id) is not None
+
+    # 上次 save_to_txt 的 (文件路径, messages.version, 已写入消息数, 文件大小)
+    _saved: Optional[Tuple[str, int, int, int]] = PrivateAttr(default=None)
 
     def save_to_txt(self, directory: str = "chat_logs"):
         """将聊天消息保存到文本文件
-        
+
+        自上次保存以来只追加过消息且文件未被改动时，只追加新消息；否则重写整个文件。
+
         Args:
             directory: 保存文件的目录，默认为 'chat_logs'
         """
@@ -30,50 +296,405 @@ class AgentChat(BaseModel):
         
         # 构建文件路径
         file_path = os.path.join(directory, f"{self.chat_id}.txt")
-        
+
+        messages = list(self.messages)
+        version = self.messages.version
+        start, mode = 0, "w"
+        if self._saved is not None:
+            path, saved_version, count, size = self._saved
+            if (path == file_path and saved_version == version and count <= len(messages)
+                    and os.path.exists(file_path) and os.path.getsize(file_path) == size):
+                start, mode = count, "a"
+
         # 写入消息
-        with open(file_path, "w", encoding="utf-8") as f:
-            for message in self.messages:
+        with open(file_path, mode, encoding="utf-8") as f:
+            for message in messages[start:]:
                 f.write(f"[{message.timestamp}] {message.from_member_name}: {message.message}\n")
+        self._saved = (file_path, version, len(messages), os.path.getsize(file_path))
 
 
 class AgentChats(BaseModel):
+    """一个成员的全部聊天记录
+
+    线程安全：消息由分发线程写入，同时 reply、命令处理等可能在其他线程读取或清空。
+    chats 字典的增删持有 _lock，同一 chat 的复合操作持有该 chat 的锁（AgentChat.lock），不同 chat 之间互不阻塞。
+    读取时 MessageStore 的遍历基于快照，需要多个操作之间一致时使用 copy_messages 或 chat_lock。
+    """
     member_id: str
     chats: Dict[str, AgentChat] = {}
     # 存储聊天引用关系
     reference_chats: Dict[str, List[str]] = {}
 
-    def add_message(self, message: Message):
-        if message.chat_id not in self.chats:
-            self.chats[message.chat_id] = AgentChat(chat_id=message.chat_id, member_id=self.member_id)
-        self.chats[message.chat_id].add_message(message)
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    # 保留策略，见 retention.py；默认不淘汰任何消息
+    _default_retention: List[RetentionPolicy] = PrivateAttr(default_factory=list)
+    _chat_retention: Dict[str, List[RetentionPolicy]] = PrivateAttr(default_factory=dict)
+    _spill: Optional[SpillStore] = PrivateAttr(default=None)
+    _is_pinned: Optional[Callable[[Message], bool]] = PrivateAttr(default=None)
+    # 持久化后端，见 memoryBackend.py；为 None 时只保存在内存中
+    _backend: Optional['MemoryBackend'] = PrivateAttr(default=None)
+    # 进程内共享的聊天记录，见 sharedLog.py；为 None 时每个 chat 单独保存消息
+    _shared_log: Optional['SharedLog'] = PrivateAttr(default=None)
+    # 全文索引，见 memoryIndex.py；为 None 时 search 逐条扫描
+    _index: Optional[MemoryIndex] = PrivateAttr(default=None)
+    # 语义检索，见 semanticMemory.py
+    _semantic: Optional['SemanticMemory'] = PrivateAttr(default=None)
+    # 随消息增删维护的索引（上面两者及 attach_index 挂载的），都提供 add / add_many / remove / remove_chat
+    _indexes: List = PrivateAttr(default_factory=list)
+
+    def use_shared_log(self, shared_log: 'SharedLog'):
+        """之后创建的 chat 引用共享日志中的消息，已有的 chat 转换为共享视图"""
+        self._shared_log = shared_log
+        for chat in list(self.chats.values()):
+            with chat.lock:
+                view = shared_log.view(chat.chat_id)
+                view.extend(chat.messages)
+                chat.messages = view
+
+    def parse_message(self, data: dict) -> Message:
+        """把线路上收到的消息转换为 Message，使用共享日志时同一条消息只校验一次"""
+        if self._shared_log is not None:
+            return self._shared_log.intern_wire(data)
+        return Message.from_wire(data)
+
+    def _new_chat(self, chat_id: str) -> AgentChat:
+        messages = self._shared_log.view(chat_id) if self._shared_log is not None else MessageStore()
+        return AgentChat(chat_id=chat_id, member_id=self.member_id, messages=messages)
+
+    def attach_backend(self, backend: 'MemoryBackend', restore: bool = True) -> int:
+        """挂载持久化后端，之后添加、删除和清空消息都会写入后端
+
+        被保留策略淘汰的消息只从内存中移除，后端仍然保留完整记录。
+
+        Args:
+            backend: 持久化后端
+            restore: 是否先从后端恢复该成员的聊天记录
+
+        Returns:
+            int: 恢复的消息数
+        """
+        self._backend = None
+        # 挂载前已在内存中、且不是从后端恢复的消息，挂载后补写到后端；恢复的消息不再写回
+        unsaved = {(chat.chat_id, message.message_id): message
+                   for chat in list(self.chats.values()) for message in chat.messages}
+        restored = 0
+        if restore:
+            for chat_id, messages in backend.load_chats(self.member_id).items():
+                chat = self.chats.get(chat_id) or self.create_chat(chat_id)
+                for message in messages:
+                    restored += chat.add_message(message)
+                    if unsaved:
+                        unsaved.pop((chat_id, message.message_id), None)
+                self.enforce_retention(chat_id, spill=False)
+                self._reindex_chat(chat_id)
+        for message in unsaved.values():
+            backend.append(self.member_id, message)
+        self._backend = backend
+        return restored
+
+    @property
+    def backend(self) -> Optional['MemoryBackend']:
+        return self._backend
+
+    def set_retention(self, policies: List[RetentionPolicy], chat_id: str = None, spill_directory: str = None,
+                      is_pinned: Callable[[Message], bool] = None):
+        """设置保留策略，添加消息时按策略淘汰旧消息
+
+        Args:
+            policies: 保留策略列表，依次执行
+            chat_id: 只对该 chat 生效，为 None 时作为所有 chat 的默认策略
+            spill_directory: 被淘汰的消息追加写入该目录，为 None 时保持原设置（默认直接丢弃）
+            is_pinned: 置顶判断，置顶消息不会被淘汰，默认为 message_type 为 system 的消息
+        """
+        if chat_id is None:
+            self._default_retention = list(policies)
+        else:
+            self._chat_retention[chat_id] = list(policies)
+        if spill_directory is not None:
+            self._spill = SpillStore(os.path.join(spill_directory, self.member_id))
+        if is_pinned is not None:
+            self._is_pinned = is_pinned
+        for chat in list(self.chats.values()):
+            if chat_id is None or chat.chat_id == chat_id:
+                self.enforce_retention(chat.chat_id)
+
+    def enforce_retention(self, chat_id: str, spill: bool = True) -> List[Message]:
+        """按保留策略淘汰该 chat 的消息，返回被淘汰的消息
+
+        Args:
+            chat_id: 聊天ID
+            spill: 是否把淘汰的消息写入 spill 目录
+        """
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return []
+        return self._enforce_retention(chat, spill)
+
+    def _enforce_retention(self, chat: AgentChat, spill: bool = True) -> List[Message]:
+        # 每条消息都会调用，私有属性经 BaseModel.__getattr__ 读取，每次数微秒，这里只读一次
+        private = self.__pydantic_private__
+        policies = private['_chat_retention'].get(chat.chat_id, private['_default_retention'])
+        if not policies:
+            return []
+        evicted = []
+        with chat.lock:
+            ledger = self._ledger(chat, private['_is_pinned'] or is_system_message)
+            for policy in policies:
+                for message in policy.evict(chat.messages, ledger.is_pinned, ledger):
+                    if chat.remove_message(message.message_id):
+                        ledger.removed(chat.messages, message)
+                        evicted.append(message)
+            for index in private['_indexes']:
+                # 索引可以用 evict 区别对待淘汰和删除，如摘要仍然保留被淘汰消息的内容
+                remove = getattr(index, 'evict', index.remove)
+                for message in evicted:
+                    remove(chat.chat_id, message.message_id)
+        spill_store = private['_spill']
+        if evicted and spill and spill_store is not None:
+            spill_store.append(chat.chat_id, evicted)
+        return evicted
+
+    def pinned_predicate(self) -> Callable[[Message], bool]:
+        """当前的置顶判断；逐条判断大量消息时先取出，读取私有属性的开销较大"""
+        return self._is_pinned or is_system_message
+
+    def is_pinned(self, message: Message) -> bool:
+        return self.pinned_predicate()(message)
+
+    def _ledger(self, chat: AgentChat, is_pinned: Callable[[Message], bool] = None) -> PinnedLedger:
+        """chat 的置顶统计，不存在或置顶判断已改变时新建；调用方持有 chat.lock"""
+        is_pinned = is_pinned or self.pinned_predicate()
+        store = chat.messages
+        ledger = store.pinned_ledger
+        if ledger is None or ledger.is_pinned is not is_pinned:
+            ledger = store.pinned_ledger = PinnedLedger(is_pinned)
+        ledger.sync(store)
+        return ledger
+
+    def pinned_messages(self, chat_id: str) -> List[Message]:
+        """chat 中的置顶消息，按到达顺序；随增删增量维护，不遍历全部消息"""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return []
+        with chat.lock:
+            return list(self._ledger(chat).pinned.values())
+
+    def load_spilled(self, chat_id: str) -> List[Message]:
+        """读回被淘汰并写入磁盘的消息"""
+        return self._spill.load(chat_id) if self._spill is not None else []
+
+    def add_message(self, message: Message) -> bool:
+        chat = self.get_chat(message.chat_id)
+        private = self.__pydantic_private__
+        with chat.lock:
+            added = chat.add_message(message)
+            if not added:
+                return False
+            backend = private['_backend']
+            if backend is not None:
+                backend.append(self.member_id, message)
+            ledger = chat.messages.pinned_ledger
+            if ledger is not None:
+                ledger.added(chat.messages, message)
+            for index in private['_indexes']:
+                index.add(message)
+            if private['_default_retention'] or private['_chat_retention']:
+                self._enforce_retention(chat)
+        return True
 
     def clear_chat(self, chat_id: str):
-        if chat_id in self.chats:
-            self.chats[chat_id].clear_messages()
+        chat = self.chats.get(chat_id)
+        if chat is not None:
+            with chat.lock:
+                chat.clear_messages()
+                for index in self._indexes:
+                    index.remove_chat(chat_id)
+                if self._backend is not None:
+                    self._backend.clear(self.member_id, chat_id)
+        elif self._backend is not None:
+            self._backend.clear(self.member_id, chat_id)
 
     def get_chat(self, chat_id: str) -> AgentChat:
         chat = self.chats.get(chat_id)
         if chat is None:
-            chat = self.create_chat(chat_id)
+            with self._lock:
+                chat = self.chats.get(chat_id)
+                if chat is None:
+                    chat = self.create_chat(chat_id)
         return chat
 
+    def chat_lock(self, chat_id: str) -> threading.RLock:
+        """该 chat 的锁，持有期间其他线程不能修改该 chat"""
+        return self.get_chat(chat_id).lock
+
+    def copy_messages(self, chat_id: str) -> List[Message]:
+        """该 chat 当前消息的一致副本"""
+        chat = self.get_chat(chat_id)
+        with chat.lock:
+            return list(chat.messages)
+
+    def snapshot(self, path: str) -> int:
+        """把全部聊天记录写入二进制快照，见 snapshot.py
+
+        Returns:
+            int: 写入的消息数
+        """
+        # snapshot.py 依赖本模块，延迟导入
+        from .snapshot import write_snapshot
+        return write_snapshot(path, {self.member_id: self})
+
+    def restore(self, snapshot: Union[str, 'Snapshot']) -> int:
+        """从快照恢复聊天记录，各 chat 的消息在第一次访问时才解码
+
+        Args:
+            snapshot: 快照文件路径或已打开的 Snapshot
+
+        Returns:
+            int: 恢复的消息数
+        """
+        from .snapshot import Snapshot
+        if isinstance(snapshot, str):
+            snapshot = Snapshot(snapshot)
+        return snapshot.restore(self)
+
     def get_messages(self, chat_id: str) -> List[Message]:
         chat = self.get_chat(chat_id)
         return chat.messages
 
+    def get_message(self, message_id: str, chat_id: str) -> Optional[Message]:
+        chat = self.chats.get(chat_id)
+        return chat.get_message(message_id) if chat else None
+
     def remove_message(self, message_id: str, chat_id: str) -> bool:
         chat = self.chats.get(chat_id)
-        if chat:
-            chat.remove_message(message_id)
-            return True
-        return False
+        if chat is not None:
+            with chat.lock:
+                message = chat.messages.remove_by_id(message_id)
+                removed = message is not None
+                if removed:
+                    ledger = chat.messages.pinned_ledger
+                    if ledger is not None:
+                        ledger.removed(chat.messages, message)
+                    for index in self._indexes:
+                        index.remove(chat_id, message_id)
+        else:
+            removed = False
+        if self._backend is not None:
+            # 消息可能已被保留策略从内存中淘汰，但仍在后端
+            self._backend.remove(self.member_id, chat_id, message_id)
+        return removed
 
     def create_chat(self, chat_id: str) -> AgentChat:
-        chat = AgentChat(chat_id=chat_id, member_id=self.member_id)
-        self.chats[chat_id] = chat
+        chat = self._new_chat(chat_id)
+        with self._lock:
+            self.chats[chat_id] = chat
         return chat
 
+    def replace_chat(self, chat: AgentChat):
+        """整体替换一个 chat（如从快照恢复），不写入持久化后端；启用了索引时立即重建该 chat 的索引"""
+        with self._lock:
+            self.chats[chat.chat_id] = chat
+        self._reindex_chat(chat.chat_id)
+
+    # ---- 全文索引
+
+    def enable_index(self) -> MemoryIndex:
+        """启用全文索引，已有的消息立即加入，之后随添加、删除、清空和保留策略淘汰增量维护
+
+        只跟踪通过 AgentChats 的方法做出的修改，直接修改 AgentChat.messages 时需要调用 replace_chat 重建。
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = self.attach_index(MemoryIndex())
+        return self._index
+
+    @property
+    def index(self) -> Optional[MemoryIndex]:
+        return self._index
+
+    def enable_semantic_memory(self, embedder=None) -> 'SemanticMemory':
+        """启用语义检索，需要安装 numpy；维护方式与 enable_index 相同，已启用时返回现有的索引
+
+        Args:
+            embedder: 嵌入器，默认为 TfidfEmbedder，见 semanticMemory.py
+        """
+        # 只在启用时导入 numpy
+        from .semanticMemory import SemanticMemory
+        with self._lock:
+            if self._semantic is None:
+                self._semantic = self.attach_index(SemanticMemory(embedder))
+        return self._semantic
+
+    @property
+    def semantic(self) -> Optional['SemanticMemory']:
+        return self._semantic
+
+    def attach_index(self, index):
+        """挂载随消息增删维护的索引，已有的消息立即加入
+
+        Args:
+            index: 提供 add(message)、add_many(messages)、remove(chat_id, message_id) 和 remove_chat(chat_id)，
+                可选提供 evict(chat_id, message_id) 处理保留策略淘汰的消息，默认与 remove 相同
+        """
+        self._indexes.append(index)
+        for chat_id in list(self.chats):
+            self._reindex_chat(chat_id, (index,))
+        return index
+
+    def _reindex_chat(self, chat_id: str, indexes=None):
+        indexes = self._indexes if indexes is None else indexes
+        if not indexes:
+            return
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            for index in indexes:
+                index.remove_chat(chat_id)
+            return
+        with chat.lock:
+            for index in indexes:
+                index.remove_chat(chat_id)
+                index.add_many(chat.messages)
+
+    def search(self, keywords: str = None, phrase: str = None, chat_id: str = None, speaker: str = None,
+               since: Union[str, datetime, int] = None, until: Union[str, datetime, int] = None,
+               limit: int = None) -> List[Message]:
+        """按关键词、短语、发言人和时间范围查找消息，从新到旧排列
+
+        启用索引（enable_index）时查询倒排索引，否则逐条扫描，两者的匹配规则相同，见 memoryIndex.Query。
+
+        Args:
+            keywords: 关键词，所有单词都要出现，中日韩文字片段要作为连续子串出现
+            phrase: 短语，要作为连续子串出现
+            chat_id: 只在该 chat 中查找，为 None 时查找全部 chat
+            speaker: 发言人的 member_id 或名字
+            since: 时间下限（含），时间戳字符串、datetime 或 HLC
+            until: 时间上限（不含）
+            limit: 最多返回的条数
+
+        Returns:
+            List[Message]: 单个 chat 内按到达顺序从新到旧；未启用索引且跨 chat 查找时按 HLC 从新到旧
+        """
+        query = Query(keywords, phrase, chat_id, speaker, since, until)
+        if self._index is not None:
+            return self._index.query(query, limit)
+        if chat_id is None:
+            chats = list(self.chats.values())
+        else:
+            chats = [self.chats[chat_id]] if chat_id in self.chats else []
+        results = []
+        for chat in chats:
+            matched = 0
+            for message in reversed(chat.messages):
+                if query.matches(message):
+                    results.append(message)
+                    matched += 1
+                    if limit is not None and matched >= limit:
+                        break
+        if len(chats) > 1:
+            results.sort(key=order_key, reverse=True)
+        return results[:limit] if limit is not None else results
+
     def add_reference_chat(self, chat_id: str, reference_chat_id: str):
         """添加聊天引用关系
         
@@ -81,10 +702,11 @@ class AgentChats(BaseModel):
             chat_id: 主聊天ID
             reference_chat_id: 引用聊天ID
         """
-        if chat_id not in self.reference_chats:
-            self.reference_chats[chat_id] = []
-        if reference_chat_id not in self.reference_chats[chat_id]:
-            self.reference_chats[chat_id].append(reference_chat_id)
+        with self._lock:
+            if chat_id not in self.reference_chats:
+                self.reference_chats[chat_id] = []
+            if reference_chat_id not in self.reference_chats[chat_id]:
+                self.reference_chats[chat_id].append(reference_chat_id)
 
     def get_reference_chats(self, chat_id: str) -> List[str]:
         """获取指定聊天的所有引用聊天ID
@@ -0,0 +1,253 @@
+"""AgentChats 的持久化后端
+
+写入只追加，按 chat、时间和 message_id 建索引；智能体进程重启后从本地恢复聊天记录，
+再以最后一条消息为游标向服务器补拉，不需要重新加载全部历史。
+
+用法:
+    backend = SQLiteMemoryBackend('agent_memory.db')
+    agent.restore_memory(backend)  # MemberClientWithChats，login 之前调用
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from .clock import from_timestamp, order_key
+from .dto import Message
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，未安装时回退到标准库
+    orjson = None
+
+
+def _dumps(data: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _loads(text: str) -> dict:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class MemoryBackend:
+    """持久化后端接口，所有方法以 member_id 区分不同智能体的记录"""
+
+    def append(self, member_id: str, message: Message):
+        raise NotImplementedError
+
+    def remove(self, member_id: str, chat_id: str, message_id: str):
+        raise NotImplementedError
+
+    def clear(self, member_id: str, chat_id: str):
+        raise NotImplementedError
+
+    def load_chats(self, member_id: str) -> Dict[str, List[Message]]:
+        """读取该成员的全部聊天记录，按写入顺序排列"""
+        raise NotImplementedError
+
+    def get_messages(self, member_id: str, chat_id: str, since: Union[str, datetime, int] = None,
+                     until: Union[str, datetime, int] = None, limit: int = None) -> List[Message]:
+        raise NotImplementedError
+
+    def get_message(self, member_id: str, message_id: str) -> Optional[Message]:
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """基于 SQLite WAL 的后端
+
+    写操作进入队列，由后台线程批量提交：累计 batch_size 条或距上次提交超过 flush_interval 秒时提交一次，
+    因此写入不会阻塞消息处理线程。WAL 模式下读连接与写线程互不阻塞，其他进程也可以同时读取。
+    读操作之前会先提交队列中的写入，保证读到自己的写入。
+
+    Args:
+        path: 数据库文件路径
+        batch_size: 每次提交的最大写操作数
+        flush_interval: 写入最多延迟的秒数
+        synchronous: SQLite 的 synchronous 设置。'NORMAL' 只在 checkpoint 时 fsync，进程崩溃不丢数据，
+            断电可能丢失最近提交的事务；'FULL' 每次提交都 fsync；'OFF' 不 fsync
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            message_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            hlc INTEGER NOT NULL DEFAULT 0,
+            payload TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS messages_id ON messages (member_id, message_id);
+        CREATE INDEX IF NOT EXISTS messages_chat ON messages (member_id, chat_id, seq);
+    """
+    # hlc 列存放 clock.order_key，按时间范围查询时使用
+    _HLC_INDEX = 'CREATE INDEX IF NOT EXISTS messages_hlc ON messages (member_id, chat_id, hlc)'
+
+    def __init__(self, path: str = 'agent_memory.db', batch_size: int = 256, flush_interval: float = 0.2,
+                 synchronous: str = 'NORMAL'):
+        if synchronous.upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError(f'unknown synchronous mode: {synchronous}')
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous.upper()
+
+        self._local = threading.local()
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+
+        writer = self._connect()
+        writer.executescript(self._SCHEMA)
+        columns = {row[1] for row in writer.execute('PRAGMA table_info(messages)')}
+        if 'hlc' not in columns:
+            # 早期版本创建的数据库没有 hlc 列
+            writer.execute('ALTER TABLE messages ADD COLUMN hlc INTEGER NOT NULL DEFAULT 0')
+        writer.execute(self._HLC_INDEX)
+        writer.commit()
+        self._writer = writer
+        self._thread = threading.Thread(target=self._write_loop, name='memory-backend', daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """每个线程一个读连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- 写入
+
+    def append(self, member_id: str, message: Message):
+        self._queue.put(('append', (member_id, message.chat_id, message.message_id, message.timestamp,
+                                    order_key(message), _dumps(message.to_wire()))))
+
+    def remove(self, member_id: str, chat_id: str, message_id: str):
+        self._queue.put(('remove', (member_id, message_id)))
+
+    def clear(self, member_id: str, chat_id: str):
+        self._queue.put(('clear', (member_id, chat_id)))
+
+    def flush(self):
+        """等待队列中的写入全部提交"""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        done.wait()
+
+    def _write_loop(self):
+        while True:
+            op = self._queue.get()
+            batch = [op]
+            deadline = time.monotonic() + self.flush_interval
+            # 凑满一批或到达提交时间
+            while len(batch) < self.batch_size and batch[-1][0] not in ('flush', 'close'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+            for kind, arg in batch:
+                if kind == 'flush':
+                    arg.set()
+                elif kind == 'close':
+                    self._writer.close()
+                    arg.set()
+                    return
+
+    def _commit(self, batch: List[Tuple[str, object]]):
+        conn = self._writer
+        try:
+            conn.execute('BEGIN')
+            for kind, arg in batch:
+                if kind == 'append':
+                    conn.execute('INSERT OR IGNORE INTO messages '
+                                 '(member_id, chat_id, message_id, timestamp, hlc, payload) VALUES (?, ?, ?, ?, ?, ?)',
+                                 arg)
+                elif kind == 'remove':
+                    conn.execute('DELETE FROM messages WHERE member_id = ? AND message_id = ?', arg)
+                elif kind == 'clear':
+                    conn.execute('DELETE FROM messages WHERE member_id = ? AND chat_id = ?', arg)
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            print(f'memory backend: 写入失败: {e}')
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+
+    # ---- 读取
+
+    def load_chats(self, member_id: str) -> Dict[str, List[Message]]:
+        self.flush()
+        chats: Dict[str, List[Message]] = {}
+        rows = self._reader().execute(
+            'SELECT chat_id, payload FROM messages WHERE member_id = ? ORDER BY chat_id, seq', (member_id,))
+        for chat_id, payload in rows:
+            chats.setdefault(chat_id, []).append(Message.from_wire(_loads(payload)))
+        return chats
+
+    def get_messages(self, member_id: str, chat_id: str, since: Union[str, datetime, int] = None,
+                     until: Union[str, datetime, int] = None, limit: int = None) -> List[Message]:
+        """按写入顺序返回该 chat 的消息
+
+        Args:
+            since: 只返回不早于该时间的消息，可以是时间戳字符串、datetime 或 HLC
+            until: 只返回早于该时间的消息
+            limit: 只返回最近的 limit 条
+        """
+        self.flush()
+        sql = 'SELECT seq, payload FROM messages WHERE member_id = ? AND chat_id = ?'
+        params: list = [member_id, chat_id]
+        if since is not None:
+            sql += ' AND hlc >= ?'
+            params.append(from_timestamp(since))
+        if until is not None:
+            sql += ' AND hlc < ?'
+            params.append(from_timestamp(until))
+        if limit is not None:
+            sql = f'SELECT seq, payload FROM ({sql} ORDER BY seq DESC LIMIT ?) ORDER BY seq'
+            params.append(limit)
+        else:
+            sql += ' ORDER BY seq'
+        return [Message.from_wire(_loads(payload)) for _, payload in self._reader().execute(sql, params)]
+
+    def get_message(self, member_id: str, message_id: str) -> Optional[Message]:
+        self.flush()
+        row = self._reader().execute('SELECT payload FROM messages WHERE member_id = ? AND message_id = ?',
+                                     (member_id, message_id)).fetchone()
+        return Message.from_wire(_loads(row[0])) if row else None
+
+    def close(self):
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(('close', done))
+        done.wait()
+        self._closed = True
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
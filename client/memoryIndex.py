@@ -0,0 +1,280 @@
+"""聊天记录的全文倒排索引
+
+智能体和主持人原来通过倒序遍历消息列表查找关键词（如 process_wolf_kill 查找 ATTACK ... TERMINATE），
+耗时随历史长度增长。MemoryIndex 随 AgentChats 的增删增量维护：
+    - 文本先把全角字母、数字和标点转为半角并转为小写，ＡＴＴＡＣＫ 与 attack 相同
+    - 字母数字按单词切分；中日韩文字没有空格分词，按单字和相邻两字（bigram）建立倒排
+    - 另外按 chat 和发言人（member_id 与名字）建立倒排，按时间范围过滤时使用消息的 HLC
+
+查询时从最短的倒排表开始倒序遍历，其余倒排表二分判断，只对少量候选消息核对原文，
+结果按加入索引的顺序从新到旧排列。
+"""
+import bisect
+import operator
+import re
+import threading
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from .clock import from_timestamp, order_key
+from .dto import Message
+
+# 平假名、片假名、中日韩统一表意文字（含扩展 A）、兼容表意文字、韩文音节
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+# 中日韩文字的连续片段，或不含中日韩文字和下划线的单词
+_TOKEN = re.compile(rf'[{_CJK}]+|(?:(?![{_CJK}_])\w)+')
+_CJK_CHAR = re.compile(rf'[{_CJK}]')
+
+
+# 全角 ASCII 字符和全角空格转为半角；unicodedata.normalize('NFKC') 效果相同但慢一倍以上
+_HALFWIDTH = {code: code - 0xfee0 for code in range(0xff01, 0xff5f)}
+_HALFWIDTH[0x3000] = 0x20
+_FULLWIDTH = re.compile('[\uff01-\uff5e\u3000]')
+
+
+def normalize(text: str) -> str:
+    if _FULLWIDTH.search(text):
+        text = text.translate(_HALFWIDTH)
+    return text.lower()
+
+
+def _runs(text: str) -> List[str]:
+    return _TOKEN.findall(normalize(text))
+
+
+def _is_cjk(run: str) -> bool:
+    return _CJK_CHAR.match(run) is not None
+
+
+def index_terms(text: str) -> Set[str]:
+    """文本在索引中的词项：单词，以及中日韩文字的单字和 bigram"""
+    terms = set()
+    for run in _runs(text):
+        if _is_cjk(run):
+            terms.update(run)
+            terms.update(map(operator.add, run, run[1:]))
+        else:
+            terms.add(run)
+    return terms
+
+
+class Query:
+    """编译后的查询条件，索引查询和未启用索引时的逐条扫描使用相同的匹配规则
+
+    Args:
+        keywords: 关键词，所有单词都要出现；中日韩文字片段要作为连续子串出现
+        phrase: 短语，规范化后要作为连续子串出现
+        chat_id: 只在该 chat 中查找
+        speaker: 发言人的 member_id 或名字
+        since: 时间下限（含），时间戳字符串、datetime 或 HLC
+        until: 时间上限（不含）
+    """
+
+    def __init__(self, keywords: str = None, phrase: str = None, chat_id: str = None, speaker: str = None,
+                 since: Union[str, datetime, int] = None, until: Union[str, datetime, int] = None):
+        self.chat_id = chat_id
+        self.speaker = speaker
+        self.since = from_timestamp(since) if since is not None else None
+        self.until = from_timestamp(until) if until is not None else None
+        self.phrase = normalize(phrase) if phrase else None
+        # 需要出现在倒排中的词项，单字词项只在没有 bigram 时使用
+        self.terms: List[str] = []
+        # 需要在原文中核对的子串
+        self.substrings: List[str] = []
+        for text, is_phrase in ((keywords, False), (phrase, True)):
+            if not text:
+                continue
+            for run in _runs(text):
+                if not _is_cjk(run):
+                    self.terms.append(run)
+                elif len(run) == 1:
+                    self.terms.append(run)
+                else:
+                    self.terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+                    if len(run) > 2 and not is_phrase:
+                        self.substrings.append(run)
+        if self.phrase:
+            self.substrings.append(self.phrase)
+        self.terms = list(dict.fromkeys(self.terms))
+
+    def in_range(self, key: int) -> bool:
+        return (self.since is None or key >= self.since) and (self.until is None or key < self.until)
+
+    def verify(self, message: Message) -> bool:
+        """核对倒排无法精确判断的条件：中日韩片段和短语的连续性"""
+        if not self.substrings:
+            return True
+        text = normalize(message.message)
+        return all(substring in text for substring in self.substrings)
+
+    def matches(self, message: Message) -> bool:
+        """不借助索引判断消息是否满足全部条件"""
+        if self.chat_id is not None and message.chat_id != self.chat_id:
+            return False
+        if self.speaker is not None and self.speaker not in (message.from_member_id, message.from_member_name):
+            return False
+        if not self.in_range(order_key(message)):
+            return False
+        if self.terms and not set(self.terms) <= index_terms(message.message):
+            return False
+        return self.verify(message)
+
+
+def _contains(postings: array, doc: int) -> bool:
+    position = bisect.bisect_left(postings, doc)
+    return position < len(postings) and postings[position] == doc
+
+
+class MemoryIndex:
+    """一个成员全部聊天记录的倒排索引，由 AgentChats.enable_index 创建并随增删维护
+
+    删除只把文档置空，倒排表中的文档号在查询时跳过，删除的文档过多时重建。
+    """
+
+    # 已删除的文档数超过该值且超过存活文档数时重建
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self, messages: Iterable[Message] = ()):
+        self._lock = threading.RLock()
+        self._reset()
+        self.add_many(messages)
+
+    def _reset(self):
+        # 文档号 -> 消息，删除后为 None
+        self._docs: List[Optional[Message]] = []
+        self._keys = array('q')
+        # (chat_id, message_id) -> 文档号
+        self._doc_ids: Dict[tuple, int] = {}
+        self._terms: Dict[str, array] = {}
+        self._chats: Dict[str, array] = {}
+        self._speakers: Dict[str, array] = {}
+        self._removed = 0
+
+    @staticmethod
+    def _post(postings: Dict[str, array], key: str, doc: int):
+        posting = postings.get(key)
+        if posting is None:
+            posting = postings[key] = array('I')
+        posting.append(doc)
+
+    def add(self, message: Message) -> bool:
+        """加入一条消息，已在索引中时返回 False"""
+        with self._lock:
+            doc_key = (message.chat_id, message.message_id)
+            if doc_key in self._doc_ids:
+                return False
+            doc = len(self._docs)
+            self._doc_ids[doc_key] = doc
+            self._docs.append(message)
+            self._keys.append(order_key(message))
+            postings = self._terms
+            for term in index_terms(message.message):
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = array('I')
+                posting.append(doc)
+            self._post(self._chats, message.chat_id, doc)
+            self._post(self._speakers, message.from_member_id, doc)
+            if message.from_member_name and message.from_member_name != message.from_member_id:
+                self._post(self._speakers, message.from_member_name, doc)
+            return True
+
+    def add_many(self, messages: Iterable[Message]):
+        with self._lock:
+            for message in messages:
+                self.add(message)
+
+    def remove(self, chat_id: str, message_id: str) -> bool:
+        with self._lock:
+            doc = self._doc_ids.pop((chat_id, message_id), None)
+            if doc is None:
+                return False
+            self._docs[doc] = None
+            self._removed += 1
+            self._maybe_compact()
+            return True
+
+    def remove_chat(self, chat_id: str) -> int:
+        """删除一个 chat 的全部消息，返回删除的条数"""
+        with self._lock:
+            removed = 0
+            for doc in self._chats.pop(chat_id, ()):
+                message = self._docs[doc]
+                if message is not None:
+                    del self._doc_ids[(message.chat_id, message.message_id)]
+                    self._docs[doc] = None
+                    removed += 1
+            self._removed += removed
+            self._maybe_compact()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _maybe_compact(self):
+        if self._removed > self.COMPACT_THRESHOLD and self._removed > len(self._doc_ids):
+            live = [message for message in self._docs if message is not None]
+            self._reset()
+            self.add_many(live)
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def __contains__(self, message: Message) -> bool:
+        return (message.chat_id, message.message_id) in self._doc_ids
+
+    def search(self, keywords: str = None, phrase: str = None, chat_id: str = None, speaker: str = None,
+               since: Union[str, datetime, int] = None, until: Union[str, datetime, int] = None,
+               limit: int = None) -> List[Message]:
+        """查找满足全部条件的消息，按加入顺序从新到旧排列，参数见 Query
+
+        Args:
+            limit: 最多返回的条数，为 None 时返回全部
+        """
+        return self.query(Query(keywords, phrase, chat_id, speaker, since, until), limit)
+
+    def query(self, query: Query, limit: int = None) -> List[Message]:
+        with self._lock:
+            postings = []
+            for term in query.terms:
+                postings.append(self._terms.get(term))
+            if query.chat_id is not None:
+                postings.append(self._chats.get(query.chat_id))
+            if query.speaker is not None:
+                postings.append(self._speakers.get(query.speaker))
+            if any(posting is None for posting in postings):
+                return []
+            postings.sort(key=len)
+            candidates = reversed(postings[0]) if postings else range(len(self._docs) - 1, -1, -1)
+            others = postings[1:]
+
+            results = []
+            for doc in candidates:
+                message = self._docs[doc]
+                if message is None or not query.in_range(self._keys[doc]):
+                    continue
+                if others and not all(_contains(posting, doc) for posting in others):
+                    continue
+                if not query.verify(message):
+                    continue
+                results.append(message)
+                if limit is not None and len(results) >= limit:
+                    break
+            return results
+
+    def find_last(self, keywords: str = None, phrase: str = None, chat_id: str = None,
+                  speaker: str = None) -> Optional[Message]:
+        """满足条件的最新一条消息"""
+        results = self.search(keywords, phrase, chat_id, speaker, limit=1)
+        return results[0] if results else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'messages': len(self._doc_ids),
+                'removed': self._removed,
+                'terms': len(self._terms),
+                'postings': sum(len(posting) for posting in self._terms.values()),
+            }
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from .dto import Chat, Member
+
+
+class TTLCache:
+    """带过期时间和容量上限的 LRU 缓存，线程安全"""
+
+    def __init__(self, ttl: float = 60, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MetadataCache:
+    """客户端的 Chat / Member 元数据缓存
+
+    条目在 ttl 秒后过期，也会在服务器推送 chat 变更或成员变更事件时失效。
+    存入和取出时都深拷贝，调用方修改拿到的对象（如 chat.members）不会影响缓存。
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 1024):
+        self.chats = TTLCache(ttl, max_size)
+        # chat_id -> 完整的成员信息列表
+        self.chat_members = TTLCache(ttl, max_size)
+        self.members = TTLCache(ttl, max_size)
+
+    @staticmethod
+    def _copy(value):
+        return value.model_copy(deep=True) if value is not None else None
+
+    def get_chat(self, chat_id: str) -> Optional[Chat]:
+        return self._copy(self.chats.get(chat_id))
+
+    def put_chat(self, chat: Chat):
+        self.chats.put(chat.chat_id, self._copy(chat))
+
+    def get_chat_members(self, chat_id: str) -> Optional[List[Member]]:
+        members = self.chat_members.get(chat_id)
+        return [self._copy(member) for member in members] if members is not None else None
+
+    def put_chat_members(self, chat_id: str, members: List[Member]):
+        members = [self._copy(member) for member in members]
+        self.chat_members.put(chat_id, members)
+        for member in members:
+            self.members.put(member.member_id, member)
+
+    def get_member(self, member_id: str) -> Optional[Member]:
+        return self._copy(self.members.get(member_id))
+
+    def put_member(self, member: Member):
+        self.members.put(member.member_id, self._copy(member))
+
+    def invalidate_chat(self, chat_id: str):
+        self.chats.invalidate(chat_id)
+        self.chat_members.invalidate(chat_id)
+
+    def invalidate_member(self, member_id: str):
+        self.members.invalidate(member_id)
+
+    def clear(self):
+        self.chats.clear()
+        self.chat_members.clear()
+        self.members.clear()
+
+    def stats(self) -> Dict[str, int]:
+        caches = (self.chats, self.chat_members, self.members)
+        return {
+            'hits': sum(cache.hits for cache in caches),
+            'misses': sum(cache.misses for cache in caches),
+            'size': sum(len(cache) for cache in caches),
+        }
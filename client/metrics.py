@@ -0,0 +1,336 @@
+import bisect
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import socketio
+
+# 直方图桶上界：1 微秒到约 230 秒，相邻两桶相差 2^(1/4) 倍。分位数在桶内线性插值并限制在 [min, max] 内，
+# 1 微秒以上的估计值与真实值落在同一个桶中，相对误差不超过桶宽，即 2^(1/4) - 1 ≈ 19%；1 微秒以下的绝对误差不超过 1 微秒
+_BUCKET_BOUNDS = tuple(0.000001 * 2 ** (i / 4) for i in range(112))
+
+
+class Histogram:
+    """固定对数桶的延迟直方图，记录一次观测只需一次二分查找"""
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(_BUCKET_BOUNDS, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                if bucket_count and seen + bucket_count >= rank:
+                    lower = _BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+                    upper = _BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else self.max
+                    value = lower + (upper - lower) * (rank - seen) / bucket_count
+                    return min(max(value, self.min), self.max)
+                seen += bucket_count
+            return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """进程内的指标注册表
+
+    直方图和计数器都以 (指标名, 标签) 为键，标签通常是事件名或处理函数名。时间单位为秒。
+    快照可以导出为 dict、在本地端口以 Prometheus 文本格式提供，或定期打印到日志。
+    enabled 为 False 时所有记录操作直接返回。
+
+    主要指标：
+        rpc_seconds{event}            发出事件到收到服务器确认的耗时
+        rpc_errors{event}             调用超时或失败次数
+        event_handler_seconds{event}  socket 线程中事件处理函数的执行时间
+        handler_seconds{handler}      分发器中消息处理函数的执行时间
+        queue_wait_seconds{handler}   消息在分发器中排队的时间
+        handler_errors{handler}       处理函数抛出异常的次数
+        llm_seconds{model}            模型调用耗时
+        llm_errors{model}             模型调用失败次数
+        bytes{direction}              收发的编码后字节数，direction 为 in / out
+        packets{direction}            收发的包数
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = 'mcagent'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.started_at = time.time()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        # 计数器按线程分片，每个线程只写自己的分片，inc 不加锁；快照时把所有分片相加
+        self._local = threading.local()
+        self._counter_shards: List[Dict[Tuple[str, str], float]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, label: str, value: float):
+        if not self.enabled:
+            return
+        key = (name, label)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+
+    def inc(self, name: str, label: str = '', value: float = 1):
+        if not self.enabled:
+            return
+        key = (name, label)
+        try:
+            shard = self._local.counters
+        except AttributeError:
+            shard = self._new_counter_shard()
+        shard[key] = shard.get(key, 0) + value
+
+    def _new_counter_shard(self) -> Dict[Tuple[str, str], float]:
+        shard = {}
+        with self._lock:
+            self._counter_shards.append(shard)
+        self._local.counters = shard
+        return shard
+
+    @contextmanager
+    def timer(self, name: str, label: str, error_counter: str = None):
+        """记录代码块的耗时，抛出异常时计入 error_counter"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if error_counter:
+                self.inc(error_counter, label)
+            raise
+        finally:
+            self.observe(name, label, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """所有指标的快照
+
+        Returns:
+            dict: {'uptime': 秒, 'histograms': {名称: {标签: 摘要}}, 'counters': {名称: {标签: 值}}}
+        """
+        with self._lock:
+            histograms = list(self._histograms.items())
+            shards = list(self._counter_shards)
+        counters: Dict[Tuple[str, str], float] = {}
+        for shard in shards:
+            # 其他线程可能正在写入该分片，先复制再遍历
+            for key, value in shard.copy().items():
+                counters[key] = counters.get(key, 0) + value
+        result = {'uptime': time.time() - self.started_at, 'histograms': {}, 'counters': {}}
+        for (name, label), histogram in histograms:
+            result['histograms'].setdefault(name, {})[label] = histogram.summary()
+        for (name, label), value in counters.items():
+            result['counters'].setdefault(name, {})[label] = value
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            # 换一个 threading.local，各线程在下一次 inc 时创建新的分片
+            self._local = threading.local()
+            self._counter_shards = []
+            self.started_at = time.time()
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式，直方图以 summary 类型导出 p50/p95/p99"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot['histograms'].items()):
+            metric = f'{self.prefix}_{name}'
+            label_name = _label_name(name)
+            lines.append(f'# TYPE {metric} summary')
+            for label, summary in sorted(series.items()):
+                for q in ('p50', 'p95', 'p99'):
+                    quantile = int(q[1:]) / 100
+                    lines.append(f'{metric}{{{label_name}="{_escape(label)}",quantile="{quantile}"}} {summary[q]:.6f}')
+                lines.append(f'{metric}_sum{{{label_name}="{_escape(label)}"}} {summary["sum"]:.6f}')
+                lines.append(f'{metric}_count{{{label_name}="{_escape(label)}"}} {summary["count"]}')
+        for name, series in sorted(snapshot['counters'].items()):
+            metric = f'{self.prefix}_{name}_total'
+            label_name = _label_name(name)
+            lines.append(f'# TYPE {metric} counter')
+            for label, value in sorted(series.items()):
+                lines.append(f'{metric}{{{label_name}="{_escape(label)}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int = 9108, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """在后台线程中启动 HTTP 服务，GET /metrics 返回 Prometheus 文本"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f'metrics available at http://{host}:{server.server_address[1]}/metrics')
+        return server
+
+    def start_log_tick(self, interval: float = 60) -> threading.Event:
+        """每 interval 秒打印一次延迟摘要，返回的 Event 置位后停止"""
+        stop = threading.Event()
+
+        def tick():
+            while not stop.wait(interval):
+                print(self.format_summary())
+
+        threading.Thread(target=tick, name='metrics-log', daemon=True).start()
+        return stop
+
+    def format_summary(self) -> str:
+        snapshot = self.snapshot()
+        lines = [f'[metrics] uptime {snapshot["uptime"]:.0f}s']
+        for name, series in sorted(snapshot['histograms'].items()):
+            for label, s in sorted(series.items()):
+                lines.append(f'  {name:<22} {label:<32} n={s["count"]:<7} p50={s["p50"] * 1000:8.1f}ms '
+                             f'p95={s["p95"] * 1000:8.1f}ms p99={s["p99"] * 1000:8.1f}ms')
+        for name, series in sorted(snapshot['counters'].items()):
+            for label, value in sorted(series.items()):
+                lines.append(f'  {name:<22} {label:<32} {value:g}')
+        return '\n'.join(lines)
+
+
+def _label_name(metric_name: str) -> str:
+    if metric_name.startswith(('rpc_', 'event_')):
+        return 'event'
+    if metric_name.startswith(('handler_', 'queue_')):
+        return 'handler'
+    if metric_name.startswith('llm_'):
+        return 'model'
+    if metric_name in ('bytes', 'packets'):
+        return 'direction'
+    return 'label'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_default_metrics = Metrics()
+
+
+def get_default_metrics() -> Metrics:
+    """进程内共享的默认指标注册表"""
+    return _default_metrics
+
+
+class InstrumentedClient(socketio.Client):
+    """记录 RPC 延迟、错误数和事件处理时间的 socketio.Client"""
+
+    metrics = _default_metrics
+
+    def emit(self, event, data=None, namespace=None, callback=None):
+        if callback is not None and self.metrics.enabled:
+            start = time.perf_counter()
+            original = callback
+
+            def callback(*args):
+                self.metrics.observe('rpc_seconds', event, time.perf_counter() - start)
+                return original(*args)
+
+        return super().emit(event, data, namespace=namespace, callback=callback)
+
+    def call(self, event, data=None, namespace=None, timeout=60):
+        try:
+            return super().call(event, data, namespace=namespace, timeout=timeout)
+        except Exception:
+            self.metrics.inc('rpc_errors', event)
+            raise
+
+    def _trigger_event(self, event, namespace, *args):
+        if not self.metrics.enabled:
+            return super()._trigger_event(event, namespace, *args)
+        start = time.perf_counter()
+        try:
+            return super()._trigger_event(event, namespace, *args)
+        finally:
+            self.metrics.observe('event_handler_seconds', event, time.perf_counter() - start)
+
+
+class InstrumentedAsyncClient(socketio.AsyncClient):
+    """InstrumentedClient 的异步版本"""
+
+    metrics = _default_metrics
+
+    async def emit(self, event, data=None, namespace=None, callback=None):
+        if callback is not None and self.metrics.enabled:
+            start = time.perf_counter()
+            original = callback
+
+            if inspect.iscoroutinefunction(original):
+                async def callback(*args):
+                    self.metrics.observe('rpc_seconds', event, time.perf_counter() - start)
+                    return await original(*args)
+            else:
+                def callback(*args):
+                    self.metrics.observe('rpc_seconds', event, time.perf_counter() - start)
+                    return original(*args)
+
+        return await super().emit(event, data, namespace=namespace, callback=callback)
+
+    async def call(self, event, data=None, namespace=None, timeout=60):
+        try:
+            return await super().call(event, data, namespace=namespace, timeout=timeout)
+        except Exception:
+            self.metrics.inc('rpc_errors', event)
+            raise
+
+    async def _trigger_event(self, event, namespace, *args):
+        if not self.metrics.enabled:
+            return await super()._trigger_event(event, namespace, *args)
+        start = time.perf_counter()
+        try:
+            return await super()._trigger_event(event, namespace, *args)
+        finally:
+            self.metrics.observe('event_handler_seconds', event, time.perf_counter() - start)
+
+
+def record_bytes(direction: str, size: int):
+    """记录一个编码后的包，由 codec 调用"""
+    metrics = _default_metrics
+    if metrics.enabled:
+        metrics.inc('bytes', direction, size)
+        metrics.inc('packets', direction)
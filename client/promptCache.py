@@ -0,0 +1,133 @@
+"""聊天记录到模型消息的增量转换缓存
+
+每次调用模型前都要把上下文中的 Message 转换为模型的消息格式（langchain 的 HumanMessage/AIMessage、
+OpenRouter 的 OpenAIMessage），构造这些对象的开销与历史长度成正比，而相邻两轮的上下文几乎相同。
+PromptCache 挂载在一个成员的 AgentChats 上：
+    - 每条消息只转换一次，按 (chat_id, message_id) 缓存，删除消息、清空 chat 时丢弃对应的结果
+    - 每个序列（按调用方给出的键，通常是 chat_id）保存上次的结果，这次的消息以上次的为前缀时只转换新追加的消息；
+      上次末尾是临时追加的提示（如投票提示）时，去掉这一条后仍可复用
+    - 转换结果只取决于消息内容和成员自己的 member_id（区分自己和他人的发言），可以在多轮之间共享
+
+用法:
+    self.prompt_cache = PromptCache(to_langchain_message, self.memory)
+    messages = self.prompt_cache.convert(chat.chat_id, chat.messages)
+"""
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from .dto import Message
+
+
+class PromptCache:
+    """一个成员的 Message -> 模型消息转换缓存，创建时挂载到 memory 上随删除失效
+
+    Args:
+        converter: 转换一条消息的函数，参数为 (消息, 成员自己的 member_id)
+        memory: 成员的聊天记录（AgentChats）
+        max_messages: 缓存的单条转换结果上限，超出时全部丢弃重新转换（临时的提示消息不会被删除，需要上限）
+    """
+
+    def __init__(self, converter: Callable[[Message, str], Any], memory, max_messages: int = 200000):
+        self.converter = converter
+        self.member_id = memory.member_id
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        # chat_id -> message_id -> (消息, 转换结果)
+        self._converted: Dict[str, Dict[str, Tuple[Message, Any]]] = {}
+        self._count = 0
+        # 序列键 -> (上次的消息, 上次的转换结果)
+        self._sequences: Dict[str, Tuple[List[Message], List[Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+        memory.attach_index(self)
+
+    # ---- AgentChats 的索引接口：转换在使用时进行，这里只处理失效
+
+    def add(self, message: Message) -> bool:
+        return True
+
+    def add_many(self, messages: Sequence[Message]):
+        pass
+
+    def remove(self, chat_id: str, message_id: str) -> bool:
+        with self._lock:
+            converted = self._converted.get(chat_id)
+            if converted is None or converted.pop(message_id, None) is None:
+                return False
+            self._count -= 1
+            return True
+
+    def remove_chat(self, chat_id: str) -> int:
+        with self._lock:
+            removed = len(self._converted.pop(chat_id, ()))
+            self._count -= removed
+            # 序列可能以其他键（如 temp-vote）引用该 chat 的消息，全部丢弃，下次转换时按单条缓存重建
+            self._sequences.clear()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._converted.clear()
+            self._sequences.clear()
+            self._count = 0
+
+    # ---- 转换
+
+    def _convert_one(self, message: Message) -> Any:
+        converted = self._converted.get(message.chat_id)
+        if converted is None:
+            converted = self._converted[message.chat_id] = {}
+        entry = converted.get(message.message_id)
+        # 同一个 message_id 的消息可能被替换（MessageStore.__setitem__），内容不同时重新转换
+        if entry is not None and (entry[0] is message or entry[0] == message):
+            self.hits += 1
+            return entry[1]
+        if entry is None and self._count >= self.max_messages:
+            self._converted.clear()
+            self._count = 0
+            converted = self._converted[message.chat_id] = {}
+        result = self.converter(message, self.member_id)
+        if entry is None:
+            self._count += 1
+        converted[message.message_id] = (message, result)
+        self.misses += 1
+        return result
+
+    def convert(self, key: str, messages: Sequence[Message]) -> List[Any]:
+        """转换一个消息序列
+
+        Args:
+            key: 序列键，同一个键的相邻两次调用之间复用相同的前缀
+            messages: 按顺序排列的消息，可以是 list 或 MessageStore
+
+        Returns:
+            List[Any]: 转换后的消息，调用方可以修改
+        """
+        messages = messages.range() if hasattr(messages, 'range') else list(messages)
+        with self._lock:
+            reused = 0
+            previous = self._sequences.get(key)
+            if previous is not None:
+                old_messages, old_converted = previous
+                # 前缀用列表比较，同一对象直接判等，只有不同的对象才比较内容
+                for prefix in (len(old_messages), len(old_messages) - 1):
+                    if 0 < prefix <= len(messages) and messages[:prefix] == old_messages[:prefix]:
+                        reused = prefix
+                        break
+            if reused:
+                converted = old_converted[:reused]
+                self.hits += reused
+            else:
+                converted = []
+            converted.extend(self._convert_one(message) for message in messages[reused:])
+            self._sequences[key] = (messages, converted)
+            return list(converted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'messages': self._count,
+                'sequences': len(self._sequences),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
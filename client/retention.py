@@ -0,0 +1,356 @@
+"""聊天记录的保留策略和上下文窗口
+
+AgentChats 默认保存收到的每一条消息，长期运行的智能体内存和每轮模型调用的 token 数都会不断增长。
+这里提供按 chat 配置的保留策略，被淘汰的消息可以追加写入磁盘；以及按 token 预算组装上下文窗口的函数。
+
+用法:
+    agent.memory.set_retention([MaxMessages(500), MaxAge(6 * 3600)], spill_directory='chat_spill')
+    agent.memory.set_retention([PinnedPlusTail(50)], chat_id=game_chat_id)
+    agent.context_token_budget = 4000
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from .dto import Message
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 是可选依赖，未安装时按字符数估算
+    tiktoken = None
+
+# 汉字、假名、谚文等字符大约各占一个 token
+_CJK = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]')
+# 每条消息在对话格式中的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, tiktoken
+    if _encoding is None and tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.get_encoding('o200k_base')
+                except Exception:  # 编码表需要联网下载，失败时回退到估算
+                    tiktoken = None
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数
+
+    安装了 tiktoken 时精确计数，否则按 CJK 字符每个 1 个、其他字符每 4 个 1 个估算。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message: Message, counter: Callable[[str], int] = estimate_tokens) -> int:
+    """消息在上下文中占用的 token 数，与 convert_to_langchain_messages 的格式一致"""
+    return counter(f'{message.from_member_name}: {message.message}') + MESSAGE_OVERHEAD_TOKENS
+
+
+def is_system_message(message: Message) -> bool:
+    """默认的置顶判断：message_type 为 system 的消息"""
+    return message.message_type == 'system'
+
+
+def _parse_timestamp(timestamp: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        return None
+
+
+class PinnedLedger:
+    """一个 chat 的置顶消息和未置顶消息的统计，由 AgentChats 随增删增量维护
+
+    保留策略和上下文窗口用它代替每次遍历全部历史：
+        - pinned: 置顶消息，按到达顺序
+        - unpinned: 未置顶的消息数
+        - unpinned_tokens: 未置顶消息的 token 总数（默认计数函数），第一次使用时统计，之后增量维护
+
+    记录上次同步时 MessageStore 的 version 和长度，消息绕过 AgentChats 被修改时两者对不上，使用前重新统计。
+    """
+
+    def __init__(self, is_pinned: Callable[[Message], bool]):
+        self.is_pinned = is_pinned
+        self.pinned: Dict[str, Message] = {}
+        self.unpinned = 0
+        self._tokens: Optional[int] = None
+        self._version = -1
+        self._length = -1
+
+    def sync(self, store):
+        """与 store 不一致时重新统计，调用方持有 chat 的锁"""
+        if store.version != self._version or len(store) != self._length:
+            self.pinned = {}
+            self.unpinned = 0
+            self._tokens = None
+            for message in store:
+                if self.is_pinned(message):
+                    self.pinned[message.message_id] = message
+                else:
+                    self.unpinned += 1
+            self._version, self._length = store.version, len(store)
+
+    def added(self, store, message: Message):
+        """message 追加到 store 之后调用"""
+        if store.version != self._version or len(store) != self._length + 1:
+            self._version = -1
+            return
+        if self.is_pinned(message):
+            self.pinned[message.message_id] = message
+        else:
+            self.unpinned += 1
+            if self._tokens is not None:
+                self._tokens += message_tokens(message)
+        self._length += 1
+
+    def removed(self, store, message: Message):
+        """message 从 store 删除之后调用"""
+        if store.version != self._version + 1 or len(store) != self._length - 1:
+            self._version = -1
+            return
+        if self.pinned.pop(message.message_id, None) is None:
+            self.unpinned -= 1
+            if self._tokens is not None:
+                self._tokens -= message_tokens(message)
+        self._version, self._length = store.version, len(store)
+
+    def unpinned_tokens(self, store) -> int:
+        self.sync(store)
+        if self._tokens is None:
+            self._tokens = sum(message_tokens(m) for m in store if m.message_id not in self.pinned)
+        return self._tokens
+
+
+def _oldest_unpinned(messages: Sequence[Message], pinned: Dict[str, Message],
+                     limit: Callable[[Message], bool]) -> List[Message]:
+    """从最旧的消息开始取未置顶的消息，直到 limit 返回 False
+
+    按迭代而不是按位置读取：MessageStore 按位置访问会压缩墓碑，每次淘汰都压缩就成了 O(n)。
+    """
+    evicted = []
+    for message in messages:
+        if message.message_id in pinned:
+            continue
+        if not limit(message):
+            break
+        evicted.append(message)
+    return evicted
+
+
+class RetentionPolicy:
+    """保留策略基类
+
+    evict 返回需要淘汰的消息，置顶消息（is_pinned 为 True）不会被淘汰。
+    messages 按到达顺序排列，越靠前越旧。AgentChats 另外传入该 chat 的 PinnedLedger，
+    策略可以用它避免遍历全部消息；为 None 时逐条判断。
+    """
+
+    def evict(self, messages: Sequence[Message], is_pinned: Callable[[Message], bool],
+              ledger: PinnedLedger = None) -> List[Message]:
+        raise NotImplementedError
+
+
+def _evict_count(messages, is_pinned, ledger, keep: int) -> List[Message]:
+    """淘汰最旧的未置顶消息，只保留 keep 条"""
+    if len(messages) <= keep:
+        return []
+    if ledger is None:
+        candidates = [m for m in messages if not is_pinned(m)]
+        excess = len(candidates) - keep
+        return candidates[:excess] if excess > 0 else []
+    ledger.sync(messages)
+    excess = ledger.unpinned - keep
+    if excess <= 0:
+        return []
+
+    def over(message):
+        nonlocal excess
+        excess -= 1
+        return excess >= 0
+
+    return _oldest_unpinned(messages, ledger.pinned, over)
+
+
+class MaxMessages(RetentionPolicy):
+    """最多保留 max_messages 条未置顶的消息"""
+
+    def __init__(self, max_messages: int):
+        self.max_messages = max_messages
+
+    def evict(self, messages, is_pinned, ledger=None):
+        return _evict_count(messages, is_pinned, ledger, self.max_messages)
+
+
+class MaxAge(RetentionPolicy):
+    """淘汰早于 max_age 秒的消息，时间戳无法解析的消息保留"""
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+
+    def evict(self, messages, is_pinned, ledger=None):
+        now = datetime.now()
+        evicted = []
+        for message in messages:
+            timestamp = _parse_timestamp(message.timestamp)
+            if timestamp is None or is_pinned(message):
+                continue
+            if (now - timestamp).total_seconds() <= self.max_age:
+                break
+            evicted.append(message)
+        return evicted
+
+
+class MaxTokens(RetentionPolicy):
+    """未置顶消息的 token 总数不超过 max_tokens，从最旧的消息开始淘汰"""
+
+    def __init__(self, max_tokens: int, counter: Callable[[str], int] = estimate_tokens):
+        self.max_tokens = max_tokens
+        self.counter = counter
+        # message_id -> token 数，避免每次重新计数
+        self._tokens: Dict[str, int] = {}
+
+    def tokens(self, message: Message) -> int:
+        tokens = self._tokens.get(message.message_id)
+        if tokens is None:
+            tokens = self._tokens[message.message_id] = message_tokens(message, self.counter)
+        return tokens
+
+    def evict(self, messages, is_pinned, ledger=None):
+        if ledger is not None and self.counter is estimate_tokens:
+            # 总数由 ledger 增量维护，只计数被淘汰的消息
+            total = ledger.unpinned_tokens(messages)
+            if total <= self.max_tokens:
+                return []
+
+            def over(message):
+                nonlocal total
+                if total <= self.max_tokens:
+                    return False
+                total -= message_tokens(message)
+                return True
+
+            return _oldest_unpinned(messages, ledger.pinned, over)
+
+        candidates = [m for m in messages if not is_pinned(m)]
+        total = sum(self.tokens(m) for m in candidates)
+        evicted = []
+        for message in candidates:
+            if total <= self.max_tokens:
+                break
+            total -= self.tokens(message)
+            evicted.append(message)
+        for message in evicted:
+            self._tokens.pop(message.message_id, None)
+        return evicted
+
+
+class PinnedPlusTail(RetentionPolicy):
+    """只保留置顶消息和最近 tail 条消息
+
+    Args:
+        tail: 保留的最近消息数
+        pinned: 额外的置顶判断，与 AgentChats 的置顶判断取或
+    """
+
+    def __init__(self, tail: int, pinned: Callable[[Message], bool] = None):
+        self.tail = tail
+        self.pinned = pinned
+
+    def evict(self, messages, is_pinned, ledger=None):
+        if self.pinned is None:
+            return _evict_count(messages, is_pinned, ledger, self.tail)
+        if len(messages) <= self.tail:
+            return []
+
+        def keep(m):
+            return is_pinned(m) or self.pinned(m)
+
+        candidates = [m for m in messages if not keep(m)]
+        excess = len(candidates) - self.tail
+        return candidates[:excess] if excess > 0 else []
+
+
+class SpillStore:
+    """把淘汰的消息按 chat 追加写入 JSON Lines 文件，需要时可以读回"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, chat_id: str) -> str:
+        return os.path.join(self.directory, f'{chat_id}.jsonl')
+
+    def append(self, chat_id: str, messages: Iterable[Message]):
+        lines = ''.join(json.dumps(m.to_wire(), ensure_ascii=False) + '\n' for m in messages)
+        if not lines:
+            return
+        with self._lock, open(self.path(chat_id), 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def load(self, chat_id: str) -> List[Message]:
+        """读回该 chat 被淘汰的消息，按淘汰顺序排列"""
+        path = self.path(chat_id)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [Message.from_wire(json.loads(line)) for line in f if line.strip()]
+
+
+def build_context_window(messages: Sequence[Message], budget: Optional[int], reserved: int = 0,
+                         is_pinned: Callable[[Message], bool] = is_system_message,
+                         counter: Callable[[str], int] = estimate_tokens,
+                         pinned: Sequence[Message] = None) -> List[Message]:
+    """在 token 预算内组装上下文窗口
+
+    置顶消息总是保留，剩余预算从最新的消息开始向前填充，结果保持原有顺序。
+
+    Args:
+        messages: 按时间排列的候选消息
+        budget: token 预算，为 None 时不限制
+        reserved: 预算中预留给提示词等其他内容的 token 数
+        is_pinned: 置顶判断
+        counter: token 计数函数
+        pinned: messages 中的置顶消息，与 messages 顺序相同；提供时不再逐条判断置顶，
+            只从末尾向前读取到预算用完（见 AgentChats.pinned_messages）
+
+    Returns:
+        List[Message]: 选中的消息
+    """
+    if budget is None:
+        return list(messages)
+    if pinned is None:
+        pinned = [m for m in messages if is_pinned(m)]
+    pinned_ids = {m.message_id for m in pinned}
+    remaining = budget - reserved - sum(message_tokens(m, counter) for m in pinned)
+
+    start = len(messages)
+    while start > 0:
+        message = messages[start - 1]
+        if message.message_id not in pinned_ids:
+            tokens = message_tokens(message, counter)
+            if tokens > remaining:
+                break
+            remaining -= tokens
+        start -= 1
+    tail = messages[start:]
+    if not pinned_ids:
+        return list(tail)
+    tail_ids = {m.message_id for m in tail}
+    return [m for m in pinned if m.message_id not in tail_ids] + list(tail)
@@ -0,0 +1,418 @@
+"""聊天记录的本地语义检索
+
+上下文窗口（retention.build_context_window）只保留最近的消息，更早但与当前话题相关的发言会被截掉；
+把全部历史发给模型，提示词长度和调用延迟又随聊天记录增长。SemanticMemory 在本地把每条消息嵌入为向量，
+保存在一个连续的 numpy 矩阵中，检索时一次矩阵-向量乘法算出与查询的相似度，取最高的若干条：
+    - 不联网、不需要 GPU，默认的嵌入器是对 memoryIndex.index_terms 的词项做特征哈希并按 TF-IDF 加权
+    - 嵌入器可替换，只需提供 dim 和 embed(texts)，见 HashingEmbedder
+    - 随 AgentChats 的增删增量维护，删除的行在查询时屏蔽，过多时压缩
+
+build_retrieval_window 用最近消息加检索结果组装上下文窗口，启用后智能体回复时的提示词长度不随历史增长。
+
+用法:
+    agent.enable_semantic_memory()
+    agent.memory.semantic.search('昨晚谁跳了预言家', k=5)
+"""
+import threading
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .dto import Message
+from .memoryIndex import index_terms
+from .retention import build_context_window, estimate_tokens, is_system_message, message_tokens
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，只有启用语义检索时需要
+    np = None
+
+DEFAULT_DIM = 512
+# 组装上下文窗口时，默认以最近的几条消息作为检索的查询
+QUERY_MESSAGES = 3
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('语义检索需要 numpy：pip install numpy')
+
+
+def _normalize(vectors: 'np.ndarray') -> 'np.ndarray':
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    vectors /= norms
+    return vectors
+
+
+class HashingEmbedder:
+    """特征哈希嵌入：每个词项按 crc32 落到 dim 维中的一维，并按哈希的最高位取正负号以抵消冲突
+
+    词项与全文索引相同（单词，以及中日韩文字的单字和 bigram），向量做 L2 归一化，点积即余弦相似度。
+    crc32 在不同进程中结果相同，同样的文本总是得到同样的向量。
+
+    自定义嵌入器需要提供 dim 属性和 embed(texts) 方法，返回 (len(texts), dim) 的 float32 归一化矩阵；
+    可选提供 update(texts) 和 reset()，见 TfidfEmbedder。
+
+    Args:
+        dim: 向量维数
+    """
+
+    # 词项 -> 带符号的维度编号（+1 以区分 0 的正负）的缓存上限
+    CACHE_SIZE = 1 << 20
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        _require_numpy()
+        self.dim = dim
+        self._buckets: Dict[str, int] = {}
+        # 最近一次提取特征的 (texts, 结果)，同一批文本先 update 再 embed 时只分词一次
+        self._last: Tuple[Optional[Sequence[str]], tuple] = (None, ())
+
+    def _bucket(self, term: str) -> int:
+        code = self._buckets.get(term)
+        if code is None:
+            h = zlib.crc32(term.encode('utf-8'))
+            code = h % self.dim + 1
+            if h & 0x80000000:
+                code = -code
+            if len(self._buckets) >= self.CACHE_SIZE:
+                self._buckets.clear()
+            self._buckets[term] = code
+        return code
+
+    def _features(self, texts: Sequence[str]) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """每个词项的 (文本序号, 维度, 符号)"""
+        if self._last[0] is texts:
+            return self._last[1]
+        rows, codes = [], []
+        cached, bucket = self._buckets.get, self._bucket
+        for row, text in enumerate(texts):
+            terms = index_terms(text)
+            rows.extend([row] * len(terms))
+            # 编号不会是 0，缓存未命中时才计算哈希
+            codes.extend([cached(term) or bucket(term) for term in terms])
+        codes = np.asarray(codes, dtype=np.int64)
+        features = np.asarray(rows, dtype=np.int64), np.abs(codes) - 1, np.sign(codes).astype(np.float32)
+        self._last = (texts, features)
+        return features
+
+    def _weights(self) -> Optional['np.ndarray']:
+        return None
+
+    def embed(self, texts: Sequence[str]) -> 'np.ndarray':
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        rows, columns, signs = self._features(texts)
+        np.add.at(vectors, (rows, columns), signs)
+        weights = self._weights()
+        if weights is not None:
+            vectors *= weights
+        return _normalize(vectors)
+
+    def update(self, texts: Sequence[str]) -> bool:
+        """记录新加入的文本，返回 True 时之前嵌入的向量已过期，需要重新嵌入"""
+        return False
+
+    def reset(self):
+        pass
+
+
+class TfidfEmbedder(HashingEmbedder):
+    """在特征哈希的基础上按逆文档频率加权，降低"玩家"、"号"这类几乎每条消息都有的词项的影响
+
+    文档频率随 update 增量累计；向量按嵌入时的 IDF 加权，文档数比上次全部重新嵌入时增长 REFIT_GROWTH 倍后
+    update 返回 True，由 SemanticMemory 重新嵌入全部消息，均摊到每条消息的开销是常数。
+    删除的消息不从文档频率中扣除。
+
+    Args:
+        dim: 向量维数
+        min_docs: 文档数达到该值时第一次重新嵌入
+    """
+
+    REFIT_GROWTH = 2
+
+    def __init__(self, dim: int = DEFAULT_DIM, min_docs: int = 256):
+        super().__init__(dim)
+        self.min_docs = min_docs
+        self.reset()
+
+    def reset(self):
+        self._df = np.zeros(self.dim, dtype=np.float64)
+        self._docs = 0
+        # 上次全部重新嵌入时的文档数
+        self._fitted_docs = 0
+        self._idf: Optional['np.ndarray'] = None
+
+    def update(self, texts: Sequence[str]) -> bool:
+        if not texts:
+            return False
+        rows, columns, _ = self._features(texts)
+        # 同一条文本中落到同一维的词项只计一次
+        present = np.unique(rows * self.dim + columns) % self.dim
+        self._df += np.bincount(present, minlength=self.dim)
+        self._docs += len(texts)
+        self._idf = None
+        if self._docs >= max(self._fitted_docs * self.REFIT_GROWTH, self.min_docs):
+            self._fitted_docs = self._docs
+            return True
+        return False
+
+    def _weights(self) -> Optional['np.ndarray']:
+        if self._docs == 0:
+            return None
+        if self._idf is None:
+            self._idf = (np.log((1 + self._docs) / (1 + self._df)) + 1).astype(np.float32)
+        return self._idf
+
+
+class SemanticMemory:
+    """一个成员全部聊天记录的向量索引，由 AgentChats.enable_semantic_memory 创建并随增删维护
+
+    向量按加入顺序保存在 (容量, dim) 的 float32 矩阵中，容量不足时翻倍；每行记录所属 chat 的编号，
+    删除的行编号为 -1，查询时按编号屏蔽，删除的行过多时压缩。
+
+    Args:
+        embedder: 嵌入器，默认为 TfidfEmbedder
+        messages: 初始消息
+    """
+
+    # 已删除的行数超过该值且超过存活行数时压缩
+    COMPACT_THRESHOLD = 1024
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, embedder=None, messages: Iterable[Message] = ()):
+        _require_numpy()
+        self.embedder = embedder if embedder is not None else TfidfEmbedder()
+        self._lock = threading.RLock()
+        self._reset()
+        self.add_many(messages)
+
+    def _reset(self, capacity: int = INITIAL_CAPACITY):
+        self._matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._chat_codes = np.full(capacity, -1, dtype=np.int32)
+        self._size = 0
+        # 行号 -> 消息，删除后为 None
+        self._messages: List[Optional[Message]] = []
+        # (chat_id, message_id) -> 行号
+        self._rows: Dict[tuple, int] = {}
+        self._codes: Dict[str, int] = {}
+        self._removed = 0
+
+    def _reserve(self, count: int):
+        capacity = len(self._matrix)
+        if self._size + count <= capacity:
+            return
+        capacity = max(capacity * 2, self._size + count)
+        matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        chat_codes = np.full(capacity, -1, dtype=np.int32)
+        chat_codes[:self._size] = self._chat_codes[:self._size]
+        self._matrix, self._chat_codes = matrix, chat_codes
+
+    def _chat_code(self, chat_id: str) -> int:
+        code = self._codes.get(chat_id)
+        if code is None:
+            code = self._codes[chat_id] = len(self._codes)
+        return code
+
+    def add(self, message: Message) -> bool:
+        """加入一条消息，已在索引中时返回 False"""
+        return self.add_many((message,)) == 1
+
+    def add_many(self, messages: Iterable[Message]) -> int:
+        """批量嵌入并加入消息，返回新加入的条数"""
+        with self._lock:
+            batch = {}
+            for message in messages:
+                key = (message.chat_id, message.message_id)
+                if key not in self._rows and key not in batch:
+                    batch[key] = message
+            if not batch:
+                return 0
+            batch = list(batch.values())
+            texts = [message.message or '' for message in batch]
+            if self.embedder.update(texts):
+                self._rebuild(batch)
+            else:
+                self._append(batch, self.embedder.embed(texts))
+            return len(batch)
+
+    def _append(self, messages: List[Message], vectors: 'np.ndarray'):
+        self._reserve(len(messages))
+        start = self._size
+        self._matrix[start:start + len(messages)] = vectors
+        for row, message in enumerate(messages, start):
+            self._rows[(message.chat_id, message.message_id)] = row
+            self._chat_codes[row] = self._chat_code(message.chat_id)
+            self._messages.append(message)
+        self._size += len(messages)
+
+    def _rebuild(self, extra: List[Message] = ()):
+        """用当前的嵌入器重新嵌入全部存活的消息，同时去掉删除的行"""
+        live = [message for message in self._messages if message is not None]
+        live.extend(extra)
+        self._reset(max(self.INITIAL_CAPACITY, len(live)))
+        # 分批嵌入，避免一次分配过大的临时矩阵
+        for start in range(0, len(live), 4096):
+            chunk = live[start:start + 4096]
+            self._append(chunk, self.embedder.embed([message.message or '' for message in chunk]))
+
+    def remove(self, chat_id: str, message_id: str) -> bool:
+        with self._lock:
+            row = self._rows.pop((chat_id, message_id), None)
+            if row is None:
+                return False
+            self._drop(row)
+            self._maybe_compact()
+            return True
+
+    def remove_chat(self, chat_id: str) -> int:
+        """删除一个 chat 的全部消息，返回删除的条数"""
+        with self._lock:
+            code = self._codes.get(chat_id)
+            if code is None:
+                return 0
+            rows = np.flatnonzero(self._chat_codes[:self._size] == code)
+            for row in rows.tolist():
+                message = self._messages[row]
+                del self._rows[(message.chat_id, message.message_id)]
+                self._drop(row)
+            self._maybe_compact()
+            return len(rows)
+
+    def _drop(self, row: int):
+        self._messages[row] = None
+        self._chat_codes[row] = -1
+        self._removed += 1
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self.embedder.reset()
+
+    def _maybe_compact(self):
+        if self._removed <= self.COMPACT_THRESHOLD or self._removed <= len(self._rows):
+            return
+        keep = np.flatnonzero(self._chat_codes[:self._size] >= 0)
+        count = len(keep)
+        self._matrix[:count] = self._matrix[keep]
+        self._chat_codes[:count] = self._chat_codes[keep]
+        self._chat_codes[count:self._size] = -1
+        self._messages = [self._messages[row] for row in keep.tolist()]
+        self._rows = {(message.chat_id, message.message_id): row for row, message in enumerate(self._messages)}
+        self._size = count
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, message: Message) -> bool:
+        return (message.chat_id, message.message_id) in self._rows
+
+    def search(self, text: str, k: int = 8, chat_ids: Iterable[str] = None,
+               accept: Callable[[Message], bool] = None, min_score: float = 0.0) -> List[Tuple[float, Message]]:
+        """与 text 最相似的消息
+
+        Args:
+            text: 查询文本
+            k: 最多返回的条数
+            chat_ids: 只在这些 chat 中查找，为 None 时查找全部 chat
+            accept: 额外的筛选条件，按相似度从高到低逐条判断，直到取满 k 条
+            min_score: 相似度（余弦）需要大于该值
+
+        Returns:
+            List[Tuple[float, Message]]: (相似度, 消息)，按相似度从高到低排列
+        """
+        with self._lock:
+            if not self._rows or k <= 0:
+                return []
+            size = self._size
+            query = self.embedder.embed([text])[0]
+            scores = self._matrix[:size] @ query
+            codes = self._chat_codes[:size]
+            if chat_ids is None:
+                valid = codes >= 0
+            else:
+                wanted = [self._codes[chat_id] for chat_id in set(chat_ids) if chat_id in self._codes]
+                if not wanted:
+                    return []
+                valid = np.isin(codes, wanted)
+            valid &= scores > min_score
+            rows = np.flatnonzero(valid)
+
+            results = []
+            for row in self._ranked(rows, scores[rows], k if accept is None else k * 2):
+                message = self._messages[row]
+                if accept is not None and not accept(message):
+                    continue
+                results.append((float(scores[row]), message))
+                if len(results) >= k:
+                    break
+            return results
+
+    @staticmethod
+    def _ranked(rows: 'np.ndarray', scores: 'np.ndarray', first: int) -> Iterable[int]:
+        """按相似度从高到低依次给出行号：先用 argpartition 取前 first 个排序，不够时再排序其余的"""
+        if len(rows) > first:
+            top = np.argpartition(-scores, first)[:first]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            yield from rows[top].tolist()
+            rest = np.ones(len(rows), dtype=bool)
+            rest[top] = False
+            rest = np.flatnonzero(rest)
+            yield from rows[rest[np.argsort(-scores[rest], kind='stable')]].tolist()
+        else:
+            yield from rows[np.argsort(-scores, kind='stable')].tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'messages': len(self._rows),
+                'removed': self._removed,
+                'capacity': len(self._matrix),
+                'dim': self.embedder.dim,
+                'bytes': self._matrix.nbytes,
+            }
+
+
+def build_retrieval_window(messages: Sequence[Message], budget: Optional[int], semantic: SemanticMemory,
+                           reserved: int = 0, is_pinned: Callable[[Message], bool] = is_system_message,
+                           counter: Callable[[str], int] = estimate_tokens, k: int = 8, share: float = 0.3,
+                           query: str = None, pinned: Sequence[Message] = None) -> List[Message]:
+    """用最近的消息加语义检索结果组装上下文窗口
+
+    全部消息能放进预算时与 build_context_window 相同。否则预算的 share 留给检索结果，其余按
+    build_context_window 选取置顶消息和最近消息；再以最近几条消息（或 query）为查询，从 messages 中未选中的
+    消息里取最相似的至多 k 条填入检索预算。结果保持 messages 的原有顺序。
+
+    Args:
+        messages: 按时间排列的候选消息
+        budget: token 预算，为 None 时不限制
+        semantic: 包含这些消息的语义索引
+        reserved: 预算中预留给提示词等其他内容的 token 数
+        is_pinned: 置顶判断
+        counter: token 计数函数
+        k: 最多检索的条数
+        share: 留给检索结果的预算比例
+        query: 检索的查询文本，默认为最近的 QUERY_MESSAGES 条消息
+        pinned: messages 中的置顶消息，见 build_context_window
+
+    Returns:
+        List[Message]: 选中的消息
+    """
+    window = build_context_window(messages, budget, reserved, is_pinned, counter, pinned)
+    retrieval_budget = int((budget - reserved) * share) if budget is not None else 0
+    if len(window) == len(messages) or retrieval_budget <= 0 or k <= 0:
+        return window
+    window = build_context_window(messages, budget - retrieval_budget, reserved, is_pinned, counter, pinned)
+    selected = {message.message_id for message in window}
+    if query is None:
+        query = '\n'.join(message.message or '' for message in window[-QUERY_MESSAGES:])
+    candidates = {(message.chat_id, message.message_id) for message in messages
+                  if message.message_id not in selected}
+
+    remaining = retrieval_budget
+    for _, message in semantic.search(query, k, chat_ids={chat_id for chat_id, _ in candidates},
+                                      accept=lambda m: (m.chat_id, m.message_id) in candidates):
+        tokens = message_tokens(message, counter)
+        if tokens <= remaining:
+            remaining -= tokens
+            selected.add(message.message_id)
+    return [message for message in messages if message.message_id in selected]
@@ -0,0 +1,231 @@
+import heapq
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .dto import Message
+from .events import Events
+
+
+class SendQueue:
+    """出站消息队列，流水线发送并支持按 chat 批量提交
+
+    - 每个 chat 同时最多只有一个请求在途，保证同一 chat 内的消息顺序；不同 chat 的请求并行发出
+    - 在途请求总数不超过 window
+    - 某个 chat 的请求在途时，后续消息在队列中累积，下一次以 SEND_MESSAGES 批量事件一次提交（最多 max_batch 条）
+    - 排队消息数达到 max_pending 时，submit 阻塞直到有空位
+    - submit 返回 Future，结果为服务器对该消息的确认，如 {'message_id': ..., 'status': 'success', ...}
+    - 请求超过 ack_timeout 未确认时其 Future 以 TimeoutError 完成并让出窗口，但该 chat 保持阻塞，
+      直到迟到的确认到达或连接断开（abort_in_flight），避免后续消息先于超时的消息到达服务器
+    - 所有请求的超时由一个后台线程按截止时间堆统一检查
+    """
+
+    def __init__(self, client, window: int = 8, max_batch: int = 32, max_pending: int = 1000,
+                 ack_timeout: float = 60, batch: bool = True):
+        self.client = client
+        self.window = window
+        self.max_batch = max_batch if batch else 1
+        self.max_pending = max_pending
+        self.ack_timeout = ack_timeout
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        # chat_id -> 待发送的 (消息, Future)
+        self._pending: Dict[str, Deque[Tuple[Message, Future]]] = {}
+        # 有待发送消息且没有在途请求的 chat
+        self._ready: Deque[str] = deque()
+        self._in_flight_chats = set()
+        self._in_flight = 0
+        self._queued = 0
+        self._request_seq = 0
+        # request_seq -> (chat_id, 消息和 Future)，等待确认的请求，包括已超时但确认未到的
+        self._requests_in_flight: Dict[int, Tuple[str, List[Tuple[Message, Future]]]] = {}
+        # 已超时、仍阻塞所在 chat 的请求
+        self._timed_out = set()
+        # (截止时间, request_seq) 的最小堆，由 _reaper 线程检查；确认后的请求不从堆中删除，到期时跳过
+        self._deadlines: List[Tuple[float, int]] = []
+        self._reaper_wakeup = threading.Condition(self._lock)
+        self._reaper: Optional[threading.Thread] = None
+
+        # 统计信息
+        self._requests = 0
+        self._batched_messages = 0
+        self._timeouts = 0
+
+    def submit(self, message: Message) -> Future:
+        """将消息加入发送队列
+
+        Args:
+            message: 要发送的消息
+
+        Returns:
+            Future: 服务器确认该消息后完成；发送失败或超时时以异常完成
+        """
+        future = Future()
+        with self._lock:
+            while self._queued >= self.max_pending:
+                self._not_full.wait()
+            chat_id = message.chat_id
+            self._pending.setdefault(chat_id, deque()).append((message, future))
+            self._queued += 1
+            if chat_id not in self._in_flight_chats and len(self._pending[chat_id]) == 1:
+                self._ready.append(chat_id)
+        self._pump()
+        return future
+
+    def flush(self, chat_id: str = None, timeout: float = None) -> bool:
+        """等待队列中的消息全部得到确认
+
+        Args:
+            chat_id: 只等待该 chat 的消息，为 None 时等待所有消息
+            timeout: 最长等待时间，单位为秒
+
+        Returns:
+            bool: 是否在超时前全部完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._has_pending(chat_id):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def _has_pending(self, chat_id: str = None) -> bool:
+        if chat_id is None:
+            return self._queued > 0 or bool(self._requests_in_flight)
+        return bool(self._pending.get(chat_id)) or chat_id in self._in_flight_chats
+
+    def _pump(self):
+        """在窗口允许的范围内发出请求"""
+        while True:
+            with self._lock:
+                if self._in_flight >= self.window or not self._ready:
+                    return
+                chat_id = self._ready.popleft()
+                queue = self._pending[chat_id]
+                items = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+                if not queue:
+                    del self._pending[chat_id]
+                self._in_flight_chats.add(chat_id)
+                self._in_flight += 1
+                self._queued -= len(items)
+                self._request_seq += 1
+                request_seq = self._request_seq
+                self._requests += 1
+                if len(items) > 1:
+                    self._batched_messages += len(items)
+                self._not_full.notify_all()
+            self._send(chat_id, items, request_seq)
+
+    def _send(self, chat_id: str, items: List[Tuple[Message, Future]], request_seq: int):
+        with self._lock:
+            self._requests_in_flight[request_seq] = (chat_id, items)
+            heapq.heappush(self._deadlines, (time.monotonic() + self.ack_timeout, request_seq))
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name='send-queue-reaper', daemon=True)
+                self._reaper.start()
+            elif self._deadlines[0][1] == request_seq:
+                self._reaper_wakeup.notify()
+
+        def on_ack(*response):
+            ack = response[0] if response else None
+            if len(items) == 1:
+                acks = [ack]
+            else:
+                acks = ack if isinstance(ack, list) else [ack] * len(items)
+            self._finish(request_seq, acks=acks)
+
+        try:
+            if len(items) == 1:
+                self.client.socket.emit(Events.SEND_MESSAGE, items[0][0].to_wire(), callback=on_ack)
+            else:
+                payload = {'chat_id': chat_id, 'messages': [message.to_wire() for message, _ in items]}
+                self.client.socket.emit(Events.SEND_MESSAGES, payload, callback=on_ack)
+        except Exception as e:
+            self._finish(request_seq, error=e)
+
+    def _finish(self, request_seq: int, acks: List = None, error: Exception = None):
+        """请求得到确认或失败，完成其中尚未完成的 Future，并放行所在 chat"""
+        with self._lock:
+            request = self._requests_in_flight.pop(request_seq, None)
+            if request is None:
+                return
+            timed_out = request_seq in self._timed_out
+            self._timed_out.discard(request_seq)
+            # 已确认请求的截止时间留在堆中到期时才弹出，积累过多时重建
+            if len(self._deadlines) > 2 * len(self._requests_in_flight) + 64:
+                self._deadlines = [d for d in self._deadlines if d[1] in self._requests_in_flight]
+                heapq.heapify(self._deadlines)
+        chat_id, items = request
+        for index, (message, future) in enumerate(items):
+            if error is not None:
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            item_ack = acks[index] if index < len(acks) else None
+            # 超时后迟到的确认仍然采用服务器分配的 HLC，但 Future 已经以 TimeoutError 完成
+            self.client.adopt_ack(message, item_ack)
+            if not future.done():
+                future.set_result(item_ack)
+        # 超时时已经让出了窗口
+        self._complete(chat_id, release_window=not timed_out)
+
+    def _reap(self):
+        """超时检查线程：等待最早的截止时间，到期的请求以 TimeoutError 完成"""
+        while True:
+            with self._lock:
+                expired = []
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, request_seq = heapq.heappop(self._deadlines)
+                    if request_seq in self._requests_in_flight and request_seq not in self._timed_out:
+                        self._timed_out.add(request_seq)
+                        self._timeouts += 1
+                        # 让出窗口，但 chat 仍在 _in_flight_chats 中，直到确认到达
+                        self._in_flight -= 1
+                        expired.append((request_seq, self._requests_in_flight[request_seq]))
+                if not expired:
+                    if not self._deadlines:
+                        self._reaper = None
+                        return
+                    self._reaper_wakeup.wait(self._deadlines[0][0] - now)
+                    continue
+            for request_seq, (chat_id, items) in expired:
+                error = TimeoutError(f'send request {request_seq} to chat {chat_id} was not acknowledged '
+                                     f'within {self.ack_timeout}s')
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(error)
+            self._pump()
+
+    def abort_in_flight(self, error: Exception = None):
+        """连接断开时调用：在途请求的确认不会再到达，以异常完成它们并放行阻塞的 chat"""
+        with self._lock:
+            request_seqs = list(self._requests_in_flight)
+        for request_seq in request_seqs:
+            self._finish(request_seq, error=error or ConnectionError('connection lost before acknowledgement'))
+
+    def _complete(self, chat_id: str, release_window: bool = True):
+        with self._lock:
+            if release_window:
+                self._in_flight -= 1
+            self._in_flight_chats.discard(chat_id)
+            if self._pending.get(chat_id):
+                self._ready.append(chat_id)
+            self._idle.notify_all()
+        self._pump()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queued': self._queued,
+                'in_flight': self._in_flight,
+                'requests': self._requests,
+                'batched_messages': self._batched_messages,
+                'timeouts': self._timeouts,
+            }
@@ -0,0 +1,212 @@
+import threading
+from typing import Dict, Callable, Any, List
+
+from .codec import create_socket, socketio_path
+from .events import Events
+
+
+class SharedConnection:
+    """多个成员身份共享的一条 Socket.IO 连接
+
+    连接以 auth={'shared': True} 登录服务器，之后每个成员通过 ATTACH_MEMBER 挂载到这条连接上。
+    服务器发往共享连接的事件会带上 to_member_id，由本类路由到对应成员注册的处理函数；
+    成员发出的请求会带上 as_member_id，服务器据此确定调用者身份。
+
+    用法:
+        connection = SharedConnection('http://localhost:3000')
+        agent = LangchainMemberAgent('tom', 'tom-id', socket=connection.member_socket('tom-id', 'tom'))
+        agent.login()
+
+        # 已经创建的客户端也可以改用共享连接，但它构造时已经创建了自己的 socketio.Client
+        connection.bind(other_agent)
+    """
+
+    # 由连接本身处理、不需要按成员路由的事件
+    _local_events = (Events.CONNECT, Events.DISCONNECT, Events.RECEIVE_LOGIN_RESPONSE)
+
+    def __init__(self, url='http://localhost:3000', serializer='json'):
+        self.base_url = url
+        # 线路编码：'json'、'msgpack' 或 'msgpack-tagged'，所有挂载的成员共用
+        self.serializer = serializer
+        self.socket = create_socket(serializer)
+        self.connect_timeout = 10  # 设置连接超时时间，单位为秒
+
+        # member_id -> {event: handler}
+        self.routes: Dict[str, Dict[str, Callable]] = {}
+        # member_id -> member_name，用于断线重连后重新挂载
+        self.members: Dict[str, str] = {}
+        self._routed_events = set()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._has_connected = False
+
+        self.socket.on(Events.RECEIVE_LOGIN_RESPONSE, self._on_login_response)
+        self.socket.on(Events.DISCONNECT, self._on_disconnect)
+
+    def member_socket(self, member_id: str, member_name: str) -> 'MemberSocket':
+        """成员在这条连接上的 socket，作为 MemberClient 的 socket 参数传入"""
+        return MemberSocket(self, member_id, member_name)
+
+    def bind(self, client) -> 'MemberSocket':
+        """让成员客户端使用这条共享连接，需要在 login 之前调用；构造时已传入本连接的 socket 时不再替换"""
+        socket = client.socket
+        if not (isinstance(socket, MemberSocket) and socket.connection is self and socket.member_id == client.member_id):
+            client.socket = MemberSocket(self, client.member_id, client.name)
+        client.base_url = self.base_url
+        return client.socket
+
+    def connect(self) -> bool:
+        with self._lock:
+            if self.socket.connected and self._ready.is_set():
+                return True
+            if not self.socket.connected:
+                self._ready.clear()
+                self.socket.connect(self.base_url, transports=['websocket'],
+                                    socketio_path=socketio_path(self.serializer), auth={'shared': True})
+        if not self._ready.wait(self.connect_timeout):
+            print("Shared connection timed out. Please try again.")
+            return False
+        return True
+
+    def attach(self, member_id: str, member_name: str) -> dict:
+        """将成员挂载到共享连接，返回与 RECEIVE_LOGIN_RESPONSE 相同格式的结果"""
+        if not self.connect():
+            return {'status': 408, 'message': 'shared connection timed out'}
+        self.members[member_id] = member_name
+        try:
+            return self.socket.call(Events.ATTACH_MEMBER,
+                                    {'member_id': member_id, 'member_name': member_name},
+                                    timeout=self.connect_timeout)
+        except Exception as e:
+            return {'status': 500, 'message': f'attach failed: {e}'}
+
+    def detach(self, member_id: str):
+        # 保留成员注册的处理函数：客户端只绑定一次事件，重新 login 时仍然需要它们
+        self.members.pop(member_id, None)
+        if self.socket.connected:
+            self.socket.call(Events.DETACH_MEMBER, {'member_id': member_id})
+
+    def on(self, member_id: str, event: str, handler: Callable):
+        self.routes.setdefault(member_id, {})[event] = handler
+        if event in self._local_events or event in self._routed_events:
+            return
+        self._routed_events.add(event)
+        self.socket.on(event, lambda data=None: self._route(event, data))
+
+    def _route(self, event: str, data: Any):
+        """根据 to_member_id 将事件分发给对应成员，处理函数的返回值作为 ack"""
+        if not isinstance(data, dict) or 'to_member_id' not in data:
+            print(f'shared connection: {event} 缺少 to_member_id，无法路由')
+            return None
+        data = dict(data)
+        member_id = data.pop('to_member_id')
+        handler = self.routes.get(member_id, {}).get(event)
+        if handler is None:
+            print(f'shared connection: {member_id} 未注册 {event} 处理函数')
+            return None
+        return handler(data)
+
+    def _on_login_response(self, data):
+        if data.get('status') != 200:
+            print(f"Shared connection login failed: {data.get('message')}")
+            return
+        reconnected = self._has_connected
+        self._has_connected = True
+        self._ready.set()
+        if reconnected and self.members:
+            # 断线重连后服务器已丢失挂载关系，需要重新挂载所有成员
+            threading.Thread(target=self._reattach_all, daemon=True).start()
+
+    def _reattach_all(self):
+        for member_id, member_name in list(self.members.items()):
+            self._deliver_attached(member_id, self.attach(member_id, member_name))
+
+    def _deliver_attached(self, member_id: str, rsp: dict) -> bool:
+        """把挂载结果交给成员：挂载成功时先触发成员的 CONNECT 处理函数，再交付登录响应
+
+        Returns:
+            bool: 成员是否已注册登录响应处理函数
+        """
+        handlers = self.routes.get(member_id, {})
+        if rsp.get('status') == 200 and handlers.get(Events.CONNECT):
+            handlers[Events.CONNECT]()
+        handler = handlers.get(Events.RECEIVE_LOGIN_RESPONSE)
+        if handler:
+            handler(rsp)
+        return handler is not None
+
+    def _on_disconnect(self, *args):
+        self._ready.clear()
+        for handlers in list(self.routes.values()):
+            handler = handlers.get(Events.DISCONNECT)
+            if handler:
+                handler()
+
+    def wait(self):
+        self.socket.wait()
+
+    def disconnect(self):
+        self.socket.disconnect()
+
+
+class MemberSocket:
+    """单个成员在共享连接上的视图
+
+    提供 MemberClient 用到的 socketio.Client 接口子集（on/call/emit/connect/wait/disconnect），
+    因此 MemberClient 及其子类无需修改即可运行在共享连接上。
+    """
+
+    def __init__(self, connection: SharedConnection, member_id: str, member_name: str):
+        self.connection = connection
+        self.member_id = member_id
+        self.member_name = member_name
+        self.attached = False
+        # MemberClient 在 connect 之后才绑定事件，登录响应需要暂存到处理函数注册时再交付
+        self._pending_login_response = None
+
+    @property
+    def connected(self) -> bool:
+        return self.attached and self.connection.socket.connected
+
+    def on(self, event: str, handler: Callable = None):
+        if handler is None:
+            def set_handler(h):
+                self.connection.on(self.member_id, event, h)
+                return h
+
+            return set_handler
+        self.connection.on(self.member_id, event, handler)
+        if event == Events.RECEIVE_LOGIN_RESPONSE and self._pending_login_response is not None:
+            rsp, self._pending_login_response = self._pending_login_response, None
+            handler(rsp)
+
+    def _with_identity(self, data: Any) -> dict:
+        payload = dict(data) if data is not None else {}
+        payload['as_member_id'] = self.member_id
+        return payload
+
+    def call(self, event: str, data: Any = None, timeout: float = 60):
+        return self.connection.socket.call(event, self._with_identity(data), timeout=timeout)
+
+    def emit(self, event: str, data: Any = None, callback: Callable = None):
+        self.connection.socket.emit(event, self._with_identity(data), callback=callback)
+
+    def connect(self, url: str = None, transports: List[str] = None, auth: dict = None, **kwargs):
+        """挂载成员，并把挂载结果作为登录响应交给成员的处理函数"""
+        rsp = self.connection.attach(self.member_id, self.member_name)
+        self.attached = rsp.get('status') == 200
+        if not self.connection._deliver_attached(self.member_id, rsp):
+            self._pending_login_response = rsp
+
+    def disconnect(self):
+        if not self.attached:
+            return
+        self.attached = False
+        self.connection.detach(self.member_id)
+        # 与 socketio.Client 一样，主动断开时也触发 DISCONNECT 处理函数
+        handler = self.connection.routes.get(self.member_id, {}).get(Events.DISCONNECT)
+        if handler:
+            handler()
+
+    def wait(self):
+        self.connection.wait()
@@ -0,0 +1,398 @@
+"""同一进程内多个智能体共享的聊天记录
+
+狼人杀等示例中，十几个智能体运行在同一进程里，每个智能体的 AgentChats 都会各自校验并保存同一个 chat 的全部消息。
+SharedLog 为每个 chat 维护一份只追加的消息日志，同一条消息只校验、保存一次；
+各智能体的 chat 改为引用日志的视图（SharedMessageView），视图只记录自己的起点、终点和缺口（尚未收到或已删除的位置）。
+智能体做出日志无法表示的修改（插入、替换、重新收到清空前的消息）时，视图才复制出私有副本，之后与普通 MessageStore 相同。
+
+用法:
+    shared_log = get_default_shared_log()
+    for agent in agents:
+        shared_log.bind(agent)  # 在 login 之前调用
+        agent.login()
+"""
+import threading
+import weakref
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from .clock import from_timestamp, order_key
+from .dto import Message
+from .memory import MessageStore, _select_between
+
+
+class SharedChatLog:
+    """一个 chat 的只追加消息日志
+
+    位置是绝对序号，裁剪掉所有视图都不再引用的前缀后，其余消息的位置不变。
+    """
+
+    # 可裁剪的前缀达到该长度时裁剪
+    TRIM_THRESHOLD = 1024
+
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        # (第一条消息的绝对位置, 消息列表)，裁剪时整体替换，读取方无需加锁
+        self._segment: Tuple[int, List[Message]] = (0, [])
+        # message_id -> 绝对位置
+        self._positions: Dict[str, int] = {}
+        # 消息是否按 HLC 非递减顺序追加
+        self.time_sorted = True
+        self._last_key = 0
+        self._appended = 0
+        self._views: 'weakref.WeakSet[SharedMessageView]' = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    @property
+    def end(self) -> int:
+        """下一条消息的绝对位置"""
+        base, items = self._segment
+        return base + len(items)
+
+    @property
+    def base(self) -> int:
+        return self._segment[0]
+
+    def __len__(self) -> int:
+        return len(self._segment[1])
+
+    def position(self, message_id: str) -> Optional[int]:
+        return self._positions.get(message_id)
+
+    def at(self, position: int) -> Optional[Message]:
+        base, items = self._segment
+        index = position - base
+        return items[index] if 0 <= index < len(items) else None
+
+    def intern(self, message: Message) -> Tuple[int, Message]:
+        """把消息加入日志，已存在时返回日志中的消息对象
+
+        Returns:
+            Tuple[int, Message]: 消息的绝对位置和日志中的消息对象
+        """
+        with self._lock:
+            position = self._positions.get(message.message_id)
+            if position is not None:
+                return position, self.at(position)
+            return self._append(message), message
+
+    def intern_wire(self, data: dict) -> Message:
+        """线路上收到的消息，日志中已有时直接返回，不再校验"""
+        position = self._positions.get(data.get('message_id'))
+        if position is not None:
+            message = self.at(position)
+            if message is not None:
+                return message
+        return self.intern(Message.from_wire(data))[1]
+
+    def _append(self, message: Message) -> int:
+        key = order_key(message)
+        if key < self._last_key:
+            self.time_sorted = False
+        self._last_key = max(key, self._last_key)
+        base, items = self._segment
+        position = base + len(items)
+        self._positions[message.message_id] = position
+        items.append(message)
+        self._appended += 1
+        if self._appended % self.TRIM_THRESHOLD == 0:
+            self._trim()
+        return position
+
+    def _trim(self):
+        """丢弃所有共享视图的起点之前的消息，调用方持有锁"""
+        base, items = self._segment
+        low = min((view._start for view in list(self._views)), default=base + len(items))
+        drop = low - base
+        if drop < self.TRIM_THRESHOLD:
+            return
+        for message in items[:drop]:
+            self._positions.pop(message.message_id, None)
+        self._segment = (low, items[drop:])
+
+    def _register(self, view: 'SharedMessageView'):
+        with self._lock:
+            self._views.add(view)
+
+    def _unregister(self, view: 'SharedMessageView'):
+        with self._lock:
+            self._views.discard(view)
+
+
+class SharedMessageView(MessageStore):
+    """AgentChat.messages 的共享实现，引用 SharedChatLog 中的消息
+
+    可见的消息为日志中 [起点, 终点) 范围内、不在缺口中的消息，按日志顺序排列：
+    - 追加日志中更靠后的消息时终点后移，中间尚未收到的位置记为缺口；收到缺口处的消息时填上缺口
+    - 删除最早的消息时起点后移，其他删除记为缺口
+    - 清空时起点和终点移到日志末尾，此后重新收到清空前的消息会转为私有副本
+    - 插入、替换或缺口过多时转为私有副本
+    """
+
+    def __init__(self, log: SharedChatLog):
+        self.log = log
+        self._shared = True
+        self._start = self._end = log.end
+        # 早于该位置的消息已被清空，不能再通过共享日志加入
+        self._floor = 0
+        self._holes: Set[int] = set()
+        super().__init__()
+        log._register(self)
+
+    # MessageStore 定义了 __eq__，视图需要按身份哈希才能放入日志的 WeakSet
+    __hash__ = object.__hash__
+
+    # 共享模式下有序性取决于日志
+    @property
+    def _time_sorted(self) -> bool:
+        return self.log.time_sorted if self._shared else self._private_sorted
+
+    @_time_sorted.setter
+    def _time_sorted(self, value: bool):
+        self._private_sorted = value
+
+    @property
+    def shared(self) -> bool:
+        """是否仍在引用共享日志"""
+        return self._shared
+
+    def _contains_position(self, position: Optional[int]) -> bool:
+        return position is not None and self._start <= position < self._end and position not in self._holes
+
+    def _visible(self) -> List[Message]:
+        with self._lock:
+            start, end = self._start, self._end
+            holes = set(self._holes) if self._holes else None
+        base, items = self.log._segment
+        messages = items[start - base:end - base]
+        if holes:
+            messages = [m for position, m in enumerate(messages, start) if position not in holes]
+        return messages
+
+    def _materialize(self):
+        """复制出私有副本，之后按普通 MessageStore 处理，调用方持有锁"""
+        messages = self._visible()
+        self._items = list(messages)
+        self._positions = {m.message_id: i for i, m in enumerate(self._items)}
+        self._removed = 0
+        self._private_sorted = self.log.time_sorted
+        self._last_key = order_key(messages[-1]) if messages else 0
+        self._holes = set()
+        self._shared = False
+        self.log._unregister(self)
+
+    def _check_holes(self):
+        if len(self._holes) > self.COMPACT_THRESHOLD and len(self._holes) > len(self):
+            self._materialize()
+
+    # ---- 按 message_id 的操作
+
+    def append(self, message: Message) -> bool:
+        with self._lock:
+            if not self._shared:
+                return super().append(message)
+            position, _ = self.log.intern(message)
+            if self._start == self._end:
+                if position < self._floor:
+                    self._materialize()
+                    return super().append(message)
+                self._start, self._end = position, position + 1
+                return True
+            if position >= self._end:
+                self._holes.update(range(self._end, position))
+                self._end = position + 1
+            elif position >= self._start:
+                if position not in self._holes:
+                    return False
+                # 填上缺口相当于在中间插入，递增 version 让合并时间线等按 version 增量同步的读取方重新比对
+                self._holes.discard(position)
+                self.version += 1
+            elif position >= self._floor and position >= self.log.base:
+                self._holes.update(range(position + 1, self._start))
+                self._start = position
+                self.version += 1
+            else:
+                self._materialize()
+                return super().append(message)
+            self._check_holes()
+            return True
+
+    def get(self, message_id: str) -> Optional[Message]:
+        if not self._shared:
+            return super().get(message_id)
+        position = self.log.position(message_id)
+        return self.log.at(position) if self._contains_position(position) else None
+
+    def remove_by_id(self, message_id: str) -> Optional[Message]:
+        with self._lock:
+            if not self._shared:
+                return super().remove_by_id(message_id)
+            position = self.log.position(message_id)
+            if not self._contains_position(position):
+                return None
+            message = self.log.at(position)
+            self.version += 1
+            if position == self._start:
+                self._start += 1
+                while self._start < self._end and self._start in self._holes:
+                    self._holes.discard(self._start)
+                    self._start += 1
+            elif position == self._end - 1:
+                self._end -= 1
+                while self._end > self._start and self._end - 1 in self._holes:
+                    self._holes.discard(self._end - 1)
+                    self._end -= 1
+            else:
+                self._holes.add(position)
+                self._check_holes()
+            return message
+
+    def index_of(self, message_id: str) -> int:
+        with self._lock:
+            if not self._shared:
+                return super().index_of(message_id)
+            position = self.log.position(message_id)
+            if not self._contains_position(position):
+                return -1
+            return position - self._start - sum(1 for hole in self._holes if hole < position)
+
+    def last(self) -> Optional[Message]:
+        if not self._shared:
+            return super().last()
+        for position in range(self._end - 1, self._start - 1, -1):
+            if position not in self._holes:
+                return self.log.at(position)
+        return None
+
+    def between(self, since: Union[str, datetime, int] = None,
+                until: Union[str, datetime, int] = None) -> List[Message]:
+        if not self._shared:
+            return super().between(since, until)
+        since_key = from_timestamp(since) if since is not None else None
+        until_key = from_timestamp(until) if until is not None else None
+        return _select_between(self._visible(), since_key, until_key, self.log.time_sorted)
+
+    # ---- 序列接口
+
+    def _compact(self):
+        if not self._shared:
+            super()._compact()
+
+    def __len__(self) -> int:
+        if not self._shared:
+            return super().__len__()
+        return self._end - self._start - len(self._holes)
+
+    def __iter__(self):
+        if not self._shared:
+            return super().__iter__()
+        return iter(self._visible())
+
+    def __reversed__(self):
+        if not self._shared:
+            return super().__reversed__()
+        return reversed(self._visible())
+
+    def __contains__(self, item) -> bool:
+        if not self._shared:
+            return super().__contains__(item)
+        message_id = item if isinstance(item, str) else getattr(item, 'message_id', None)
+        return self._contains_position(self.log.position(message_id))
+
+    def __getitem__(self, index):
+        with self._lock:
+            if not self._shared:
+                return super().__getitem__(index)
+            if isinstance(index, int) and not self._holes:
+                length = self._end - self._start
+                if index < 0:
+                    index += length
+                if not 0 <= index < length:
+                    raise IndexError('MessageStore index out of range')
+                return self.log.at(self._start + index)
+            return self._visible()[index]
+
+    def __setitem__(self, index, message: Message):
+        with self._lock:
+            if self._shared:
+                self._materialize()
+            super().__setitem__(index, message)
+
+    def __delitem__(self, index):
+        with self._lock:
+            if not self._shared:
+                return super().__delitem__(index)
+            targets = self._visible()[index] if isinstance(index, slice) else [self._visible()[index]]
+            for message in targets:
+                self.remove_by_id(message.message_id)
+
+    def insert(self, index: int, message: Message):
+        with self._lock:
+            if self._shared:
+                if message in self:
+                    return
+                self._materialize()
+            super().insert(index, message)
+
+    def clear(self):
+        with self._lock:
+            if not self._shared:
+                return super().clear()
+            self._start = self._end = self._floor = self.log.end
+            self._holes = set()
+            self.version += 1
+
+    def __repr__(self) -> str:
+        return f'SharedMessageView({list(self)!r})'
+
+
+class SharedLog:
+    """进程内共享的聊天记录，按 chat 保存 SharedChatLog"""
+
+    def __init__(self):
+        self._chats: Dict[str, SharedChatLog] = {}
+        self._lock = threading.Lock()
+
+    def chat(self, chat_id: str) -> SharedChatLog:
+        log = self._chats.get(chat_id)
+        if log is None:
+            with self._lock:
+                log = self._chats.setdefault(chat_id, SharedChatLog(chat_id))
+        return log
+
+    def view(self, chat_id: str) -> SharedMessageView:
+        """创建该 chat 的一个新视图"""
+        return SharedMessageView(self.chat(chat_id))
+
+    def intern_wire(self, data: dict) -> Message:
+        """把线路上收到的消息转换为 Message，同一条消息只校验一次"""
+        return self.chat(data['chat_id']).intern_wire(data)
+
+    def bind(self, client):
+        """让成员客户端的聊天记录引用这份共享日志，需要在收到消息之前调用"""
+        client.memory.use_shared_log(self)
+        return client
+
+    def stats(self) -> dict:
+        chats = list(self._chats.values())
+        views = [view for log in chats for view in list(log._views)]
+        return {
+            'chats': len(chats),
+            'messages': sum(len(log) for log in chats),
+            'shared_views': len(views),
+            'holes': sum(len(view._holes) for view in views),
+        }
+
+
+_default_shared_log: Optional[SharedLog] = None
+_default_shared_log_lock = threading.Lock()
+
+
+def get_default_shared_log() -> SharedLog:
+    """进程内所有智能体共用的共享日志"""
+    global _default_shared_log
+    if _default_shared_log is None:
+        with _default_shared_log_lock:
+            if _default_shared_log is None:
+                _default_shared_log = SharedLog()
+    return _default_shared_log
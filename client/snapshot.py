@@ -0,0 +1,388 @@
+"""聊天记录与智能体状态的二进制快照
+
+用于暂停一组智能体后快速恢复（如部署时），或把狼人杀游戏回放到某一天。
+按 JSON 保存再用 pydantic 逐条校验恢复，百万条消息需要几分钟；快照恢复时只读取元数据，
+各 chat 的消息在第一次访问时才从 mmap 中解码，并且跳过校验。
+
+文件格式（整数均为小端）:
+    头部    MAGIC(8 字节) + 元数据偏移(uint64) + 元数据长度(uint64)
+    消息块  每个 chat 一块，MessagePack 编码的列数组
+            [message_id, message, message_type, from_member_id, from_member_name, timestamp, hlc]，
+            message_type、from_member_id、from_member_name 取值很少，保存为字符串表中的下标。
+            同一进程中多个成员的同一 chat 只保存一次
+    下标块  成员的消息不是消息块中连续一段时，保存其行号列表
+    元数据  MessagePack 编码的字典：字符串表、各消息块的位置、各成员的 chat 列表、参考聊天和智能体状态
+
+用法:
+    save_agents('day3.snap', [host] + players)
+    snapshot = restore_agents('day3.snap', [host] + players)  # 在 login 之前调用
+"""
+import mmap
+import os
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import msgpack
+
+from .clock import order_key
+from .dto import Message
+from .memory import AgentChat, AgentChats, MessageStore
+
+MAGIC = b'AGSNAP\x00\x01'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sQQ')
+
+_MESSAGE_FIELDS = set(Message.model_fields)
+_new = object.__new__
+_set = object.__setattr__
+
+
+def _restore_message(chat_id: str, message_id: str, text: str, message_type: str, from_member_id: str,
+                     from_member_name: str, timestamp: str, hlc: int) -> Message:
+    """用快照中的可信数据直接构造 Message，跳过校验，结果与 Message.model_construct 相同"""
+    message = _new(Message)
+    _set(message, '__dict__', {
+        'message': text,
+        'message_type': message_type,
+        'chat_id': chat_id,
+        'from_member_id': from_member_id,
+        'from_member_name': from_member_name,
+        'timestamp': timestamp,
+        'message_id': message_id,
+        'hlc': hlc,
+    })
+    _set(message, '__pydantic_fields_set__', _MESSAGE_FIELDS)
+    _set(message, '__pydantic_extra__', None)
+    _set(message, '__pydantic_private__', None)
+    return message
+
+
+class LazyMessageStore(MessageStore):
+    """快照中的一个 chat，第一次访问消息时才解码
+
+    len() 和 version 不需要解码；其余操作先解码全部消息，之后与普通 MessageStore 相同。
+    """
+
+    _loader: Optional[Callable[[], List[Message]]] = None
+
+    def __init__(self, loader: Callable[[], List[Message]], count: int, time_sorted: bool, last_key: int):
+        super().__init__()
+        self._loader = loader
+        self._count = count
+        self._time_sorted = time_sorted
+        self._last_key = last_key
+
+    # MessageStore 的方法都通过 _items 和 _positions 访问消息，在这里触发解码；
+    # 整体赋值（如 clear）时不再需要快照中的内容
+    @property
+    def _items(self) -> List[Optional[Message]]:
+        if self._loader is not None:
+            self._load()
+        return self._item_list
+
+    @_items.setter
+    def _items(self, value: List[Optional[Message]]):
+        self._loader = None
+        self._item_list = value
+
+    @property
+    def _positions(self) -> Dict[str, int]:
+        if self._loader is not None:
+            self._load()
+        return self._position_map
+
+    @_positions.setter
+    def _positions(self, value: Dict[str, int]):
+        self._loader = None
+        self._position_map = value
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def _load(self):
+        with self._lock:
+            loader = self._loader
+            if loader is None:
+                return
+            messages = loader()
+            self._item_list = messages
+            self._position_map = {m.message_id: i for i, m in enumerate(messages)}
+            self._loader = None
+
+    def __len__(self) -> int:
+        if self._loader is not None:
+            return self._count
+        return super().__len__()
+
+
+class _LogWriter:
+    """同一 chat 在所有成员中出现过的消息，按首次出现的顺序编号"""
+
+    __slots__ = ('messages', 'rows')
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        # message_id -> 行号
+        self.rows: Dict[str, int] = {}
+
+    def row(self, message: Message) -> int:
+        row = self.rows.get(message.message_id)
+        if row is None:
+            row = self.rows[message.message_id] = len(self.messages)
+            self.messages.append(message)
+        return row
+
+
+def write_snapshot(path: str, members: Dict[str, AgentChats], states: Dict[str, dict] = None) -> int:
+    """把若干成员的聊天记录和状态写入快照文件
+
+    先写入临时文件再替换，写入过程中崩溃不会损坏已有的快照。每个 chat 在持有其锁时复制，
+    写入期间其他线程可以继续收发消息。
+
+    Args:
+        path: 快照文件路径
+        members: 成员ID -> 聊天记录
+        states: 成员ID -> 智能体状态，值需要能用 MessagePack 编码
+
+    Returns:
+        int: 写入的消息数，同一条消息在多个成员中只计一次
+    """
+    states = states or {}
+    logs: Dict[str, _LogWriter] = {}
+    member_chats: Dict[str, List[Tuple[str, List[int], List[Message]]]] = {}
+    for member_id, memory in members.items():
+        entries = member_chats[member_id] = []
+        for chat_id, chat in list(memory.chats.items()):
+            messages = memory.copy_messages(chat_id)
+            log = logs.setdefault(chat_id, _LogWriter())
+            entries.append((chat_id, [log.row(message) for message in messages], messages))
+
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        index = string_ids.get(value)
+        if index is None:
+            index = string_ids[value] = len(strings)
+            strings.append(value)
+        return index
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, 0, 0))
+
+        def write_block(value) -> List[int]:
+            data = msgpack.packb(value, use_bin_type=True)
+            offset = f.tell()
+            f.write(data)
+            return [offset, len(data)]
+
+        log_blocks = {}
+        for chat_id, log in logs.items():
+            columns = ([], [], [], [], [], [], [])
+            ids, texts, types, senders, names, timestamps, hlcs = columns
+            for message in log.messages:
+                ids.append(message.message_id)
+                texts.append(message.message)
+                types.append(intern(message.message_type))
+                senders.append(intern(message.from_member_id))
+                names.append(intern(message.from_member_name))
+                timestamps.append(message.timestamp)
+                hlcs.append(message.hlc)
+            log_blocks[chat_id] = write_block(list(columns)) + [len(log.messages)]
+
+        meta_members = {}
+        for member_id, entries in member_chats.items():
+            memory = members[member_id]
+            chats = []
+            for chat_id, rows, messages in entries:
+                entry = {
+                    'chat_id': chat_id,
+                    'count': len(rows),
+                    'time_sorted': all(order_key(a) <= order_key(b) for a, b in zip(messages, messages[1:])),
+                    'last_key': order_key(messages[-1]) if messages else 0,
+                    'last_id': messages[-1].message_id if messages else None,
+                    # 他人消息的最大 HLC，恢复后作为补拉游标
+                    'peer_hlc': max((m.hlc for m in messages if m.from_member_id != member_id), default=0),
+                }
+                start = rows[0] if rows else 0
+                if rows == list(range(start, start + len(rows))):
+                    entry['range'] = [start, start + len(rows)]
+                else:
+                    entry['index'] = write_block(rows)
+                chats.append(entry)
+            meta_members[member_id] = {
+                'chats': chats,
+                'reference_chats': {k: list(v) for k, v in memory.reference_chats.items()},
+                'state': states.get(member_id) or {},
+            }
+
+        meta_offset, meta_length = write_block({
+            'version': FORMAT_VERSION,
+            'strings': strings,
+            'logs': log_blocks,
+            'members': meta_members,
+        })
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, meta_offset, meta_length))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return sum(len(log.messages) for log in logs.values())
+
+
+class Snapshot:
+    """只读打开的快照文件
+
+    恢复后各 chat 的 LazyMessageStore 引用该对象，解码前需要保持打开；
+    同一 chat 在多个成员中共用解码出的 Message 对象。
+
+    Args:
+        path: 快照文件路径
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_offset, meta_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f'{path} 不是聊天记录快照')
+        meta = self._unpack([meta_offset, meta_length])
+        if meta.get('version') != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f'不支持的快照版本 {meta.get("version")}')
+        self._strings: List[str] = meta['strings']
+        self._log_blocks: Dict[str, List[int]] = meta['logs']
+        self._members: Dict[str, dict] = meta['members']
+        # chat_id -> 解码后的消息
+        self._logs: Dict[str, List[Message]] = {}
+        self._lock = threading.Lock()
+
+    def _unpack(self, block: List[int]):
+        if self._mmap.closed:
+            raise ValueError(f'快照 {self.path} 已关闭')
+        offset, length = block[0], block[1]
+        return msgpack.unpackb(self._mmap[offset:offset + length], raw=False, strict_map_key=False)
+
+    @property
+    def members(self) -> List[str]:
+        return list(self._members)
+
+    def message_count(self) -> int:
+        """快照中的消息数，同一条消息在多个成员中只计一次"""
+        return sum(block[2] for block in self._log_blocks.values())
+
+    def state(self, member_id: str) -> dict:
+        member = self._members.get(member_id)
+        return member['state'] if member else {}
+
+    def cursors(self, member_id: str) -> Dict[str, Tuple[Optional[str], int]]:
+        """chat_id -> (最后一条消息ID, 他人消息的最大 HLC)，用于恢复后补拉离线期间的消息"""
+        member = self._members.get(member_id)
+        if not member:
+            return {}
+        return {entry['chat_id']: (entry['last_id'], entry['peer_hlc']) for entry in member['chats']}
+
+    def _load_log(self, chat_id: str) -> List[Message]:
+        log = self._logs.get(chat_id)
+        if log is not None:
+            return log
+        with self._lock:
+            log = self._logs.get(chat_id)
+            if log is None:
+                strings = self._strings
+                ids, texts, types, senders, names, timestamps, hlcs = self._unpack(self._log_blocks[chat_id])
+                log = self._logs[chat_id] = [
+                    _restore_message(chat_id, message_id, text, strings[t], strings[s], strings[n], timestamp, hlc)
+                    for message_id, text, t, s, n, timestamp, hlc
+                    in zip(ids, texts, types, senders, names, timestamps, hlcs)
+                ]
+        return log
+
+    def load_chat(self, member_id: str, chat_id: str) -> List[Message]:
+        """解码一个成员的一个 chat，返回新的列表"""
+        for entry in self._members[member_id]['chats']:
+            if entry['chat_id'] == chat_id:
+                return self._load_entry(entry)
+        raise KeyError(chat_id)
+
+    def _load_entry(self, entry: dict) -> List[Message]:
+        log = self._load_log(entry['chat_id'])
+        if 'range' in entry:
+            start, stop = entry['range']
+            return log[start:stop]
+        return [log[row] for row in self._unpack(entry['index'])]
+
+    def restore(self, memory: AgentChats, member_id: str = None) -> int:
+        """用快照替换聊天记录中的对应 chat，不写入持久化后端，也不执行保留策略
+
+        Args:
+            memory: 要恢复的聊天记录
+            member_id: 快照中的成员ID，默认为 memory.member_id
+
+        Returns:
+            int: 恢复的消息数
+        """
+        member = self._members.get(member_id or memory.member_id)
+        if member is None:
+            return 0
+        restored = 0
+        for entry in member['chats']:
+            store = LazyMessageStore(lambda entry=entry: self._load_entry(entry), entry['count'],
+                                     entry['time_sorted'], entry['last_key'])
+            memory.replace_chat(AgentChat(chat_id=entry['chat_id'], member_id=memory.member_id, messages=store))
+            restored += entry['count']
+        for chat_id, reference_chat_ids in member['reference_chats'].items():
+            for reference_chat_id in reference_chat_ids:
+                memory.add_reference_chat(chat_id, reference_chat_id)
+        return restored
+
+    def load_all(self):
+        """解码全部消息，之后可以安全地关闭快照"""
+        for chat_id in self._log_blocks:
+            self._load_log(chat_id)
+
+    def close(self):
+        """关闭文件映射，之后访问尚未解码的 chat 会出错"""
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_agents(path: str, agents: Iterable) -> int:
+    """把一组智能体的聊天记录和状态（get_state）写入同一个快照
+
+    Returns:
+        int: 写入的消息数
+    """
+    agents = list(agents)
+    members = {agent.member_id: agent.memory for agent in agents}
+    states = {agent.member_id: agent.get_state() for agent in agents if hasattr(agent, 'get_state')}
+    return write_snapshot(path, members, states)
+
+
+def restore_agents(path: Union[str, Snapshot], agents: Iterable, resume: bool = True) -> Snapshot:
+    """从快照恢复一组智能体，需要在 login 之前调用
+
+    Args:
+        path: 快照文件路径或已打开的 Snapshot
+        agents: 带有 restore_snapshot 的智能体，见 MemberClientWithChats
+        resume: 登录后是否向服务器补拉快照之后的消息
+
+    Returns:
+        Snapshot: 打开的快照，各 chat 在第一次访问时从中解码
+    """
+    snapshot = path if isinstance(path, Snapshot) else Snapshot(path)
+    for agent in agents:
+        agent.restore_snapshot(snapshot, resume=resume)
+    return snapshot
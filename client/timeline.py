@@ -0,0 +1,186 @@
+"""主聊天与参考聊天的合并时间线
+
+get_all_messages 原来每次都把主聊天和所有参考聊天的消息拼起来按时间戳重新排序，
+历史越长，每次回复和投票越慢。MergedTimeline 保存合并后的有序结果，读取时只合并各 chat 新追加的消息。
+"""
+import bisect
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .dto import Message
+from .clock import from_timestamp, order_key
+from .memory import AgentChats, MessageStore
+
+# (HLC, 来源 chat 的序号, 在来源 chat 中的到达序号)；HLC 相同时主聊天在前，同一 chat 内按到达顺序
+_Key = Tuple[int, int, int]
+
+
+class _Source:
+    """一个来源 chat 已合并到时间线的状态"""
+
+    __slots__ = ('store', 'version', 'count', 'next_seq', 'keys')
+
+    def __init__(self, store: MessageStore):
+        self.store = store
+        self.version = store.version
+        self.count = 0
+        self.next_seq = 0
+        # message_id -> 排序键
+        self.keys: Dict[str, _Key] = {}
+
+
+class MergedTimeline:
+    """主聊天及其参考聊天按 HLC 排列的合并视图
+
+    读取时与各 chat 的 MessageStore 同步：
+    - 自上次读取以来只追加过消息的 chat，只把新消息合并进来；新消息通常是最新的，直接追加到末尾，否则二分插入
+    - 发生过删除、替换等修改的 chat（MessageStore.version 变化），按 message_id 比对后增删差异部分
+    - 来源 chat 列表变化时，用 heapq.merge 对各 chat 已排序的消息做多路归并重建
+
+    Args:
+        memory: 聊天记录
+        chat_ids: 主聊天ID在前，其后为参考聊天ID
+    """
+
+    def __init__(self, memory: AgentChats, chat_ids: Sequence[str]):
+        self.memory = memory
+        self.chat_ids: List[str] = []
+        self._sources: Dict[str, _Source] = {}
+        self._keys: List[_Key] = []
+        self._messages: List[Message] = []
+        self._lock = threading.RLock()
+        self.set_chats(chat_ids)
+
+    def set_chats(self, chat_ids: Sequence[str]):
+        """设置来源 chat，列表变化时重建"""
+        chat_ids = list(dict.fromkeys(chat_ids))
+        with self._lock:
+            if chat_ids != self.chat_ids:
+                self.chat_ids = chat_ids
+                self._rebuild()
+
+    def _rebuild(self):
+        self._sources = {}
+        runs = []
+        for index, chat_id in enumerate(self.chat_ids):
+            store = self.memory.get_chat(chat_id).messages
+            with store.lock:
+                source = self._sources[chat_id] = _Source(store)
+                run = [(self._assign_key(source, index, message), message) for message in store]
+            # 乱序到达的 chat 单独排序，其余 chat 本身已有序
+            if not source.store._time_sorted:
+                run.sort(key=lambda item: item[0])
+            runs.append(run)
+        merged = list(heapq.merge(*runs, key=lambda item: item[0]))
+        self._keys = [key for key, _ in merged]
+        self._messages = [message for _, message in merged]
+
+    @staticmethod
+    def _assign_key(source: _Source, index: int, message: Message) -> _Key:
+        key = (order_key(message), index, source.next_seq)
+        source.next_seq += 1
+        source.keys[message.message_id] = key
+        source.count += 1
+        return key
+
+    def _insert(self, key: _Key, message: Message):
+        if not self._keys or key >= self._keys[-1]:
+            self._keys.append(key)
+            self._messages.append(message)
+            return
+        position = bisect.bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._messages.insert(position, message)
+
+    def _sync(self):
+        """把各来源 chat 自上次同步以来的变化合并进来，调用方持有锁"""
+        for index, chat_id in enumerate(self.chat_ids):
+            source = self._sources[chat_id]
+            store = self.memory.get_chat(chat_id).messages
+            if store is not source.store:
+                # chat 被整体替换
+                self._rebuild()
+                return
+            with store.lock:
+                self._sync_source(index, source, store)
+
+    def _sync_source(self, index: int, source: _Source, store: MessageStore):
+        """合并一个来源 chat 的变化，调用方持有 store 的锁，保证比较 version 与读取消息之间 store 不被修改"""
+        if store.version == source.version:
+            if len(store) > source.count:
+                for message in store.range(source.count):
+                    self._insert(self._assign_key(source, index, message), message)
+            return
+
+        removed = {message_id: key for message_id, key in source.keys.items() if message_id not in store}
+        if removed:
+            self._remove(removed.values())
+            for message_id in removed:
+                del source.keys[message_id]
+            source.count -= len(removed)
+        if len(store) > source.count:
+            for message in store:
+                if message.message_id not in source.keys:
+                    self._insert(self._assign_key(source, index, message), message)
+        source.version = store.version
+
+    def _remove(self, keys):
+        """按排序键删除消息，少量删除时二分定位，否则整体过滤"""
+        keys = list(keys)
+        if len(keys) <= 8:
+            for key in keys:
+                position = bisect.bisect_left(self._keys, key)
+                if position < len(self._keys) and self._keys[position] == key:
+                    del self._keys[position]
+                    del self._messages[position]
+            return
+        removed = set(keys)
+        kept = [(key, message) for key, message in zip(self._keys, self._messages) if key not in removed]
+        self._keys = [key for key, _ in kept]
+        self._messages = [message for _, message in kept]
+
+    def messages(self) -> List[Message]:
+        """按时间排列的全部消息"""
+        with self._lock:
+            self._sync()
+            return list(self._messages)
+
+    def ordered(self, messages: Iterable[Message]) -> List[Message]:
+        """把来源 chat 中的若干消息按时间线的顺序排列，不在时间线中的消息被丢弃"""
+        with self._lock:
+            self._sync()
+            keyed = []
+            for message in messages:
+                source = self._sources.get(message.chat_id)
+                key = source.keys.get(message.message_id) if source is not None else None
+                if key is not None:
+                    keyed.append((key, message))
+        keyed.sort(key=lambda item: item[0])
+        return [message for _, message in keyed]
+
+    def tail(self, count: int) -> List[Message]:
+        """最近的 count 条消息"""
+        with self._lock:
+            self._sync()
+            return self._messages[-count:] if count > 0 else []
+
+    def window(self, since: Union[str, datetime, int] = None,
+               until: Union[str, datetime, int] = None) -> List[Message]:
+        """时间在 [since, until) 内的消息，since 和 until 可以是时间戳字符串、datetime 或 HLC"""
+        with self._lock:
+            self._sync()
+            lo = bisect.bisect_left(self._keys, (from_timestamp(since),)) if since is not None else 0
+            hi = bisect.bisect_left(self._keys, (from_timestamp(until),)) if until is not None else len(self._keys)
+            return self._messages[lo:hi]
+
+    def last(self) -> Optional[Message]:
+        with self._lock:
+            self._sync()
+            return self._messages[-1] if self._messages else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._messages)
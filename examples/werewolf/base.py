@@ -7,7 +7,7 @@ from pydantic import BaseModel
 from client.dto import Member
 from client.langChainMA import LangchainMemberAgent
 from client.memberClient import command
-from client.memory import AgentChat
+from client.memory import AgentChat, MessageStore
 
 # 游戏规则说明
 GameRule = """
@@ -340,7 +340,7 @@ class Villager(LangchainMemberAgent):
     def __init__(self, name: str, member_id: str, role: Role = Role.VILLAGER, style: str = '',
                  ability: str = '无特殊能力',
                  target: str = '找出狼人并投票驱逐，帮助好人阵营获得胜利',
-                 villager_chat_id: str = None):
+                 villager_chat_id: str = None, **kwargs):
         """初始化村民
         
         Args:
@@ -352,7 +352,7 @@ class Villager(LangchainMemberAgent):
             target: 玩家目标
             villager_chat_id: 村民会议聊天ID
         """
-        super().__init__(name, member_id)
+        super().__init__(name, member_id, **kwargs)
 
         # 游戏状态
         self.is_alive: bool = True
@@ -365,6 +365,8 @@ class Villager(LangchainMemberAgent):
 
         # 聊天相关
         self.villager_chat_id = villager_chat_id
+        # 较早的发言由后台摘要代替，长局中每轮提示词的 token 数保持平稳；摘要在看到相同发言的玩家之间共享
+        self.enable_compaction()
 
         # 初始化提示词
         self.prompt = PromptTemplate.get_base_prompt(name, role.value, ability, target, style)
@@ -379,6 +381,18 @@ class Villager(LangchainMemberAgent):
             self.style
         )
 
+    def get_state(self) -> dict:
+        """保存到快照中的游戏状态"""
+        state = super().get_state()
+        state['is_alive'] = self.is_alive
+        return state
+
+    def set_state(self, state: dict):
+        """从快照恢复游戏状态"""
+        super().set_state(state)
+        self.is_alive = state.get('is_alive', self.is_alive)
+        self.update_prompt()
+
     @command()
     def vote(self, data: dict):
         """进行投票
@@ -401,13 +415,14 @@ class Villager(LangchainMemberAgent):
         temp_chat = AgentChat(
             chat_id='temp-vote',
             member_id=self.member_id,
-            messages=self.get_all_messages(self.villager_chat_id)
+            messages=MessageStore.from_unique(self.get_all_messages(self.villager_chat_id))
         )
         temp_chat.messages.append(vote_message)
         temp_chat.save_to_txt()
         # 获取AI响应并提取投票目标
         self.update_prompt()
-        res = self.get_ai_response(self.prompt, temp_chat)
+        # 历史消息加上本轮提示，整体裁剪到上下文预算内
+        res = self.get_ai_response(self.prompt, self.fit_to_budget(self.prompt, temp_chat))
         print(f'{self.name}的回复: {res}')
         candidate = get_target(res, 'VOTETO')
 
@@ -472,7 +487,7 @@ class Witch(Villager):
     每晚只能使用一种药水。
     """
 
-    def __init__(self, name: str, member_id: str, style: str, villager_chat_id: str):
+    def __init__(self, name: str, member_id: str, style: str, villager_chat_id: str, **kwargs):
         """初始化女巫角色
         
         Args:
@@ -487,12 +502,23 @@ class Witch(Villager):
             style=style,
             ability='每晚可以使用一瓶解药救人或使用一瓶毒药杀人，每种药水只能使用一次',
             target='找出狼人并投票驱逐，帮助好人阵营获得胜利',
-            villager_chat_id=villager_chat_id
+            villager_chat_id=villager_chat_id,
+            **kwargs
         )
         # 药水状态
         self.has_save: bool = True  # 是否还有解药
         self.has_kill: bool = True  # 是否还有毒药
 
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state.update(has_save=self.has_save, has_kill=self.has_kill)
+        return state
+
+    def set_state(self, state: dict):
+        self.has_save = state.get('has_save', self.has_save)
+        self.has_kill = state.get('has_kill', self.has_kill)
+        super().set_state(state)
+
     @command('save-or-kill')
     def save_or_kill(self, data: dict) -> str:
         """处理救人或杀人的选择
@@ -519,7 +545,7 @@ class Witch(Villager):
         temp_chat = AgentChat(
             chat_id='temp-witch',
             member_id=self.member_id,
-            messages=self.get_all_messages(self.villager_chat_id)
+            messages=MessageStore.from_unique(self.get_all_messages(self.villager_chat_id))
         )
 
         # 添加提示到聊天记录
@@ -528,7 +554,8 @@ class Witch(Villager):
 
         # 获取AI响应并处理结果
         self.update_prompt()
-        res = self.get_ai_response(self.prompt, temp_chat)
+        # 历史消息加上本轮提示，整体裁剪到上下文预算内
+        res = self.get_ai_response(self.prompt, self.fit_to_budget(self.prompt, temp_chat))
         print(f'女巫的回答: {res}')
 
         # 解析行动结果
@@ -574,7 +601,7 @@ class Prophet(Villager):
     预言家每晚可以验证一名玩家的身份。
     """
 
-    def __init__(self, name: str, member_id: str, style: str, villager_chat_id: str):
+    def __init__(self, name: str, member_id: str, style: str, villager_chat_id: str, **kwargs):
         """初始化预言家角色
         
         Args:
@@ -590,11 +617,21 @@ class Prophet(Villager):
             style=style,
             ability='每晚可以验证一名玩家的身份',
             target='找出狼人并投票驱逐，帮助好人阵营获得胜利',
-            villager_chat_id=villager_chat_id
+            villager_chat_id=villager_chat_id,
+            **kwargs
         )
         # 已验证的玩家信息
         self.verify_dict: Dict[str, str] = {}
 
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state['verify_dict'] = dict(self.verify_dict)
+        return state
+
+    def set_state(self, state: dict):
+        self.verify_dict = dict(state.get('verify_dict', self.verify_dict))
+        super().set_state(state)
+
     @command('get-verify-target')
     def get_verify_target(self, data: dict) -> Optional[str]:
         """选择要验证的目标玩家
@@ -627,7 +664,7 @@ class Prophet(Villager):
         temp_chat = AgentChat(
             chat_id='temp-prophet',
             member_id=self.member_id,
-            messages=self.get_all_messages(self.villager_chat_id)
+            messages=MessageStore.from_unique(self.get_all_messages(self.villager_chat_id))
         )
         # print('预言家的prompt:', verify_prompt)
         # 添加提示到聊天记录
@@ -636,7 +673,8 @@ class Prophet(Villager):
 
         # 获取AI响应并提取验证目标
         self.update_prompt()
-        res = self.get_ai_response(self.prompt, temp_chat)
+        # 历史消息加上本轮提示，整体裁剪到上下文预算内
+        res = self.get_ai_response(self.prompt, self.fit_to_budget(self.prompt, temp_chat))
         print('预言家思考:', res)
 
         target = get_target(res, 'VERIFY')
@@ -682,7 +720,8 @@ class Werewolf(Villager):
     狼人可以在夜晚与队友讨论并选择一名玩家袭击。
     """
 
-    def __init__(self, name: str, member_id: str, style: str, villager_chat_id: str, werewolf_chat_id: str):
+    def __init__(self, name: str, member_id: str, style: str, villager_chat_id: str, werewolf_chat_id: str,
+                 **kwargs):
         """初始化狼人角色
         
         Args:
@@ -697,7 +736,8 @@ class Werewolf(Villager):
             style=style,
             ability='在夜晚可以与其他狼人商议后袭击一名玩家',
             target='在白天学会伪装隐藏自己的真实身份，与其他狼人合作，消灭所有好人阵营玩家',
-            villager_chat_id=villager_chat_id
+            villager_chat_id=villager_chat_id,
+            **kwargs
         )
         # 狼人相关
         self.teammates: List[str] = []  # 狼人队友列表
@@ -708,6 +748,16 @@ class Werewolf(Villager):
         self.add_reference_chat(self.villager_chat_id, self.werewolf_chat_id)
         self.add_reference_chat(self.werewolf_chat_id, self.villager_chat_id)
 
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state.update(teammates=list(self.teammates), host_member_id=self.host_member_id)
+        return state
+
+    def set_state(self, state: dict):
+        self.teammates = list(state.get('teammates', self.teammates))
+        self.host_member_id = state.get('host_member_id', self.host_member_id)
+        super().set_state(state)
+
     def update_prompt(self):
         """更新狼人的提示词，包含队友信息"""
         teammates_prompt = self.get_teammates_prompt()
@@ -1,9 +1,12 @@
+import os
 import re
+from concurrent.futures import Future
 from typing import Callable, List, Optional, Dict, Tuple
 
-from base import Role, GameState, GameTime, VillagerInfo, get_most_voted
+from base import Role, GameState, GameTime, VillagerInfo, DayInfo, get_most_voted
 from client.chatManager import BaseChatManager
 from client.dto import Message
+from client.snapshot import save_agents
 from daysInfoManager import DaysInfoManager
 
 
@@ -13,7 +16,7 @@ class BaseHost(BaseChatManager):
     负责管理村民信息和基本的游戏状态。
     """
 
-    def __init__(self, name: str, member_id: str, villager_ids: List[str]):
+    def __init__(self, name: str, member_id: str, villager_ids: List[str], **kwargs):
         """初始化主持人
         
         Args:
@@ -21,7 +24,7 @@ class BaseHost(BaseChatManager):
             member_id: 主持人ID
             villager_ids: 村民ID列表
         """
-        super().__init__(name, member_id)
+        super().__init__(name, member_id, **kwargs)
         self.villager_ids = villager_ids
         self.villagers: List[VillagerInfo] = []
         self.game_time = GameTime()
@@ -157,16 +160,27 @@ class GameHost(BaseHost):
     使用状态模式管理不同阶段的游戏流程。
     """
 
-    def __init__(self, name: str, member_id: str, villager_ids: List[str]=None):
-        super().__init__(name, member_id, villager_ids)
+    def __init__(self, name: str, member_id: str, villager_ids: List[str]=None, **kwargs):
+        super().__init__(name, member_id, villager_ids, **kwargs)
         # 游戏状态
         self.game_state = GameState.INIT
         self.days_manager = DaysInfoManager()  # 使用 DaysInfoManager 替代 days_info 字典
+        # 主持人需要在聊天记录中查找指令（如狼人的 ATTACK ... TERMINATE），启用全文索引
+        self.memory.enable_index()
+        # 每天的发言由历史摘要的线程池在后台总结，写入 DayInfo.day_summary
+        self.enable_compaction()
+        # 当天第一条消息在村民会议中的位置，天数 -> 正在生成的发言总结
+        self.day_start_index = 0
+        self.pending_day_summaries: Dict[int, Future] = {}
 
         # 聊天频道
         self.villagers_chat_id: str = None  # 村民会议（所有人的公共频道）
         self.wolves_chat_id: str = None  # 狼人会议（狼人的私密频道）
 
+        # 设置后每个阶段开始时把 snapshot_agents 的聊天记录和状态写入该目录，用于从某一天回放
+        self.snapshot_directory: Optional[str] = None
+        self.snapshot_agents: List = []
+
         # 状态处理器映射
         self.handlers: Dict[GameState, Callable[[Message], None]] = {
             # 夜晚阶段
@@ -179,6 +193,54 @@ class GameHost(BaseHost):
             GameState.WILL: self.handle_will_phase,
         }
 
+    def get_state(self) -> dict:
+        """保存到快照中的游戏进度"""
+        self.collect_day_summaries()
+        state = super().get_state()
+        state.update(
+            game_state=self.game_state.name,
+            game_time=list(self.game_time.get_time()),
+            days_info={day: info.model_dump() for day, info in self.days_manager.days_info.items()},
+            villager_ids=list(self.villager_ids or []),
+            villagers_chat_id=self.villagers_chat_id,
+            wolves_chat_id=self.wolves_chat_id,
+        )
+        return state
+
+    def set_state(self, state: dict):
+        """从快照恢复游戏进度"""
+        super().set_state(state)
+        if 'game_state' in state:
+            self.game_state = GameState[state['game_state']]
+        if 'game_time' in state:
+            self.game_time.set_time(*state['game_time'])
+        if 'days_info' in state:
+            self.days_manager.days_info = {int(day): DayInfo(**info) for day, info in state['days_info'].items()}
+        self.villager_ids = state.get('villager_ids', self.villager_ids)
+        self.villagers_chat_id = state.get('villagers_chat_id', self.villagers_chat_id)
+        self.wolves_chat_id = state.get('wolves_chat_id', self.wolves_chat_id)
+
+    def save_phase_snapshot(self) -> Optional[str]:
+        """把当前阶段开始时所有智能体的聊天记录和状态写入 snapshot_directory
+
+        Returns:
+            Optional[str]: 快照文件路径，未设置 snapshot_directory 时返回 None
+        """
+        if not self.snapshot_directory:
+            return None
+        day_number, is_day = self.game_time.get_time()
+        path = os.path.join(self.snapshot_directory, f'day{day_number}-{"day" if is_day else "night"}.snap')
+        count = save_agents(path, self.snapshot_agents or [self])
+        print(f'已保存{self.game_time}的快照 {path}，共 {count} 条消息')
+        return path
+
+    def resume_game(self):
+        """从快照恢复后，从所在阶段的开头继续游戏"""
+        if self.game_time.is_day:
+            self.start_day_phase()
+        else:
+            self.start_night_phase()
+
     def init_game(self):
         """初始化游戏"""
         self.update_villagers_info()
@@ -233,7 +295,7 @@ class GameHost(BaseHost):
             death_msg = f'昨晚，{", ".join(deaths)} 玩家死亡。'
         else:
             death_msg = '昨晚是平安夜，没有玩家死亡。'
-        self.send_message(death_msg, self.villagers_chat_id)
+        self.send_message_async(death_msg, self.villagers_chat_id)
 
         if not self.check_game_over():
             # 进入发言阶段
@@ -246,7 +308,7 @@ class GameHost(BaseHost):
         """处理投票结果阶段"""
         most_voted_name = self.days_manager.get_day_info(self.game_time.day_number).out
         if most_voted_name:
-            self.send_message(f'{most_voted_name} 被投票驱逐出局。', self.villagers_chat_id)
+            self.send_message_async(f'{most_voted_name} 被投票驱逐出局。', self.villagers_chat_id)
             most_voted_player = self.get_villager_info_by_name(most_voted_name)
             if most_voted_player:
                 self.game_state = GameState.WILL
@@ -386,9 +448,13 @@ class GameHost(BaseHost):
         alive_player_ids = [p.member_id for p in alive_players]
         alive_player_names = [p.name for p in alive_players]
 
-        votes_res = self.send_command('vote', alive_player_ids,
-                                      {'candidates': alive_player_names})
-        votes = [vote.result for vote in votes_res]
+        # 每收到一票就计入，不必等待所有玩家都投完
+        votes = []
+        for vote in self.iter_command_results('vote', alive_player_ids,
+                                              {'candidates': alive_player_names}, timeout=300):
+            if vote.error is None and vote.result:
+                votes.append(vote.result)
+                print(f'{vote.command.to} 已投票，当前 {len(votes)}/{len(alive_player_ids)} 票')
 
         most_voted_name = get_most_voted(votes)
         most_voted_player = self.get_villager_info_by_name(most_voted_name)
@@ -399,13 +465,14 @@ class GameHost(BaseHost):
         if not self.check_game_over():
             # 进入遗言阶段
             self.game_state = GameState.WILL
-            self.send_message(f'{most_voted_name} 被驱逐，请发表遗言。', self.villagers_chat_id)
+            self.send_message_async(f'{most_voted_name} 被驱逐，请发表遗言。', self.villagers_chat_id)
             self.choose_next_speaker(self.villagers_chat_id, most_voted_player.member_id)
 
     def handle_will_phase(self, message: Message):
         """处理遗言阶段"""
         print(f'{message.from_member_name}已发表遗言:{message.message}')
         print('遗言阶段结束，准备进入夜晚')
+        self.summarize_day(self.game_time.day_number)
         # 遗言结束，进入夜晚
         self.game_time.next_phase()
         self.start_night_phase()
@@ -432,7 +499,7 @@ class GameHost(BaseHost):
         target_names = [p.name for p in alive_players]
 
         # 主持人在狼人频道宣布开始
-        self.send_message(
+        self.send_message_async(
             f'狼人请睁眼。\n'
             f'今晚的狼人们：{", ".join(wolf_names)}\n'
             f'可以袭击的目标：{", ".join(target_names)}\n'
@@ -448,12 +515,10 @@ class GameHost(BaseHost):
 
     def process_wolf_kill(self) -> Optional[str]:
         """处理狼人的击杀结果"""
-        messages = self.memory.get_chat(self.wolves_chat_id).messages
-        final_message = next((msg.message for msg in reversed(messages)
-                              if 'TERMINATE' in msg.message.upper() and 'ATTACK' in msg.message.upper()), None)
-
-        if not final_message:
+        found = self.memory.search('ATTACK TERMINATE', chat_id=self.wolves_chat_id, limit=1)
+        if not found:
             return None
+        final_message = found[0].message
 
         target = None
         match = re.search(r'ATTACK\s+([^\s]+)\s+TERMINATE', final_message.upper())
@@ -461,7 +526,7 @@ class GameHost(BaseHost):
             target = match.group(1)
 
         if target:
-            self.send_message(f'狼人们一致决定袭击 {target}。狼人请闭眼。', self.wolves_chat_id)
+            self.send_message_async(f'狼人们一致决定袭击 {target}。狼人请闭眼。', self.wolves_chat_id)
 
         return target
 
@@ -487,7 +552,9 @@ class GameHost(BaseHost):
         """
         print(f'进入夜晚阶段，当前游戏时间：{self.game_time}')
         self.game_state = GameState.NIGHT_START
-        self.send_message('天黑请闭眼。', self.villagers_chat_id)
+        self.collect_day_summaries()
+        self.save_phase_snapshot()
+        self.send_message_async('天黑请闭眼。', self.villagers_chat_id)
         # 开始狼人杀人环节
         self.start_wolf_discussion()
 
@@ -498,11 +565,33 @@ class GameHost(BaseHost):
 
         # 初始化新的一天的信息
         self.days_manager.get_day_info(self.game_time.day_number)
-            
+        self.day_start_index = len(self.memory.get_chat(self.villagers_chat_id).messages)
+        self.collect_day_summaries()
+
         self.game_state = GameState.DAY_START
-        self.send_message('天亮了，请大家睁眼。', self.villagers_chat_id)
+        self.save_phase_snapshot()
+        # 主持人的公告走出站队列，不逐条等待确认；choose_next_speaker 会先等待同一 chat 的公告送达
+        self.send_message_async('天亮了，请大家睁眼。', self.villagers_chat_id)
         self.handle_death_report()
 
     def add_night_message(self, day_number: int, message: str):
         """添加夜晚消息"""
         self.days_manager.add_night_message(day_number, message)
+
+    def summarize_day(self, day_number: int):
+        """在后台总结当天村民会议中的发言，完成后由 collect_day_summaries 写入 DayInfo.day_summary"""
+        messages = self.memory.get_chat(self.villagers_chat_id).messages.range(self.day_start_index)
+        if messages:
+            self.pending_day_summaries[day_number] = self.compactor.summarize_async(messages)
+
+    def collect_day_summaries(self):
+        """把已完成的发言总结写入对应的 DayInfo，在主持人自己的线程中调用，避免与其他字段的更新交错"""
+        for day_number, future in list(self.pending_day_summaries.items()):
+            if not future.done():
+                continue
+            del self.pending_day_summaries[day_number]
+            if future.exception() is not None:
+                print(f'第{day_number}天的发言总结失败: {future.exception()}')
+                continue
+            self.days_manager.update_day_info(day_number, day_summary=future.result())
+            print(f'第{day_number}天发言总结: {future.result()}')
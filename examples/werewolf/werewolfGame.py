@@ -7,6 +7,10 @@ sys.path.append(module_path)
 
 from base import Villager, Werewolf, Prophet, Witch
 from hosts import GameHost
+from client.memberClient import login_many
+from client.sharedConnection import SharedConnection
+from client.sharedLog import get_default_shared_log
+from client.snapshot import restore_agents
 
 styles = [
     "说话风格幽默，喜欢以'天哪！'开头",
@@ -23,9 +27,17 @@ styles = [
 
 
 if __name__ == '__main__':
-    host = GameHost(name='主持人', member_id='werewolf_host')
-    # host.signup()
-    host.login()
+    # python werewolfGame.py [快照文件]：指定快照时从快照所在的阶段继续游戏，快照见 snapshots 目录
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else None
+
+    # 所有智能体共用一条连接，连接数不随玩家数量增长
+    connection = SharedConnection('http://localhost:3000')
+    # 所有智能体共用一份聊天记录，同一条消息只保存一次
+    shared_log = get_default_shared_log()
+
+    host = GameHost(name='主持人', member_id='werewolf_host',
+                    socket=connection.member_socket('werewolf_host', '主持人'))
+    shared_log.bind(host)
     # _, wolves_chat = host.create_chat('wolves_chat')
     # _, villagers_chat = host.create_chat('villagers_chat')
     # print('wolves_chat_id:', wolves_chat.chat_id)
@@ -34,35 +46,46 @@ if __name__ == '__main__':
     villagers_chat_id = '2027a18b-4ec3-49c5-ad6a-5f0ab6f5f104'
     wolves_chat_id = 'b83ddd90-2363-46a2-93ab-2d135dd6234c'
 
-    # 注册
+    # 注册，每个智能体使用共享连接上自己的 socket，不再各自创建连接
+    shared = connection.member_socket
+
     villager1 = Villager(name='天真无邪小可爱', member_id='villager_001', style=styles[0],
-                         villager_chat_id=villagers_chat_id)
+                         villager_chat_id=villagers_chat_id, socket=shared('villager_001', '天真无邪小可爱'))
     villager2 = Villager(name='段子手张三', member_id='villager_002', style=styles[1],
-                         villager_chat_id=villagers_chat_id)
+                         villager_chat_id=villagers_chat_id, socket=shared('villager_002', '段子手张三'))
 
     werewolf = Werewolf(name='诗魂李白', member_id='villager_003', style=styles[2], villager_chat_id=villagers_chat_id,
-                        werewolf_chat_id=wolves_chat_id)
+                        werewolf_chat_id=wolves_chat_id, socket=shared('villager_003', '诗魂李白'))
 
-    villager3 = Villager(name='傲娇王子', member_id='villager_004', style=styles[3], villager_chat_id=villagers_chat_id)
-    prophet = Prophet(name='捣蛋鬼小明', member_id='villager_005', style=styles[4], villager_chat_id=villagers_chat_id)
+    villager3 = Villager(name='傲娇王子', member_id='villager_004', style=styles[3], villager_chat_id=villagers_chat_id,
+                         socket=shared('villager_004', '傲娇王子'))
+    prophet = Prophet(name='捣蛋鬼小明', member_id='villager_005', style=styles[4], villager_chat_id=villagers_chat_id,
+                      socket=shared('villager_005', '捣蛋鬼小明'))
 
     villager4 = Villager(name='交际花小芳', member_id='villager_006', style=styles[5],
-                         villager_chat_id=villagers_chat_id)
+                         villager_chat_id=villagers_chat_id, socket=shared('villager_006', '交际花小芳'))
 
-    witch = Witch(name='完美强迫症', member_id='villager_007', style=styles[6], villager_chat_id=villagers_chat_id)
+    witch = Witch(name='完美强迫症', member_id='villager_007', style=styles[6], villager_chat_id=villagers_chat_id,
+                  socket=shared('villager_007', '完美强迫症'))
     werewolf2 = Werewolf(name='杠精老王', member_id='villager_008', style=styles[7], villager_chat_id=villagers_chat_id,
-                         werewolf_chat_id=wolves_chat_id)
+                         werewolf_chat_id=wolves_chat_id, socket=shared('villager_008', '杠精老王'))
 
     villager6 = Villager(name='愤世嫉俗哥', member_id='villager_009', style=styles[8],
-                         villager_chat_id=villagers_chat_id)
+                         villager_chat_id=villagers_chat_id, socket=shared('villager_009', '愤世嫉俗哥'))
 
     werewolf3 = Werewolf(name='暴躁狼王', member_id='villager_010', style=styles[9], villager_chat_id=villagers_chat_id,
-                         werewolf_chat_id=wolves_chat_id)
+                         werewolf_chat_id=wolves_chat_id, socket=shared('villager_010', '暴躁狼王'))
     villagers = [villager1, villager2, werewolf, villager3, prophet, villager4, witch, werewolf2, villager6, werewolf3]
 
     for v in villagers:
         # v.signup()
-        v.login()
+        shared_log.bind(v)
+    # 快照需要在登录之前恢复，登录后补拉快照之后的消息
+    if snapshot_path:
+        restore_agents(snapshot_path, [host] + villagers)
+    # host.signup()
+    host.login()
+    login_many(villagers)
     # host.pull_members_into_chat(villagers_chat_id, [v.member_id for v in villagers])
     # host.pull_members_into_chat(wolves_chat_id, [v.member_id for v in [werewolf, werewolf2, werewolf3]])
 
@@ -74,6 +97,11 @@ if __name__ == '__main__':
     werewolf.host_member_id = host.member_id
     werewolf2.host_member_id = host.member_id
     werewolf3.host_member_id = host.member_id
+    host.snapshot_directory = 'snapshots'
+    host.snapshot_agents = [host] + villagers
     input('输入回车开始游戏')
-    host.start_night_phase()
+    if snapshot_path:
+        host.resume_game()
+    else:
+        host.start_night_phase()
     host.socket.wait()
@@ -1,5 +1,6 @@
 export enum EventsServer {
   SEND_MESSAGE = 'send_message',
+  SEND_MESSAGES = 'send_messages',
   NEXT_SPEAKER = 'next_speaker',
   SEND_COMMAND = 'send_command',
   CREATE_CHAT = 'create_chat',
@@ -22,6 +23,9 @@ export enum EventsServer {
   REGISTER_CHAT_MANAGER = 'register_chat_manager',
   LISTEN_IN_CHAT = 'listen_in_chat',
   UNLISTEN_IN_CHAT = 'unlisten_in_chat',
+  ATTACH_MEMBER = 'attach_member',
+  DETACH_MEMBER = 'detach_member',
+  SEND_COMMAND_STREAM = 'send_command_stream',
 }
 
 export enum EventsClient {
@@ -30,4 +34,7 @@ export enum EventsClient {
   RECEIVE_LOGIN_RESPONSE = 'receive_login_response',
   NEXT_SPEAKER = 'next_speaker',
   RECEIVE_NOTIFICATION_FROM_CHAT = 'receive_notification_from_chat',
+  CHAT_CHANGED = 'chat_changed',
+  CHAT_MEMBERSHIP_CHANGED = 'chat_membership_changed',
+  RECEIVE_COMMAND_RESULT = 'receive_command_result',
 }
@@ -31,7 +31,20 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
 
   // 当客户端连接时触发
   async handleConnection(client: Socket): Promise<void> {
-    const { member_id, member_name } = client.handshake.auth;
+    const { member_id, member_name, shared } = client.handshake.auth;
+    // 共享连接：连接本身不代表任何成员，成员通过 ATTACH_MEMBER 挂载
+    if (shared) {
+      client.data.shared = true;
+      client.data.members = new Set<string>();
+      client.emit(EventsClient.RECEIVE_LOGIN_RESPONSE, {
+        status: 200,
+        message: 'shared connection established',
+        data: { shared: true },
+      });
+      this.logger.log(`Shared connection ${client.id} established.`);
+      return;
+    }
+
     // 如果没有提供 member_id 和 member_name，则拒绝连接
     if (!member_id || !member_name) {
       client.emit(EventsClient.RECEIVE_LOGIN_RESPONSE, {
@@ -87,18 +100,107 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     await this.onlineMembersService.removeOnlineMemberBySocket(client);
   }
 
+  // 通知 chat 的成员、监听者和管理员 chat 信息发生了变化，客户端据此使缓存失效
+  private async notifyChatChanged(
+    chat_id: string,
+    event: EventsClient,
+    payload: any,
+    extraMembers: string[] = [],
+  ): Promise<void> {
+    const chat = await this.chatService.getChat(chat_id);
+    const targets = new Set<string>([
+      ...(chat?.members ?? []),
+      ...(chat?.chat_listeners ?? []),
+      ...(chat?.manager ? [chat.manager] : []),
+      ...extraMembers,
+    ]);
+    for (const member of targets) {
+      const socket =
+        await this.onlineMembersService.getSocketByMemberId(member);
+      if (socket?.connected) {
+        socket.emit(
+          event,
+          this.onlineMembersService.withTarget(socket, member, payload),
+        );
+      }
+    }
+  }
+
   @SubscribeMessage(EventsServer.SEND_MESSAGE)
   async handleMessage(client: Socket, data: any): Promise<any> {
-    const chat_id = data.chat_id;
+    // 消息的发送者由 from_member_id 指定，共享连接的身份字段无需转发
+    delete data.as_member_id;
     console.log('send message:', data);
 
+    const { failed, recipients } = await this.resolveRecipients(data);
+    if (failed) {
+      return failed;
+    }
+    this.messageService.stamp(data);
+    const notReceivedMembers = await this.deliverMessage(data, recipients);
+    return this.completeMessage(data, notReceivedMembers);
+  }
+
+  // 同一 chat 的一批消息：校验一次，依次发出所有消息而不等待前一条的确认，
+  // socket.io 保证同一连接上的发送顺序，确认并行等待，最后按顺序持久化
+  @SubscribeMessage(EventsServer.SEND_MESSAGES)
+  async handleSendMessages(client: Socket, data: any): Promise<any[]> {
+    const messages: any[] = data.messages ?? [];
+    console.log(`send messages: ${messages.length} to ${data.chat_id}`);
+    if (messages.length === 0) {
+      return [];
+    }
+
+    const first = messages[0];
+    const mixed = messages.some(
+      (message) =>
+        message.chat_id !== first.chat_id ||
+        message.from_member_id !== first.from_member_id,
+    );
+    if (mixed) {
+      return messages.map((message) => ({
+        message_id: message.message_id,
+        status: 'failed',
+        message: 'Batch must contain messages of one sender in one chat',
+      }));
+    }
+
+    const { failed, recipients } = await this.resolveRecipients(first);
+    if (failed) {
+      return messages.map((message) => ({
+        ...failed,
+        message_id: message.message_id,
+      }));
+    }
+
+    messages.forEach((message) => this.messageService.stamp(message));
+    const deliveries = messages.map((message) =>
+      this.deliverMessage(message, recipients),
+    );
+    const results = [];
+    for (let i = 0; i < messages.length; i++) {
+      results.push(
+        await this.completeMessage(messages[i], await deliveries[i]),
+      );
+    }
+    return results;
+  }
+
+  // 校验发送者和 chat，返回在线的接收者及其连接；校验失败时返回给发送方的结果
+  private async resolveRecipients(
+    data: any,
+  ): Promise<{ failed?: any; recipients?: [string, Socket][] }> {
+    const chat_id = data.chat_id;
+
     //检测member_id是否存在
     const member = await this.memberService.getMember(data.from_member_id);
     if (!member) {
       return {
-        message_id: data.message_id,
-        status: 'failed',
-        message: 'Member not found',
+        failed: {
+          message_id: data.message_id,
+          status: 'failed',
+          message: 'Member not found',
+        },
       };
     }
 
@@ -106,9 +208,11 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     const chat = await this.chatService.getChat(chat_id);
     if (!chat) {
       return {
-        message_id: data.message_id,
-        status: 'failed',
-        message: 'Chat not found',
+        failed: {
+          message_id: data.message_id,
+          status: 'failed',
+          message: 'Chat not found',
+        },
       };
     }
 
@@ -116,9 +220,11 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     const members = await this.chatService.getMembers(chat_id);
     if (!members.includes(data.from_member_id)) {
       return {
-        message_id: data.message_id,
-        status: 'failed',
-        message: 'Sender not in chat',
+        failed: {
+          message_id: data.message_id,
+          status: 'failed',
+          message: 'Sender not in chat',
+        },
       };
     }
 
@@ -134,8 +240,6 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     const onlineMembers = await this.onlineMembersService.getOnlineMembers();
 
     //合并membersWithoutSender和listeners, 避免重复
-    // const membersToSend_ = [...membersWithoutSender, ...listeners];
-
     const membersToSendSet = new Set([...membersWithoutSender, ...listeners]);
 
     //只发给在线成员
@@ -143,38 +247,60 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
       membersToSendSet.has(member),
     );
 
-    // 发送消息并等待每个成员的确认
-    const acknowledgmentPromises = membersToSend.map(async (member: string) => {
-      try {
-        const clientTo =
-          await this.onlineMembersService.getSocketByMemberId(member);
-        if (clientTo?.connected) {
+    const recipients = await Promise.all(
+      membersToSend.map(
+        async (member: string): Promise<[string, Socket]> => [
+          member,
+          await this.onlineMembersService.getSocketByMemberId(member),
+        ],
+      ),
+    );
+    return { recipients };
+  }
+
+  // 发送消息并等待每个成员的确认，返回未确认的成员。
+  // 所有 emit 在调用时同步发出，连续调用时每个接收者收到的顺序与调用顺序一致
+  private async deliverMessage(
+    data: any,
+    recipients: [string, Socket][],
+  ): Promise<string[]> {
+    const acknowledgmentPromises = recipients.map(
+      async ([member, clientTo]) => {
+        if (!clientTo?.connected) {
+          console.warn(`Client for member ${member} is not connected.`);
+          return member; // 如果该成员未连接，返回其 ID
+        }
+        try {
           // 使用 emitWithAck 发送消息并等待确认
           const acknowledgment = await clientTo.emitWithAck(
             EventsClient.RECEIVE_MESSAGE,
-            data,
+            this.onlineMembersService.withTarget(clientTo, member, data),
           );
 
           // 处理确认
           if (acknowledgment == true) {
             console.log(`Message successfully delivered to ${member}`);
-            return null; // 成功，返回null表示该成员已确认接收
           }
-        } else {
-          console.warn(`Client for member ${member} is not connected.`);
-          return member; // 如果该成员未连接，返回其 ID
+          return null; // 返回null表示该成员已确认接收
+        } catch (error) {
+          console.error(
+            `Failed to send message to member ${member}:`,
+            error,
+          );
+          return member; // 如果发生错误，返回该成员 ID
         }
-      } catch (error) {
-        console.error(`Failed to send message to member ${member}:`, error);
-        return member; // 如果发生错误，返回该成员 ID
-      }
-    });
+      },
+    );
 
     // 等待所有成员的确认，或者找出未确认的成员
-    const notReceivedMembers = (
-      await Promise.all(acknowledgmentPromises)
-    ).filter(Boolean);
+    return (await Promise.all(acknowledgmentPromises)).filter(Boolean);
+  }
 
+  // 持久化消息并生成返回给发送方的结果
+  private async completeMessage(
+    data: any,
+    notReceivedMembers: string[],
+  ): Promise<any> {
     if (notReceivedMembers.length > 0) {
       console.log(
         'Message forwarding completed, not received:',
@@ -185,13 +311,14 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
     // 将消息添加到聊天记录中
     await this.messageService.addMessage(data);
-    await this.chatService.addMessageToChat(chat_id, data.message_id);
+    await this.chatService.addMessageToChat(data.chat_id, data.message_id);
 
     // 返回结果给发送方
     return {
       message_id: data.message_id,
       status: notReceivedMembers.length === 0 ? 'success' : 'pending',
       notReceivedMembers,
+      hlc: data.hlc,
     };
   }
 
@@ -199,7 +326,10 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
   async handleCreateChat(client: Socket, data: any): Promise<any> {
     console.log('create chat:', data);
     const chat_id = uuidv4();
-    const created_by = client.handshake.auth.member_id;
+    const created_by = this.onlineMembersService.resolveMemberId(client, data);
+    if (!created_by) {
+      return this.onlineMembersService.notAttached(data);
+    }
     // 调用服务层创建聊天
     const response = await this.chatService.createChat(
       chat_id,
@@ -240,13 +370,16 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
 
     // 添加成员
-    await this.chatService.addMember(
-      data.chat_id,
-      client.handshake.auth.member_id,
-    );
-    const member = await this.memberService.joinChat(
-      client.handshake.auth.member_id,
+    const member_id = this.onlineMembersService.resolveMemberId(client, data);
+    if (!member_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
+    await this.chatService.addMember(data.chat_id, member_id);
+    const member = await this.memberService.joinChat(member_id, data.chat_id);
+    await this.notifyChatChanged(
       data.chat_id,
+      EventsClient.CHAT_MEMBERSHIP_CHANGED,
+      { chat_id: data.chat_id, member_ids: [member_id], action: 'join' },
     );
 
     // 返回结果给客户端
@@ -289,10 +422,14 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
   }
 
   @SubscribeMessage(EventsServer.GET_JOINED_CHATS)
-  async handleGetJoinedChats(client: Socket): Promise<any> {
+  async handleGetJoinedChats(client: Socket, data: any): Promise<any> {
     console.log('get joined chats');
 
-    return this.chatService.getJoinedChats(client.handshake.auth.member_id);
+    const member_id = this.onlineMembersService.resolveMemberId(client, data);
+    if (!member_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
+    return this.chatService.getJoinedChats(member_id);
   }
 
   @SubscribeMessage(EventsServer.GET_CHAT)
@@ -329,6 +466,14 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
       await this.memberService.exitChat(member, data.chat_id);
     }
     await this.chatService.deleteChat(data.chat_id);
+    await this.notifyChatChanged(
+      data.chat_id,
+      EventsClient.CHAT_CHANGED,
+      { chat_id: data.chat_id, action: 'delete' },
+      [...members, ...(chat.chat_listeners ?? []), chat.manager].filter(
+        Boolean,
+      ),
+    );
 
     return {
       status: 'success',
@@ -352,9 +497,11 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
 
     // 检测member是否存在
-    const member = await this.memberService.getMember(
-      client.handshake.auth.member_id,
-    );
+    const member_id = this.onlineMembersService.resolveMemberId(client, data);
+    if (!member_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
+    const member = await this.memberService.getMember(member_id);
     if (!member) {
       return {
         status: 'failed',
@@ -363,21 +510,21 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
 
     // 检测member是否在chat中
-    if (!chat.members.includes(client.handshake.auth.member_id)) {
+    if (!chat.members.includes(member_id)) {
       return {
         status: 'failed',
         message: 'Member not in chat',
       };
     }
 
-    await this.memberService.exitChat(
-      data.chat_id,
-      client.handshake.auth.member_id,
-    );
+    await this.memberService.exitChat(data.chat_id, member_id);
 
-    await this.chatService.removeMember(
+    await this.chatService.removeMember(data.chat_id, member_id);
+    await this.notifyChatChanged(
       data.chat_id,
-      client.handshake.auth.member_id,
+      EventsClient.CHAT_MEMBERSHIP_CHANGED,
+      { chat_id: data.chat_id, member_ids: [member_id], action: 'exit' },
+      [member_id],
     );
 
     return {
@@ -386,44 +533,82 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     };
   }
 
+  // 向单个成员发送命令并等待结果，失败或超时时返回 error
+  private async dispatchCommand(data: CommandDto, member: string) {
+    const { to, as_member_id, timeout_ms, request_id, ...command } = data;
+    const commandInfo = { command: data.command, by: data.by, to: member };
+    const clientTo =
+      await this.onlineMembersService.getSocketByMemberId(member);
+    if (!clientTo?.connected) {
+      console.warn(`Client for member ${member} is not connected.`);
+      return {
+        result: null,
+        command: commandInfo,
+        error: 'Client not connected',
+      };
+    }
+    try {
+      const emitter = timeout_ms ? clientTo.timeout(timeout_ms) : clientTo;
+      const result = await emitter.emitWithAck(
+        EventsClient.RECEIVE_COMMAND,
+        this.onlineMembersService.withTarget(clientTo, member, command),
+      );
+      console.log(`receive ${member} command res:`, result);
+      return { result, command: commandInfo };
+    } catch (error) {
+      console.error(`Error sending to member ${member}:`, error);
+      return { result: null, command: commandInfo, error: String(error) };
+    }
+  }
+
   @SubscribeMessage(EventsServer.SEND_COMMAND)
   async handleSendCommand(client: Socket, data: CommandDto) {
-    const { to, ...dataWithoutTo } = data;
     console.log('send command:', data);
     // 检测to
-    if (!to || to.length === 0) {
+    if (!data.to || data.to.length === 0) {
       return {
         status: 'failed',
         message: 'To is empty',
       };
     }
-    // 使用 map 收集所有的 Promise
-    const promises = to.map(async (member: string) => {
-      const clientTo =
-        await this.onlineMembersService.getSocketByMemberId(member);
-      if (clientTo?.connected) {
-        try {
-          const result = await clientTo.emitWithAck(
-            EventsClient.RECEIVE_COMMAND,
-            dataWithoutTo,
+    // 并行执行所有的请求
+    return Promise.all(
+      data.to.map((member: string) => this.dispatchCommand(data, member)),
+    );
+  }
+
+  // 流式命令：立即确认，每个接收者返回结果后单独推送给发送方
+  @SubscribeMessage(EventsServer.SEND_COMMAND_STREAM)
+  async handleSendCommandStream(client: Socket, data: CommandDto) {
+    console.log('send command stream:', data);
+    if (!data.to || data.to.length === 0) {
+      return {
+        status: 'failed',
+        message: 'To is empty',
+      };
+    }
+    const caller = this.onlineMembersService.resolveMemberId(client, data);
+    if (!caller) {
+      return this.onlineMembersService.notAttached(data);
+    }
+    for (const member of data.to) {
+      this.dispatchCommand(data, member).then((result) => {
+        if (client.connected) {
+          client.emit(
+            EventsClient.RECEIVE_COMMAND_RESULT,
+            this.onlineMembersService.withTarget(client, caller, {
+              ...result,
+              request_id: data.request_id,
+            }),
           );
-          console.log(`receive ${member} command res:`, result);
-          return {
-            result: result,
-            command: { command: data.command, by: data.by, to: member },
-          };
-        } catch (error) {
-          console.error(`Error sending to member ${member}:`, error);
-          return { member, error };
         }
-      } else {
-        console.warn(`Client for member ${member} is not connected.`);
-        return { member, error: 'Client not connected' };
-      }
-    });
-
-    // 并行执行所有的请求
-    return Promise.all(promises);
+      });
+    }
+    return {
+      status: 'success',
+      request_id: data.request_id,
+      count: data.to.length,
+    };
   }
 
   @SubscribeMessage(EventsServer.PULL_MEMBERS_INTO_CHAT)
@@ -454,6 +639,12 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
       await this.chatService.addMember(chat_id, newMember);
     }
 
+    await this.notifyChatChanged(
+      chat_id,
+      EventsClient.CHAT_MEMBERSHIP_CHANGED,
+      { chat_id, member_ids: newMembers, action: 'pull' },
+    );
+
     return {
       status: 'success',
       message: 'Members pulled into chat successfully',
@@ -475,9 +666,11 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
   @SubscribeMessage(EventsServer.GET_CREATED_CHATS)
   async handleGetCreatedChats(client: Socket, data: any): Promise<any> {
     console.log('get created chats:', data);
-    return this.chatService.getCreatedChatsByMemberId(
-      client.handshake.auth.member_id,
-    );
+    const member_id = this.onlineMembersService.resolveMemberId(client, data);
+    if (!member_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
+    return this.chatService.getCreatedChatsByMemberId(member_id);
   }
 
   @SubscribeMessage(EventsServer.GET_CHAT_MEMBERS)
@@ -506,6 +699,12 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     const chat_id = data.chat_id;
     await this.memberService.exitChat(member_id, chat_id);
     await this.chatService.removeMember(chat_id, member_id);
+    await this.notifyChatChanged(
+      chat_id,
+      EventsClient.CHAT_MEMBERSHIP_CHANGED,
+      { chat_id, member_ids: [member_id], action: 'remove' },
+      [member_id],
+    );
     return {
       status: 'success',
       message: 'Member removed from chat successfully',
@@ -521,7 +720,12 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
       console.log('连接已断开，无法发送消息');
     }
     console.log('next speaker:', data.member_id);
-    clientTo.emit(EventsClient.NEXT_SPEAKER, { chat_id: data.chat_id });
+    clientTo.emit(
+      EventsClient.NEXT_SPEAKER,
+      this.onlineMembersService.withTarget(clientTo, data.member_id, {
+        chat_id: data.chat_id,
+      }),
+    );
   }
 
   @SubscribeMessage(EventsServer.LOAD_CHAT_MESSAGES_FROM_SERVER)
@@ -529,13 +733,27 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     console.log('load chat messages from server:', data);
     const chat_id = data.chat_id;
     const count = data.count;
-    const messageIds = await this.chatService.getMessages(chat_id, count);
+    // since_hlc: 客户端收到的最大 HLC，优先于消息ID游标，按 HLC 顺序返回
+    if (data.since_hlc) {
+      return this.messageService.getMessagesSince(
+        chat_id,
+        data.since_hlc,
+        count,
+      );
+    }
+    // since: 客户端最后见到的消息ID，断线重连后只补拉之后的消息
+    const messageIds = await this.chatService.getMessages(
+      chat_id,
+      count,
+      data.since,
+    );
     return this.messageService.getMessages(messageIds);
   }
 
   @SubscribeMessage(EventsServer.SEND_NOTIFICATION_TO_CHAT)
   async handleSendNotificationToChat(client: Socket, data: any) {
     console.log('send notification to chat:', data);
+    delete data.as_member_id;
     const to_chat_id = data.to_chat_id;
     const manager_id = await this.chatService.getChatManager(to_chat_id);
     if (!manager_id) {
@@ -554,7 +772,7 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
     return manager_client.emit(
       EventsClient.RECEIVE_NOTIFICATION_FROM_CHAT,
-      data,
+      this.onlineMembersService.withTarget(manager_client, manager_id, data),
     );
   }
 
@@ -562,8 +780,15 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
   async handleRegisterChatManager(client: Socket, data: any) {
     console.log('register chat manager:', data);
     const chat_id = data.chat_id;
-    const manager_id = client.handshake.auth.member_id;
+    const manager_id = this.onlineMembersService.resolveMemberId(client, data);
+    if (!manager_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
     await this.chatService.setChatManager(chat_id, manager_id);
+    await this.notifyChatChanged(chat_id, EventsClient.CHAT_CHANGED, {
+      chat_id,
+      action: 'register_manager',
+    });
     return {
       status: 'success',
       message: `Chat manager: ${manager_id} registered successfully`,
@@ -574,7 +799,13 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
   async handleListenInChat(client: Socket, data: any) {
     console.log('listen in chat:', data);
     const chat_id = data.chat_id;
-    const listener_member_id = client.handshake.auth.member_id;
+    const listener_member_id = this.onlineMembersService.resolveMemberId(
+      client,
+      data,
+    );
+    if (!listener_member_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
 
     //检测member是否存在
     const member = await this.memberService.getMember(listener_member_id);
@@ -586,6 +817,11 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
     await this.chatService.addListener(chat_id, listener_member_id);
     await this.memberService.listenInChat(listener_member_id, chat_id);
+    await this.notifyChatChanged(
+      chat_id,
+      EventsClient.CHAT_MEMBERSHIP_CHANGED,
+      { chat_id, member_ids: [listener_member_id], action: 'listen' },
+    );
     return {
       status: 'success',
       message: `Listener: ${listener_member_id} listened in chat: ${chat_id} successfully`,
@@ -596,13 +832,68 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
   async handleUnlistenInChat(client: Socket, data: any) {
     console.log('unlisten in chat:', data);
     const chat_id = data.chat_id;
-    const listener_member_id = client.handshake.auth.member_id;
+    const listener_member_id = this.onlineMembersService.resolveMemberId(
+      client,
+      data,
+    );
+    if (!listener_member_id) {
+      return this.onlineMembersService.notAttached(data);
+    }
     await this.chatService.removeListener(chat_id, listener_member_id);
     await this.memberService.unListenInChat(listener_member_id, chat_id);
+    await this.notifyChatChanged(
+      chat_id,
+      EventsClient.CHAT_MEMBERSHIP_CHANGED,
+      { chat_id, member_ids: [listener_member_id], action: 'unlisten' },
+      [listener_member_id],
+    );
     console.log('unlisten chat success', data.chat_id);
     return {
       status: 'success',
       message: `Listener: ${listener_member_id} unlistened in chat: ${chat_id} successfully`,
     };
   }
+
+  @SubscribeMessage(EventsServer.ATTACH_MEMBER)
+  async handleAttachMember(client: Socket, data: any) {
+    if (!this.onlineMembersService.isSharedSocket(client)) {
+      return {
+        status: 400,
+        message: 'attach_member is only allowed on shared connections',
+      };
+    }
+    const { member_id, member_name } = data;
+    if (!member_id || !member_name) {
+      return {
+        status: 400,
+        message: 'Missing member_id or member_name',
+      };
+    }
+    const member = await this.memberService.getMember(member_id);
+    if (!member) {
+      return {
+        status: 404,
+        message: `MemberId ${member_id} does not exist`,
+      };
+    }
+    this.onlineMembersService.attachMember(member_id, client);
+    await this.memberService.updateMember(member_id, { name: member_name });
+    this.logger.log(
+      `${member_name} (${member_id}) attached to shared connection ${client.id}.`,
+    );
+    return {
+      status: 200,
+      message: `${member_name} ${member_id} login success`,
+      data: { member_id, member_name },
+    };
+  }
+
+  @SubscribeMessage(EventsServer.DETACH_MEMBER)
+  async handleDetachMember(client: Socket, data: any) {
+    this.onlineMembersService.detachMember(data.member_id, client);
+    return {
+      status: 'success',
+      message: `${data.member_id} detached`,
+    };
+  }
 }
@@ -1,5 +1,9 @@
 import { Module } from '@nestjs/common';
 import { ChatGateway } from './chat.gateway';
+import {
+  MsgpackChatGateway,
+  TaggedMsgpackChatGateway,
+} from './msgpack.gateway';
 import { OnlineMembersService } from './online_members.service';
 import { MemberService } from './member.service';
 import { ChatService } from './chat.service';
@@ -23,6 +27,8 @@ import { MessageService } from './message.service';
   ],
   providers: [
     ChatGateway,
+    MsgpackChatGateway,
+    TaggedMsgpackChatGateway,
     OnlineMembersService,
     MemberService,
     ChatService,
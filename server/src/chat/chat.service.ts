@@ -89,8 +89,12 @@ export class ChatService {
     return this.chatRepository.getCreatedChatsByMemberId(member_id);
   }
 
-  async getMessages(chat_id: string, count: number): Promise<string[]> {
-    return this.chatRepository.getMessages(chat_id, count);
+  async getMessages(
+    chat_id: string,
+    count: number,
+    since?: string,
+  ): Promise<string[]> {
+    return this.chatRepository.getMessages(chat_id, count, since);
   }
 
   async setChatManager(chat_id: string, manager_id: string): Promise<Chat> {
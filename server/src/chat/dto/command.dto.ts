@@ -3,4 +3,10 @@ export interface CommandDto {
   by: string;
   to: string[];
   data: any;
+  // 共享连接上发送命令的成员
+  as_member_id?: string;
+  // 单个接收者的超时时间（毫秒），超时的接收者以 error 返回
+  timeout_ms?: number;
+  // 流式命令的请求ID，用于客户端匹配逐个返回的结果
+  request_id?: string;
 }
@@ -6,4 +6,5 @@ export interface MessageDto {
   from_member_name: string;
   chat_id: string;
   timestamp: Date;
+  hlc?: number;
 }
@@ -0,0 +1,34 @@
+// 混合逻辑时钟，编码与 client/clock.py 一致：
+// 高位为 Unix 毫秒，低 LOGICAL_BITS 位为逻辑计数，结果不超过 2^53，number 可以精确表示
+export const LOGICAL_BITS = 10;
+const LOGICAL_SCALE = 2 ** LOGICAL_BITS;
+
+export function physicalMs(hlc: number): number {
+  return Math.floor(hlc / LOGICAL_SCALE);
+}
+
+export class HybridLogicalClock {
+  private last = 0;
+
+  // maxDriftMs: 远端时钟超前本地物理时间超过该值时不合并
+  constructor(private readonly maxDriftMs = 60_000) {}
+
+  now(): number {
+    const candidate = Date.now() * LOGICAL_SCALE;
+    this.last = candidate > this.last ? candidate : this.last + 1;
+    return this.last;
+  }
+
+  // 收到带 HLC 的消息时合并对方的时钟，返回本地新的 HLC
+  update(remote?: number): number {
+    const wallMs = Date.now();
+    let remoteHlc = Number.isSafeInteger(remote) && remote > 0 ? remote : 0;
+    const ahead = physicalMs(remoteHlc) - wallMs;
+    if (remoteHlc && ahead > this.maxDriftMs) {
+      console.log(`HLC: 忽略超前 ${ahead} ms 的远端时钟`);
+      remoteHlc = 0;
+    }
+    this.last = Math.max(wallMs * LOGICAL_SCALE, this.last + 1, remoteHlc + 1);
+    return this.last;
+  }
+}
@@ -1,10 +1,20 @@
 import { Injectable } from '@nestjs/common';
 import { Message } from './schemas/message.schema';
 import { MessageRepositoryService } from './repository/message.repo';
+import { HybridLogicalClock } from './hlc';
 @Injectable()
 export class MessageService {
+  // 所有网关共用一个时钟，保证分配的 HLC 单调递增
+  private readonly clock = new HybridLogicalClock();
+
   constructor(private readonly messageRepo: MessageRepositoryService) {}
 
+  // 收到消息时分配 HLC，合并发送方的时钟，使因果上在后的消息 HLC 更大
+  stamp(message: any): number {
+    message.hlc = this.clock.update(message.hlc);
+    return message.hlc;
+  }
+
   async addMessage(message: any): Promise<Message> {
     return this.messageRepo.addMessage(
       message.message_id,
@@ -13,6 +23,8 @@ export class MessageService {
       message.chat_id,
       message.message_type,
       message.timestamp,
+      message.from_member_name,
+      message.hlc,
     );
   }
 
@@ -23,4 +35,12 @@ export class MessageService {
   async getMessages(message_ids: string[]): Promise<Message[]> {
     return this.messageRepo.getMessages(message_ids);
   }
+
+  async getMessagesSince(
+    chat_id: string,
+    since_hlc: number,
+    count: number = -1,
+  ): Promise<Message[]> {
+    return this.messageRepo.getMessagesSince(chat_id, since_hlc, count);
+  }
 }
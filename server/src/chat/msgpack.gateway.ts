@@ -0,0 +1,24 @@
+import { WebSocketGateway } from '@nestjs/websockets';
+import { Injectable } from '@nestjs/common';
+import * as msgpackParser from 'socket.io-msgpack-parser';
+import { ChatGateway } from './chat.gateway';
+import { taggedMsgpackParser } from './wire/tagged-msgpack.parser';
+
+// socket.io 的 parser 按服务器配置，不能按连接切换，
+// 因此二进制编码各自挂在独立的 path 上，客户端通过连接路径协商编码。
+// 事件处理逻辑全部继承自 ChatGateway，在线成员保存在共享的 OnlineMembersService 中，
+// 不同编码的客户端之间可以正常收发消息。
+export const MSGPACK_PATH = '/socket.io-msgpack';
+export const MSGPACK_TAGGED_PATH = '/socket.io-msgpack-tagged';
+
+@WebSocketGateway({ cors: true, path: MSGPACK_PATH, parser: msgpackParser })
+@Injectable()
+export class MsgpackChatGateway extends ChatGateway {}
+
+@WebSocketGateway({
+  cors: true,
+  path: MSGPACK_TAGGED_PATH,
+  parser: taggedMsgpackParser,
+})
+@Injectable()
+export class TaggedMsgpackChatGateway extends ChatGateway {}
@@ -27,12 +27,67 @@ export class OnlineMembersService {
   }
 
   async removeOnlineMemberBySocket(socket: Socket): Promise<void> {
-    const member = await this.findOnlineMemberBySocket(socket);
-    if (member) {
+    // 共享连接上可能挂载了多个成员，需要全部移除
+    for (const member of await this.findOnlineMembersBySocket(socket)) {
       await this.removeOnlineMember(member);
     }
   }
 
+  async findOnlineMembersBySocket(socket: Socket): Promise<string[]> {
+    const members: string[] = [];
+    for (const [memberId, value] of this.onlineMembers) {
+      if (value === socket) {
+        members.push(memberId);
+      }
+    }
+    return members;
+  }
+
+  // 共享连接：一个 socket 承载多个成员身份
+  isSharedSocket(socket: Socket): boolean {
+    return socket?.data?.shared === true;
+  }
+
+  attachMember(memberId: string, socket: Socket): void {
+    if (!socket.data.members) {
+      socket.data.members = new Set<string>();
+    }
+    socket.data.members.add(memberId);
+    this.onlineMembers.set(memberId, socket);
+  }
+
+  detachMember(memberId: string, socket: Socket): void {
+    socket.data.members?.delete(memberId);
+    if (this.onlineMembers.get(memberId) === socket) {
+      this.onlineMembers.delete(memberId);
+    }
+  }
+
+  // 在共享连接上，由请求数据中的 as_member_id 指定调用者身份；该成员未挂载到这条连接时返回 undefined，
+  // 调用方需要以 notAttached 的结果拒绝请求
+  resolveMemberId(socket: Socket, data?: any): string | undefined {
+    if (this.isSharedSocket(socket)) {
+      const memberId = data?.as_member_id;
+      return socket.data.members?.has(memberId) ? memberId : undefined;
+    }
+    return socket.handshake.auth.member_id;
+  }
+
+  notAttached(data?: any): { status: string; message: string } {
+    return {
+      status: 'failed',
+      message: `Member ${data?.as_member_id} is not attached to this shared connection`,
+    };
+  }
+
+  // 发往共享连接的事件需要带上目标成员，由客户端路由到对应的智能体
+  withTarget(socket: Socket, memberId: string, payload: any): any {
+    if (this.isSharedSocket(socket)) {
+      return { ...payload, to_member_id: memberId };
+    }
+    return payload;
+  }
+
   async findOnlineMemberBySocket(socket: Socket): Promise<string | undefined> {
     for (const [memberId, value] of this.onlineMembers) {
       if (value === socket) {
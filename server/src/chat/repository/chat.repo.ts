@@ -87,6 +87,7 @@ export class ChatRepositoryService {
   async getChatMessageIds(
     chatId: string,
     count: number = -1,
+    since?: string,
   ): Promise<string[]> {
     const chat = await this.chatModel
       .findOne({ chat_id: chatId })
@@ -97,13 +98,22 @@ export class ChatRepositoryService {
       return [];
     }
 
+    let messages = chat.messages;
+    // 提供了游标时只返回游标之后的消息；游标不存在（如 chat 被清空）时按 count 返回
+    if (since) {
+      const index = messages.lastIndexOf(since);
+      if (index >= 0) {
+        messages = messages.slice(index + 1);
+      }
+    }
+
     // 如果 count = -1，返回所有消息
     if (count === -1) {
-      return chat.messages;
+      return messages;
     }
 
     // 获取倒数 count 条消息
-    const messageIds = chat.messages.slice(-count);
+    const messageIds = messages.slice(-count);
 
     return messageIds;
   }
@@ -130,8 +140,12 @@ export class ChatRepositoryService {
     return this.chatModel.find({ created_by: member_id }).exec();
   }
 
-  async getMessages(chat_id: string, count: number): Promise<string[]> {
-    return this.getChatMessageIds(chat_id, count);
+  async getMessages(
+    chat_id: string,
+    count: number,
+    since?: string,
+  ): Promise<string[]> {
+    return this.getChatMessageIds(chat_id, count, since);
   }
 
   async setChatManager(
@@ -16,14 +16,18 @@ export class MessageRepositoryService {
     chat_id: string,
     message_type: string,
     timestamp: Date,
+    from_member_name?: string,
+    hlc?: number,
   ): Promise<Message> {
     const newMessage = new this.messageModel({
       message_id,
       message,
       from_member_id,
+      from_member_name,
       chat_id,
       message_type,
       timestamp,
+      hlc,
     });
     return newMessage.save();
   }
@@ -32,7 +36,26 @@ export class MessageRepositoryService {
     return this.messageModel.findOne({ message_id }).exec();
   }
 
+  // 按 message_ids 的顺序返回，$in 查询本身不保证顺序
   async getMessages(message_ids: string[]): Promise<Message[]> {
-    return this.messageModel.find({ message_id: { $in: message_ids } }).exec();
+    const messages = await this.messageModel
+      .find({ message_id: { $in: message_ids } })
+      .exec();
+    const byId = new Map(messages.map((m) => [m.message_id, m]));
+    return message_ids.map((id) => byId.get(id)).filter((m) => m);
+  }
+
+  // HLC 大于 since_hlc 的消息，按 HLC 升序；count 不为 -1 时只返回最近的 count 条
+  async getMessagesSince(
+    chat_id: string,
+    since_hlc: number,
+    count: number = -1,
+  ): Promise<Message[]> {
+    const query = this.messageModel.find({ chat_id, hlc: { $gt: since_hlc } });
+    if (count === -1) {
+      return query.sort({ hlc: 1 }).exec();
+    }
+    const latest = await query.sort({ hlc: -1 }).limit(count).exec();
+    return latest.reverse();
   }
 }
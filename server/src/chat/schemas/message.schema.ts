@@ -9,6 +9,10 @@ export class Message {
   @Prop({ required: true })
   from_member_id: string;
 
+  // 断线重连补拉消息时，客户端需要发送者名称
+  @Prop()
+  from_member_name: string;
+
   @Prop({ required: true })
   chat_id: string;
 
@@ -23,6 +27,12 @@ export class Message {
 
   @Prop({ required: true })
   timestamp: Date;
+
+  // 混合逻辑时钟，由服务器在收到消息时分配，见 hlc.ts
+  @Prop({ default: 0 })
+  hlc: number;
 }
 
 export const MessageSchema = SchemaFactory.createForClass(Message);
+// 按 HLC 游标分页加载聊天记录
+MessageSchema.index({ chat_id: 1, hlc: 1 });
@@ -0,0 +1,39 @@
+// 协议中常见的键名，tagged 编码时替换为其下标的十进制字符串（"0"、"1"...）。
+// 必须与 client/codec.py 中的 FIELD_TAGS 保持一致，只能在末尾追加，不能调整顺序。
+export const FIELD_TAGS: readonly string[] = [
+  'message',
+  'message_type',
+  'chat_id',
+  'from_member_id',
+  'from_member_name',
+  'timestamp',
+  'message_id',
+  'to_chat_id',
+  'member_id',
+  'name',
+  'description',
+  'listen_in_chats',
+  'is_group',
+  'members',
+  'messages',
+  'created_by',
+  'createdAt',
+  'manager',
+  'listeners',
+  'command',
+  'by',
+  'to',
+  'data',
+  'result',
+  'error',
+  'status',
+  'as_member_id',
+  'to_member_id',
+  'request_id',
+  'timeout_ms',
+  'count',
+  'complete',
+  'manager_id',
+  'member_name',
+  'hlc',
+];
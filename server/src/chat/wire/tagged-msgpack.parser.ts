@@ -0,0 +1,56 @@
+import * as msgpackParser from 'socket.io-msgpack-parser';
+import { FIELD_TAGS } from './field-tags';
+
+const TAG_BY_KEY = new Map<string, string>(
+  FIELD_TAGS.map((key, index) => [key, String(index)]),
+);
+const KEY_BY_TAG = new Map<string, string>(
+  FIELD_TAGS.map((key, index) => [String(index), key]),
+);
+
+function mapKeys(value: any, mapping: Map<string, string>): any {
+  if (value === null || typeof value !== 'object') {
+    return value;
+  }
+  if (Buffer.isBuffer(value) || ArrayBuffer.isView(value)) {
+    return value;
+  }
+  if (Array.isArray(value)) {
+    return value.map((item) => mapKeys(item, mapping));
+  }
+  // mongoose 文档、ObjectId、Date 等按 JSON 编码时的形式处理
+  if (typeof value.toJSON === 'function') {
+    return mapKeys(value.toJSON(), mapping);
+  }
+  const mapped = {};
+  for (const key of Object.keys(value)) {
+    mapped[mapping.get(key) ?? key] = mapKeys(value[key], mapping);
+  }
+  return mapped;
+}
+
+export function tagKeys(value: any): any {
+  return mapKeys(value, TAG_BY_KEY);
+}
+
+export function untagKeys(value: any): any {
+  return mapKeys(value, KEY_BY_TAG);
+}
+
+// MessagePack 编码，且事件数据中的键名替换为短标签
+export class Encoder extends msgpackParser.Encoder {
+  encode(packet: any) {
+    return super.encode({ ...packet, data: tagKeys(packet.data) });
+  }
+}
+
+export class Decoder extends msgpackParser.Decoder {
+  emit(event: string, packet?: any) {
+    if (event === 'decoded') {
+      packet = { ...packet, data: untagKeys(packet.data) };
+    }
+    return super.emit(event, packet);
+  }
+}
+
+export const taggedMsgpackParser = { Encoder, Decoder };
@@ -0,0 +1,67 @@
+import pytest
+
+from client.asyncMemberAgent import AsyncMemberClientWithChats
+from client.dto import Chat, Message
+from client.memberAgent import MemberClientWithChats
+
+
+def _message(message_id: str, hlc: int, from_member_id: str = 'peer') -> Message:
+    return Message(message='hi', message_type='text', chat_id='c', from_member_id=from_member_id,
+                   message_id=message_id, hlc=hlc)
+
+
+@pytest.fixture(params=[MemberClientWithChats, AsyncMemberClientWithChats])
+def client_class(request):
+    return request.param
+
+
+def test_duplicate_messages_are_dropped(client_class):
+    client = client_class('me', 'me')
+    assert client._remember_message(_message('m1', 10))
+    assert not client._remember_message(_message('m1', 10))
+    assert client._last_seen == {'c': 'm1'}
+    assert client._last_seen_hlc == {'c': 10}
+
+
+def test_own_messages_do_not_advance_hlc_cursor(client_class):
+    client = client_class('me', 'me')
+    client._remember_message(_message('m1', 10))
+    client._remember_message(_message('m2', 20, from_member_id='me'))
+    assert client._last_seen == {'c': 'm2'}
+    assert client._last_seen_hlc == {'c': 10}
+
+
+@pytest.mark.parametrize('resume', [True, False])
+def test_restore_snapshot_honors_resume(client_class, tmp_path, resume):
+    writer = MemberClientWithChats('me', 'me')
+    writer.memory.add_message(_message('m1', 10))
+    writer.memory.add_message(_message('m2', 20))
+    path = str(tmp_path / 'agents.snapshot')
+    writer.save_snapshot(path)
+
+    client = client_class('me', 'me')
+    assert client.restore_snapshot(path, resume=resume) == 2
+    assert client._on_login_accepted() is resume
+    assert client._last_seen == {'c': 'm2'}
+    # 之后的登录是重连，按 resume_on_reconnect 补拉
+    assert client._on_login_accepted() is True
+
+
+def test_reconnect_clears_metadata_cache(client_class):
+    client = client_class('me', 'me')
+    client.resume_on_reconnect = False
+    assert client._on_login_accepted() is False
+    client.metadata_cache.put_chat(Chat(chat_id='c', name='c', is_group=True, created_by='me', createdAt=''))
+    assert client._on_login_accepted() is False
+    assert client.metadata_cache.get_chat('c') is None
+
+
+def test_resume_buffer_is_drained_in_order(client_class):
+    client = client_class('me', 'me')
+    cursors, _ = client._begin_resume()
+    assert client._begin_resume() is None
+    assert client._buffer_if_resuming(_message('m1', 10))
+    assert client._buffer_if_resuming(_message('m2', 20))
+    assert [m.message_id for m in client._take_resume_buffer()] == ['m1', 'm2']
+    assert client._take_resume_buffer() == []
+    assert not client._buffer_if_resuming(_message('m3', 30))
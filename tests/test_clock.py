@@ -0,0 +1,102 @@
+import threading
+from datetime import datetime, timezone
+
+from client.clock import (LOGICAL_BITS, HybridLogicalClock, from_timestamp, logical, order_key, pack,
+                          physical_ms)
+from client.dto import Message
+
+
+class FakeWallClock:
+    """由测试控制的物理时钟，单位为秒"""
+
+    def __init__(self, seconds: float = 1_700_000_000.0):
+        self.seconds = seconds
+
+    def __call__(self) -> float:
+        return self.seconds
+
+
+def test_pack_round_trip():
+    hlc = pack(1_700_000_000_123, 5)
+    assert physical_ms(hlc) == 1_700_000_000_123
+    assert logical(hlc) == 5
+    assert pack(1, (1 << LOGICAL_BITS) - 1) < pack(2)
+    # JavaScript number 可以精确表示
+    assert pack(4_102_444_800_000, (1 << LOGICAL_BITS) - 1) < 2 ** 53
+
+
+def test_now_is_monotonic_when_wall_clock_stalls_or_goes_back():
+    wall = FakeWallClock()
+    clock = HybridLogicalClock(wall)
+    first = clock.now()
+    second = clock.now()
+    assert second == first + 1
+    wall.seconds -= 10
+    third = clock.now()
+    assert third > second
+    assert physical_ms(third) == physical_ms(first)
+    wall.seconds += 20
+    assert physical_ms(clock.now()) == int(wall.seconds * 1000)
+
+
+def test_update_orders_after_remote():
+    wall = FakeWallClock()
+    sender, receiver = HybridLogicalClock(wall), HybridLogicalClock(FakeWallClock(wall.seconds - 5))
+    sent = sender.now()
+    received = receiver.update(sent)
+    # 接收方时钟落后，因果上在后的事件仍然更大
+    assert received > sent
+    assert receiver.now() > received
+    assert receiver.update(None) > received
+
+
+def test_update_ignores_remote_beyond_max_drift():
+    wall = FakeWallClock()
+    clock = HybridLogicalClock(wall, max_drift_ms=1000)
+    remote = pack(int(wall.seconds * 1000) + 60_000)
+    assert clock.update(remote) < remote
+    assert physical_ms(clock.peek()) == int(wall.seconds * 1000)
+
+
+def test_now_is_unique_across_threads():
+    clock = HybridLogicalClock()
+    results = [[] for _ in range(4)]
+
+    def work(out):
+        for _ in range(2000):
+            out.append(clock.now())
+
+    threads = [threading.Thread(target=work, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for out in results:
+        assert out == sorted(out)
+    merged = [hlc for out in results for hlc in out]
+    assert len(set(merged)) == len(merged)
+
+
+def test_from_timestamp_formats():
+    local = datetime(2024, 1, 2, 3, 4, 5, 678000)
+    expected = pack(int(local.timestamp() * 1000))
+    assert from_timestamp(str(local)) == expected
+    assert from_timestamp(local) == expected
+    utc = datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    assert from_timestamp('2024-01-02T03:04:05.678Z') == pack(int(utc.timestamp() * 1000))
+    assert from_timestamp(1_700_000_000.5) == pack(1_700_000_000_500)
+    assert from_timestamp(12345) == 12345
+    assert from_timestamp(None) == 0
+    assert from_timestamp('not a time') == 0
+
+
+def test_order_key_prefers_hlc_and_falls_back_to_timestamp():
+    earlier = datetime(2024, 1, 2, 3, 4, 5)
+    with_hlc = Message(message='a', message_type='text', chat_id='c', from_member_id='m', message_id='a',
+                       timestamp=str(earlier), hlc=pack(int(earlier.timestamp() * 1000) + 1000, 1))
+    legacy = Message(message='b', message_type='text', chat_id='c', from_member_id='m', message_id='b',
+                     timestamp=str(earlier.replace(second=6)))
+    assert order_key(with_hlc) == with_hlc.hlc
+    assert order_key(legacy) == from_timestamp(legacy.timestamp)
+    # 同一毫秒内带逻辑计数的 HLC 排在换算出的旧消息之后
+    assert sorted([with_hlc, legacy], key=order_key) == [legacy, with_hlc]
@@ -0,0 +1,105 @@
+import struct
+
+import msgpack
+import pytest
+from socketio import packet
+
+from client import codec
+from client.codec import CountingJSONPacket, CountingMsgPackPacket, FastJSON, TaggedMsgPackPacket, create_socket
+from client.dto import Chat, Message
+from client.metrics import get_default_metrics
+
+
+def _counters():
+    return get_default_metrics().snapshot()['counters']
+
+
+def test_fast_json_falls_back_for_non_str_keys():
+    data = {1: 'a', None: 'b', 'big': 2 ** 70}
+    assert FastJSON.loads(FastJSON.dumps(data)) == {'1': 'a', 'null': 'b', 'big': 2 ** 70}
+
+
+def test_json_socket_does_not_change_global_packet_json():
+    before = packet.Packet.json
+    socket = create_socket(codec.JSON)
+    assert socket.packet_class is CountingJSONPacket
+    assert packet.Packet.json is before
+
+
+def test_json_packet_counts_utf8_bytes():
+    metrics = get_default_metrics()
+    metrics.reset()
+    encoded = CountingJSONPacket(packet.EVENT, data=['receive_message', {'message': '你好'}]).encode()
+    size = len(encoded.encode('utf-8'))
+    assert size > len(encoded)
+    decoded = CountingJSONPacket(encoded_packet=encoded)
+    assert decoded.data == ['receive_message', {'message': '你好'}]
+    assert _counters()['bytes'] == {'out': size, 'in': size}
+
+
+def test_message_wire_round_trip():
+    message = Message(message='你好', message_type='text', chat_id='c', from_member_id='m',
+                      message_id='id1', hlc=42)
+    encoded = CountingJSONPacket(packet.EVENT, data=['receive_message', message.to_wire()]).encode()
+    data = CountingJSONPacket(encoded_packet=encoded).data[1]
+    assert Message.from_wire({**data, '_id': 'mongo', '__v': 0}) == message
+
+
+# 2024-03-05T06:07:08.123Z，new Date(1709618828123)
+DATE_MS = 1709618828123
+DATE_JSON = '2024-03-05T06:07:08.123Z'
+
+
+def _notepack_date(ms: int) -> bytes:
+    """按 notepack.io 3 的方式编码 JS Date：毫秒为 0 时用 timestamp 32，否则用 timestamp 64"""
+    seconds, rest = divmod(ms, 1000)
+    if rest == 0:
+        return b'\xd6\xff' + struct.pack('>I', seconds)
+    return b'\xd7\xff' + struct.pack('>Q', (rest * 1000000) << 34 | seconds)
+
+
+def _notepack_legacy_date(ms: int) -> bytes:
+    """notepack.io 3 之前的编码：fixext 8、类型 0 的 float64 毫秒数"""
+    return b'\xd7\x00' + struct.pack('>d', ms)
+
+
+def _packet_with_date(date: bytes) -> bytes:
+    placeholder = 'DATE_PLACEHOLDER'
+    data = {'type': packet.EVENT, 'nsp': '/', 'data': [
+        'receive_message',
+        {'message': 'hi', 'message_type': 'text', 'chat_id': 'c', 'from_member_id': 'm',
+         'message_id': 'id1', '_id': 'mongo', 'timestamp': placeholder},
+    ]}
+    encoded = msgpack.dumps(data)
+    packed_placeholder = msgpack.dumps(placeholder)
+    assert encoded.count(packed_placeholder) == 1
+    return encoded.replace(packed_placeholder, date)
+
+
+@pytest.mark.parametrize('encode', [_notepack_date, _notepack_legacy_date])
+@pytest.mark.parametrize('packet_class', [CountingMsgPackPacket, TaggedMsgPackPacket])
+def test_msgpack_date_ext_decodes_to_iso_string(encode, packet_class):
+    decoded = packet_class(encoded_packet=_packet_with_date(encode(DATE_MS)))
+    message = Message.from_wire(decoded.data[1])
+    assert message.timestamp == DATE_JSON
+
+
+def test_msgpack_whole_second_date_and_nested_dates():
+    whole = DATE_MS // 1000 * 1000
+    decoded = CountingMsgPackPacket(encoded_packet=msgpack.dumps({
+        'type': packet.ACK, 'nsp': '/', 'id': 1,
+        'data': [{'status': 'success', 'data': {
+            'chat_id': 'c', 'name': 'n', 'is_group': True, 'created_by': 'm',
+            'createdAt': msgpack.Timestamp.from_unix_nano(whole * 1000000),
+        }}, [msgpack.Timestamp.from_unix_nano(DATE_MS * 1000000)]],
+    }))
+    chat = Chat.from_wire(decoded.data[0]['data'])
+    assert chat.createdAt == '2024-03-05T06:07:08.000Z'
+    assert decoded.data[1] == [DATE_JSON]
+
+
+def test_msgpack_other_ext_types_are_kept():
+    ext = msgpack.ExtType(5, b'abc')
+    decoded = CountingMsgPackPacket(encoded_packet=msgpack.dumps({'type': packet.EVENT, 'nsp': '/',
+                                                                   'data': ['e', ext]}))
+    assert decoded.data == ['e', ext]
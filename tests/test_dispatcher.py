@@ -0,0 +1,88 @@
+import threading
+import time
+
+from client.dispatcher import Dispatcher
+
+
+def _blocked_dispatcher(policy: str):
+    """一个工作线程被占住、队列已满的分发器"""
+    dispatcher = Dispatcher(max_workers=1, max_queue=2, policy=policy)
+    release = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    dispatcher.submit('k', hold)
+    assert started.wait(5)
+    dispatcher.submit('k', lambda: None)
+    dispatcher.submit('k', lambda: None)
+    return dispatcher, release
+
+
+def _wait_idle(dispatcher: Dispatcher, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while dispatcher.queue_depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_same_key_runs_in_order_and_keys_run_in_parallel():
+    dispatcher = Dispatcher(max_workers=4)
+    order = []
+    done = threading.Barrier(3, timeout=5)
+    for i in range(50):
+        dispatcher.submit('a', order.append, i)
+    # 两个不同 key 的任务同时执行才能越过屏障
+    dispatcher.submit('b', done.wait)
+    dispatcher.submit('c', done.wait)
+    done.wait()
+    _wait_idle(dispatcher)
+    assert order == list(range(50))
+
+
+def test_non_blocking_submit_spills_past_the_limit():
+    dispatcher, release = _blocked_dispatcher(Dispatcher.BLOCK)
+    ran = []
+    started = time.monotonic()
+    assert dispatcher.submit('k', ran.append, 1, block=False)
+    assert time.monotonic() - started < 1
+    assert dispatcher.stats()['spilled'] == 1
+    release.set()
+    _wait_idle(dispatcher)
+    time.sleep(0.05)
+    assert ran == [1]
+
+
+def test_blocking_submit_waits_for_space():
+    dispatcher, release = _blocked_dispatcher(Dispatcher.BLOCK)
+    accepted = threading.Event()
+    threading.Thread(target=lambda: dispatcher.submit('k', lambda: None) and accepted.set(), daemon=True).start()
+    assert not accepted.wait(0.1)
+    release.set()
+    assert accepted.wait(5)
+    assert dispatcher.stats()['spilled'] == 0
+
+
+def test_drop_policy_drops_regardless_of_block():
+    dispatcher, release = _blocked_dispatcher(Dispatcher.DROP)
+    assert not dispatcher.submit('k', lambda: None)
+    assert not dispatcher.submit('k', lambda: None, block=False)
+    assert dispatcher.stats()['dropped'] == 2
+    release.set()
+
+
+def test_worker_submits_do_not_block():
+    dispatcher = Dispatcher(max_workers=1, max_queue=1)
+    results = []
+
+    def fan_out():
+        for i in range(5):
+            results.append(dispatcher.submit('other', lambda: None))
+
+    dispatcher.submit('k', fan_out)
+    deadline = time.monotonic() + 5
+    while len(results) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert results == [True] * 5
+    assert dispatcher.stats()['spilled'] >= 4
@@ -0,0 +1,30 @@
+import pytest
+
+from client.loopbackServer import LoopbackServer, Session
+
+
+def test_session_requires_transport_methods():
+    with pytest.raises(TypeError):
+        Session()
+
+    class Partial(Session):
+        @property
+        def connected(self):
+            return True
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+
+def test_loopback_sockets_are_sessions():
+    from client.memberClient import MemberClient
+
+    server = LoopbackServer()
+    client = MemberClient('a', 'a')
+    assert isinstance(server.bind(client), Session)
+    assert client.login()
+    assert client.socket.connected
+    client.socket.disconnect()
+    assert not client.socket.connected
+    server.stop()
@@ -0,0 +1,102 @@
+import random
+import re
+from typing import List, Optional
+
+import pytest
+
+from client.dto import Message
+from client.memory import AgentChats
+
+NAMES = ['Alice', 'Bob', '3号', '小明', 'charlie']
+TEMPLATES = [
+    'ATTACK {name} TERMINATE',
+    'attack {name} terminate',
+    '我建议 ATTACK {name}，大家怎么看',
+    '同意，TERMINATE 吧',
+    '今晚先讨论一下 {name}',
+    '{name} 昨天的发言很可疑',
+    'Attack   {name}   Terminate。',
+]
+
+
+def _history(seed: int, count: int = 300) -> List[Message]:
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        chat_id = rng.choice(['wolves', 'public'])
+        text = rng.choice(TEMPLATES).format(name=rng.choice(NAMES))
+        messages.append(Message(message=text, message_type='text', chat_id=chat_id, from_member_id=f'w{i % 3}',
+                                message_id=f'm{i}', hlc=i + 1))
+    return messages
+
+
+def _substring_kill(memory: AgentChats, chat_id: str) -> Optional[str]:
+    """原来 process_wolf_kill 的实现：倒序查找同时包含 ATTACK 和 TERMINATE 的消息"""
+    messages = memory.get_chat(chat_id).messages
+    return next((msg.message for msg in reversed(messages)
+                 if 'TERMINATE' in msg.message.upper() and 'ATTACK' in msg.message.upper()), None)
+
+
+def _search_kill(memory: AgentChats, chat_id: str) -> Optional[str]:
+    found = memory.search('ATTACK TERMINATE', chat_id=chat_id, limit=1)
+    return found[0].message if found else None
+
+
+def _target(text: Optional[str]) -> Optional[str]:
+    match = re.search(r'ATTACK\s+([^\s]+)\s+TERMINATE', text.upper()) if text else None
+    return match.group(1) if match else None
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_search_matches_substring_check_in_process_wolf_kill(seed, indexed):
+    memory = AgentChats(member_id='host')
+    if indexed:
+        memory.enable_index()
+    rng = random.Random(seed)
+    for count, message in enumerate(_history(seed), 1):
+        memory.add_message(message)
+        if rng.random() < 0.1:
+            victim = rng.choice(list(memory.get_chat(message.chat_id).messages))
+            memory.remove_message(victim.message_id, victim.chat_id)
+        if count % 10 == 0:
+            for chat_id in ('wolves', 'public'):
+                expected = _substring_kill(memory, chat_id)
+                assert _search_kill(memory, chat_id) == expected
+                assert _target(_search_kill(memory, chat_id)) == _target(expected)
+
+
+def test_index_and_scan_agree():
+    history = _history(7, 500)
+    scanned, indexed = AgentChats(member_id='host'), AgentChats(member_id='host')
+    indexed.enable_index()
+    for message in history:
+        scanned.add_message(message)
+        indexed.add_message(message)
+    queries = [
+        {'keywords': 'attack'},
+        {'keywords': 'ATTACK terminate', 'chat_id': 'wolves'},
+        {'keywords': '发言'},
+        {'keywords': '小明', 'speaker': 'w1'},
+        {'phrase': 'attack alice'},
+        {'keywords': 'attack', 'since': 100, 'until': 200},
+        {'keywords': 'missing'},
+    ]
+    for query in queries:
+        for chat_id in ('wolves', 'public'):
+            kwargs = dict(query, chat_id=query.get('chat_id', chat_id))
+            assert [m.message_id for m in indexed.search(**kwargs)] == \
+                   [m.message_id for m in scanned.search(**kwargs)], kwargs
+
+
+def test_fullwidth_and_case_are_normalized():
+    memory = AgentChats(member_id='host')
+    memory.enable_index()
+    memory.add_message(Message(message='ＡＴＴＡＣＫ Bob ＴＥＲＭＩＮＡＴＥ', message_type='text', chat_id='wolves',
+                               from_member_id='w0', message_id='m0', hlc=1))
+    memory.add_message(Message(message='counterattack is not an attack word', message_type='text',
+                               chat_id='wolves', from_member_id='w0', message_id='m1', hlc=2))
+    assert [m.message_id for m in memory.search('attack terminate')] == ['m0']
+    assert [m.message_id for m in memory.search('attack')] == ['m1', 'm0']
+    memory.remove_message('m0', 'wolves')
+    assert memory.search('attack terminate') == []
@@ -0,0 +1,58 @@
+import random
+import threading
+
+import pytest
+
+from client.metrics import Histogram, Metrics
+
+
+@pytest.mark.parametrize('scale', [2e-6, 1e-5, 1e-3, 1.0])
+def test_quantiles_within_one_bucket(scale):
+    rng = random.Random(7)
+    values = sorted(scale * rng.uniform(0.5, 2) for _ in range(5000))
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert histogram.quantile(q) == pytest.approx(exact, rel=0.19)
+
+
+def test_sub_microsecond_values_are_bounded_by_min_max():
+    histogram = Histogram()
+    for value in (1e-7, 2e-7, 3e-7):
+        histogram.observe(value)
+    assert 1e-7 <= histogram.quantile(0.5) <= 3e-7
+
+
+def test_counters_sum_across_threads():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(10000):
+            metrics.inc('packets', 'in')
+            metrics.inc('bytes', 'in', 3)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    work()
+    for thread in threads:
+        thread.join()
+    counters = metrics.snapshot()['counters']
+    assert counters['packets']['in'] == 50000
+    assert counters['bytes']['in'] == 150000
+
+
+def test_reset_and_disabled():
+    metrics = Metrics()
+    metrics.inc('packets', 'out')
+    metrics.reset()
+    assert metrics.snapshot()['counters'] == {}
+    metrics.inc('packets', 'out', 2)
+    assert metrics.snapshot()['counters'] == {'packets': {'out': 2}}
+    metrics.enabled = False
+    metrics.inc('packets', 'out')
+    metrics.observe('rpc_seconds', 'send_message', 0.1)
+    assert metrics.snapshot()['counters'] == {'packets': {'out': 2}}
+    assert metrics.snapshot()['histograms'] == {}
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from client.loopbackServer import LoopbackServer
+from client.memberClient import MemberClient
+from client.sharedConnection import SharedConnection
+
+
+class Recorder(MemberClient):
+    def __init__(self, name, member_id):
+        super().__init__(name, member_id)
+        self.received = []
+        self.resumed = threading.Event()
+
+    def on_receive_message(self, message):
+        self.received.append(message.message)
+
+    def resume_session(self) -> int:
+        try:
+            return super().resume_session()
+        finally:
+            self.resumed.set()
+
+
+@pytest.fixture
+def server():
+    server = LoopbackServer()
+    yield server
+    server.stop()
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_resume_replays_missed_messages_once(server, shared):
+    sender = MemberClient('a', 'a')
+    server.bind(sender)
+    receiver = Recorder('b', 'b')
+    if shared:
+        connection = SharedConnection()
+        server.bind(connection)
+        server.signup(receiver.member_id, receiver.name)
+        connection.bind(receiver)
+    else:
+        server.bind(receiver)
+    assert sender.login() and receiver.login()
+    _, chat = sender.create_chat('room')
+    sender.pull_members_into_chat(chat.chat_id, ['b'])
+    sender.send_message('one', chat.chat_id)
+    assert _wait_for(lambda: receiver.received == ['one'])
+
+    receiver.socket.disconnect()
+    sender.send_message('two', chat.chat_id)
+    sender.send_message('three', chat.chat_id)
+    # 游标失效时服务器返回最近的消息，其中已经收到过的需要去重
+    receiver._last_seen.clear()
+    receiver._last_seen_hlc.clear()
+    receiver._last_seen[chat.chat_id] = 'unknown'
+
+    started = time.monotonic()
+    assert receiver.login()
+    assert receiver.resumed.wait(5)
+    # 等待连接事件而不是轮询超时
+    assert time.monotonic() - started < receiver.connect_timeout / 2
+    assert _wait_for(lambda: len(receiver.received) == 3)
+    time.sleep(0.1)
+    assert receiver.received == ['one', 'two', 'three']
+
+    sender.send_message('four', chat.chat_id)
+    assert _wait_for(lambda: receiver.received[-1:] == ['four'])
+    assert receiver.received == ['one', 'two', 'three', 'four']
@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from client.dto import Message, ReplyData
+from client.memberAgent import BaseMemberAgent
+from client.memory import AgentChats, MessageStore
+from client.retention import (MaxMessages, MaxTokens, PinnedLedger, PinnedPlusTail, build_context_window,
+                              is_system_message, message_tokens)
+
+
+def _message(index: int, chat_id: str = 'c', message_type: str = 'text', text: str = None) -> Message:
+    return Message(message=text or f'message {index}', message_type=message_type, chat_id=chat_id,
+                   from_member_id='peer', from_member_name='peer', message_id=f'm{index}', hlc=index + 1)
+
+
+def _history(count: int, pinned_every: int = 10):
+    return [_message(i, message_type='system' if i % pinned_every == 0 else 'text', text='x' * (i % 7 * 10))
+            for i in range(count)]
+
+
+def _fresh_ledger(store: MessageStore) -> PinnedLedger:
+    ledger = PinnedLedger(is_system_message)
+    ledger.sync(store)
+    return ledger
+
+
+def _assert_ledger_consistent(store: MessageStore):
+    ledger = store.pinned_ledger
+    fresh = _fresh_ledger(store)
+    ledger.sync(store)
+    assert list(ledger.pinned) == list(fresh.pinned)
+    assert ledger.unpinned == fresh.unpinned
+    assert ledger.unpinned_tokens(store) == fresh.unpinned_tokens(store)
+
+
+def test_message_store_dedup_and_tombstones():
+    store = MessageStore(_history(200))
+    assert not store.append(_message(5))
+    for i in range(0, 200, 2):
+        assert store.remove_by_id(f'm{i}') is not None
+    assert store.remove_by_id('m0') is None
+    assert len(store) == 100
+    assert [m.message_id for m in store][:3] == ['m1', 'm3', 'm5']
+    assert store.index_of('m5') == 2
+    assert store.get('m199').message_id == 'm199'
+    assert store.last().message_id == 'm199'
+
+
+def test_message_store_between_uses_hlc():
+    store = MessageStore(_history(50))
+    assert [m.message_id for m in store.between(11, 14)] == ['m10', 'm11', 'm12']
+    shuffled = _history(50)
+    random.Random(1).shuffle(shuffled)
+    unsorted = MessageStore(shuffled)
+    assert {m.message_id for m in unsorted.between(11, 14)} == {'m10', 'm11', 'm12'}
+
+
+def test_from_unique_falls_back_on_duplicates():
+    messages = _history(5)
+    assert len(MessageStore.from_unique(messages + messages[:1])) == 5
+    assert list(MessageStore.from_unique(messages)) == messages
+
+
+@pytest.mark.parametrize('policy', [MaxMessages(30), MaxTokens(400), PinnedPlusTail(20)])
+def test_retention_keeps_pinned_and_ledger_consistent(policy):
+    memory = AgentChats(member_id='me')
+    memory.set_retention([policy])
+    rng = random.Random(3)
+    for i, message in enumerate(_history(300)):
+        memory.add_message(message)
+        if i % 17 == 0:
+            victim = rng.choice(list(memory.chats['c'].messages))
+            memory.remove_message(victim.message_id, 'c')
+    store = memory.chats['c'].messages
+    _assert_ledger_consistent(store)
+    # 置顶消息不会被淘汰，除非被直接删除
+    pinned = [m for m in store if is_system_message(m)]
+    assert [m.message_id for m in memory.pinned_messages('c')] == [m.message_id for m in pinned]
+    # 用 ledger 的淘汰结果与逐条判断的结果一致，都不需要再淘汰
+    assert policy.evict(store, is_system_message, None) == []
+
+
+def test_ledger_resyncs_when_store_is_modified_directly():
+    memory = AgentChats(member_id='me')
+    for message in _history(40):
+        memory.add_message(message)
+    assert len(memory.pinned_messages('c')) == 4
+    store = memory.chats['c'].messages
+    # 绕过 AgentChats 修改
+    store.append(_message(1000, message_type='system'))
+    del store[1]
+    assert [m.message_id for m in memory.pinned_messages('c')] == ['m0', 'm10', 'm20', 'm30', 'm1000']
+    _assert_ledger_consistent(store)
+
+
+def test_max_tokens_ledger_path_matches_scan():
+    messages = _history(200)
+    ledger_store = MessageStore(messages)
+    ledger = _fresh_ledger(ledger_store)
+    with_ledger = MaxTokens(500).evict(ledger_store, is_system_message, ledger)
+    without = MaxTokens(500).evict(messages, is_system_message, None)
+    assert [m.message_id for m in with_ledger] == [m.message_id for m in without]
+    kept = [m for m in messages if m not in with_ledger and not is_system_message(m)]
+    assert sum(message_tokens(m) for m in kept) <= 500
+
+
+def test_context_window_with_precomputed_pinned_matches_scan():
+    messages = _history(500)
+    pinned = [m for m in messages if is_system_message(m)]
+    for budget in (50, 500, 5000):
+        assert build_context_window(messages, budget, reserved=20) == \
+               build_context_window(messages, budget, reserved=20, pinned=pinned)
+
+
+def test_reply_builds_the_window_once():
+    class Agent(BaseMemberAgent):
+        def get_ai_response(self, prompt, chat):
+            self.seen = list(chat.messages)
+            return 'ok'
+
+        def send_message(self, message, chat_id):
+            return None
+
+    agent = Agent('me', 'me')
+    agent.context_token_budget = 200
+    agent.prompt = 'prompt'
+    for message in _history(300):
+        agent.memory.add_message(message)
+    agent.reply(ReplyData(chat_id='c'))
+    assert agent.seen == agent.get_context_window('c', agent.prompt)
+    assert len(agent.seen) < 300
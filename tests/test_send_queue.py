@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from client.dto import Message
+from client.events import Events
+from client.sendQueue import SendQueue
+
+
+class FakeSocket:
+    """记录发出的请求，由测试决定何时确认"""
+
+    def __init__(self):
+        self.sent = []
+        self.sent_event = threading.Condition()
+
+    def emit(self, event, data, callback=None):
+        with self.sent_event:
+            self.sent.append((event, data, callback))
+            self.sent_event.notify_all()
+
+    def ack(self, index: int):
+        event, data, callback = self.sent[index]
+        if event == Events.SEND_MESSAGE:
+            callback({'message_id': data['message_id'], 'status': 'success', 'hlc': 100 + index})
+        else:
+            callback([{'message_id': m['message_id'], 'status': 'success'} for m in data['messages']])
+
+
+class FakeClient:
+    def __init__(self):
+        self.socket = FakeSocket()
+        self.adopted = []
+
+    def adopt_ack(self, message, ack):
+        self.adopted.append(message.message_id)
+
+
+def _message(chat_id: str, message_id: str) -> Message:
+    return Message(message=message_id, message_type='text', chat_id=chat_id, from_member_id='me',
+                   message_id=message_id)
+
+
+def _sent_ids(socket: FakeSocket):
+    ids = []
+    for event, data, _ in socket.sent:
+        if event == Events.SEND_MESSAGE:
+            ids.append([data['message_id']])
+        else:
+            ids.append([m['message_id'] for m in data['messages']])
+    return ids
+
+
+def test_one_request_per_chat_and_batching():
+    client = FakeClient()
+    queue = SendQueue(client)
+    futures = [queue.submit(_message('a', f'a{i}')) for i in range(3)]
+    queue.submit(_message('b', 'b0'))
+    # a0 在途时 a1、a2 累积；b 不受 a 的阻塞
+    assert _sent_ids(client.socket) == [['a0'], ['b0']]
+    client.socket.ack(0)
+    assert _sent_ids(client.socket) == [['a0'], ['b0'], ['a1', 'a2']]
+    client.socket.ack(2)
+    assert [f.result(0)['message_id'] for f in futures] == ['a0', 'a1', 'a2']
+    assert queue.flush('a', timeout=0)
+    assert not queue.flush(timeout=0)
+    client.socket.ack(1)
+    assert queue.flush(timeout=0)
+
+
+def test_window_limits_requests_in_flight():
+    client = FakeClient()
+    queue = SendQueue(client, window=2)
+    for chat_id in 'abc':
+        queue.submit(_message(chat_id, chat_id))
+    assert _sent_ids(client.socket) == [['a'], ['b']]
+    client.socket.ack(0)
+    assert _sent_ids(client.socket) == [['a'], ['b'], ['c']]
+
+
+def test_timed_out_chat_stays_blocked_until_late_ack():
+    client = FakeClient()
+    queue = SendQueue(client, window=1, ack_timeout=0.05)
+    first = queue.submit(_message('a', 'a0'))
+    second = queue.submit(_message('a', 'a1'))
+    other = queue.submit(_message('b', 'b0'))
+    with pytest.raises(TimeoutError):
+        first.result(2)
+    # 超时让出了窗口，其他 chat 可以继续发送，但 a1 必须等 a0 的确认
+    with client.socket.sent_event:
+        client.socket.sent_event.wait_for(lambda: len(client.socket.sent) == 2, 2)
+    assert _sent_ids(client.socket) == [['a0'], ['b0']]
+    client.socket.ack(1)
+    assert other.result(0)['message_id'] == 'b0'
+    assert not second.done()
+
+    client.socket.ack(0)
+    assert 'a0' in client.adopted
+    assert _sent_ids(client.socket) == [['a0'], ['b0'], ['a1']]
+    client.socket.ack(2)
+    assert second.result(0)['message_id'] == 'a1'
+    assert queue.stats()['timeouts'] == 1
+    assert queue.stats()['in_flight'] == 0
+
+
+def test_abort_in_flight_releases_blocked_chats():
+    client = FakeClient()
+    queue = SendQueue(client, ack_timeout=0.05)
+    first = queue.submit(_message('a', 'a0'))
+    with pytest.raises(TimeoutError):
+        first.result(2)
+    second = queue.submit(_message('a', 'a1'))
+    third = queue.submit(_message('b', 'b0'))
+    assert _sent_ids(client.socket) == [['a0'], ['b0']]
+
+    queue.abort_in_flight()
+    with pytest.raises(ConnectionError):
+        third.result(0)
+    assert _sent_ids(client.socket) == [['a0'], ['b0'], ['a1']]
+    client.socket.ack(2)
+    assert second.result(0)['message_id'] == 'a1'
+    assert queue.stats()['in_flight'] == 0
+
+
+def test_single_reaper_thread():
+    client = FakeClient()
+    queue = SendQueue(client, ack_timeout=0.05)
+    before = threading.active_count()
+    futures = [queue.submit(_message(f'c{i}', f'm{i}')) for i in range(8)]
+    assert threading.active_count() <= before + 1
+    for future in futures:
+        with pytest.raises(TimeoutError):
+            future.result(2)
+    deadline = time.monotonic() + 2
+    while queue._reaper is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue._reaper is None
@@ -0,0 +1,44 @@
+from unittest import mock
+
+import pytest
+
+from client import memberClient
+from client.events import Events
+from client.loopbackServer import LoopbackServer
+from client.memberAgent import BaseMemberAgent
+from client.sharedConnection import MemberSocket, SharedConnection
+
+
+@pytest.fixture
+def server():
+    server = LoopbackServer()
+    yield server
+    server.stop()
+
+
+def test_injected_socket_skips_creating_a_client(server):
+    connection = SharedConnection()
+    server.bind(connection)
+    server.signup('a', 'a')
+    with mock.patch.object(memberClient, 'create_socket') as create_socket:
+        agent = BaseMemberAgent('a', 'a', socket=connection.member_socket('a', 'a'))
+    create_socket.assert_not_called()
+    socket = agent.socket
+    assert connection.bind(agent) is socket
+    assert agent.login()
+    ok, chat = agent.create_chat('room')
+    assert ok and chat.created_by == 'a'
+
+
+def test_unattached_member_is_rejected(server):
+    connection = SharedConnection()
+    server.bind(connection)
+    server.signup('a', 'a')
+    server.signup('ghost', 'ghost')
+    agent = BaseMemberAgent('a', 'a', socket=connection.member_socket('a', 'a'))
+    assert agent.login()
+    ghost = MemberSocket(connection, 'ghost', 'ghost')
+    rsp = ghost.call(Events.CREATE_CHAT, {'name': 'room'})
+    assert rsp['status'] == 'failed' and 'ghost' in rsp['message']
+    rsp = ghost.call(Events.GET_JOINED_CHATS)
+    assert rsp['status'] == 'failed'